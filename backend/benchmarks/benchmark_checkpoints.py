@@ -0,0 +1,118 @@
+"""
+Benchmark: costo de escribir el checkpoint de cada batch (deltas vs estado completo).
+
+Simula un trabajo largo y guarda un checkpoint al terminar cada batch en una
+base SQLite temporal:
+
+- "deltas": lo que guarda CheckpointsTrabajo, solo el delta del batch (sus
+  codificaciones, conceptos nuevos y contadores).
+- "estado completo": un checkpoint que vuelve a serializar todas las
+  codificaciones acumuladas en cada batch, como un checkpointer genérico que
+  guarda el valor completo de cada canal que cambió.
+
+Con deltas el costo por batch debe ser plano a lo largo del trabajo; con el
+estado completo crece con las codificaciones acumuladas. También mide cuánto
+tarda reanudar (leer y reaplicar todos los deltas).
+
+Uso (desde backend/):
+    python benchmarks/benchmark_checkpoints.py
+    python benchmarks/benchmark_checkpoints.py --respuestas 50000 --batch 25
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from cod_backend.core.codificacion.graph.checkpoints import (  # noqa: E402
+    CheckpointsTrabajo,
+    restaurar_estado,
+)
+
+
+def _codificacion(fila: int) -> Dict[str, Any]:
+    return {
+        "fila_excel": fila,
+        "texto": f"respuesta de ejemplo número {fila} sobre el precio y la atención",
+        "decision": "historico",
+        "codigos_historicos": [1, 3],
+        "codigos_nuevos": [],
+        "dato_auxiliar": None,
+        "categoria": None,
+    }
+
+
+def _delta(batch: int, tamanio: int) -> Dict[str, Any]:
+    inicio = batch * tamanio
+    return {
+        "codificaciones": [_codificacion(inicio + i + 2) for i in range(tamanio)],
+        "indice_conceptos": {f"concepto {batch}": 1000 + batch},
+        "proximo_codigo_nuevo": 1001 + batch,
+        "prompt_tokens": 3000,
+        "completion_tokens": 800,
+        "total_tokens": 3800,
+    }
+
+
+def _medir(esquema: str, total_batches: int, tamanio: int, ruta: str) -> List[float]:
+    """Tiempo de escritura del checkpoint de cada batch (segundos)."""
+    checkpoints = CheckpointsTrabajo(ruta)
+    checkpoints.batches_completados("bench", esquema)
+    acumuladas: List[Dict[str, Any]] = []
+    tiempos: List[float] = []
+    for batch in range(total_batches):
+        delta = _delta(batch, tamanio)
+        inicio = time.perf_counter()
+        if esquema == "deltas":
+            checkpoints.guardar_batch("bench", batch, delta)
+        else:
+            acumuladas.extend(delta["codificaciones"])
+            checkpoints.guardar_batch("bench", 0, {**delta, "codificaciones": acumuladas})
+        tiempos.append(time.perf_counter() - inicio)
+    checkpoints.cerrar()
+    return tiempos
+
+
+def _ms(duraciones: List[float]) -> float:
+    ordenadas = sorted(duraciones)
+    return ordenadas[len(ordenadas) // 2] * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--respuestas", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=20)
+    args = parser.parse_args()
+    total_batches = args.respuestas // args.batch
+
+    with tempfile.TemporaryDirectory() as directorio:
+        deltas = _medir("deltas", total_batches, args.batch, str(Path(directorio) / "deltas.sqlite"))
+        completo = _medir("completo", total_batches, args.batch, str(Path(directorio) / "completo.sqlite"))
+
+        checkpoints = CheckpointsTrabajo(str(Path(directorio) / "deltas.sqlite"))
+        inicio = time.perf_counter()
+        hechos = checkpoints.batches_completados("bench", "deltas")
+        estado = restaurar_estado(
+            {"codificaciones": [], "indice_conceptos": {}, "prompt_tokens": 0, "completion_tokens": 0,
+             "total_tokens": 0},
+            (hechos[i] for i in sorted(hechos)),
+        )
+        reanudar = time.perf_counter() - inicio
+        checkpoints.cerrar()
+
+    print(f"{args.respuestas} respuestas en {total_batches} batches de {args.batch}\n")
+    print("Mediana del checkpoint por batch (ms), por décimo del trabajo:")
+    print(f"{'décimo':>7} | {'deltas':>8} | {'estado completo':>15}")
+    paso = max(total_batches // 10, 1)
+    for decil in range(0, total_batches, paso):
+        print(f"{decil // paso + 1:>7} | {_ms(deltas[decil:decil + paso]):>8.3f} | "
+              f"{_ms(completo[decil:decil + paso]):>15.3f}")
+    print(f"\nTotal escribiendo checkpoints: deltas {sum(deltas):.2f}s | estado completo {sum(completo):.2f}s")
+    print(f"Reanudar ({len(estado['codificaciones'])} codificaciones): {reanudar * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
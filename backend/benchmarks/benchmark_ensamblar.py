@@ -0,0 +1,105 @@
+"""
+Benchmark: ensamblado de un batch indexado por respuesta_id vs búsqueda lineal.
+
+Genera batches sintéticos (validaciones, evaluaciones y cobertura del LLM para
+cada respuesta, en orden aleatorio) y mide por tamaño de batch:
+
+- "indexado": nodo_ensamblar, que indexa los resultados del batch por
+  respuesta_id una vez y busca cada respuesta en O(1).
+- "lineal": las búsquedas del ensamblado anterior, un `next(...)` sobre
+  evaluaciones y cobertura por cada respuesta (cuadrático en el batch).
+
+Con el índice, el tiempo por respuesta se mantiene al crecer el batch.
+
+Uso (desde backend/):
+    python benchmarks/benchmark_ensamblar.py
+    python benchmarks/benchmark_ensamblar.py --tamanios 50 100 500 2000 --repeticiones 20
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from cod_backend.core.codificacion.nodes import nodo_ensamblar  # noqa: E402
+
+CATALOGO = [{"codigo": c, "descripcion": f"Concepto {c}"} for c in range(1, 31)]
+
+
+def _estado_batch(tamanio: int, semilla: int) -> Dict[str, Any]:
+    """Estado de ensamblado de un batch sintético (sin conceptos nuevos)."""
+    rng = random.Random(semilla)
+    ids = list(range(1, tamanio + 1))
+    evaluaciones = [
+        {
+            "respuesta_id": rid,
+            "evaluaciones": [
+                {"codigo": c["codigo"], "aplica": rng.random() < 0.1, "confianza": 0.9} for c in CATALOGO
+            ],
+        }
+        for rid in ids
+    ]
+    cobertura = [{"respuesta_id": rid, "conceptos_nuevos": []} for rid in ids]
+    rng.shuffle(evaluaciones)
+    rng.shuffle(cobertura)
+    return {
+        "catalogo": CATALOGO,
+        "indice_conceptos": {},
+        "batch_respuestas": [{"fila_excel": rid + 1, "texto": f"respuesta {rid}"} for rid in ids],
+        "validaciones_batch": [{"respuesta_id": rid, "es_valida": True} for rid in ids],
+        "evaluaciones_batch": evaluaciones,
+        "cobertura_batch": cobertura,
+        "respuestas_especiales": {},
+    }
+
+
+def _busqueda_lineal(state: Dict[str, Any]) -> None:
+    """Búsquedas por respuesta del ensamblado anterior."""
+    for i in range(len(state["batch_respuestas"])):
+        resp_id = i + 1
+        next((ev for ev in state["evaluaciones_batch"] if ev["respuesta_id"] == resp_id), {"evaluaciones": []})
+        next((c for c in state["cobertura_batch"] if c["respuesta_id"] == resp_id), {"conceptos_nuevos": []})
+
+
+def _indexado(state: Dict[str, Any]) -> None:
+    asyncio.run(nodo_ensamblar(state))
+
+
+def _medir(funcion: Callable[[Dict[str, Any]], None], state: Dict[str, Any], repeticiones: int) -> float:
+    """Mejor tiempo de `repeticiones` corridas (segundos)."""
+    tiempos: List[float] = []
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion(state)
+            tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanios", type=int, nargs="+", default=[25, 50, 100, 200, 400, 800],
+                        help="Respuestas por batch")
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"Catálogo de {len(CATALOGO)} códigos | mejor de {args.repeticiones} corridas\n")
+    print(f"{'batch':>6} | {'ensamblar indexado':>18} | {'por respuesta':>13} | "
+          f"{'solo búsquedas lineales':>23} | {'por respuesta':>13}")
+    for tamanio in args.tamanios:
+        state = _estado_batch(tamanio, args.semilla)
+        indexado = _medir(_indexado, state, args.repeticiones)
+        lineal = _medir(_busqueda_lineal, state, args.repeticiones)
+        print(f"{tamanio:>6} | {indexado * 1000:>16.2f}ms | {indexado / tamanio * 1e6:>11.1f}µs | "
+              f"{lineal * 1000:>21.2f}ms | {lineal / tamanio * 1e6:>11.1f}µs")
+
+
+if __name__ == "__main__":
+    main()
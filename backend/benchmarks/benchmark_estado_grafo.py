@@ -0,0 +1,180 @@
+"""
+Benchmark: costo por batch del estado del grafo (deltas vs copias).
+
+Corre el grafo de codificación (preparar_batch → codificar → ensamblar →
+finalizar) sobre un trabajo grande y mide el tiempo de cada batch:
+
+- "deltas": el estado actual, con nodos que devuelven solo lo que cambian y
+  el canal de solo-agregar `codificaciones`.
+- "copias": el esquema anterior, en el que cada nodo devolvía `{**state, ...}`
+  y ensamblar hacía `state["codificaciones"] + codificaciones_batch`.
+
+El nodo de codificación se reemplaza por uno sintético (sin LLM, sin códigos
+nuevos) para medir solo el transporte del estado; preparar_batch, ensamblar y
+finalizar son los reales. Con deltas, el costo por batch debe ser plano a lo
+largo del trabajo; con copias crece con las codificaciones acumuladas.
+
+Uso (desde backend/):
+    python benchmarks/benchmark_estado_grafo.py
+    python benchmarks/benchmark_estado_grafo.py --respuestas 100000 --batch 50
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Annotated, Any, Dict, List, TypedDict, get_args, get_origin, get_type_hints
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from langgraph.graph import StateGraph, END  # noqa: E402
+from langchain_core.runnables import RunnableConfig  # noqa: E402
+
+from cod_backend.core.codificacion.graph.builder import nodo_finalizar  # noqa: E402
+from cod_backend.core.codificacion.graph.state import EstadoCodificacion  # noqa: E402
+from cod_backend.core.codificacion.nodes import (  # noqa: E402
+    decidir_continuar,
+    nodo_ensamblar,
+    nodo_preparar_batch,
+)
+
+# El mismo estado sin reductores: cada clave devuelta sobrescribe el canal
+EstadoSinReductores = TypedDict("EstadoSinReductores", {
+    clave: get_args(tipo)[0] if get_origin(tipo) is Annotated else tipo
+    for clave, tipo in get_type_hints(EstadoCodificacion, include_extras=True).items()
+})
+
+
+async def _codificar_sintetico(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Resultado fijo por respuesta: válida, código 1 del catálogo, sin conceptos nuevos."""
+    ids = range(1, len(state["batch_respuestas"]) + 1)
+    return {
+        "validaciones_batch": [{"respuesta_id": rid, "es_valida": True} for rid in ids],
+        "evaluaciones_batch": [
+            {"respuesta_id": rid, "evaluaciones": [{"codigo": 1, "aplica": True, "confianza": 0.95}]}
+            for rid in ids
+        ],
+        "cobertura_batch": [],
+        "respuestas_especiales": {},
+        "prompt_tokens": 1000,
+        "completion_tokens": 200,
+        "total_tokens": 1200,
+    }
+
+
+def _con_copias(nodo):
+    """Nodo al estilo anterior: devuelve el estado completo con su delta aplicado."""
+    async def _nodo(state: Dict[str, Any]) -> Dict[str, Any]:
+        delta = await nodo(state)
+        if "codificaciones" in delta:
+            delta = {**delta, "codificaciones": state["codificaciones"] + delta["codificaciones"]}
+        for contador in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            if contador in delta:
+                delta[contador] = state.get(contador, 0) + delta[contador]
+        return {**state, **delta}
+    return _nodo
+
+
+def _grafo(esquema: str, tiempos: List[float]):
+    """Grafo con la topología de construir_grafo; `tiempos` recibe el fin de cada batch."""
+    async def _finalizar(state: Dict[str, Any]) -> Dict[str, Any]:
+        tiempos.append(time.perf_counter())
+        return await nodo_finalizar(state)
+
+    async def _continuar(state: Dict[str, Any]) -> str:
+        return await decidir_continuar(state)
+
+    nodos = {
+        "preparar_batch": nodo_preparar_batch,
+        "codificar_combinado": _codificar_sintetico,
+        "ensamblar": nodo_ensamblar,
+        "finalizar": _finalizar,
+    }
+    if esquema == "copias":
+        workflow = StateGraph(EstadoSinReductores)
+        nodos = {nombre: _con_copias(nodo) for nombre, nodo in nodos.items()}
+    else:
+        workflow = StateGraph(EstadoCodificacion)
+    for nombre, nodo in nodos.items():
+        workflow.add_node(nombre, nodo)
+    workflow.set_entry_point("preparar_batch")
+    workflow.add_edge("preparar_batch", "codificar_combinado")
+    workflow.add_edge("codificar_combinado", "ensamblar")
+    workflow.add_edge("ensamblar", "finalizar")
+    workflow.add_conditional_edges(
+        "finalizar", _continuar, {"preparar_batch": "preparar_batch", "finalizar": END}
+    )
+    return workflow.compile()
+
+
+def _estado_inicial(total: int, batch: int) -> Dict[str, Any]:
+    respuestas = [
+        {"fila_excel": i + 2, "texto": f"el precio es justo para lo que ofrecen {i}", "dato_auxiliar": None}
+        for i in range(total)
+    ]
+    estado: Dict[str, Any] = {
+        clave: 0 for clave in get_type_hints(EstadoCodificacion) if clave.endswith(("tokens", "_rapido"))
+    }
+    estado.update({
+        "pregunta": "P1",
+        "modelo_gpt": "determinista",
+        "backend_llm": "determinista",
+        "batch_size": batch,
+        "limites_batches": [*range(0, total, batch), total],
+        "respuestas": respuestas,
+        "catalogo": [{"codigo": 1, "descripcion": "Precio"}],
+        "batch_actual": 0,
+        "batch_respuestas": [],
+        "codificaciones": [],
+        "validaciones_batch": [],
+        "evaluaciones_batch": [],
+        "cobertura_batch": [],
+        "respuestas_especiales": {},
+        "proximo_codigo_nuevo": 2,
+        "config_auxiliar": None,
+    })
+    return estado
+
+
+async def _medir(esquema: str, total: int, batch: int) -> List[float]:
+    """Duración de cada batch (segundos)."""
+    tiempos: List[float] = []
+    app = _grafo(esquema, tiempos)
+    estado = _estado_inicial(total, batch)
+    total_batches = len(estado["limites_batches"]) - 1
+    config = RunnableConfig(recursion_limit=total_batches * 4 + 10)
+    inicio = time.perf_counter()
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        final = await app.ainvoke(estado, config)
+    assert len(final["codificaciones"]) == total
+    marcas = [inicio, *tiempos]
+    return [fin - ini for ini, fin in zip(marcas, marcas[1:])]
+
+
+def _ms(duraciones: List[float]) -> float:
+    duraciones = sorted(duraciones)
+    return duraciones[len(duraciones) // 2] * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--respuestas", type=int, default=50_000, help="Respuestas del trabajo")
+    parser.add_argument("--batch", type=int, default=50, help="Respuestas por batch")
+    parser.add_argument("--esquemas", nargs="+", default=["deltas", "copias"], choices=["deltas", "copias"])
+    args = parser.parse_args()
+
+    total_batches = -(-args.respuestas // args.batch)
+    decimo = max(total_batches // 10, 1)
+    print(f"{args.respuestas} respuestas | batches de {args.batch} | {total_batches} batches")
+    print("Mediana del tiempo por batch (ms) en cada décimo del trabajo\n")
+    print(f"{'esquema':>8} | " + " ".join(f"{d * 10:>4}%" for d in range(1, 11)) + " | último/primero | total")
+    for esquema in args.esquemas:
+        duraciones = asyncio.run(_medir(esquema, args.respuestas, args.batch))
+        medianas = [_ms(duraciones[i:i + decimo]) for i in range(0, decimo * 10, decimo)]
+        print(f"{esquema:>8} | " + " ".join(f"{m:>5.2f}" for m in medianas) +
+              f" | {medianas[-1] / medianas[0]:>13.2f}x | {sum(duraciones):>4.1f}s")
+
+if __name__ == "__main__":
+    main()
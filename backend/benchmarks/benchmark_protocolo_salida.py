@@ -0,0 +1,194 @@
+"""
+Benchmark: protocolo de salida "completo" vs "compacto".
+
+Compara, por tamaño de catálogo, los tokens de salida (completion) de un batch
+y su latencia estimada:
+
+- Modo sintético (por defecto, sin red): genera la salida que el modelo
+  devolvería en cada protocolo para un batch de respuestas (la misma
+  codificación en ambos), cuenta sus tokens con tiktoken y estima la latencia
+  como TTFT + tokens / velocidad de generación + tiempo medido de parseo,
+  validación y expansión.
+- Modo API (--api): llama al modelo real con las dos plantillas sobre el mismo
+  batch sintético y mide tokens de salida y latencia de pared.
+
+Uso (desde backend/):
+    python benchmarks/benchmark_protocolo_salida.py
+    python benchmarks/benchmark_protocolo_salida.py --catalogos 20 100 300 --batch 30
+    python benchmarks/benchmark_protocolo_salida.py --api --modelo gpt-4o-mini
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from langchain_core.messages import AIMessage  # noqa: E402
+
+from cod_backend.core.codificacion.llm import PROTOCOLO_COMPACTO, PROTOCOLO_COMPLETO  # noqa: E402
+from cod_backend.core.codificacion.nodes import codificar_combinado as cc  # noqa: E402
+
+TEMAS = [
+    "precio", "atención", "sabor", "calidad", "rapidez", "limpieza", "variedad",
+    "ubicación", "promociones", "estacionamiento", "horario", "tamaño",
+]
+
+
+def _contador_tokens() -> Callable[[str], int]:
+    """Cuenta tokens con tiktoken (o ~4 caracteres por token si no está instalado)."""
+    try:
+        import tiktoken
+        codificador = tiktoken.get_encoding("o200k_base")
+        return lambda texto: len(codificador.encode(texto))
+    except Exception:
+        return lambda texto: len(texto) // 4 + 1
+
+
+def _generar_batch(num_codigos: int, tamanio_batch: int, semilla: int) -> Tuple[List[Dict[str, Any]], List[str], Dict[str, Any]]:
+    """
+    Genera catálogo, respuestas y la codificación "verdadera" del batch.
+
+    Returns:
+        Tupla con (catálogo, líneas de respuestas del prompt, codificación por respuesta)
+    """
+    rng = random.Random(semilla)
+    catalogo = [
+        {"codigo": i + 1, "descripcion": f"{TEMAS[i % len(TEMAS)].capitalize()} {i // len(TEMAS) + 1}"}
+        for i in range(num_codigos)
+    ]
+    respuestas: List[str] = []
+    codificacion: Dict[int, Dict[str, Any]] = {}
+    codigo_nuevo = num_codigos + 1
+    for rid in range(1, tamanio_batch + 1):
+        aplican = rng.sample(range(1, num_codigos + 1), k=rng.choice([1, 1, 2]))
+        respuestas.append(f"{rid}. me gustó el {rng.choice(TEMAS)} y la {rng.choice(TEMAS)}")
+        nuevos = []
+        if rng.random() < 0.3:
+            nuevos.append({"codigo": codigo_nuevo, "descripcion": f"Concepto nuevo {codigo_nuevo}",
+                           "texto_original": "algo distinto"})
+            codigo_nuevo += 1
+        codificacion[rid] = {"valida": rng.random() > 0.05, "aplican": aplican, "nuevos": nuevos}
+    return catalogo, respuestas, codificacion
+
+
+def _salida_completa(catalogo: List[Dict[str, Any]], codificacion: Dict[int, Dict[str, Any]]) -> str:
+    """Salida en el protocolo completo: un veredicto por código del catálogo."""
+    salida: Dict[str, List[Dict[str, Any]]] = {"validaciones": [], "evaluaciones": [], "analisis": []}
+    for rid, cod in codificacion.items():
+        salida["validaciones"].append({
+            "respuesta_id": rid, "es_valida": cod["valida"],
+            "razon": "Contiene información relevante" if cod["valida"] else "Ruido sin contenido",
+        })
+        salida["evaluaciones"].append({
+            "respuesta_id": rid,
+            "evaluaciones": [
+                {"codigo": c["codigo"], "aplica": c["codigo"] in cod["aplican"],
+                 "confianza": 0.92 if c["codigo"] in cod["aplican"] else 0.1}
+                for c in catalogo
+            ] if cod["valida"] else [],
+        })
+        salida["analisis"].append({
+            "respuesta_id": rid, "respuesta_cubierta_completamente": not cod["nuevos"],
+            "conceptos_nuevos": cod["nuevos"] if cod["valida"] else [],
+        })
+    return json.dumps(salida, ensure_ascii=False)
+
+
+def _salida_compacta(codificacion: Dict[int, Dict[str, Any]]) -> str:
+    """Salida en el protocolo compacto: solo los códigos que aplican."""
+    salida = {"r": [
+        {
+            "id": rid, "ok": cod["valida"], "razon": "" if cod["valida"] else "Ruido sin contenido",
+            "cod": [{"c": c, "p": 0.92} for c in cod["aplican"]] if cod["valida"] else [],
+            "cub": not cod["nuevos"],
+            "nuevos": [{"c": n["codigo"], "d": n["descripcion"], "t": n["texto_original"]}
+                       for n in cod["nuevos"]] if cod["valida"] else [],
+        }
+        for rid, cod in codificacion.items()
+    ]}
+    return json.dumps(salida, ensure_ascii=False)
+
+
+def _tiempo_parseo(contenido: str, protocolo: str, repeticiones: int = 20) -> float:
+    """Tiempo medio (s) de parseo + validación (+ expansión) de una salida."""
+    mensaje = AIMessage(content=contenido)
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        cc._parsear_salida(mensaje, estructurada=True, protocolo=protocolo)
+    return (time.perf_counter() - inicio) / repeticiones
+
+
+def benchmark_sintetico(args: argparse.Namespace) -> None:
+    """Compara ambos protocolos con salidas sintéticas (sin red)."""
+    contar = _contador_tokens()
+    print(f"Batch de {args.batch} respuestas | TTFT {args.ttft}s | {args.tokens_por_segundo} tokens/s\n")
+    print(f"{'catálogo':>9} | {'tokens completo':>15} | {'tokens compacto':>15} | {'reducción':>9} | "
+          f"{'latencia completo':>17} | {'latencia compacto':>17}")
+    for num_codigos in args.catalogos:
+        catalogo, _respuestas, codificacion = _generar_batch(num_codigos, args.batch, args.semilla)
+        filas = {}
+        for protocolo, contenido in (
+            (PROTOCOLO_COMPLETO, _salida_completa(catalogo, codificacion)),
+            (PROTOCOLO_COMPACTO, _salida_compacta(codificacion)),
+        ):
+            tokens = contar(contenido)
+            latencia = args.ttft + tokens / args.tokens_por_segundo + _tiempo_parseo(contenido, protocolo)
+            filas[protocolo] = (tokens, latencia)
+        completo, compacto = filas[PROTOCOLO_COMPLETO], filas[PROTOCOLO_COMPACTO]
+        reduccion = 1 - compacto[0] / completo[0]
+        print(f"{num_codigos:>9} | {completo[0]:>15} | {compacto[0]:>15} | {reduccion:>8.1%} | "
+              f"{completo[1]:>16.1f}s | {compacto[1]:>16.1f}s")
+
+
+async def benchmark_api(args: argparse.Namespace) -> None:
+    """Compara ambos protocolos con llamadas reales al modelo."""
+    print(f"Modelo {args.modelo} | batch de {args.batch} respuestas\n")
+    print(f"{'catálogo':>9} | {'protocolo':>9} | {'prompt':>7} | {'completion':>10} | {'latencia':>8}")
+    for num_codigos in args.catalogos:
+        catalogo, respuestas, _codificacion = _generar_batch(num_codigos, args.batch, args.semilla)
+        for protocolo in (PROTOCOLO_COMPLETO, PROTOCOLO_COMPACTO):
+            state: Dict[str, Any] = {
+                "modelo_gpt": args.modelo,
+                "protocolo_salida": protocolo,
+                "salida_estructurada": True,
+            }
+            contexto = {
+                "pregunta": "¿Qué fue lo que más le gustó de su visita?",
+                "catalogo": "\n".join(f"  {c['codigo']}. {c['descripcion']}" for c in catalogo),
+                "codigos_existentes": "No hay códigos nuevos creados en batches anteriores.",
+            }
+            metricas = {"reintentos_llm": 0, "reintentos_429": 0, "cached_tokens": 0, "reparaciones_json": 0}
+            inicio = time.perf_counter()
+            _resultado, prompt_tokens, completion_tokens = await cc._llamar_llm(
+                state, contexto, respuestas, num_codigos + 1, metricas
+            )
+            latencia = time.perf_counter() - inicio
+            print(f"{num_codigos:>9} | {protocolo:>9} | {prompt_tokens:>7} | {completion_tokens:>10} | {latencia:>7.1f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalogos", type=int, nargs="+", default=[20, 50, 100, 200],
+                        help="Tamaños de catálogo a comparar")
+    parser.add_argument("--batch", type=int, default=20, help="Respuestas por batch")
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--ttft", type=float, default=0.6, help="Tiempo hasta el primer token (s)")
+    parser.add_argument("--tokens-por-segundo", type=float, default=80.0,
+                        help="Velocidad de generación del modelo (tokens de salida por segundo)")
+    parser.add_argument("--api", action="store_true", help="Llamar al modelo real (requiere OPENAI_API_KEY)")
+    parser.add_argument("--modelo", default="gpt-4o-mini")
+    args = parser.parse_args()
+
+    if args.api:
+        asyncio.run(benchmark_api(args))
+    else:
+        benchmark_sintetico(args)
+
+
+if __name__ == "__main__":
+    main()
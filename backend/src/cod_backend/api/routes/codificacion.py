@@ -12,10 +12,11 @@ import time
 
 from ...schemas.api_schemas import CodificacionRequest, CodificacionResponse
 from ...core.codificador_nuevo import CodificadorNuevo
+from ...core.codificacion.graph.checkpoints import obtener_checkpoints
 from ...utils import save_data, obtener_mensaje_error_descriptivo, formatear_error_para_frontend
 from ... import config
 from .progress import crear_proceso, obtener_proceso, eliminar_proceso
-from typing import Union
+from typing import Optional, Union
 
 router = APIRouter()
 
@@ -24,6 +25,10 @@ def limpiar_archivos_temporales(horas_antiguedad: int = 24):
     """
     Limpia archivos temporales más antiguos que el tiempo especificado.
     
+    Los archivos de entrada de trabajos con checkpoint se conservan mientras el
+    checkpoint exista (hasta CHECKPOINTS_MAX_DIAS sin actividad), para poder
+    reanudarlos.
+    
     Args:
         horas_antiguedad: Archivos más antiguos que estas horas serán eliminados (default: 24)
     """
@@ -32,12 +37,14 @@ def limpiar_archivos_temporales(horas_antiguedad: int = 24):
         return
     
     tiempo_limite = time.time() - (horas_antiguedad * 3600)
+    checkpoints = obtener_checkpoints()
+    conservar = checkpoints.rutas_registradas() if checkpoints is not None else set()
     archivos_eliminados = 0
     espacio_liberado = 0
     
     try:
         for archivo in temp_dir.iterdir():
-            if archivo.is_file():
+            if archivo.is_file() and archivo.resolve() not in conservar:
                 # Verificar antigüedad del archivo
                 tiempo_modificacion = archivo.stat().st_mtime
                 if tiempo_modificacion < tiempo_limite:
@@ -62,17 +69,38 @@ async def ejecutar_codificacion_con_progreso(
     codificador: CodificadorNuevo,
     ruta_respuestas: str,
     ruta_codigos: str | None,
-    nombre_archivo: str
+    nombre_archivo: str,
+    parametros_codificador: Optional[dict] = None
 ):
     """
     Ejecuta la codificación con actualización de progreso en tiempo real
+    
+    Con `parametros_codificador` (las opciones de CodificadorNuevo) el trabajo
+    queda registrado en los checkpoints: si falla o se cancela, los archivos
+    temporales se conservan y se puede reanudar con
+    /control/{proceso_id}/reanudar-desde-checkpoint. El modo lote no guarda
+    checkpoints por batch, así que sus trabajos no se registran.
     """
+    checkpoints = (
+        obtener_checkpoints()
+        if parametros_codificador is not None and not codificador.modo_lote
+        else None
+    )
     try:
         controlador = obtener_proceso(proceso_id)
         if not controlador:
             return
         
         controlador.mensaje = "📤 Preparando archivos..."
+        if checkpoints is not None:
+            checkpoints.registrar_trabajo(proceso_id, {
+                "ruta_respuestas": ruta_respuestas,
+                "ruta_codigos": ruta_codigos,
+                "nombre_archivo": nombre_archivo,
+                "total_respuestas": controlador.total_respuestas,
+                "total_batches": controlador.total_batches,
+                "codificador": parametros_codificador,
+            })
         
         # Cargar datos para obtener el total (solo filas con respuesta no vacía)
         import pandas as pd
@@ -91,7 +119,7 @@ async def ejecutar_codificacion_con_progreso(
             total_respuestas = len(df)
         
         # Callback para actualizar progreso durante la codificación REAL
-        def actualizar_progreso_real(progreso: float, mensaje: str):
+        async def actualizar_progreso_real(progreso: float, mensaje: str):
             """
             Callback llamado por el codificador durante el procesamiento
             progreso: float de 0-1 (porcentaje real del codificador)
@@ -101,10 +129,9 @@ async def ejecutar_codificacion_con_progreso(
             if controlador.cancelado:
                 raise Exception("Proceso cancelado por el usuario")
             
-            # Verificar si está pausado (bloquear hasta que se reanude)
+            # Verificar si está pausado (esperar sin bloquear el event loop)
             while controlador.pausado:
-                import time
-                time.sleep(0.5)
+                await asyncio.sleep(0.5)
                 if controlador.cancelado:
                     raise Exception("Proceso cancelado por el usuario")
             
@@ -140,7 +167,8 @@ async def ejecutar_codificacion_con_progreso(
         resultados = await codificador.ejecutar_codificacion(
             ruta_respuestas=ruta_respuestas,
             ruta_codigos=ruta_codigos,
-            progress_callback=actualizar_progreso_real
+            progress_callback=actualizar_progreso_real,
+            proceso_id=proceso_id if checkpoints is not None else None
         )
         
         # Guardar resultados
@@ -159,6 +187,9 @@ async def ejecutar_codificacion_con_progreso(
             resultados.to_excel(writer, sheet_name='Resultados', index=False)
             if df_codigos_nuevos is not None and not df_codigos_nuevos.empty:
                 df_codigos_nuevos.to_excel(writer, sheet_name='Códigos Nuevos', index=False)
+            df_auditoria = getattr(codificador, "df_auditoria_similares", None)
+            if df_auditoria is not None and not df_auditoria.empty:
+                df_auditoria.to_excel(writer, sheet_name='Agrupación Similares', index=False)
         
         # Para compatibilidad con el frontend, los códigos nuevos están en la misma hoja
         ruta_codigos_nuevos = archivo_resultados if (df_codigos_nuevos is not None and not df_codigos_nuevos.empty) else None
@@ -184,6 +215,10 @@ async def ejecutar_codificacion_con_progreso(
             }
         controlador.stats = stats
         
+        # El trabajo terminó: su checkpoint ya no hace falta
+        if checkpoints is not None:
+            checkpoints.eliminar(proceso_id)
+        
         # Limpiar archivos temporales
         Path(ruta_respuestas).unlink(missing_ok=True)
         if ruta_codigos:
@@ -217,8 +252,14 @@ async def ejecutar_codificacion_con_progreso(
         if controlador:
             controlador.mensaje = f"❌ {mensaje_error}"
             controlador.error = mensaje_error  # Guardar error para que el frontend lo reciba
+            controlador.reanudable = checkpoints is not None
             controlador.cancelar()
         
+        if checkpoints is not None:
+            # Se conservan los archivos para reanudar desde el checkpoint
+            print(f"💾 Checkpoint conservado: POST /control/{proceso_id}/reanudar-desde-checkpoint para reanudar")
+            return
+        
         # Limpiar archivos temporales
         Path(ruta_respuestas).unlink(missing_ok=True)
         if ruta_codigos:
@@ -268,7 +309,8 @@ async def codificar_respuestas_upload(
                 shutil.copyfileobj(archivo_codigos.file, buffer)
         
         # Crear codificador (usando nuevo sistema)
-        codificador = CodificadorNuevo(modelo=modelo)
+        parametros_codificador = {"modelo": modelo}
+        codificador = CodificadorNuevo(**parametros_codificador)
         
         # Cargar datos para obtener el total de respuestas
         import pandas as pd
@@ -288,7 +330,8 @@ async def codificar_respuestas_upload(
             codificador,
             str(ruta_respuestas),
             str(ruta_codigos) if ruta_codigos else None,
-            archivo_respuestas.filename
+            archivo_respuestas.filename,
+            parametros_codificador
         )
         
         return CodificacionResponse(
@@ -391,6 +434,14 @@ async def codificar_respuestas_nuevo_upload(
     modelo: str = Form("gpt-5"),
     usar_dato_auxiliar: str = Form("false"),
     categorizacion_auxiliar: str = Form(None),
+    batches_concurrentes: int = Form(1),
+    umbral_similares: Optional[float] = Form(None),
+    preclasificar: bool = Form(False),
+    modo_lote: bool = Form(False),
+    modelo_rapido: Optional[str] = Form(None),
+    solicitudes_redundantes: Optional[bool] = Form(None),
+    backend: Optional[str] = Form(None),
+    plazo_segundos: Optional[float] = Form(None),
 ):
     """
     Nuevo endpoint de codificación que usa el grafo basado en LangGraph / LangChain.
@@ -430,7 +481,22 @@ async def codificar_respuestas_nuevo_upload(
                 raise HTTPException(status_code=400, detail="Error al parsear categorización de dato auxiliar")
 
         # Usar el nuevo codificador (grafo V3)
-        codificador = CodificadorNuevo(modelo=modelo, config_auxiliar=config_auxiliar)
+        parametros_codificador = {
+            "modelo": modelo,
+            "config_auxiliar": config_auxiliar,
+            "batches_concurrentes": batches_concurrentes,
+            "umbral_similares": umbral_similares,
+            "preclasificar": preclasificar,
+            "modo_lote": modo_lote,
+            "modelo_rapido": modelo_rapido or None,
+            "solicitudes_redundantes": solicitudes_redundantes,
+            "backend": backend or None,
+            "plazo_segundos": plazo_segundos,
+        }
+        try:
+            codificador = CodificadorNuevo(**parametros_codificador)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
         # Cargar datos para total de respuestas (para progreso)
         import pandas as pd
@@ -459,6 +525,7 @@ async def codificar_respuestas_nuevo_upload(
             str(ruta_respuestas),
             str(ruta_codigos) if ruta_codigos else None,
             archivo_respuestas.filename,
+            parametros_codificador,
         )
 
         return CodificacionResponse(
@@ -471,6 +538,8 @@ async def codificar_respuestas_nuevo_upload(
             proceso_id=proceso_id,
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         mensaje_error = obtener_mensaje_error_descriptivo(
             e,
@@ -479,6 +548,67 @@ async def codificar_respuestas_nuevo_upload(
         raise HTTPException(status_code=500, detail=mensaje_error)
 
 
+@router.post("/control/{proceso_id}/reanudar-desde-checkpoint", response_model=CodificacionResponse)
+async def reanudar_desde_checkpoint(proceso_id: str, background_tasks: BackgroundTasks):
+    """
+    Reanuda un trabajo interrumpido (error, cancelación o reinicio del servidor)
+    desde su checkpoint: los batches ya completados no se vuelven a enviar al LLM.
+
+    Args:
+        proceso_id: ID del trabajo a reanudar (se conserva para el progreso)
+
+    Returns:
+        Resultado de la codificación con proceso_id para seguimiento
+    """
+    checkpoints = obtener_checkpoints()
+    parametros = checkpoints.obtener_parametros(proceso_id) if checkpoints is not None else None
+    if parametros is None:
+        raise HTTPException(status_code=404, detail="No hay checkpoint para este proceso")
+
+    controlador = obtener_proceso(proceso_id)
+    if controlador and not controlador.cancelado:
+        raise HTTPException(status_code=409, detail="El proceso sigue en ejecución")
+
+    ruta_respuestas = parametros["ruta_respuestas"]
+    ruta_codigos = parametros["ruta_codigos"]
+    if not Path(ruta_respuestas).exists() or (ruta_codigos and not Path(ruta_codigos).exists()):
+        raise HTTPException(
+            status_code=404,
+            detail="Los archivos del trabajo ya no están disponibles (limpieza de temporales)"
+        )
+
+    try:
+        codificador = CodificadorNuevo(**parametros["codificador"])
+        crear_proceso(proceso_id, parametros["total_respuestas"], parametros["total_batches"])
+
+        background_tasks.add_task(
+            ejecutar_codificacion_con_progreso,
+            proceso_id,
+            codificador,
+            ruta_respuestas,
+            ruta_codigos,
+            parametros["nombre_archivo"],
+            parametros["codificador"],
+        )
+
+        return CodificacionResponse(
+            mensaje="Codificación reanudada desde checkpoint",
+            total_respuestas=parametros["total_respuestas"],
+            total_preguntas=0,
+            costo_total=0.0,
+            ruta_resultados="",
+            ruta_codigos_nuevos=None,
+            proceso_id=proceso_id,
+        )
+
+    except Exception as e:
+        mensaje_error = obtener_mensaje_error_descriptivo(
+            e,
+            contexto="Error al reanudar la codificación"
+        )
+        raise HTTPException(status_code=500, detail=mensaje_error)
+
+
 @router.post("/codificar", response_model=CodificacionResponse)
 async def codificar_respuestas(request: CodificacionRequest):
     """
@@ -499,7 +629,17 @@ async def codificar_respuestas(request: CodificacionRequest):
             raise HTTPException(status_code=404, detail=f"Archivo de códigos no encontrado: {request.ruta_codigos}")
         
         # Crear codificador (usando nuevo sistema)
-        codificador = CodificadorNuevo(modelo=request.modelo)
+        codificador = CodificadorNuevo(
+            modelo=request.modelo,
+            batches_concurrentes=request.batches_concurrentes,
+            umbral_similares=request.umbral_similares,
+            preclasificar=request.preclasificar,
+            modo_lote=request.modo_lote,
+            modelo_rapido=request.modelo_rapido,
+            solicitudes_redundantes=request.solicitudes_redundantes,
+            backend=request.backend,
+            plazo_segundos=request.plazo_segundos,
+        )
         
         # Ejecutar codificación
         resultados = await codificador.ejecutar_codificacion(
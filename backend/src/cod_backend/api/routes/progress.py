@@ -8,6 +8,8 @@ import asyncio
 import json
 from datetime import datetime
 
+from ...core.codificacion.llm import estadisticas_pool, estadisticas_limitadores
+
 router = APIRouter()
 
 # Almacenamiento en memoria para el estado de los procesos
@@ -31,6 +33,7 @@ class ControladorProceso:
         self.archivo_codigos_nuevos: str | None = None
         self.stats: dict | None = None
         self.error: str | None = None  # Mensaje de error si ocurre uno
+        self.reanudable = False  # Falló con checkpoint: se puede reanudar desde él
         
     def actualizar(
         self,
@@ -80,6 +83,7 @@ class ControladorProceso:
             "archivo_codigos_nuevos": self.archivo_codigos_nuevos,
             "stats": self.stats,
             "error": self.error,  # Incluir error si existe
+            "reanudable": self.reanudable,
         }
 
 
@@ -245,6 +249,8 @@ async def obtener_monitoreo():
             "progreso_promedio": round(progreso_promedio, 1)
         },
         "procesos": lista_procesos,
+        "pool_llm": estadisticas_pool(),
+        "limitadores_llm": estadisticas_limitadores(),
         "timestamp": datetime.now().isoformat()
     }
 
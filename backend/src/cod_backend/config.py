@@ -5,10 +5,54 @@ Este archivo mantiene compatibilidad con código antiguo que importa desde .conf
 Reexporta todo desde el nuevo módulo config/
 """
 # Reexportar todo desde los submódulos de config/
-from .config.pricing import PRECIOS_POR_1K, obtener_precios, calcular_costo
-from .config.models import supports_temperature
+from .config.pricing import PRECIOS_POR_1K, FACTOR_PRECIO_LOTES, obtener_precios, calcular_costo
+from .config.models import supports_temperature, LIMITES_POR_MODELO, obtener_limites_modelo
 from .config.settings import (
     OPENAI_API_KEY,
     OPENAI_MODEL,
     PROJECT_ROOT,
+    LLM_MAX_CONEXIONES,
+    LLM_MAX_CONEXIONES_KEEPALIVE,
+    LLM_KEEPALIVE_SEGUNDOS,
+    LLM_CACHE_HABILITADO,
+    LLM_CACHE_RUTA,
+    LLM_CACHE_MAX_ENTRADAS,
+    LLM_CACHE_MAX_DIAS,
+    LEXICO_UMBRAL,
+    LEXICO_MARGEN,
+    CATALOGO_MAX_TOKENS,
+    LLM_SALIDA_ESTRUCTURADA,
+    LLM_PROTOCOLO_SALIDA,
+    LLM_STREAMING,
+    LLM_LOTES_BASE_URL,
+    LLM_LOTES_INTERVALO_SONDEO,
+    LLM_LOTES_VENTANA,
+    CASCADA_CONFIANZA_MIN,
+    CASCADA_CONFIANZA_MAX,
+    LLM_SOLICITUDES_REDUNDANTES,
+    LLM_REDUNDANTE_PERCENTIL,
+    LLM_REDUNDANTE_MIN_MUESTRAS,
+    LLM_REDUNDANTE_PLAZO_MINIMO,
+    LLM_BACKEND,
+    LLM_COMPATIBLE_BASE_URL,
+    LLM_COMPATIBLE_API_KEY,
+    LLM_COMPATIBLE_CONCURRENCIA,
+    LLM_COMPATIBLE_VENTANA_CONTEXTO,
+    LLM_COMPATIBLE_PRECIO_PROMPT_1K,
+    LLM_COMPATIBLE_PRECIO_COMPLETION_1K,
+    LLM_COMPATIBLE_SALIDA_ESTRUCTURADA,
+    LLM_TIMEOUT_LLAMADA,
+    LLM_TIMEOUT_FACTOR_LATENCIA,
+    LLM_TIMEOUT_MINIMO,
+    TRABAJO_PLAZO_SEGUNDOS,
+    PLAZO_MARGEN_RIESGO,
+    PLAZO_MODELO_RAPIDO,
+    BATCH_TOKENS_OBJETIVO,
+    BATCH_FRACCION_VENTANA,
+    BATCH_MAX_TOKENS_SALIDA,
+    BATCH_MAX_RESPUESTAS,
+    TOKENS_USAR_TIKTOKEN,
+    CHECKPOINTS_HABILITADOS,
+    CHECKPOINTS_RUTA,
+    CHECKPOINTS_MAX_DIAS,
 )
@@ -1,6 +1,7 @@
 """
 Configuración de modelos de LLM.
 """
+import os
 from typing import Dict
 
 
@@ -27,3 +28,35 @@ def supports_temperature(model: str) -> bool:
     return True
 
 
+# Límites de velocidad por modelo (valores iniciales; el limitador los ajusta
+# con los headers x-ratelimit-* que devuelve la API)
+LIMITES_POR_MODELO: Dict[str, Dict[str, int]] = {
+    "gpt-5": {"rpm": 500, "tpm": 500_000},
+    "gpt-4.1": {"rpm": 500, "tpm": 300_000},
+    "gpt-4o": {"rpm": 500, "tpm": 300_000},
+    "gpt-4o-mini": {"rpm": 500, "tpm": 1_000_000},
+}
+
+LLM_CONCURRENCIA_INICIAL = int(os.getenv("LLM_CONCURRENCIA_INICIAL", "4"))
+LLM_CONCURRENCIA_MAXIMA = int(os.getenv("LLM_CONCURRENCIA_MAXIMA", "32"))
+
+
+def obtener_limites_modelo(modelo: str) -> Dict[str, int]:
+    """
+    Obtiene los límites de velocidad iniciales de un modelo.
+    
+    Se pueden sobrescribir con las variables de entorno LLM_RPM y LLM_TPM.
+    
+    Args:
+        modelo: Nombre del modelo
+        
+    Returns:
+        Diccionario con rpm, tpm, concurrencia_inicial y concurrencia_maxima
+    """
+    base = LIMITES_POR_MODELO.get(modelo, {"rpm": 500, "tpm": 200_000})
+    return {
+        "rpm": int(os.getenv("LLM_RPM", base["rpm"])),
+        "tpm": int(os.getenv("LLM_TPM", base["tpm"])),
+        "concurrencia_inicial": LLM_CONCURRENCIA_INICIAL,
+        "concurrencia_maxima": LLM_CONCURRENCIA_MAXIMA,
+    }
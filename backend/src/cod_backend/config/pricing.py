@@ -3,6 +3,11 @@ Configuración de precios por modelo de OpenAI.
 
 Precios convertidos desde precios por 1M tokens de OpenAI (divididos por 1000).
 Fuente: https://openai.com/api/pricing/ (actualizado 2025)
+
+Los tokens de entrada servidos desde la caché de prompts del proveedor
+(prefijo repetido entre llamadas) se cobran con el precio "prompt_cacheado".
+Las solicitudes procesadas con la API de lotes (modo offline) se cobran con
+FACTOR_PRECIO_LOTES sobre el precio interactivo.
 """
 from typing import Dict
 
@@ -10,22 +15,29 @@ from typing import Dict
 PRECIOS_POR_1K: Dict[str, Dict[str, float]] = {
     "gpt-5": {
         "prompt": 0.005,      # $5.00 por 1M tokens → $0.005 por 1K tokens
+        "prompt_cacheado": 0.0005,  # 90% de descuento sobre el prefijo cacheado
         "completion": 0.015,  # $15.00 por 1M tokens → $0.015 por 1K tokens
     },
     "gpt-4.1": {
         "prompt": 0.003,      # $3.00 por 1M tokens → $0.003 por 1K tokens
+        "prompt_cacheado": 0.00075,  # 75% de descuento sobre el prefijo cacheado
         "completion": 0.012,  # $12.00 por 1M tokens → $0.012 por 1K tokens
     },
     "gpt-4o": {
         "prompt": 0.0025,     # $2.50 por 1M tokens → $0.0025 por 1K tokens
+        "prompt_cacheado": 0.00125,  # 50% de descuento sobre el prefijo cacheado
         "completion": 0.01,   # $10.00 por 1M tokens → $0.01 por 1K tokens
     },
     "gpt-4o-mini": {
         "prompt": 0.00015,   # $0.150 por 1M tokens → $0.00015 por 1K tokens
+        "prompt_cacheado": 0.000075,  # 50% de descuento sobre el prefijo cacheado
         "completion": 0.0006, # $0.600 por 1M tokens → $0.0006 por 1K tokens
     }
 }
 
+# La API de lotes cobra la mitad del precio interactivo (entrada y salida)
+FACTOR_PRECIO_LOTES = 0.5
+
 
 def obtener_precios(modelo: str) -> Dict[str, float]:
     """
@@ -35,30 +47,44 @@ def obtener_precios(modelo: str) -> Dict[str, float]:
         modelo: Nombre del modelo (ej: "gpt-5", "gpt-4o-mini")
         
     Returns:
-        Diccionario con precios de prompt y completion por 1K tokens
+        Diccionario con precios de prompt, prompt_cacheado y completion por 1K tokens
     """
-    return PRECIOS_POR_1K.get(
+    precios = PRECIOS_POR_1K.get(
         modelo, 
         PRECIOS_POR_1K.get("gpt-5", {"prompt": 0.0, "completion": 0.0})
     )
+    # Sin precio de caché conocido, los tokens cacheados se cobran como entrada normal
+    return {"prompt_cacheado": precios["prompt"], **precios}
 
 
-def calcular_costo(prompt_tokens: int, completion_tokens: int, modelo: str) -> float:
+def calcular_costo(
+    prompt_tokens: int,
+    completion_tokens: int,
+    modelo: str,
+    cached_tokens: int = 0,
+    en_lote: bool = False,
+) -> float:
     """
     Calcula el costo total basado en tokens y modelo.
     
     Args:
-        prompt_tokens: Número de tokens de entrada
+        prompt_tokens: Número de tokens de entrada (incluye los cacheados)
         completion_tokens: Número de tokens de salida
         modelo: Nombre del modelo
+        cached_tokens: Tokens de entrada servidos desde la caché de prompts
+        en_lote: Si los tokens se procesaron con la API de lotes
         
     Returns:
         Costo total en USD
     """
     precios = obtener_precios(modelo)
+    cached_tokens = min(cached_tokens, prompt_tokens)
     costo_total = (
-        (prompt_tokens / 1000.0) * precios["prompt"]
+        ((prompt_tokens - cached_tokens) / 1000.0) * precios["prompt"]
+        + (cached_tokens / 1000.0) * precios["prompt_cacheado"]
         + (completion_tokens / 1000.0) * precios["completion"]
     )
+    if en_lote:
+        costo_total *= FACTOR_PRECIO_LOTES
     return costo_total
 
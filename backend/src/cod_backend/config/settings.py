@@ -28,6 +28,143 @@ except ImportError:
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
+# ============================================
+# POOL DE CONEXIONES HTTP PARA EL LLM
+# ============================================
+
+LLM_MAX_CONEXIONES = int(os.getenv("LLM_MAX_CONEXIONES", "50"))
+LLM_MAX_CONEXIONES_KEEPALIVE = int(os.getenv("LLM_MAX_CONEXIONES_KEEPALIVE", "20"))
+LLM_KEEPALIVE_SEGUNDOS = float(os.getenv("LLM_KEEPALIVE_SEGUNDOS", "120"))
+
+# ============================================
+# CACHÉ PERSISTENTE DE RESPUESTAS DEL LLM
+# ============================================
+
+LLM_CACHE_HABILITADO = os.getenv("LLM_CACHE_HABILITADO", "true").lower() == "true"
+LLM_CACHE_RUTA = os.getenv("LLM_CACHE_RUTA", "cache/llm_respuestas.sqlite")
+LLM_CACHE_MAX_ENTRADAS = int(os.getenv("LLM_CACHE_MAX_ENTRADAS", "200000"))
+LLM_CACHE_MAX_DIAS = float(os.getenv("LLM_CACHE_MAX_DIAS", "30"))
+
+# ============================================
+# PRECLASIFICADOR LÉXICO (sin LLM)
+# ============================================
+
+LEXICO_UMBRAL = float(os.getenv("LEXICO_UMBRAL", "0.9"))
+LEXICO_MARGEN = float(os.getenv("LEXICO_MARGEN", "0.15"))
+
+# ============================================
+# CATÁLOGO EN EL PROMPT
+# ============================================
+
+# Presupuesto de tokens para la lista corta de códigos del catálogo por batch
+CATALOGO_MAX_TOKENS = int(os.getenv("CATALOGO_MAX_TOKENS", "2000"))
+
+# ============================================
+# SALIDA DEL LLM
+# ============================================
+
+# Pide JSON con esquema estricto (structured outputs) y lo valida con pydantic
+LLM_SALIDA_ESTRUCTURADA = os.getenv("LLM_SALIDA_ESTRUCTURADA", "true").lower() == "true"
+# Protocolo de salida: "completo" (veredicto por código del catálogo) o "compacto"
+# (solo los códigos que aplican; menos tokens de salida con catálogos grandes)
+LLM_PROTOCOLO_SALIDA = os.getenv("LLM_PROTOCOLO_SALIDA", "completo").lower()
+# Pide las respuestas en streaming para reportar progreso por respuesta durante la llamada
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"
+
+# ============================================
+# API DE LOTES (MODO OFFLINE)
+# ============================================
+
+# URL base de la API de lotes (cualquier endpoint compatible con /files y /batches)
+LLM_LOTES_BASE_URL = os.getenv("LLM_LOTES_BASE_URL", "https://api.openai.com/v1")
+# Segundos entre consultas del estado de un lote
+LLM_LOTES_INTERVALO_SONDEO = float(os.getenv("LLM_LOTES_INTERVALO_SONDEO", "30"))
+# Ventana de procesamiento pedida al proveedor
+LLM_LOTES_VENTANA = os.getenv("LLM_LOTES_VENTANA", "24h")
+
+# ============================================
+# CASCADA DE MODELOS
+# ============================================
+
+# Banda de incertidumbre: las respuestas cuya mejor confianza del modelo rápido
+# cae en [MIN, MAX) se vuelven a codificar con el modelo principal
+CASCADA_CONFIANZA_MIN = float(os.getenv("CASCADA_CONFIANZA_MIN", "0.6"))
+CASCADA_CONFIANZA_MAX = float(os.getenv("CASCADA_CONFIANZA_MAX", "0.9"))
+
+# ============================================
+# SOLICITUDES REDUNDANTES (LATENCIA DE COLA)
+# ============================================
+
+# Repite como solicitud redundante la llamada que supera el plazo aprendido de las latencias del trabajo
+LLM_SOLICITUDES_REDUNDANTES = os.getenv("LLM_SOLICITUDES_REDUNDANTES", "false").lower() == "true"
+# Percentil de la latencia por respuesta a partir del cual se lanza la solicitud redundante
+LLM_REDUNDANTE_PERCENTIL = float(os.getenv("LLM_REDUNDANTE_PERCENTIL", "0.95"))
+# Llamadas completadas del modelo antes de empezar a lanzar solicitudes redundantes
+LLM_REDUNDANTE_MIN_MUESTRAS = int(os.getenv("LLM_REDUNDANTE_MIN_MUESTRAS", "5"))
+# Plazo mínimo (segundos) antes de lanzar una solicitud redundante, aunque el historial sea más rápido
+LLM_REDUNDANTE_PLAZO_MINIMO = float(os.getenv("LLM_REDUNDANTE_PLAZO_MINIMO", "10"))
+
+# ============================================
+# BACKENDS DE LLM
+# ============================================
+
+# Backend por defecto: "openai", "compatible" (servidor propio con API de OpenAI) o "determinista" (sin red)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai").lower()
+# Servidor de inferencia compatible con la API de OpenAI (vLLM, llama.cpp, TGI... en la red local)
+LLM_COMPATIBLE_BASE_URL = os.getenv("LLM_COMPATIBLE_BASE_URL", "http://localhost:8000/v1")
+LLM_COMPATIBLE_API_KEY = os.getenv("LLM_COMPATIBLE_API_KEY", "local")
+# Solicitudes simultáneas que admite el servidor propio
+LLM_COMPATIBLE_CONCURRENCIA = int(os.getenv("LLM_COMPATIBLE_CONCURRENCIA", "8"))
+# Ventana de contexto (tokens) del modelo servido
+LLM_COMPATIBLE_VENTANA_CONTEXTO = int(os.getenv("LLM_COMPATIBLE_VENTANA_CONTEXTO", "32768"))
+# Costo por 1K tokens del servidor propio (0 = capacidad ya pagada)
+LLM_COMPATIBLE_PRECIO_PROMPT_1K = float(os.getenv("LLM_COMPATIBLE_PRECIO_PROMPT_1K", "0"))
+LLM_COMPATIBLE_PRECIO_COMPLETION_1K = float(os.getenv("LLM_COMPATIBLE_PRECIO_COMPLETION_1K", "0"))
+# Si el servidor propio admite response_format json_schema estricto (structured outputs)
+LLM_COMPATIBLE_SALIDA_ESTRUCTURADA = os.getenv("LLM_COMPATIBLE_SALIDA_ESTRUCTURADA", "false").lower() == "true"
+
+# ============================================
+# PLAZOS DE TRABAJO Y TIMEOUTS POR LLAMADA
+# ============================================
+
+# Timeout de cada intento de llamada al LLM en segundos (0 = sin timeout propio)
+LLM_TIMEOUT_LLAMADA = float(os.getenv("LLM_TIMEOUT_LLAMADA", "180"))
+# Con historial de latencias, el timeout es este múltiplo del percentil de la latencia del trabajo
+LLM_TIMEOUT_FACTOR_LATENCIA = float(os.getenv("LLM_TIMEOUT_FACTOR_LATENCIA", "3"))
+# Timeout mínimo derivado del historial (segundos)
+LLM_TIMEOUT_MINIMO = float(os.getenv("LLM_TIMEOUT_MINIMO", "20"))
+# Plazo por defecto de un trabajo en segundos (0 = sin plazo)
+TRABAJO_PLAZO_SEGUNDOS = float(os.getenv("TRABAJO_PLAZO_SEGUNDOS", "0"))
+# Fracción del plazo a partir de la cual la proyección del trabajo se considera en riesgo
+PLAZO_MARGEN_RIESGO = float(os.getenv("PLAZO_MARGEN_RIESGO", "0.9"))
+# Modelo al que se cambia si el plazo está en riesgo (si no hay modelo rápido de cascada)
+PLAZO_MODELO_RAPIDO = os.getenv("PLAZO_MODELO_RAPIDO", "gpt-4o-mini")
+
+# ============================================
+# EMPAQUETADO DE BATCHES POR TOKENS
+# ============================================
+
+# Tokens objetivo por llamada (prompt + salida esperada) al llenar cada batch
+BATCH_TOKENS_OBJETIVO = int(os.getenv("BATCH_TOKENS_OBJETIVO", "12000"))
+# Fracción máxima de la ventana de contexto del modelo que puede ocupar un batch
+BATCH_FRACCION_VENTANA = float(os.getenv("BATCH_FRACCION_VENTANA", "0.5"))
+# Tokens de salida esperados por batch como máximo (evita salidas truncadas)
+BATCH_MAX_TOKENS_SALIDA = int(os.getenv("BATCH_MAX_TOKENS_SALIDA", "8000"))
+# Respuestas por batch como máximo, aunque sean muy cortas
+BATCH_MAX_RESPUESTAS = int(os.getenv("BATCH_MAX_RESPUESTAS", "60"))
+# Contar tokens con tiktoken (si no está disponible se estiman ~4 caracteres por token)
+TOKENS_USAR_TIKTOKEN = os.getenv("TOKENS_USAR_TIKTOKEN", "true").lower() == "true"
+
+# ============================================
+# CHECKPOINTS DE TRABAJOS (reanudar tras un fallo)
+# ============================================
+
+# Deltas de cada batch terminado, por proceso_id, para reanudar sin volver a pagar batches
+CHECKPOINTS_HABILITADOS = os.getenv("CHECKPOINTS_HABILITADOS", "true").lower() == "true"
+CHECKPOINTS_RUTA = os.getenv("CHECKPOINTS_RUTA", "cache/checkpoints.sqlite")
+# Días que se conserva el checkpoint de un trabajo que no terminó
+CHECKPOINTS_MAX_DIAS = float(os.getenv("CHECKPOINTS_MAX_DIAS", "7"))
+
 # ============================================
 # RUTAS (relativas a la raíz del proyecto)
 # ============================================
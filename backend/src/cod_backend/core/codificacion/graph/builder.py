@@ -3,6 +3,8 @@ Constructor del grafo de codificación.
 
 Construye el grafo de LangGraph con el flujo optimizado usando el nodo combinado.
 """
+from typing import Any, Dict
+
 from langgraph.graph import StateGraph, END
 
 from .state import EstadoCodificacion
@@ -14,12 +16,19 @@ from ..nodes import (
 )
 
 
+async def nodo_finalizar(state: EstadoCodificacion) -> Dict[str, Any]:
+    """Marca el batch actual como terminado."""
+    return {"batch_actual": state["batch_actual"] + 1}
+
+
 def construir_grafo() -> StateGraph:
     """
     Construye el grafo de codificación optimizado.
     
     El grafo usa el nodo combinado que reduce el costo y latencia en ~70%
-    comparado con los nodos separados.
+    comparado con los nodos separados. Todos los nodos son asíncronos, por lo
+    que el grafo compilado se ejecuta con `astream`/`ainvoke`. Los nodos
+    devuelven solo el delta de su paso (ver EstadoCodificacion).
     
     Returns:
         Grafo compilado listo para ejecutar
@@ -30,7 +39,7 @@ def construir_grafo() -> StateGraph:
     workflow.add_node("preparar_batch", nodo_preparar_batch)
     workflow.add_node("codificar_combinado", nodo_codificar_combinado)
     workflow.add_node("ensamblar", nodo_ensamblar)
-    workflow.add_node("finalizar", lambda s: {**s, "batch_actual": s["batch_actual"] + 1})
+    workflow.add_node("finalizar", nodo_finalizar)
     
     # Configurar flujo
     workflow.set_entry_point("preparar_batch")
@@ -0,0 +1,323 @@
+"""
+Checkpoints durables de los trabajos de codificación (SQLite).
+
+Cada batch terminado guarda su delta (lo que los nodos devolvieron para ese
+batch: sus codificaciones, los conceptos nuevos del índice, los contadores
+que gastó...) bajo el `proceso_id` del trabajo. Como el estado del grafo es de
+solo-agregar, el estado después del batch N es el estado inicial más los
+deltas de los batches 0..N, así que escribir un checkpoint cuesta lo mismo en
+el batch 1 que en el 200 (no se vuelve a serializar el trabajo completo).
+
+Si el servidor se reinicia, el trabajo se cancela o un batch falla, la
+reanudación vuelve a preparar el estado inicial con los mismos archivos,
+reaplica los deltas guardados y solo envía al LLM los batches que faltan.
+La huella del trabajo (respuestas, límites de batches, catálogo y modelo)
+evita reaplicar deltas de otra entrada.
+
+Los checkpoints de trabajos que no terminaron se podan por antigüedad
+(CHECKPOINTS_MAX_DIAS); los de trabajos completados se eliminan al terminar.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from ....config import CHECKPOINTS_HABILITADOS, CHECKPOINTS_RUTA, CHECKPOINTS_MAX_DIAS
+from .state import EstadoCodificacion, REDUCTORES_ESTADO
+
+# Claves que solo valen dentro del batch (no se guardan en el checkpoint)
+CLAVES_DEL_BATCH = (
+    "batch_respuestas",
+    "validaciones_batch",
+    "evaluaciones_batch",
+    "cobertura_batch",
+    "respuestas_especiales",
+)
+
+
+def huella_trabajo(estado_inicial: EstadoCodificacion, modo: str) -> str:
+    """
+    Huella estable de la entrada de un trabajo.
+
+    Dos ejecuciones con la misma huella parten el trabajo en los mismos batches
+    con las mismas respuestas, así que sus deltas por batch son intercambiables.
+
+    Args:
+        estado_inicial: Estado inicial del grafo
+        modo: Modo de ejecución ("secuencial" o "concurrente")
+
+    Returns:
+        Hash hexadecimal
+    """
+    contenido = json.dumps(
+        [
+            modo,
+            estado_inicial.get("modelo_gpt"),
+            estado_inicial.get("huella_catalogo"),
+            estado_inicial.get("proximo_codigo_nuevo"),
+            estado_inicial.get("limites_batches"),
+            [[r.get("fila_excel"), r.get("texto")] for r in estado_inicial.get("respuestas", [])],
+        ],
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()[:16]
+
+
+def delta_del_batch(actualizaciones: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Junta las actualizaciones de los nodos de un batch en un solo delta.
+
+    Los nodos de un batch devuelven claves distintas (codificar los contadores,
+    ensamblar las codificaciones y el índice), así que basta con unirlas; se
+    descartan las claves que solo valen dentro del batch.
+
+    Args:
+        actualizaciones: Deltas de los nodos del batch, en orden
+
+    Returns:
+        Delta del batch para el checkpoint
+    """
+    delta: Dict[str, Any] = {}
+    for actualizacion in actualizaciones:
+        for clave, valor in actualizacion.items():
+            if clave not in CLAVES_DEL_BATCH:
+                delta[clave] = valor
+    return delta
+
+
+def restaurar_estado(estado: EstadoCodificacion, deltas: Iterable[Dict[str, Any]]) -> EstadoCodificacion:
+    """
+    Reaplica en el lugar los deltas de los batches guardados sobre el estado inicial.
+
+    Las claves con reductor se combinan con él (las codificaciones se agregan,
+    los contadores se suman) y el resto se sobrescribe, como en el grafo. A
+    diferencia de aplicar_actualizacion no copia los canales: el estado inicial
+    es propio del trabajo que se reanuda.
+
+    Args:
+        estado: Estado inicial del trabajo
+        deltas: Deltas de los batches completados, en orden de batch
+
+    Returns:
+        El mismo estado, con los batches completados aplicados
+    """
+    for delta in deltas:
+        for clave, valor in delta.items():
+            reductor = REDUCTORES_ESTADO.get(clave)
+            estado[clave] = reductor(estado[clave], valor) if reductor and clave in estado else valor
+    return estado
+
+
+def _desde_json(delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Devuelve las claves enteras que JSON guarda como texto (códigos recientes)."""
+    if "codigos_recientes" in delta:
+        delta["codigos_recientes"] = {int(c): d for c, d in delta["codigos_recientes"].items()}
+    return delta
+
+
+class CheckpointsTrabajo:
+    """Deltas por batch de cada trabajo en SQLite, seguros para varios hilos."""
+
+    def __init__(self, ruta: str, max_dias: float = CHECKPOINTS_MAX_DIAS):
+        self.ruta = Path(ruta)
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self.max_segundos = max_dias * 86400
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(str(self.ruta), check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            """
+            CREATE TABLE IF NOT EXISTS trabajos (
+                proceso_id TEXT PRIMARY KEY,
+                parametros TEXT,
+                huella TEXT,
+                actualizado REAL NOT NULL
+            )
+            """
+        )
+        self._conexion.execute(
+            """
+            CREATE TABLE IF NOT EXISTS batches (
+                proceso_id TEXT NOT NULL,
+                batch INTEGER NOT NULL,
+                delta TEXT NOT NULL,
+                PRIMARY KEY (proceso_id, batch)
+            )
+            """
+        )
+        self._conexion.commit()
+        self.podar()
+
+    def registrar_trabajo(self, proceso_id: str, parametros: Dict[str, Any]) -> None:
+        """
+        Guarda lo necesario para volver a lanzar el trabajo (archivos y opciones).
+
+        Args:
+            proceso_id: ID del trabajo
+            parametros: Diccionario serializable a JSON
+        """
+        with self._lock:
+            self._conexion.execute(
+                "INSERT INTO trabajos (proceso_id, parametros, actualizado) VALUES (?, ?, ?) "
+                "ON CONFLICT(proceso_id) DO UPDATE SET parametros = excluded.parametros, "
+                "actualizado = excluded.actualizado",
+                (proceso_id, json.dumps(parametros, ensure_ascii=False), time.time()),
+            )
+            self._conexion.commit()
+
+    def obtener_parametros(self, proceso_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Parámetros registrados de un trabajo.
+
+        Args:
+            proceso_id: ID del trabajo
+
+        Returns:
+            Parámetros o None si el trabajo no tiene checkpoint
+        """
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT parametros FROM trabajos WHERE proceso_id = ?", (proceso_id,)
+            ).fetchone()
+        if fila is None or fila[0] is None:
+            return None
+        return json.loads(fila[0])
+
+    def rutas_registradas(self) -> Set[Path]:
+        """
+        Archivos de entrada de los trabajos con checkpoint (hacen falta para reanudarlos).
+
+        Returns:
+            Rutas absolutas de los archivos de respuestas y de códigos
+        """
+        with self._lock:
+            filas = self._conexion.execute(
+                "SELECT parametros FROM trabajos WHERE parametros IS NOT NULL"
+            ).fetchall()
+        rutas: Set[Path] = set()
+        for (parametros,) in filas:
+            datos = json.loads(parametros)
+            for clave in ("ruta_respuestas", "ruta_codigos"):
+                if datos.get(clave):
+                    rutas.add(Path(datos[clave]).resolve())
+        return rutas
+
+    def batches_completados(self, proceso_id: str, huella: str) -> Dict[int, Dict[str, Any]]:
+        """
+        Deltas guardados de un trabajo con la misma entrada.
+
+        Si la huella guardada no coincide (otros archivos u otra partición en
+        batches), los deltas anteriores se descartan y el trabajo empieza de cero.
+
+        Args:
+            proceso_id: ID del trabajo
+            huella: Huella de la entrada actual (huella_trabajo)
+
+        Returns:
+            Diccionario índice de batch → delta
+        """
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT huella FROM trabajos WHERE proceso_id = ?", (proceso_id,)
+            ).fetchone()
+            if fila is None or fila[0] != huella:
+                self._conexion.execute("DELETE FROM batches WHERE proceso_id = ?", (proceso_id,))
+                self._conexion.execute(
+                    "INSERT INTO trabajos (proceso_id, huella, actualizado) VALUES (?, ?, ?) "
+                    "ON CONFLICT(proceso_id) DO UPDATE SET huella = excluded.huella, "
+                    "actualizado = excluded.actualizado",
+                    (proceso_id, huella, time.time()),
+                )
+                self._conexion.commit()
+                if fila is not None and fila[0] is not None:
+                    print("   ⚠️  La entrada del trabajo cambió: se descarta su checkpoint anterior")
+                return {}
+            filas = self._conexion.execute(
+                "SELECT batch, delta FROM batches WHERE proceso_id = ? ORDER BY batch",
+                (proceso_id,),
+            ).fetchall()
+        return {batch: _desde_json(json.loads(delta)) for batch, delta in filas}
+
+    def guardar_batch(self, proceso_id: str, batch: int, delta: Dict[str, Any]) -> None:
+        """
+        Guarda el delta de un batch terminado.
+
+        Args:
+            proceso_id: ID del trabajo
+            batch: Índice del batch
+            delta: Delta del batch (delta_del_batch), serializable a JSON
+        """
+        contenido = json.dumps(delta, ensure_ascii=False)
+        with self._lock:
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO batches (proceso_id, batch, delta) VALUES (?, ?, ?)",
+                (proceso_id, batch, contenido),
+            )
+            self._conexion.execute(
+                "UPDATE trabajos SET actualizado = ? WHERE proceso_id = ?",
+                (time.time(), proceso_id),
+            )
+            self._conexion.commit()
+
+    def eliminar(self, proceso_id: str) -> None:
+        """
+        Elimina el checkpoint de un trabajo (al completarse).
+
+        Args:
+            proceso_id: ID del trabajo
+        """
+        with self._lock:
+            self._conexion.execute("DELETE FROM batches WHERE proceso_id = ?", (proceso_id,))
+            self._conexion.execute("DELETE FROM trabajos WHERE proceso_id = ?", (proceso_id,))
+            self._conexion.commit()
+
+    def podar(self) -> int:
+        """
+        Elimina los checkpoints de trabajos sin actividad hace más de max_dias.
+
+        Returns:
+            Número de trabajos eliminados
+        """
+        with self._lock:
+            vencidos: List[str] = [
+                fila[0]
+                for fila in self._conexion.execute(
+                    "SELECT proceso_id FROM trabajos WHERE actualizado < ?",
+                    (time.time() - self.max_segundos,),
+                ).fetchall()
+            ]
+            for proceso_id in vencidos:
+                self._conexion.execute("DELETE FROM batches WHERE proceso_id = ?", (proceso_id,))
+                self._conexion.execute("DELETE FROM trabajos WHERE proceso_id = ?", (proceso_id,))
+            self._conexion.commit()
+        return len(vencidos)
+
+    def cerrar(self) -> None:
+        """Cierra la conexión a SQLite."""
+        with self._lock:
+            self._conexion.close()
+
+
+_lock_checkpoints = threading.Lock()
+_checkpoints: Optional[CheckpointsTrabajo] = None
+
+
+def obtener_checkpoints() -> Optional[CheckpointsTrabajo]:
+    """
+    Devuelve el almacén de checkpoints del proceso (None si está deshabilitado).
+
+    Returns:
+        Instancia de CheckpointsTrabajo o None
+    """
+    global _checkpoints
+    if not CHECKPOINTS_HABILITADOS:
+        return None
+    with _lock_checkpoints:
+        if _checkpoints is None:
+            _checkpoints = CheckpointsTrabajo(CHECKPOINTS_RUTA)
+        return _checkpoints
@@ -1,28 +1,152 @@
 """
 Estado del grafo de codificación.
+
+Los nodos devuelven solo las claves que cambian (deltas), no el estado completo.
+Los canales que crecen con el trabajo tienen reductor:
+
+- `codificaciones` es un canal de solo-agregar: cada batch aporta sus
+  codificaciones y el reductor las agrega a la lista del canal.
+- `indice_conceptos` (ver utils/conceptos.py) recibe solo los conceptos
+  nuevos que aceptó cada batch.
+- Los contadores (tokens, reintentos, caché...) se suman: cada batch devuelve
+  lo que gastó, no el acumulado.
+
+Así el costo de cada paso del grafo es proporcional al batch, no al trabajo.
 """
-from typing import TypedDict, Dict, List, Any, Optional
+import copy
+import operator
+from typing import Annotated, TypedDict, Dict, List, Any, Optional, get_args, get_origin, get_type_hints
+
+
+def agregar_codificaciones(
+    actuales: List[Dict[str, Any]],
+    nuevas: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Reductor del canal `codificaciones`: agrega las del batch en el lugar.
+
+    La lista es del canal (LangGraph la crea vacía en cada ejecución), por lo
+    que extenderla en el lugar evita copiar todas las codificaciones previas en
+    cada batch.
+
+    Args:
+        actuales: Codificaciones acumuladas del canal
+        nuevas: Codificaciones del batch
+
+    Returns:
+        La misma lista del canal, con las nuevas agregadas al final
+    """
+    actuales.extend(nuevas)
+    return actuales
+
+
+def agregar_conceptos(actuales: Dict[str, int], nuevos: Dict[str, int]) -> Dict[str, int]:
+    """
+    Reductor del canal `indice_conceptos`: agrega en el lugar los conceptos
+    aceptados por el batch. Un concepto ya indexado conserva su código.
+
+    Args:
+        actuales: Índice del canal (clave de concepto -> código)
+        nuevos: Conceptos nuevos del batch
+
+    Returns:
+        El mismo dict del canal, actualizado
+    """
+    for clave, codigo in nuevos.items():
+        actuales.setdefault(clave, codigo)
+    return actuales
+
+
+Contador = Annotated[int, operator.add]
 
 
 class EstadoCodificacion(TypedDict):
     """Estado completo del grafo de codificación."""
     pregunta: str
     modelo_gpt: str
-    batch_size: int
+    backend_llm: Any  # Backend de LLM del trabajo (instancia de BackendLLM o nombre registrado)
+    batch_size: int  # Respuestas del batch más grande
+    limites_batches: List[int]  # Inicio de cada batch (más el total): batch i = respuestas[limites[i]:limites[i + 1]]
     respuestas: List[Dict[str, Any]]
     catalogo: List[Dict[str, Any]]
     catalogo_por_categoria: Dict[str, List[Dict[str, Any]]]  # Catálogo agrupado por categoría
+    catalogo_max_tokens: int  # Presupuesto de tokens del catálogo en el prompt (lista corta por batch)
+    catalogo_tokens: int  # Tokens del catálogo completo (si caben en el presupuesto no se arma el índice)
     batch_actual: int
     batch_respuestas: List[Dict[str, Any]]
-    codificaciones: List[Dict[str, Any]]
+    codificaciones: Annotated[List[Dict[str, Any]], agregar_codificaciones]  # Solo-agregar: cada batch aporta las suyas
     validaciones_batch: List[Dict[str, Any]]
     evaluaciones_batch: List[Dict[str, Any]]
     cobertura_batch: List[Dict[str, Any]]
     proximo_codigo_nuevo: int
+    indice_conceptos: Annotated[Dict[str, int], agregar_conceptos]  # Clave de concepto -> código (catálogo + nuevos)
+    codigos_recientes: Dict[int, str]  # Últimos MAX_CODIGOS_EXISTENTES códigos nuevos creados (código -> descripción)
+    seccion_codigos_existentes: str  # codigos_recientes renderizados para el prompt (se rehace al crear códigos)
     respuestas_especiales: Dict[int, int]
-    prompt_tokens: int
-    completion_tokens: int
-    total_tokens: int
+    prompt_tokens: Contador
+    completion_tokens: Contador
+    total_tokens: Contador
+    cached_tokens: Contador  # Tokens de entrada servidos desde la caché de prompts del proveedor
+    # Robustez ante fallos del LLM
+    reintentos_llm: Contador  # Reintentos por errores transitorios (timeouts, 5xx)
+    reintentos_429: Contador  # Reintentos por límite de velocidad
+    divisiones_batch: Contador  # Veces que un batch se dividió por salida inválida/truncada
+    salida_estructurada: bool  # Pedir JSON con esquema estricto y validarlo con pydantic
+    protocolo_salida: str  # "completo" (veredicto por código) o "compacto" (solo códigos que aplican)
+    streaming: bool  # Pedir la salida en streaming (progreso por respuesta durante la llamada)
+    reparaciones_json: Contador  # Salidas que necesitaron el camino de reparación de JSON
+    # Cascada de modelos (modelo rápido primero, escalar solo las dudosas)
+    modelo_rapido: Optional[str]  # None = sin cascada (todo con modelo_gpt)
+    banda_incertidumbre: List[float]  # [min, max) de la mejor confianza que se escala
+    respuestas_cascada: Contador  # Respuestas codificadas primero con el modelo rápido
+    respuestas_escaladas: Contador  # Respuestas reenviadas al modelo principal
+    prompt_tokens_rapido: Contador  # Parte de prompt/completion/cached_tokens del modelo rápido
+    completion_tokens_rapido: Contador
+    cached_tokens_rapido: Contador
+    # Solicitudes redundantes ante llamadas lentas (latencia de cola)
+    solicitudes_redundantes: bool
+    redundantes_emitidas: Contador  # Llamadas que superaron el plazo y se repitieron
+    redundantes_ganadoras: Contador  # Solicitudes redundantes que respondieron antes que el original
+    tokens_redundantes: Contador  # Tokens gastados por los intentos perdedores
+    # Plazo del trabajo
+    fecha_limite: Optional[float]  # Segundos epoch; acota el timeout de cada llamada (None = sin plazo)
+    # Caché persistente de respuestas del LLM
+    usar_cache: bool
+    huella_catalogo: str  # Hash del catálogo histórico (parte de la clave de caché)
+    cache_consultas: Contador
+    cache_hits: Contador
     # Configuración de dato auxiliar
     config_auxiliar: Optional[Dict[str, Any]]  # {"usar": bool, "categorizacion": {"negativas": [], "neutrales": [], "positivas": []}}
 
+
+# Reductor de cada canal que no se sobrescribe (codificaciones, índice de conceptos y contadores)
+REDUCTORES_ESTADO = {
+    clave: get_args(tipo)[1]
+    for clave, tipo in get_type_hints(EstadoCodificacion, include_extras=True).items()
+    if get_origin(tipo) is Annotated
+}
+
+
+def aplicar_actualizacion(
+    state: EstadoCodificacion,
+    actualizacion: Dict[str, Any],
+) -> EstadoCodificacion:
+    """
+    Aplica el delta de un nodo a un estado, como lo hace el grafo.
+
+    Para ejecutar nodos fuera del grafo (modo lote): las claves con reductor se
+    combinan con él (sobre una copia, para no modificar listas o índices que el
+    estado comparta con otros batches) y el resto se sobrescribe.
+
+    Args:
+        state: Estado antes del nodo
+        actualizacion: Claves devueltas por el nodo
+
+    Returns:
+        Estado después del nodo
+    """
+    nuevo = dict(state)
+    for clave, valor in actualizacion.items():
+        reductor = REDUCTORES_ESTADO.get(clave)
+        nuevo[clave] = reductor(copy.copy(nuevo[clave]), valor) if reductor and clave in nuevo else valor
+    return nuevo  # type: ignore[return-value]
@@ -0,0 +1,95 @@
+"""
+Infraestructura de acceso al LLM (backends, clientes compartidos, pool HTTP, limitador, caché,
+API de lotes, solicitudes redundantes, plazos y timeouts, conteo de tokens).
+"""
+from .clientes import (
+    obtener_llm,
+    obtener_http_client,
+    estadisticas_pool,
+    cerrar_clientes,
+)
+from .limitador import LimitadorModelo, obtener_limitador, estadisticas_limitadores
+from .invocacion import invocar_llm, estimar_tokens
+from .tokens import contar_tokens, contar_tokens_lista
+from .cache import CacheRespuestas, obtener_cache, clave_respuesta, huella_catalogo
+from .salida import (
+    ADAPTADOR_SALIDA,
+    ADAPTADOR_SALIDA_COMPACTA,
+    FORMATO_RESPUESTA,
+    FORMATO_RESPUESTA_COMPACTA,
+    PROTOCOLO_COMPLETO,
+    PROTOCOLO_COMPACTO,
+    PROTOCOLOS_SALIDA,
+    cargar_json,
+    validar_salida,
+    expandir_salida_compacta,
+)
+from .streaming import ParserJSONIncremental, SeguimientoStream
+from .lotes import (
+    ClienteLotes,
+    ErrorLote,
+    MAX_SOLICITUDES_POR_LOTE,
+    solicitud_lote,
+    mensaje_desde_resultado,
+)
+from .lotes_local import EndpointLotesLocal
+from .redundancia import HistorialLatencias, primera_valida
+from .plazos import PlazoTrabajo, timeout_llamada, acotar_timeout
+from .determinista import ChatDeterminista, codificar_prompt
+from .backends import (
+    BackendLLM,
+    BackendOpenAI,
+    BackendCompatible,
+    BackendDeterminista,
+    registrar_backend,
+    obtener_backend,
+)
+
+__all__ = [
+    "obtener_llm",
+    "obtener_http_client",
+    "estadisticas_pool",
+    "cerrar_clientes",
+    "LimitadorModelo",
+    "obtener_limitador",
+    "estadisticas_limitadores",
+    "invocar_llm",
+    "estimar_tokens",
+    "contar_tokens",
+    "contar_tokens_lista",
+    "CacheRespuestas",
+    "obtener_cache",
+    "clave_respuesta",
+    "huella_catalogo",
+    "ADAPTADOR_SALIDA",
+    "ADAPTADOR_SALIDA_COMPACTA",
+    "FORMATO_RESPUESTA",
+    "FORMATO_RESPUESTA_COMPACTA",
+    "PROTOCOLO_COMPLETO",
+    "PROTOCOLO_COMPACTO",
+    "PROTOCOLOS_SALIDA",
+    "cargar_json",
+    "validar_salida",
+    "expandir_salida_compacta",
+    "ParserJSONIncremental",
+    "SeguimientoStream",
+    "ClienteLotes",
+    "ErrorLote",
+    "MAX_SOLICITUDES_POR_LOTE",
+    "solicitud_lote",
+    "mensaje_desde_resultado",
+    "EndpointLotesLocal",
+    "HistorialLatencias",
+    "primera_valida",
+    "PlazoTrabajo",
+    "timeout_llamada",
+    "acotar_timeout",
+    "ChatDeterminista",
+    "codificar_prompt",
+    "BackendLLM",
+    "BackendOpenAI",
+    "BackendCompatible",
+    "BackendDeterminista",
+    "registrar_backend",
+    "obtener_backend",
+]
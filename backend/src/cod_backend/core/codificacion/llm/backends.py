@@ -0,0 +1,239 @@
+"""
+Backends de LLM seleccionables por trabajo.
+
+Un backend entrega el modelo de chat y declara sus características:
+concurrencia máxima y límites del limitador, ventana de contexto, costo por
+token y si admite la API de lotes y la salida estructurada. El nodo de codificación y el codificador
+solo hablan con esta interfaz, de modo que el mismo grafo corre contra:
+
+- "openai": la API de OpenAI (clientes compartidos, precios de pricing.py).
+- "compatible": cualquier servidor con la API de OpenAI en otra URL base
+  (vLLM, llama.cpp, TGI... en la red local), con su propia concurrencia,
+  ventana de contexto y costo.
+- "determinista": un modelo en proceso sin red (ChatDeterminista) para CI y
+  benchmarks.
+
+Los backends por nombre se resuelven en el registro del proceso
+(registrar_backend / obtener_backend); una instancia pasada a un trabajo viaja
+en su estado y no toca el registro.
+"""
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+from .clientes import obtener_llm
+from .determinista import ChatDeterminista
+from ....config import (
+    calcular_costo,
+    obtener_limites_modelo,
+    LLM_BACKEND,
+    LLM_COMPATIBLE_BASE_URL,
+    LLM_COMPATIBLE_API_KEY,
+    LLM_COMPATIBLE_CONCURRENCIA,
+    LLM_COMPATIBLE_VENTANA_CONTEXTO,
+    LLM_COMPATIBLE_PRECIO_PROMPT_1K,
+    LLM_COMPATIBLE_PRECIO_COMPLETION_1K,
+    LLM_COMPATIBLE_SALIDA_ESTRUCTURADA,
+)
+from ....config.models import LLM_CONCURRENCIA_MAXIMA
+
+
+class BackendLLM(ABC):
+    """
+    Interfaz de un backend de LLM.
+
+    Atributos:
+        nombre: Nombre con el que se selecciona el backend
+        concurrencia_maxima: Llamadas simultáneas que admite el backend
+        ventana_contexto: Tokens de contexto del modelo (prompt + salida)
+        soporta_lotes: Si admite el modo lote (API de lotes del proveedor)
+        soporta_salida_estructurada: Si admite response_format json_schema estricto
+    """
+
+    nombre: str = ""
+    concurrencia_maxima: int = LLM_CONCURRENCIA_MAXIMA
+    ventana_contexto: int = 128_000
+    soporta_lotes: bool = False
+    soporta_salida_estructurada: bool = False
+
+    @abstractmethod
+    def obtener_llm(self, modelo: str) -> Any:
+        """Modelo de chat de LangChain para `modelo`."""
+
+    def identificador(self, modelo: str) -> str:
+        """
+        Identificador del modelo en este backend (clave del limitador y de la caché).
+
+        Un mismo nombre de modelo en dos backends distintos no comparte cuota
+        ni resultados cacheados.
+        """
+        return f"{self.nombre}:{modelo}"
+
+    def limites(self, modelo: str) -> Dict[str, int]:
+        """Límites iniciales del limitador (rpm, tpm, concurrencia_inicial, concurrencia_maxima)."""
+        return {
+            "rpm": 100_000,
+            "tpm": 100_000_000,
+            "concurrencia_inicial": self.concurrencia_maxima,
+            "concurrencia_maxima": self.concurrencia_maxima,
+        }
+
+    def calcular_costo(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        modelo: str,
+        cached_tokens: int = 0,
+        en_lote: bool = False,
+    ) -> float:
+        """Costo en USD de los tokens usados (ver config.calcular_costo)."""
+        return 0.0
+
+
+class BackendOpenAI(BackendLLM):
+    """API de OpenAI con los clientes y el pool HTTP compartidos."""
+
+    nombre = "openai"
+    soporta_lotes = True
+    soporta_salida_estructurada = True
+
+    def obtener_llm(self, modelo: str) -> Any:
+        return obtener_llm(modelo)
+
+    def identificador(self, modelo: str) -> str:
+        # Sin prefijo: mismas claves de limitador y caché que antes de existir los backends
+        return modelo
+
+    def limites(self, modelo: str) -> Dict[str, int]:
+        return obtener_limites_modelo(modelo)
+
+    def calcular_costo(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        modelo: str,
+        cached_tokens: int = 0,
+        en_lote: bool = False,
+    ) -> float:
+        return calcular_costo(prompt_tokens, completion_tokens, modelo, cached_tokens, en_lote)
+
+
+class BackendCompatible(BackendLLM):
+    """Servidor propio con la API de OpenAI (Chat Completions) en otra URL base."""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        concurrencia_maxima: Optional[int] = None,
+        ventana_contexto: Optional[int] = None,
+        precio_prompt_1k: Optional[float] = None,
+        precio_completion_1k: Optional[float] = None,
+        nombre: str = "compatible",
+        soporta_salida_estructurada: Optional[bool] = None,
+    ):
+        """
+        Args:
+            base_url: URL base del servidor (por defecto LLM_COMPATIBLE_BASE_URL)
+            api_key: Clave del servidor (por defecto LLM_COMPATIBLE_API_KEY)
+            concurrencia_maxima: Solicitudes simultáneas (por defecto LLM_COMPATIBLE_CONCURRENCIA)
+            ventana_contexto: Tokens de contexto (por defecto LLM_COMPATIBLE_VENTANA_CONTEXTO)
+            precio_prompt_1k: USD por 1K tokens de entrada (por defecto LLM_COMPATIBLE_PRECIO_PROMPT_1K)
+            precio_completion_1k: USD por 1K tokens de salida (por defecto LLM_COMPATIBLE_PRECIO_COMPLETION_1K)
+            nombre: Nombre en el registro (para tener varios servidores)
+            soporta_salida_estructurada: Si el servidor admite response_format
+                json_schema estricto (por defecto LLM_COMPATIBLE_SALIDA_ESTRUCTURADA)
+        """
+        self.nombre = nombre
+        self.base_url = base_url or LLM_COMPATIBLE_BASE_URL
+        self.api_key = api_key or LLM_COMPATIBLE_API_KEY
+        self.concurrencia_maxima = concurrencia_maxima or LLM_COMPATIBLE_CONCURRENCIA
+        self.ventana_contexto = ventana_contexto or LLM_COMPATIBLE_VENTANA_CONTEXTO
+        self.precio_prompt_1k = LLM_COMPATIBLE_PRECIO_PROMPT_1K if precio_prompt_1k is None else precio_prompt_1k
+        self.precio_completion_1k = (
+            LLM_COMPATIBLE_PRECIO_COMPLETION_1K if precio_completion_1k is None else precio_completion_1k
+        )
+        self.soporta_salida_estructurada = (
+            LLM_COMPATIBLE_SALIDA_ESTRUCTURADA if soporta_salida_estructurada is None else soporta_salida_estructurada
+        )
+
+    def obtener_llm(self, modelo: str) -> Any:
+        return obtener_llm(modelo, base_url=self.base_url, api_key=self.api_key)
+
+    def calcular_costo(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        modelo: str,
+        cached_tokens: int = 0,
+        en_lote: bool = False,
+    ) -> float:
+        return (prompt_tokens / 1000.0) * self.precio_prompt_1k + (completion_tokens / 1000.0) * self.precio_completion_1k
+
+
+class BackendDeterminista(BackendLLM):
+    """Modelo determinista en proceso (ChatDeterminista): sin red ni costo."""
+
+    nombre = "determinista"
+    concurrencia_maxima = 64
+    soporta_salida_estructurada = True
+    ventana_contexto = 1_000_000
+
+    def __init__(self):
+        self._modelos: Dict[str, ChatDeterminista] = {}
+
+    def obtener_llm(self, modelo: str) -> Any:
+        llm = self._modelos.get(modelo)
+        if llm is None:
+            llm = self._modelos[modelo] = ChatDeterminista(modelo=modelo)
+        return llm
+
+
+_lock = threading.Lock()
+_backends: Dict[str, BackendLLM] = {}
+
+
+def registrar_backend(backend: BackendLLM) -> BackendLLM:
+    """
+    Registra (o reemplaza) un backend por su nombre, sin distinguir mayúsculas.
+
+    Args:
+        backend: Instancia del backend
+
+    Returns:
+        El mismo backend
+    """
+    with _lock:
+        _backends[backend.nombre.lower()] = backend
+    return backend
+
+
+def obtener_backend(nombre: Optional[str] = None) -> BackendLLM:
+    """
+    Devuelve un backend registrado; los integrados se crean la primera vez.
+
+    Args:
+        nombre: Nombre del backend (por defecto LLM_BACKEND)
+
+    Returns:
+        Backend registrado
+
+    Raises:
+        ValueError: Si no hay un backend con ese nombre
+    """
+    nombre = (nombre or LLM_BACKEND).lower()
+    with _lock:
+        backend = _backends.get(nombre)
+        if backend is None:
+            integrados = {
+                "openai": BackendOpenAI,
+                "compatible": BackendCompatible,
+                "determinista": BackendDeterminista,
+            }
+            if nombre not in integrados:
+                raise ValueError(
+                    f"Backend de LLM desconocido: {nombre} "
+                    f"(opciones: {', '.join(sorted(set(integrados) | set(_backends)))})"
+                )
+            backend = _backends[nombre] = integrados[nombre]()
+        return backend
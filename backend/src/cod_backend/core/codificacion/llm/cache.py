@@ -0,0 +1,218 @@
+"""
+Caché persistente de respuestas del LLM (SQLite).
+
+Guarda el resultado del LLM por respuesta individual, direccionado por contenido:
+la clave combina el texto normalizado de la respuesta, la pregunta, la huella
+del catálogo, el modelo y la versión del prompt. Re-ejecutar el mismo archivo
+(tras cancelar, en otra región, etc.) reutiliza lo ya pagado en lugar de
+volver a llamar a OpenAI.
+
+La caché se poda por antigüedad (LLM_CACHE_MAX_DIAS) y por tamaño
+(LLM_CACHE_MAX_ENTRADAS, expulsando las entradas usadas hace más tiempo).
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from ....config import (
+    LLM_CACHE_HABILITADO,
+    LLM_CACHE_RUTA,
+    LLM_CACHE_MAX_ENTRADAS,
+    LLM_CACHE_MAX_DIAS,
+)
+from ...utils import normalizar_texto
+
+# Cada cuántas inserciones se revisa la poda
+INSERCIONES_POR_PODA = 500
+
+
+def huella_catalogo(catalogo: List[Dict[str, Any]]) -> str:
+    """
+    Calcula una huella estable del catálogo histórico.
+
+    Args:
+        catalogo: Lista de códigos {"codigo", "descripcion"}
+
+    Returns:
+        Hash hexadecimal del catálogo
+    """
+    contenido = json.dumps(
+        [[c.get("codigo"), c.get("descripcion", "")] for c in catalogo],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()[:16]
+
+
+def clave_respuesta(
+    texto: str,
+    pregunta: str,
+    huella: str,
+    modelo: str,
+    version_prompt: str,
+) -> str:
+    """
+    Clave de caché de una respuesta individual.
+
+    Args:
+        texto: Texto de la respuesta (se normaliza con normalizar_texto)
+        pregunta: Pregunta de la encuesta
+        huella: Huella del catálogo (huella_catalogo)
+        modelo: Modelo del LLM
+        version_prompt: Versión del prompt
+
+    Returns:
+        Clave hexadecimal
+    """
+    partes = [normalizar_texto(str(texto)), pregunta or "", huella, modelo, version_prompt]
+    return hashlib.sha256("\x1f".join(partes).encode("utf-8")).hexdigest()
+
+
+class CacheRespuestas:
+    """Caché clave → resultado JSON en SQLite, segura para varios hilos."""
+
+    def __init__(
+        self,
+        ruta: str,
+        max_entradas: int = LLM_CACHE_MAX_ENTRADAS,
+        max_dias: float = LLM_CACHE_MAX_DIAS,
+    ):
+        self.ruta = Path(ruta)
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entradas = max_entradas
+        self.max_segundos = max_dias * 86400
+        self._lock = threading.Lock()
+        self._inserciones = 0
+        self._conexion = sqlite3.connect(str(self.ruta), check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            """
+            CREATE TABLE IF NOT EXISTS respuestas (
+                clave TEXT PRIMARY KEY,
+                valor TEXT NOT NULL,
+                creado REAL NOT NULL,
+                accedido REAL NOT NULL
+            )
+            """
+        )
+        self._conexion.execute(
+            "CREATE INDEX IF NOT EXISTS idx_respuestas_accedido ON respuestas(accedido)"
+        )
+        self._conexion.commit()
+        self.podar()
+
+    def obtener(self, claves: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Busca varias claves a la vez.
+
+        Args:
+            claves: Claves a buscar
+
+        Returns:
+            Diccionario clave → valor para las claves encontradas y vigentes
+        """
+        claves = list(dict.fromkeys(claves))
+        if not claves:
+            return {}
+        ahora = time.time()
+        limite = ahora - self.max_segundos
+        encontrados: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for inicio in range(0, len(claves), 500):
+                grupo = claves[inicio:inicio + 500]
+                marcadores = ",".join("?" * len(grupo))
+                filas = self._conexion.execute(
+                    f"SELECT clave, valor FROM respuestas WHERE creado >= ? AND clave IN ({marcadores})",
+                    [limite, *grupo],
+                ).fetchall()
+                for clave, valor in filas:
+                    encontrados[clave] = json.loads(valor)
+            if encontrados:
+                self._conexion.executemany(
+                    "UPDATE respuestas SET accedido = ? WHERE clave = ?",
+                    [(ahora, clave) for clave in encontrados],
+                )
+                self._conexion.commit()
+        return encontrados
+
+    def guardar(self, entradas: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Guarda (o reemplaza) varias entradas.
+
+        Args:
+            entradas: Diccionario clave → valor serializable a JSON
+        """
+        if not entradas:
+            return
+        ahora = time.time()
+        with self._lock:
+            self._conexion.executemany(
+                "INSERT OR REPLACE INTO respuestas (clave, valor, creado, accedido) VALUES (?, ?, ?, ?)",
+                [
+                    (clave, json.dumps(valor, ensure_ascii=False), ahora, ahora)
+                    for clave, valor in entradas.items()
+                ],
+            )
+            self._conexion.commit()
+            self._inserciones += len(entradas)
+            debe_podar = self._inserciones >= INSERCIONES_POR_PODA
+        if debe_podar:
+            self.podar()
+
+    def podar(self) -> int:
+        """
+        Elimina entradas vencidas y, si se excede el tamaño, las menos usadas.
+
+        Returns:
+            Número de entradas eliminadas
+        """
+        with self._lock:
+            self._inserciones = 0
+            eliminadas = self._conexion.execute(
+                "DELETE FROM respuestas WHERE creado < ?",
+                (time.time() - self.max_segundos,),
+            ).rowcount
+            total = self._conexion.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+            exceso = total - self.max_entradas
+            if exceso > 0:
+                eliminadas += self._conexion.execute(
+                    "DELETE FROM respuestas WHERE clave IN "
+                    "(SELECT clave FROM respuestas ORDER BY accedido ASC LIMIT ?)",
+                    (exceso,),
+                ).rowcount
+            self._conexion.commit()
+        return eliminadas
+
+    def total_entradas(self) -> int:
+        """Número de entradas almacenadas."""
+        with self._lock:
+            return self._conexion.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+
+    def cerrar(self) -> None:
+        """Cierra la conexión a SQLite."""
+        with self._lock:
+            self._conexion.close()
+
+
+_lock_cache = threading.Lock()
+_cache: Optional[CacheRespuestas] = None
+
+
+def obtener_cache() -> Optional[CacheRespuestas]:
+    """
+    Devuelve la caché compartida del proceso (None si está deshabilitada).
+
+    Returns:
+        Instancia de CacheRespuestas o None
+    """
+    global _cache
+    if not LLM_CACHE_HABILITADO:
+        return None
+    with _lock_cache:
+        if _cache is None:
+            _cache = CacheRespuestas(LLM_CACHE_RUTA)
+        return _cache
@@ -0,0 +1,211 @@
+"""
+Registro de clientes LLM compartidos por todo el proceso.
+
+En lugar de construir un `ChatOpenAI` (y con él un cliente HTTP nuevo) en cada
+batch, los clientes se crean una sola vez por (modelo, soporte de temperature,
+URL base) y comparten un único pool de conexiones HTTP con keep-alive (HTTP/2 si el
+paquete `h2` está instalado). Así se evitan handshakes TLS repetidos entre
+batches y entre procesos de codificación.
+"""
+import asyncio
+import hashlib
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from ....config import (
+    OPENAI_API_KEY,
+    LLM_MAX_CONEXIONES,
+    LLM_MAX_CONEXIONES_KEEPALIVE,
+    LLM_KEEPALIVE_SEGUNDOS,
+    supports_temperature,
+)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_DISPONIBLE = True
+except ImportError:
+    HTTP2_DISPONIBLE = False
+
+_lock = threading.Lock()
+_clientes_llm: Dict[Tuple[str, bool, Optional[str], str], ChatOpenAI] = {}
+_http_client: Optional[httpx.AsyncClient] = None
+_loop_http_client: Optional[asyncio.AbstractEventLoop] = None
+_tarea_cierre: Optional[asyncio.Task] = None
+
+# Contadores del pool (se actualizan desde los hooks de httpx)
+_estadisticas: Dict[str, int] = {
+    "solicitudes": 0,
+    "conexiones_nuevas": 0,
+    "handshakes_tls": 0,
+}
+
+
+async def _trace_conexion(evento: str, _info: Dict[str, Any]) -> None:
+    """Cuenta conexiones TCP y handshakes TLS nuevos (extensión `trace` de httpcore)."""
+    if evento == "connection.connect_tcp.complete":
+        _estadisticas["conexiones_nuevas"] += 1
+    elif evento == "connection.start_tls.complete":
+        _estadisticas["handshakes_tls"] += 1
+
+
+async def _hook_solicitud(request: httpx.Request) -> None:
+    """Registra cada solicitud e instala el trace de conexiones."""
+    _estadisticas["solicitudes"] += 1
+    request.extensions["trace"] = _trace_conexion
+
+
+async def _cerrar_al_terminar_loop(cliente: httpx.AsyncClient) -> None:
+    """
+    Espera en el loop del pool y lo cierra cuando se cancela.
+
+    Las conexiones de httpx solo se pueden cerrar desde su event loop: una vez
+    cerrado el loop, `aclose()` falla y los sockets quedan abiertos. Esta tarea
+    se cancela al terminar el loop (asyncio.run cancela las tareas pendientes
+    antes de cerrarlo) o cuando el pool se reemplaza, y cierra el cliente ahí.
+    """
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await cliente.aclose()
+
+
+def _cancelar_tarea_cierre(tarea: Optional[asyncio.Task]) -> None:
+    """Cancela la tarea de cierre de un pool desde cualquier hilo."""
+    if tarea is None or tarea.done():
+        return
+    loop = tarea.get_loop()
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(tarea.cancel)
+
+
+def obtener_http_client() -> httpx.AsyncClient:
+    """
+    Devuelve el cliente HTTP asíncrono compartido (lo crea la primera vez).
+
+    Si cambió el event loop, el pool anterior se cierra en su propio loop y se
+    crea uno nuevo.
+
+    Returns:
+        Cliente httpx con pool de conexiones y keep-alive
+    """
+    global _http_client, _loop_http_client, _tarea_cierre
+    try:
+        loop_actual: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+    except RuntimeError:
+        loop_actual = _loop_http_client
+    with _lock:
+        # Las conexiones de httpx pertenecen a un event loop: si cambia, se recrea el pool
+        if loop_actual is not _loop_http_client:
+            _cancelar_tarea_cierre(_tarea_cierre)
+            _tarea_cierre = None
+            _http_client = None
+            _clientes_llm.clear()
+        if _http_client is None or _http_client.is_closed:
+            _cancelar_tarea_cierre(_tarea_cierre)
+            _loop_http_client = loop_actual
+            _http_client = httpx.AsyncClient(
+                http2=HTTP2_DISPONIBLE,
+                limits=httpx.Limits(
+                    max_connections=LLM_MAX_CONEXIONES,
+                    max_keepalive_connections=LLM_MAX_CONEXIONES_KEEPALIVE,
+                    keepalive_expiry=LLM_KEEPALIVE_SEGUNDOS,
+                ),
+                timeout=httpx.Timeout(600.0, connect=10.0),
+                event_hooks={"request": [_hook_solicitud]},
+            )
+            _tarea_cierre = (
+                loop_actual.create_task(_cerrar_al_terminar_loop(_http_client))
+                if loop_actual is not None and loop_actual.is_running()
+                else None
+            )
+        return _http_client
+
+
+def obtener_llm(
+    modelo: str,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> ChatOpenAI:
+    """
+    Devuelve el cliente LLM de larga duración para un modelo.
+
+    Los clientes se registran por (modelo, soporte de temperature, URL base,
+    huella de la clave) y todos comparten el mismo pool HTTP. Dos backends con
+    la misma URL y distinta clave no comparten cliente (ni credenciales).
+
+    Args:
+        modelo: Nombre del modelo (ej: "gpt-5", "gpt-4o-mini")
+        base_url: URL de un servidor compatible con la API de OpenAI (None = OpenAI)
+        api_key: Clave para ese servidor (por defecto OPENAI_API_KEY)
+
+    Returns:
+        Instancia compartida de ChatOpenAI
+    """
+    usa_temperature = supports_temperature(modelo)
+    api_key = api_key or OPENAI_API_KEY
+    huella_api_key = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    clave = (modelo, usa_temperature, base_url, huella_api_key)
+    http_client = obtener_http_client()
+    with _lock:
+        llm = _clientes_llm.get(clave)
+        if llm is None:
+            llm_kwargs: Dict[str, Any] = {
+                "model": modelo,
+                "api_key": api_key,
+                "http_async_client": http_client,
+                # Los headers x-ratelimit-* alimentan al limitador compartido
+                "include_response_headers": True,
+                # Los 429 y reintentos los gestiona el limitador, no el SDK
+                "max_retries": 0,
+                # Uso de tokens también en las respuestas en streaming
+                "stream_usage": True,
+            }
+            if usa_temperature:
+                llm_kwargs["temperature"] = 0.1
+            if base_url:
+                llm_kwargs["base_url"] = base_url
+            llm = ChatOpenAI(**llm_kwargs)
+            _clientes_llm[clave] = llm
+        return llm
+
+
+def estadisticas_pool() -> Dict[str, Any]:
+    """
+    Estadísticas de reutilización del pool de conexiones.
+
+    Returns:
+        Diccionario con solicitudes, conexiones nuevas, handshakes TLS,
+        ratio de reutilización y clientes LLM registrados
+    """
+    solicitudes = _estadisticas["solicitudes"]
+    conexiones = _estadisticas["conexiones_nuevas"]
+    reutilizacion = 1.0 - (conexiones / solicitudes) if solicitudes else 0.0
+    return {
+        **_estadisticas,
+        "reutilizacion": round(max(reutilizacion, 0.0), 4),
+        "http2": HTTP2_DISPONIBLE,
+        "clientes_llm": len(_clientes_llm),
+    }
+
+
+async def cerrar_clientes() -> None:
+    """Cierra el pool HTTP compartido y vacía el registro de clientes."""
+    global _http_client, _tarea_cierre
+    with _lock:
+        cliente = _http_client
+        tarea = _tarea_cierre
+        _http_client = None
+        _tarea_cierre = None
+        _clientes_llm.clear()
+    if tarea is not None and tarea.get_loop() is not asyncio.get_running_loop():
+        # El pool es de otro loop: se cierra allí
+        _cancelar_tarea_cierre(tarea)
+        return
+    if tarea is not None and not tarea.done():
+        tarea.cancel()
+        await asyncio.gather(tarea, return_exceptions=True)
+    if cliente is not None and not cliente.is_closed:
+        await cliente.aclose()
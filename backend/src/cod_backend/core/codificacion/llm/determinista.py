@@ -0,0 +1,178 @@
+"""
+Modelo de chat determinista en proceso (sin red).
+
+Lee el prompt de codificación (catálogo, códigos ya creados, código base y
+respuestas numeradas) y devuelve una salida válida en el protocolo que pide el
+prompt, aplicando una regla léxica fija: un código aplica si todas las palabras
+significativas de su descripción aparecen en la respuesta; una respuesta válida
+sin códigos que apliquen propone un concepto nuevo con sus primeras palabras.
+
+Misma entrada, misma salida: sirve para correr el grafo completo en CI y en
+benchmarks (con streaming, límites y conteo de tokens) sin llamar a un proveedor.
+"""
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .invocacion import estimar_tokens
+from ...utils import normalizar_texto
+
+# Caracteres por fragmento al simular el streaming
+TAMANIO_FRAGMENTO = 64
+
+# Palabras de una descripción que no cuentan para decidir si un código aplica
+PALABRAS_VACIAS = {"para", "como", "pero", "porque", "desde", "hasta", "sobre", "entre", "muy", "mas", "los", "las", "del"}
+
+_SECCION = r"### {}\n(.*?)(?=\n### |\Z)"
+_LINEA_CODIGO = re.compile(r"^\s*(\d+)[.:]\s+(.+?)\s*$")
+_LINEA_RESPUESTA = re.compile(r"^(\d+)\.\s?(.*)$")
+
+
+def _seccion(prompt: str, nombre: str) -> str:
+    encontrada = re.search(_SECCION.format(re.escape(nombre)), prompt, re.S)
+    return encontrada.group(1).strip() if encontrada else ""
+
+
+def _palabras(texto: str) -> List[str]:
+    return [p for p in re.findall(r"\w+", normalizar_texto(texto)) if len(p) >= 3 and p not in PALABRAS_VACIAS]
+
+
+def _codigos(texto: str) -> List[Tuple[int, str]]:
+    return [
+        (int(m.group(1)), m.group(2))
+        for m in (_LINEA_CODIGO.match(linea) for linea in texto.splitlines())
+        if m
+    ]
+
+
+def codificar_prompt(prompt: str) -> Dict[str, Any]:
+    """
+    Codifica de forma determinista las respuestas de un prompt de codificación.
+
+    Args:
+        prompt: Prompt completo (plantilla codificar_combinado o codificar_compacto)
+
+    Returns:
+        Salida en el protocolo del prompt (completo o compacto)
+    """
+    catalogo = _codigos(_seccion(prompt, "CATÁLOGO HISTÓRICO"))
+    existentes = _codigos(_seccion(prompt, "CÓDIGOS NUEVOS YA CREADOS EN BATCHES ANTERIORES"))
+    base = re.search(r"\d+", _seccion(prompt, "CÓDIGO BASE PARA CÓDIGOS NUEVOS"))
+    siguiente = int(base.group()) if base else 1
+    respuestas = [
+        (int(m.group(1)), m.group(2))
+        for m in (_LINEA_RESPUESTA.match(linea) for linea in _seccion(prompt, "RESPUESTAS").splitlines())
+        if m
+    ]
+
+    palabras_catalogo = {codigo: set(_palabras(desc)) for codigo, desc in catalogo}
+    conceptos = {" ".join(_palabras(desc)): codigo for codigo, desc in existentes}
+    filas = []
+    for rid, texto in respuestas:
+        palabras = set(_palabras(texto))
+        valida = bool(palabras)
+        aplican = [c for c, clave in palabras_catalogo.items() if valida and clave and clave <= palabras]
+        nuevos = []
+        if valida and not aplican:
+            descripcion = " ".join(_palabras(texto)[:4])
+            codigo = conceptos.get(descripcion)
+            if codigo is None:
+                codigo = conceptos[descripcion] = siguiente
+                siguiente += 1
+            nuevos.append({"codigo": codigo, "descripcion": descripcion.capitalize(), "texto_original": texto})
+        filas.append((rid, valida, aplican, nuevos))
+
+    if '"r": [' in prompt:
+        return {"r": [
+            {
+                "id": rid,
+                "ok": valida,
+                "razon": "" if valida else "Sin contenido",
+                "cod": [{"c": c, "p": 0.95} for c in aplican],
+                "cub": valida and not nuevos,
+                "nuevos": [{"c": n["codigo"], "d": n["descripcion"], "t": n["texto_original"]} for n in nuevos],
+            }
+            for rid, valida, aplican, nuevos in filas
+        ]}
+    return {
+        "validaciones": [
+            {"respuesta_id": rid, "es_valida": valida, "razon": "Relevante" if valida else "Sin contenido"}
+            for rid, valida, _aplican, _nuevos in filas
+        ],
+        "evaluaciones": [
+            {
+                "respuesta_id": rid,
+                "evaluaciones": [
+                    {"codigo": c, "aplica": c in aplican, "confianza": 0.95} for c in palabras_catalogo
+                ],
+            }
+            for rid, _valida, aplican, _nuevos in filas
+        ],
+        "analisis": [
+            {"respuesta_id": rid, "respuesta_cubierta_completamente": valida and not nuevos, "conceptos_nuevos": nuevos}
+            for rid, valida, _aplican, nuevos in filas
+        ],
+    }
+
+
+class ChatDeterminista(BaseChatModel):
+    """
+    Modelo de chat que responde con codificar_prompt, sin red.
+
+    Soporta invoke, stream (en fragmentos de TAMANIO_FRAGMENTO caracteres) y
+    `bind(response_format=...)` (se ignora: la salida ya cumple el esquema).
+    """
+
+    modelo: str = "determinista"
+
+    @property
+    def _llm_type(self) -> str:
+        return "determinista"
+
+    def _responder(self, messages: List[BaseMessage]) -> Tuple[str, Dict[str, int]]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        contenido = json.dumps(codificar_prompt(prompt), ensure_ascii=False)
+        prompt_tokens = estimar_tokens(prompt)
+        completion_tokens = estimar_tokens(contenido)
+        return contenido, {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        contenido, uso = self._responder(messages)
+        mensaje = AIMessage(
+            content=contenido,
+            usage_metadata=uso,
+            response_metadata={"finish_reason": "stop", "model_name": self.modelo},
+        )
+        return ChatResult(generations=[ChatGeneration(message=mensaje)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        contenido, uso = self._responder(messages)
+        for inicio in range(0, len(contenido), TAMANIO_FRAGMENTO):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=contenido[inicio:inicio + TAMANIO_FRAGMENTO]))
+        # El uso y el finish_reason llegan en el último fragmento, como en OpenAI con stream_usage
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            usage_metadata=uso,
+            response_metadata={"finish_reason": "stop", "model_name": self.modelo},
+        ))
@@ -0,0 +1,214 @@
+"""
+Punto único de invocación del LLM.
+
+Todas las llamadas pasan por el limitador compartido del modelo: se reserva
+cuota antes de llamar, se devuelve la retroalimentación de headers al terminar
+y los 429 se esperan y reintentan en lugar de abortar el proceso. Los errores
+transitorios (timeouts, errores de conexión, 5xx) se reintentan con backoff
+exponencial con jitter (tenacity).
+
+Cada intento tiene su propio timeout (asyncio.wait_for), acotado por la fecha
+límite del trabajo si la hay; vencido el plazo, no se reintenta.
+
+Si se entrega un consumidor de stream, la respuesta se pide en streaming y
+cada fragmento de texto se le pasa a medida que llega (progreso por respuesta).
+"""
+import asyncio
+import time
+from typing import Any, Dict, Mapping, Optional
+
+import httpx
+import openai
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from .limitador import obtener_limitador
+from .plazos import acotar_timeout
+from ...utils import extraer_tokens
+
+# Reintentos ante 429 antes de rendirse
+MAX_REINTENTOS_429 = 6
+
+# Intentos totales ante errores transitorios y tope del backoff (segundos)
+MAX_INTENTOS_TRANSITORIOS = 4
+BACKOFF_MAXIMO = 30.0
+
+ERRORES_TRANSITORIOS = (
+    openai.APIConnectionError,  # Incluye APITimeoutError
+    openai.InternalServerError,
+    httpx.TimeoutException,
+    httpx.TransportError,
+    asyncio.TimeoutError,
+)
+
+
+def estimar_tokens(texto: str, tokens_completion: int = 0) -> int:
+    """
+    Estimación rápida de tokens (≈ 4 caracteres por token) más la completion esperada.
+
+    Args:
+        texto: Texto del prompt
+        tokens_completion: Tokens de salida esperados
+
+    Returns:
+        Tokens estimados
+    """
+    return len(texto) // 4 + tokens_completion
+
+
+def _headers_respuesta(respuesta: Any) -> Dict[str, Any]:
+    """Headers HTTP incluidos por ChatOpenAI en response_metadata (si existen)."""
+    meta = getattr(respuesta, "response_metadata", {}) or {}
+    return dict(meta.get("headers") or {})
+
+
+def _headers_error(error: Exception) -> Mapping[str, Any]:
+    """Headers HTTP de un error de la API de OpenAI (si existen)."""
+    respuesta = getattr(error, "response", None)
+    return getattr(respuesta, "headers", None) or {}
+
+
+def _incrementar(metricas: Optional[Dict[str, int]], clave: str) -> None:
+    """Incrementa un contador de métricas si se proporcionó el diccionario."""
+    if metricas is not None:
+        metricas[clave] = metricas.get(clave, 0) + 1
+
+
+async def _invocar_en_stream(chain: Any, entradas: Dict[str, Any], stream: Any) -> Any:
+    """
+    Invoca la chain en streaming, pasando cada fragmento de texto al consumidor.
+
+    Returns:
+        Mensaje con todos los fragmentos acumulados (contenido, metadata y uso)
+    """
+    stream.reiniciar()
+    acumulado = None
+    async for fragmento in chain.astream(entradas):
+        acumulado = fragmento if acumulado is None else acumulado + fragmento
+        texto = getattr(fragmento, "content", "")
+        if texto and isinstance(texto, str):
+            await stream.alimentar(texto)
+    return acumulado
+
+
+async def invocar_llm(
+    chain: Any,
+    entradas: Dict[str, Any],
+    modelo: str,
+    tokens_estimados: int,
+    max_reintentos_429: Optional[int] = None,
+    metricas: Optional[Dict[str, int]] = None,
+    stream: Optional[Any] = None,
+    limites: Optional[Dict[str, int]] = None,
+    timeout: Optional[float] = None,
+    fecha_limite: Optional[float] = None,
+) -> Any:
+    """
+    Invoca una chain de LangChain respetando el limitador y reintentando errores transitorios.
+
+    Args:
+        chain: Runnable a invocar (prompt | llm)
+        entradas: Variables del prompt
+        modelo: Modelo usado (clave del limitador; backend:modelo fuera de OpenAI)
+        tokens_estimados: Tokens estimados de la llamada (prompt + completion)
+        max_reintentos_429: Reintentos ante 429 (por defecto MAX_REINTENTOS_429)
+        metricas: Diccionario opcional donde se acumulan `reintentos_llm` y `reintentos_429`
+        stream: Consumidor opcional del stream (SeguimientoStream): si se indica,
+            la respuesta se pide en streaming y se le pasa cada fragmento de texto
+        limites: Límites con los que se crea el limitador si aún no existe
+            (los que declara el backend; por defecto los del modelo en OpenAI)
+        timeout: Segundos máximos de cada intento (None = sin timeout propio)
+        fecha_limite: Fecha límite del trabajo (segundos epoch): acota el timeout
+            de cada intento y corta los reintentos al vencer
+
+    Returns:
+        Respuesta del LLM (con los fragmentos acumulados si se usó streaming)
+
+    Raises:
+        openai.RateLimitError: Si se agotan los reintentos ante 429
+        asyncio.TimeoutError: Si el intento supera su timeout y no quedan
+            reintentos o el plazo del trabajo venció
+        Exception: El último error transitorio si se agotan los intentos
+    """
+    def _antes_de_esperar(estado: RetryCallState) -> None:
+        _incrementar(metricas, "reintentos_llm")
+        error = estado.outcome.exception() if estado.outcome else None
+        espera = estado.next_action.sleep if estado.next_action else 0.0
+        print(
+            f"   🔁 Error transitorio ({type(error).__name__}); "
+            f"reintento {estado.attempt_number}/{MAX_INTENTOS_TRANSITORIOS - 1} en {espera:.1f}s"
+        )
+
+    def _reintentable(error: BaseException) -> bool:
+        vencido = fecha_limite is not None and time.time() >= fecha_limite
+        return isinstance(error, ERRORES_TRANSITORIOS) and not vencido
+
+    async for intento in AsyncRetrying(
+        retry=retry_if_exception(_reintentable),
+        wait=wait_random_exponential(multiplier=1, max=BACKOFF_MAXIMO),
+        stop=stop_after_attempt(MAX_INTENTOS_TRANSITORIOS),
+        before_sleep=_antes_de_esperar,
+        reraise=True,
+    ):
+        with intento:
+            return await _invocar_con_limitador(
+                chain, entradas, modelo, tokens_estimados, max_reintentos_429, metricas, stream, limites,
+                timeout, fecha_limite
+            )
+
+
+async def _invocar_con_limitador(
+    chain: Any,
+    entradas: Dict[str, Any],
+    modelo: str,
+    tokens_estimados: int,
+    max_reintentos_429: Optional[int],
+    metricas: Optional[Dict[str, int]],
+    stream: Optional[Any] = None,
+    limites: Optional[Dict[str, int]] = None,
+    timeout: Optional[float] = None,
+    fecha_limite: Optional[float] = None,
+) -> Any:
+    """Una invocación a través del limitador del modelo, esperando los 429."""
+    limitador = obtener_limitador(modelo, limites)
+    reintentos = MAX_REINTENTOS_429 if max_reintentos_429 is None else max_reintentos_429
+    intento = 0
+
+    while True:
+        await limitador.adquirir(tokens_estimados)
+        try:
+            # El tiempo de espera en el limitador no descuenta del timeout, sí del plazo
+            espera = acotar_timeout(timeout, fecha_limite)
+            if espera is not None and espera <= 0:
+                raise asyncio.TimeoutError("Plazo del trabajo vencido")
+            if stream is None:
+                llamada = chain.ainvoke(entradas)
+            else:
+                llamada = _invocar_en_stream(chain, entradas, stream)
+            respuesta = await asyncio.wait_for(llamada, espera)
+        except openai.RateLimitError as e:
+            pausa = limitador.registrar_429(tokens_estimados, _headers_error(e))
+            # Sin cuota de la cuenta no tiene sentido reintentar
+            if "insufficient_quota" in str(e).lower() or intento >= reintentos:
+                raise
+            intento += 1
+            _incrementar(metricas, "reintentos_429")
+            # El limitador queda en pausa: el siguiente adquirir() espera el tiempo indicado
+            print(f"   ⏳ 429 de la API ({modelo}); reintento {intento}/{reintentos} en {pausa:.1f}s")
+            continue
+        except BaseException:
+            limitador.registrar_error(tokens_estimados)
+            raise
+
+        _prompt, _completion, total = extraer_tokens(respuesta)
+        limitador.liberar(
+            tokens_estimados,
+            tokens_reales=total or None,
+            headers=_headers_respuesta(respuesta),
+        )
+        return respuesta
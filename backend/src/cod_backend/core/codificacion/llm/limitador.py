@@ -0,0 +1,296 @@
+"""
+Limitador de velocidad adaptativo compartido por todos los procesos.
+
+Cada modelo tiene un limitador con dos token buckets (solicitudes por minuto
+y tokens por minuto) y un límite de concurrencia que se ajusta estilo AIMD:
+sube de forma aditiva con cada respuesta exitosa, se reduce a la mitad ante
+un 429 y se recorta a 3/4 cuando los headers `x-ratelimit-*` indican que queda
+poco margen (aviso previo al rechazo, por eso el recorte es más suave).
+Todas las llamadas al LLM pasan por aquí, de modo que varios trabajos grandes
+en paralelo se reparten la cuota en lugar de tumbarse entre sí.
+"""
+import asyncio
+import re
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional
+
+from ....config import obtener_limites_modelo
+
+# Fracción de cuota restante por debajo de la cual se considera congestión
+UMBRAL_CONGESTION = 0.1
+# Factor de la concurrencia ante congestión según headers y ante un 429
+FACTOR_CONGESTION = 0.75
+FACTOR_429 = 0.5
+# Pausa máxima entre sondeos mientras se espera cuota
+ESPERA_MAXIMA_SONDEO = 1.0
+
+
+def _parsear_duracion(valor: Optional[str]) -> Optional[float]:
+    """
+    Convierte duraciones de headers de OpenAI ("1s", "6m0s", "120ms", "2.5") a segundos.
+
+    Args:
+        valor: Valor del header
+
+    Returns:
+        Segundos, o None si no se puede interpretar
+    """
+    if not valor:
+        return None
+    valor = str(valor).strip()
+    try:
+        return float(valor)
+    except ValueError:
+        pass
+    total = 0.0
+    encontrado = False
+    for cantidad, unidad in re.findall(r"([\d.]+)(ms|h|m|s)", valor):
+        encontrado = True
+        factor = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}[unidad]
+        total += float(cantidad) * factor
+    return total if encontrado else None
+
+
+class LimitadorModelo:
+    """
+    Token bucket RPM/TPM con concurrencia AIMD para un modelo.
+
+    No usa primitivas de asyncio ligadas a un event loop: el estado se protege
+    con un lock de hilos y la espera se hace con `asyncio.sleep`.
+    """
+
+    def __init__(
+        self,
+        modelo: str,
+        rpm: int,
+        tpm: int,
+        concurrencia_inicial: int = 4,
+        concurrencia_maxima: int = 32,
+    ):
+        self.modelo = modelo
+        self.rpm = float(rpm)
+        self.tpm = float(tpm)
+        self.concurrencia_maxima = float(concurrencia_maxima)
+        self.limite_concurrencia = float(min(concurrencia_inicial, concurrencia_maxima))
+        self.en_vuelo = 0
+        self._solicitudes_disponibles = self.rpm
+        self._tokens_disponibles = self.tpm
+        self._ultima_recarga = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._lock = threading.Lock()
+        self.total_solicitudes = 0
+        self.total_429 = 0
+
+    def _recargar(self, ahora: float) -> None:
+        """Rellena los buckets según el tiempo transcurrido."""
+        transcurrido = ahora - self._ultima_recarga
+        if transcurrido <= 0:
+            return
+        self._solicitudes_disponibles = min(
+            self.rpm, self._solicitudes_disponibles + transcurrido * self.rpm / 60.0
+        )
+        self._tokens_disponibles = min(
+            self.tpm, self._tokens_disponibles + transcurrido * self.tpm / 60.0
+        )
+        self._ultima_recarga = ahora
+
+    def _intentar_adquirir(self, tokens: int) -> float:
+        """
+        Intenta reservar una solicitud y `tokens` tokens.
+
+        Returns:
+            0.0 si se reservó; si no, segundos estimados de espera
+        """
+        with self._lock:
+            ahora = time.monotonic()
+            self._recargar(ahora)
+            if ahora < self._pausa_hasta:
+                return self._pausa_hasta - ahora
+            if self.en_vuelo >= int(self.limite_concurrencia):
+                return 0.05
+            # Una solicitud más grande que el bucket completo se permite con el bucket lleno
+            tokens_necesarios = min(float(tokens), self.tpm)
+            falta_solicitudes = 1.0 - self._solicitudes_disponibles
+            falta_tokens = tokens_necesarios - self._tokens_disponibles
+            if falta_solicitudes > 0 or falta_tokens > 0:
+                espera_solicitudes = max(falta_solicitudes, 0.0) * 60.0 / self.rpm
+                espera_tokens = max(falta_tokens, 0.0) * 60.0 / self.tpm
+                return max(espera_solicitudes, espera_tokens, 0.01)
+            self._solicitudes_disponibles -= 1.0
+            self._tokens_disponibles -= tokens_necesarios
+            self.en_vuelo += 1
+            self.total_solicitudes += 1
+            return 0.0
+
+    async def adquirir(self, tokens_estimados: int) -> None:
+        """
+        Espera hasta que haya cuota y concurrencia disponibles para una llamada.
+
+        Args:
+            tokens_estimados: Tokens (prompt + completion) estimados de la llamada
+        """
+        while True:
+            espera = self._intentar_adquirir(tokens_estimados)
+            if espera <= 0:
+                return
+            await asyncio.sleep(min(espera, ESPERA_MAXIMA_SONDEO))
+
+    def liberar(
+        self,
+        tokens_estimados: int,
+        tokens_reales: Optional[int] = None,
+        headers: Optional[Mapping[str, Any]] = None,
+    ) -> None:
+        """
+        Libera el slot de una llamada exitosa y aplica la retroalimentación:
+        con congestión en los headers la concurrencia se multiplica por
+        FACTOR_CONGESTION; si no, sube de forma aditiva.
+
+        Args:
+            tokens_estimados: Tokens reservados al adquirir
+            tokens_reales: Tokens realmente consumidos (si se conocen)
+            headers: Headers de la respuesta HTTP (`x-ratelimit-*`)
+        """
+        with self._lock:
+            self.en_vuelo = max(0, self.en_vuelo - 1)
+            if tokens_reales is not None:
+                # Corregir la reserva con el consumo real
+                self._tokens_disponibles = min(
+                    self.tpm, self._tokens_disponibles + tokens_estimados - tokens_reales
+                )
+            congestion = self._aplicar_headers(headers or {})
+            if congestion:
+                self.limite_concurrencia = max(1.0, self.limite_concurrencia * FACTOR_CONGESTION)
+            else:
+                # Incremento aditivo: +1 de concurrencia por cada "ventana" completa exitosa
+                self.limite_concurrencia = min(
+                    self.concurrencia_maxima,
+                    self.limite_concurrencia + 1.0 / max(self.limite_concurrencia, 1.0),
+                )
+
+    def registrar_error(self, tokens_estimados: int) -> None:
+        """Libera el slot de una llamada fallida (sin ajustar la concurrencia)."""
+        with self._lock:
+            self.en_vuelo = max(0, self.en_vuelo - 1)
+            self._tokens_disponibles = min(self.tpm, self._tokens_disponibles + tokens_estimados)
+
+    def registrar_429(
+        self,
+        tokens_estimados: int,
+        headers: Optional[Mapping[str, Any]] = None,
+    ) -> float:
+        """
+        Registra un 429: reduce la concurrencia a la mitad y pausa al modelo.
+
+        Args:
+            tokens_estimados: Tokens reservados al adquirir (no se devuelven al bucket)
+            headers: Headers de la respuesta 429
+
+        Returns:
+            Segundos de pausa aplicados
+        """
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        retry_ms = _parsear_duracion(headers.get("retry-after-ms"))
+        if retry_ms is not None:
+            pausa = retry_ms / 1000.0
+        else:
+            pausa = _parsear_duracion(headers.get("retry-after"))
+        if pausa is None:
+            pausa = max(
+                _parsear_duracion(headers.get("x-ratelimit-reset-requests")) or 0.0,
+                _parsear_duracion(headers.get("x-ratelimit-reset-tokens")) or 0.0,
+            ) or 2.0
+        with self._lock:
+            self.en_vuelo = max(0, self.en_vuelo - 1)
+            self.total_429 += 1
+            self.limite_concurrencia = max(1.0, self.limite_concurrencia * FACTOR_429)
+            self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + pausa)
+            self._solicitudes_disponibles = min(self._solicitudes_disponibles, 0.0)
+        return pausa
+
+    def _aplicar_headers(self, headers: Mapping[str, Any]) -> bool:
+        """
+        Ajusta buckets con los headers `x-ratelimit-*` (llamar con el lock tomado).
+
+        Returns:
+            True si la cuota restante indica congestión
+        """
+        if not headers:
+            return False
+        h = {str(k).lower(): v for k, v in headers.items()}
+        congestion = False
+
+        def _entero(clave: str) -> Optional[int]:
+            try:
+                return int(h[clave]) if clave in h else None
+            except (TypeError, ValueError):
+                return None
+
+        limite_rpm = _entero("x-ratelimit-limit-requests")
+        limite_tpm = _entero("x-ratelimit-limit-tokens")
+        restante_rpm = _entero("x-ratelimit-remaining-requests")
+        restante_tpm = _entero("x-ratelimit-remaining-tokens")
+
+        if limite_rpm:
+            self.rpm = float(limite_rpm)
+        if limite_tpm:
+            self.tpm = float(limite_tpm)
+        if restante_rpm is not None:
+            self._solicitudes_disponibles = min(self._solicitudes_disponibles, float(restante_rpm))
+            congestion |= restante_rpm < self.rpm * UMBRAL_CONGESTION
+        if restante_tpm is not None:
+            self._tokens_disponibles = min(self._tokens_disponibles, float(restante_tpm))
+            congestion |= restante_tpm < self.tpm * UMBRAL_CONGESTION
+        return congestion
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Estado actual del limitador."""
+        with self._lock:
+            return {
+                "modelo": self.modelo,
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "limite_concurrencia": round(self.limite_concurrencia, 2),
+                "en_vuelo": self.en_vuelo,
+                "total_solicitudes": self.total_solicitudes,
+                "total_429": self.total_429,
+            }
+
+
+_lock_registro = threading.Lock()
+_limitadores: Dict[str, LimitadorModelo] = {}
+
+
+def obtener_limitador(modelo: str, limites: Optional[Dict[str, int]] = None) -> LimitadorModelo:
+    """
+    Devuelve el limitador compartido de un modelo (lo crea la primera vez).
+
+    Args:
+        modelo: Nombre del modelo (o identificador backend:modelo)
+        limites: Límites iniciales (rpm, tpm, concurrencia_inicial,
+            concurrencia_maxima); por defecto obtener_limites_modelo(modelo)
+
+    Returns:
+        Limitador del modelo
+    """
+    with _lock_registro:
+        limitador = _limitadores.get(modelo)
+        if limitador is None:
+            limites = limites or obtener_limites_modelo(modelo)
+            limitador = LimitadorModelo(
+                modelo,
+                rpm=limites["rpm"],
+                tpm=limites["tpm"],
+                concurrencia_inicial=limites["concurrencia_inicial"],
+                concurrencia_maxima=limites["concurrencia_maxima"],
+            )
+            _limitadores[modelo] = limitador
+        return limitador
+
+
+def estadisticas_limitadores() -> Dict[str, Dict[str, Any]]:
+    """Estadísticas de todos los limitadores registrados."""
+    with _lock_registro:
+        limitadores = list(_limitadores.values())
+    return {l.modelo: l.estadisticas() for l in limitadores}
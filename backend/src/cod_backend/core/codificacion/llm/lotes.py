@@ -0,0 +1,203 @@
+"""
+Cliente de la API de lotes (Batch API) del proveedor para el modo offline.
+
+En el modo lote todas las solicitudes del trabajo se suben en un archivo JSONL,
+el proveedor las procesa de forma asíncrona (ventana de 24 h, con descuento
+sobre el precio interactivo) y los resultados se descargan en otro JSONL.
+
+El cliente habla directamente con la API REST (`/files` y `/batches`) usando el
+pool HTTP compartido. `base_url` permite apuntarlo a cualquier endpoint
+compatible, incluido el endpoint local de prueba (EndpointLotesLocal).
+"""
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from langchain_core.messages import AIMessage
+
+from .clientes import obtener_http_client
+from .salida import cargar_json
+from ....config import (
+    OPENAI_API_KEY,
+    LLM_LOTES_BASE_URL,
+    LLM_LOTES_INTERVALO_SONDEO,
+    LLM_LOTES_VENTANA,
+)
+
+# Endpoint del proveedor al que se dirige cada solicitud del lote
+ENDPOINT_CHAT = "/v1/chat/completions"
+
+# Límite de solicitudes por archivo de la API de lotes
+MAX_SOLICITUDES_POR_LOTE = 50_000
+
+ESTADOS_TERMINALES = ("completed", "failed", "expired", "cancelled")
+
+
+class ErrorLote(RuntimeError):
+    """El lote no se pudo crear o terminó sin resultados utilizables."""
+
+
+def solicitud_lote(custom_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Línea del archivo de entrada del lote.
+
+    Args:
+        custom_id: Identificador de la solicitud (vuelve en su resultado)
+        body: Cuerpo de la llamada a chat completions
+
+    Returns:
+        Solicitud en el formato de la API de lotes
+    """
+    return {"custom_id": custom_id, "method": "POST", "url": ENDPOINT_CHAT, "body": body}
+
+
+def mensaje_desde_resultado(linea: Dict[str, Any]) -> Optional[AIMessage]:
+    """
+    Convierte una línea de resultados del lote en el mensaje que devolvería ChatOpenAI.
+
+    Así el resultado pasa por el mismo parseo, validación y conteo de tokens
+    que una llamada interactiva.
+
+    Args:
+        linea: Línea del archivo de salida (o de errores) del lote
+
+    Returns:
+        AIMessage con contenido, finish_reason y uso de tokens; None si la
+        solicitud falló
+    """
+    respuesta = linea.get("response") or {}
+    if linea.get("error") or respuesta.get("status_code") != 200:
+        return None
+    body = respuesta.get("body") or {}
+    choices = body.get("choices") or []
+    if not choices:
+        return None
+    mensaje = choices[0].get("message") or {}
+    additional_kwargs = {"refusal": mensaje["refusal"]} if mensaje.get("refusal") else {}
+    return AIMessage(
+        content=mensaje.get("content") or "",
+        additional_kwargs=additional_kwargs,
+        response_metadata={
+            "finish_reason": choices[0].get("finish_reason"),
+            "token_usage": body.get("usage") or {},
+            "model_name": body.get("model"),
+        },
+    )
+
+
+class ClienteLotes:
+    """
+    Cliente de la API de lotes: sube las solicitudes, sondea el estado y
+    descarga los resultados.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        """
+        Args:
+            api_key: Clave de la API (por defecto OPENAI_API_KEY)
+            base_url: URL base de la API (por defecto LLM_LOTES_BASE_URL)
+            http_client: Cliente httpx (por defecto el pool compartido)
+        """
+        self.api_key = api_key or OPENAI_API_KEY
+        self.base_url = (base_url or LLM_LOTES_BASE_URL).rstrip("/")
+        self._http_client = http_client
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        return self._http_client or obtener_http_client()
+
+    async def _solicitar(self, metodo: str, ruta: str, **kwargs: Any) -> httpx.Response:
+        """Hace una solicitud autenticada y falla con ErrorLote si no es 2xx."""
+        respuesta = await self.http_client.request(
+            metodo,
+            f"{self.base_url}{ruta}",
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            **kwargs,
+        )
+        if respuesta.status_code >= 400:
+            raise ErrorLote(f"API de lotes ({metodo} {ruta}): {respuesta.status_code} {respuesta.text}")
+        return respuesta
+
+    async def enviar(self, solicitudes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Sube las solicitudes como archivo JSONL y crea el lote.
+
+        Args:
+            solicitudes: Líneas de entrada (ver solicitud_lote)
+
+        Returns:
+            Objeto del lote creado (id, status, request_counts...)
+        """
+        contenido = "\n".join(json.dumps(s, ensure_ascii=False) for s in solicitudes).encode("utf-8")
+        archivo = (await self._solicitar(
+            "POST",
+            "/files",
+            data={"purpose": "batch"},
+            files={"file": ("solicitudes.jsonl", contenido, "application/jsonl")},
+        )).json()
+        return (await self._solicitar(
+            "POST",
+            "/batches",
+            json={
+                "input_file_id": archivo["id"],
+                "endpoint": ENDPOINT_CHAT,
+                "completion_window": LLM_LOTES_VENTANA,
+            },
+        )).json()
+
+    async def consultar(self, lote_id: str) -> Dict[str, Any]:
+        """Estado actual del lote."""
+        return (await self._solicitar("GET", f"/batches/{lote_id}")).json()
+
+    async def esperar(
+        self,
+        lote_id: str,
+        intervalo: Optional[float] = None,
+        al_sondear: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Sondea el lote hasta que llegue a un estado terminal.
+
+        Args:
+            lote_id: Identificador del lote
+            intervalo: Segundos entre consultas (por defecto LLM_LOTES_INTERVALO_SONDEO)
+            al_sondear: Corrutina opcional que recibe el lote en cada consulta (progreso)
+
+        Returns:
+            Objeto del lote en su estado terminal
+        """
+        intervalo = LLM_LOTES_INTERVALO_SONDEO if intervalo is None else intervalo
+        while True:
+            lote = await self.consultar(lote_id)
+            if al_sondear is not None:
+                await al_sondear(lote)
+            if lote.get("status") in ESTADOS_TERMINALES:
+                return lote
+            await asyncio.sleep(intervalo)
+
+    async def _descargar(self, archivo_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Descarga y parsea un archivo JSONL del proveedor."""
+        if not archivo_id:
+            return []
+        texto = (await self._solicitar("GET", f"/files/{archivo_id}/content")).text
+        return [cargar_json(linea) for linea in texto.splitlines() if linea.strip()]
+
+    async def resultados(self, lote: Dict[str, Any]) -> Dict[str, Optional[AIMessage]]:
+        """
+        Descarga los resultados de un lote terminado.
+
+        Args:
+            lote: Objeto del lote en estado terminal
+
+        Returns:
+            Mensaje por custom_id (None para las solicitudes que fallaron)
+        """
+        lineas = await self._descargar(lote.get("output_file_id"))
+        lineas += await self._descargar(lote.get("error_file_id"))
+        return {linea.get("custom_id"): mensaje_desde_resultado(linea) for linea in lineas}
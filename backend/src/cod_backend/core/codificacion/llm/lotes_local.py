@@ -0,0 +1,160 @@
+"""
+Endpoint local que imita la API de lotes (`/files` y `/batches`).
+
+Permite ejecutar el modo lote de punta a punta sin red: se monta como
+transporte de httpx (`httpx.MockTransport`) y cada solicitud del lote se
+responde con una función local en lugar de un modelo. El lote pasa por los
+mismos estados que en el proveedor (validating → in_progress → completed) y
+los resultados se entregan en los mismos archivos JSONL de salida y errores.
+"""
+import inspect
+import json
+import time
+from email.parser import BytesParser
+from email.policy import default as politica_email
+from typing import Any, Callable, Dict, List
+
+import httpx
+
+from .invocacion import estimar_tokens
+from .lotes import ClienteLotes
+
+URL_LOCAL = "http://lotes.local/v1"
+
+
+class EndpointLotesLocal:
+    """
+    Imitación en memoria de los endpoints de archivos y lotes del proveedor.
+    """
+
+    def __init__(self, responder: Callable[[Dict[str, Any]], Any], sondeos_en_progreso: int = 1):
+        """
+        Args:
+            responder: Función (o corrutina) que recibe el body de chat completions
+                y devuelve el contenido del mensaje (texto, o un dict que se
+                serializa a JSON). Si lanza una excepción, la solicitud va al
+                archivo de errores.
+            sondeos_en_progreso: Consultas del lote que devuelven "in_progress"
+                antes de completarse
+        """
+        self.responder = responder
+        self.sondeos_en_progreso = sondeos_en_progreso
+        self._archivos: Dict[str, bytes] = {}
+        self._lotes: Dict[str, Dict[str, Any]] = {}
+        self._pendientes: Dict[str, int] = {}
+        self.solicitudes_recibidas = 0
+
+    def cliente(self) -> ClienteLotes:
+        """Cliente de lotes conectado a este endpoint."""
+        return ClienteLotes(
+            api_key="local",
+            base_url=URL_LOCAL,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self)),
+        )
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        ruta = request.url.path.removeprefix(httpx.URL(URL_LOCAL).path)
+        partes = [p for p in ruta.split("/") if p]
+        if request.method == "POST" and partes == ["files"]:
+            return self._crear_archivo(request)
+        if request.method == "GET" and len(partes) == 3 and partes[0] == "files" and partes[2] == "content":
+            if partes[1] not in self._archivos:
+                return httpx.Response(404, json={"error": {"message": "Archivo no encontrado"}})
+            return httpx.Response(200, content=self._archivos[partes[1]])
+        if request.method == "POST" and partes == ["batches"]:
+            return self._crear_lote(json.loads(request.content))
+        if request.method == "GET" and len(partes) == 2 and partes[0] == "batches":
+            return await self._consultar_lote(partes[1])
+        return httpx.Response(404, json={"error": {"message": f"Ruta no soportada: {request.method} {ruta}"}})
+
+    def _crear_archivo(self, request: httpx.Request) -> httpx.Response:
+        encabezado = f"Content-Type: {request.headers['content-type']}\r\n\r\n".encode("utf-8")
+        mensaje = BytesParser(policy=politica_email).parsebytes(encabezado + request.content)
+        contenido = next(
+            (p.get_payload(decode=True) for p in mensaje.iter_parts() if p.get_param("name", header="content-disposition") == "file"),
+            None,
+        )
+        if contenido is None:
+            return httpx.Response(400, json={"error": {"message": "Falta el archivo"}})
+        archivo_id = self._guardar_archivo(contenido)
+        return httpx.Response(200, json={
+            "id": archivo_id, "object": "file", "bytes": len(contenido), "created_at": int(time.time()),
+            "filename": "solicitudes.jsonl", "purpose": "batch", "status": "processed",
+        })
+
+    def _guardar_archivo(self, contenido: bytes) -> str:
+        archivo_id = f"file-local-{len(self._archivos) + 1}"
+        self._archivos[archivo_id] = contenido
+        return archivo_id
+
+    def _crear_lote(self, datos: Dict[str, Any]) -> httpx.Response:
+        if datos.get("input_file_id") not in self._archivos:
+            return httpx.Response(400, json={"error": {"message": "input_file_id inválido"}})
+        lote_id = f"batch-local-{len(self._lotes) + 1}"
+        total = len(self._archivos[datos["input_file_id"]].splitlines())
+        self._lotes[lote_id] = {
+            "id": lote_id, "object": "batch", "endpoint": datos.get("endpoint"),
+            "input_file_id": datos["input_file_id"], "completion_window": datos.get("completion_window"),
+            "status": "validating", "created_at": int(time.time()),
+            "output_file_id": None, "error_file_id": None,
+            "request_counts": {"total": total, "completed": 0, "failed": 0},
+        }
+        self._pendientes[lote_id] = self.sondeos_en_progreso
+        return httpx.Response(200, json=self._lotes[lote_id])
+
+    async def _consultar_lote(self, lote_id: str) -> httpx.Response:
+        lote = self._lotes.get(lote_id)
+        if lote is None:
+            return httpx.Response(404, json={"error": {"message": "Lote no encontrado"}})
+        if lote["status"] not in ("completed", "failed", "expired", "cancelled"):
+            if self._pendientes[lote_id] > 0:
+                self._pendientes[lote_id] -= 1
+                lote["status"] = "in_progress"
+            else:
+                await self._procesar(lote)
+        return httpx.Response(200, json=lote)
+
+    async def _procesar(self, lote: Dict[str, Any]) -> None:
+        """Responde todas las solicitudes del lote y genera los archivos de resultados."""
+        salida: List[str] = []
+        errores: List[str] = []
+        for numero, linea in enumerate(self._archivos[lote["input_file_id"]].decode("utf-8").splitlines(), 1):
+            solicitud = json.loads(linea)
+            body = solicitud["body"]
+            self.solicitudes_recibidas += 1
+            try:
+                contenido = self.responder(body)
+                if inspect.isawaitable(contenido):
+                    contenido = await contenido
+            except Exception as e:
+                errores.append(json.dumps({
+                    "id": f"batch_req_{numero}", "custom_id": solicitud["custom_id"],
+                    "response": {"status_code": 500, "body": {"error": {"message": str(e)}}},
+                    "error": None,
+                }))
+                continue
+            if not isinstance(contenido, str):
+                contenido = json.dumps(contenido, ensure_ascii=False)
+            prompt_tokens = estimar_tokens(json.dumps(body.get("messages", []), ensure_ascii=False))
+            completion_tokens = estimar_tokens(contenido)
+            salida.append(json.dumps({
+                "id": f"batch_req_{numero}", "custom_id": solicitud["custom_id"],
+                "response": {"status_code": 200, "body": {
+                    "object": "chat.completion", "model": body.get("model"),
+                    "choices": [{
+                        "index": 0, "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": contenido, "refusal": None},
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                }},
+                "error": None,
+            }, ensure_ascii=False))
+        lote["status"] = "completed"
+        lote["request_counts"] = {"total": len(salida) + len(errores), "completed": len(salida), "failed": len(errores)}
+        if salida:
+            lote["output_file_id"] = self._guardar_archivo("\n".join(salida).encode("utf-8"))
+        if errores:
+            lote["error_file_id"] = self._guardar_archivo("\n".join(errores).encode("utf-8"))
@@ -0,0 +1,118 @@
+"""
+Plazos de trabajo y timeouts por llamada al LLM.
+
+Un trabajo puede tener un plazo ("terminar en 15 minutos"). El estado del grafo
+guarda solo la fecha límite (segundos epoch, serializable) y cada intento de
+llamada recibe un timeout derivado del historial de latencias del trabajo,
+acotado por el presupuesto que le queda al plazo. Sin plazo, los intentos
+igual tienen el timeout LLM_TIMEOUT_LLAMADA: una llamada colgada se corta y se
+reintenta en lugar de bloquear el batch hasta el timeout del cliente HTTP.
+
+PlazoTrabajo es el lado del planificador: proyecta el fin del trabajo según el
+ritmo de los batches terminados y registra las acciones tomadas cuando el
+plazo está en riesgo.
+"""
+import time
+from typing import Any, Dict, List, Optional
+
+from .redundancia import HistorialLatencias
+from ....config import (
+    LLM_TIMEOUT_LLAMADA,
+    LLM_TIMEOUT_FACTOR_LATENCIA,
+    LLM_TIMEOUT_MINIMO,
+    PLAZO_MARGEN_RIESGO,
+)
+
+
+def timeout_llamada(
+    modelo: str,
+    respuestas: int,
+    historial: Optional[HistorialLatencias] = None,
+) -> Optional[float]:
+    """
+    Timeout de un intento de llamada de `respuestas` respuestas.
+
+    Con historial suficiente, es LLM_TIMEOUT_FACTOR_LATENCIA veces el percentil
+    de la latencia del trabajo (nunca menos de LLM_TIMEOUT_MINIMO); siempre
+    acotado por LLM_TIMEOUT_LLAMADA. El presupuesto restante del plazo se
+    aplica aparte, al momento de cada intento (ver invocar_llm).
+
+    Args:
+        modelo: Modelo de la llamada
+        respuestas: Respuestas incluidas en la llamada
+        historial: Latencias del trabajo (opcional)
+
+    Returns:
+        Timeout en segundos, o None si no hay límite
+    """
+    timeout = LLM_TIMEOUT_LLAMADA or None
+    plazo = historial.plazo(modelo, respuestas) if historial is not None else None
+    if plazo is not None:
+        derivado = max(plazo * LLM_TIMEOUT_FACTOR_LATENCIA, LLM_TIMEOUT_MINIMO)
+        timeout = derivado if timeout is None else min(timeout, derivado)
+    return timeout
+
+
+def acotar_timeout(timeout: Optional[float], fecha_limite: Optional[float]) -> Optional[float]:
+    """
+    Acota un timeout por el tiempo que le queda a la fecha límite.
+
+    Returns:
+        Segundos disponibles (0 si el plazo ya venció), o None si no hay límite
+    """
+    if fecha_limite is None:
+        return timeout
+    restante = max(fecha_limite - time.time(), 0.0)
+    return restante if timeout is None else min(timeout, restante)
+
+
+class PlazoTrabajo:
+    """
+    Plazo de un trabajo y acciones del planificador para cumplirlo.
+
+    Atributos:
+        segundos: Duración del plazo
+        fecha_limite: Momento límite (segundos epoch)
+        acciones: Acciones tomadas, en orden ({"accion", "segundos", ...detalle})
+    """
+
+    def __init__(self, segundos: float, margen: Optional[float] = None):
+        """
+        Args:
+            segundos: Duración del plazo desde ahora
+            margen: Fracción del plazo que puede ocupar la proyección antes de
+                considerarse en riesgo (por defecto PLAZO_MARGEN_RIESGO)
+        """
+        self.segundos = segundos
+        self.margen = PLAZO_MARGEN_RIESGO if margen is None else margen
+        self.inicio = time.time()
+        self.fecha_limite = self.inicio + segundos
+        self.acciones: List[Dict[str, Any]] = []
+
+    def transcurrido(self) -> float:
+        """Segundos desde el inicio del trabajo."""
+        return time.time() - self.inicio
+
+    def vencido(self) -> bool:
+        """Si ya pasó la fecha límite."""
+        return time.time() >= self.fecha_limite
+
+    def en_riesgo(self, completados: int, total: int) -> bool:
+        """
+        Si, al ritmo de los batches terminados, el trabajo terminaría después
+        del margen del plazo. Sin batches terminados, está en riesgo si ya se
+        consumió ese tramo del plazo.
+
+        Args:
+            completados: Batches terminados
+            total: Batches del trabajo
+        """
+        limite = self.segundos * self.margen
+        transcurrido = self.transcurrido()
+        if completados <= 0:
+            return transcurrido > limite
+        return transcurrido / completados * total > limite
+
+    def registrar(self, accion: str, **detalle: Any) -> None:
+        """Registra una acción del planificador con el momento en que se tomó."""
+        self.acciones.append({"accion": accion, "segundos": round(self.transcurrido(), 1), **detalle})
@@ -0,0 +1,117 @@
+"""
+Solicitudes redundantes para acotar la latencia de cola de las llamadas al LLM.
+
+La mayoría de las llamadas de un trabajo tardan parecido, pero algunas se
+quedan colgadas mucho más que el resto. Si una llamada supera un plazo
+aprendido de las latencias del propio trabajo (un percentil alto de la
+latencia por respuesta), se lanza la misma solicitud otra vez; gana la
+primera que devuelva una salida válida y la otra se cancela.
+"""
+import asyncio
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from ....config import (
+    LLM_REDUNDANTE_PERCENTIL,
+    LLM_REDUNDANTE_MIN_MUESTRAS,
+    LLM_REDUNDANTE_PLAZO_MINIMO,
+)
+
+T = TypeVar("T")
+
+# Latencias recientes que se conservan por modelo
+MAX_MUESTRAS = 200
+
+
+class HistorialLatencias:
+    """
+    Latencias por respuesta de las llamadas completadas de un trabajo, por modelo.
+
+    La latencia se normaliza por la cantidad de respuestas de la llamada, de
+    modo que los grupos pequeños (bisección, escalado de la cascada) tienen un
+    plazo proporcional a su tamaño.
+    """
+
+    def __init__(
+        self,
+        percentil: Optional[float] = None,
+        min_muestras: Optional[int] = None,
+        plazo_minimo: Optional[float] = None,
+    ):
+        """
+        Args:
+            percentil: Percentil que define el plazo (por defecto LLM_REDUNDANTE_PERCENTIL)
+            min_muestras: Llamadas necesarias antes de lanzar solicitudes redundantes (por defecto LLM_REDUNDANTE_MIN_MUESTRAS)
+            plazo_minimo: Plazo mínimo en segundos (por defecto LLM_REDUNDANTE_PLAZO_MINIMO)
+        """
+        self.percentil = LLM_REDUNDANTE_PERCENTIL if percentil is None else percentil
+        self.min_muestras = LLM_REDUNDANTE_MIN_MUESTRAS if min_muestras is None else min_muestras
+        self.plazo_minimo = LLM_REDUNDANTE_PLAZO_MINIMO if plazo_minimo is None else plazo_minimo
+        self._muestras: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, modelo: str, segundos: float, respuestas: int) -> None:
+        """Registra la latencia de una llamada completada."""
+        with self._lock:
+            muestras = self._muestras.setdefault(modelo, deque(maxlen=MAX_MUESTRAS))
+            muestras.append(segundos / max(respuestas, 1))
+
+    def plazo(self, modelo: str, respuestas: int) -> Optional[float]:
+        """
+        Segundos tras los que conviene repetir una llamada de `respuestas` respuestas.
+
+        Returns:
+            Plazo en segundos, o None si aún no hay historial suficiente
+        """
+        with self._lock:
+            muestras = sorted(self._muestras.get(modelo, ()))
+        if not muestras or len(muestras) < self.min_muestras:
+            return None
+        indice = min(int(self.percentil * len(muestras)), len(muestras) - 1)
+        return max(muestras[indice] * max(respuestas, 1), self.plazo_minimo)
+
+
+async def primera_valida(
+    llamada: Callable[[bool], Awaitable[T]],
+    plazo: Optional[float],
+) -> Tuple[T, bool, List["asyncio.Future[T]"]]:
+    """
+    Ejecuta una llamada y, si no termina dentro del plazo, lanza una solicitud redundante.
+
+    Gana el primer intento que termina sin excepción; el otro se cancela si
+    sigue en vuelo.
+
+    Args:
+        llamada: Corrutina a ejecutar; recibe True cuando es la solicitud redundante
+        plazo: Segundos antes de repetirla (None = sin solicitud redundante)
+
+    Returns:
+        Tupla con (resultado ganador, si ganó la solicitud redundante, intentos perdedores
+        ya terminados o cancelados)
+
+    Raises:
+        Exception: El error del intento original si todos los intentos fallan
+    """
+    original = asyncio.ensure_future(llamada(False))
+    intentos: Dict["asyncio.Future[T]", bool] = {original: False}
+    try:
+        if plazo is not None:
+            await asyncio.wait({original}, timeout=plazo)
+            if not original.done():
+                intentos[asyncio.ensure_future(llamada(True))] = True
+        pendientes = set(intentos)
+        while pendientes:
+            hechos, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+            for intento in sorted(hechos, key=intentos.get):
+                if intento.exception() is None:
+                    perdedores = [t for t in intentos if t is not intento]
+                    return intento.result(), intentos[intento], perdedores
+        raise original.exception()
+    finally:
+        en_vuelo = [t for t in intentos if not t.done()]
+        for intento in en_vuelo:
+            intento.cancel()
+        if en_vuelo:
+            await asyncio.gather(*en_vuelo, return_exceptions=True)
+
@@ -0,0 +1,205 @@
+"""
+Esquemas de la salida combinada del LLM (validación + evaluación + análisis).
+
+Hay dos protocolos de salida:
+- "completo": tres secciones con un veredicto (`aplica`, `confianza`) por cada
+  código del catálogo y respuesta.
+- "compacto": un objeto corto por respuesta con solo los códigos que aplican.
+  Los tokens de salida dejan de crecer con el tamaño del catálogo; el resultado
+  se expande al formato completo (expandir_salida_compacta) y el resto del
+  grafo no distingue entre protocolos.
+
+Cada esquema se usa dos veces:
+- Como `response_format` de tipo `json_schema` estricto (structured outputs):
+  el modelo queda obligado a devolver exactamente esta estructura.
+- Como validador local: un `TypeAdapter` de pydantic compilado una sola vez
+  al importar el módulo valida el JSON ya parseado (orjson) y devuelve dicts.
+"""
+from typing import Any, Dict, List
+
+from pydantic import ConfigDict, TypeAdapter
+from typing_extensions import TypedDict
+
+try:
+    import orjson
+    ORJSON_DISPONIBLE = True
+except ImportError:
+    import json
+    ORJSON_DISPONIBLE = False
+
+_ESTRICTO = ConfigDict(extra="forbid")
+
+
+class ValidacionLLM(TypedDict):
+    __pydantic_config__ = _ESTRICTO  # type: ignore[misc]
+    respuesta_id: int
+    es_valida: bool
+    razon: str
+
+
+class EvaluacionCodigoLLM(TypedDict):
+    __pydantic_config__ = _ESTRICTO  # type: ignore[misc]
+    codigo: int
+    aplica: bool
+    confianza: float
+
+
+class EvaluacionLLM(TypedDict):
+    __pydantic_config__ = _ESTRICTO  # type: ignore[misc]
+    respuesta_id: int
+    evaluaciones: List[EvaluacionCodigoLLM]
+
+
+class ConceptoNuevoLLM(TypedDict):
+    __pydantic_config__ = _ESTRICTO  # type: ignore[misc]
+    codigo: int
+    descripcion: str
+    texto_original: str
+
+
+class AnalisisLLM(TypedDict):
+    __pydantic_config__ = _ESTRICTO  # type: ignore[misc]
+    respuesta_id: int
+    respuesta_cubierta_completamente: bool
+    conceptos_nuevos: List[ConceptoNuevoLLM]
+
+
+class SalidaCombinadaLLM(TypedDict):
+    __pydantic_config__ = _ESTRICTO  # type: ignore[misc]
+    validaciones: List[ValidacionLLM]
+    evaluaciones: List[EvaluacionLLM]
+    analisis: List[AnalisisLLM]
+
+
+class CodigoAplicadoCompacto(TypedDict):
+    __pydantic_config__ = _ESTRICTO  # type: ignore[misc]
+    c: int  # Código del catálogo
+    p: float  # Confianza
+
+
+class ConceptoNuevoCompacto(TypedDict):
+    __pydantic_config__ = _ESTRICTO  # type: ignore[misc]
+    c: int  # Código nuevo
+    d: str  # Descripción
+    t: str  # Texto original
+
+
+class RespuestaCompacta(TypedDict):
+    __pydantic_config__ = _ESTRICTO  # type: ignore[misc]
+    id: int
+    ok: bool
+    razon: str
+    cod: List[CodigoAplicadoCompacto]
+    cub: bool
+    nuevos: List[ConceptoNuevoCompacto]
+
+
+class SalidaCompactaLLM(TypedDict):
+    __pydantic_config__ = _ESTRICTO  # type: ignore[misc]
+    r: List[RespuestaCompacta]
+
+
+PROTOCOLO_COMPLETO = "completo"
+PROTOCOLO_COMPACTO = "compacto"
+PROTOCOLOS_SALIDA = (PROTOCOLO_COMPLETO, PROTOCOLO_COMPACTO)
+
+# Validadores compilados una vez por proceso
+ADAPTADOR_SALIDA: TypeAdapter = TypeAdapter(SalidaCombinadaLLM)
+ADAPTADOR_SALIDA_COMPACTA: TypeAdapter = TypeAdapter(SalidaCompactaLLM)
+
+
+def _formato_respuesta(nombre: str, adaptador: TypeAdapter) -> Dict[str, Any]:
+    """response_format para structured outputs (esquema estricto)."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": nombre,
+            "strict": True,
+            "schema": adaptador.json_schema(),
+        },
+    }
+
+
+FORMATO_RESPUESTA: Dict[str, Any] = _formato_respuesta("salida_codificacion", ADAPTADOR_SALIDA)
+FORMATO_RESPUESTA_COMPACTA: Dict[str, Any] = _formato_respuesta(
+    "salida_codificacion_compacta", ADAPTADOR_SALIDA_COMPACTA
+)
+
+
+def cargar_json(contenido: Any) -> Any:
+    """
+    Parsea JSON con orjson (o con json si orjson no está instalado).
+
+    Args:
+        contenido: Texto o bytes JSON
+
+    Returns:
+        Objeto parseado
+
+    Raises:
+        ValueError: Si el contenido no es JSON válido
+    """
+    if ORJSON_DISPONIBLE:
+        return orjson.loads(contenido)
+    return json.loads(contenido)
+
+
+def validar_salida(resultado: Any, protocolo: str = PROTOCOLO_COMPLETO) -> Dict[str, Any]:
+    """
+    Valida un resultado ya parseado contra el esquema de su protocolo.
+
+    Args:
+        resultado: Objeto JSON parseado
+        protocolo: "completo" o "compacto"
+
+    Returns:
+        Resultado validado (dicts con los tipos del esquema)
+
+    Raises:
+        pydantic.ValidationError: Si no cumple el esquema
+    """
+    if protocolo == PROTOCOLO_COMPACTO:
+        return ADAPTADOR_SALIDA_COMPACTA.validate_python(resultado)
+    return ADAPTADOR_SALIDA.validate_python(resultado)
+
+
+def expandir_salida_compacta(resultado: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convierte una salida compacta al formato completo de tres secciones.
+
+    Los códigos informados se marcan con `aplica=True`; los omitidos no se
+    agregan (ensamblar solo usa los códigos que aplican).
+
+    Args:
+        resultado: Salida compacta ({"r": [...]})
+
+    Returns:
+        Resultado con validaciones, evaluaciones y analisis
+    """
+    validaciones: List[Dict[str, Any]] = []
+    evaluaciones: List[Dict[str, Any]] = []
+    analisis: List[Dict[str, Any]] = []
+    for item in resultado.get("r", []):
+        rid = item.get("id")
+        es_valida = bool(item.get("ok", True))
+        validaciones.append({
+            "respuesta_id": rid,
+            "es_valida": es_valida,
+            "razon": item.get("razon") or ("Válida" if es_valida else "Rechazada"),
+        })
+        evaluaciones.append({
+            "respuesta_id": rid,
+            "evaluaciones": [
+                {"codigo": c.get("c"), "aplica": True, "confianza": c.get("p", 0.0)}
+                for c in item.get("cod", [])
+            ],
+        })
+        analisis.append({
+            "respuesta_id": rid,
+            "respuesta_cubierta_completamente": bool(item.get("cub", False)),
+            "conceptos_nuevos": [
+                {"codigo": n.get("c"), "descripcion": n.get("d", ""), "texto_original": n.get("t", "")}
+                for n in item.get("nuevos", [])
+            ],
+        })
+    return {"validaciones": validaciones, "evaluaciones": evaluaciones, "analisis": analisis}
@@ -0,0 +1,144 @@
+"""
+Lectura incremental de la salida del LLM en modo streaming.
+
+Mientras el modelo genera la respuesta, el texto recibido se recorre una sola
+vez (sin re-parsear lo ya leído) y cada elemento de los arreglos de primer
+nivel ("validaciones", "evaluaciones", "analisis" o "r" en el protocolo
+compacto) se entrega apenas se cierra su objeto. Con eso se sabe qué
+respuestas del batch ya están resueltas y se puede reportar progreso por
+respuesta durante los 20-60 segundos que dura una llamada.
+
+La salida completa se sigue parseando y validando al final de la llamada; el
+parseo incremental solo alimenta el progreso.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .salida import PROTOCOLO_COMPACTO, cargar_json
+
+# Secciones que deben llegar para considerar resuelta una respuesta
+SECCIONES_POR_PROTOCOLO = {
+    PROTOCOLO_COMPACTO: ("r",),
+}
+SECCIONES_COMPLETO = ("validaciones", "evaluaciones", "analisis")
+
+
+class ParserJSONIncremental:
+    """
+    Extrae los elementos de los arreglos de primer nivel de un objeto JSON a
+    medida que llega el texto.
+
+    Para `{"validaciones": [{...}, {...}], ...}` entrega ("validaciones", {...})
+    por cada objeto del arreglo en cuanto se cierra.
+    """
+
+    def __init__(self):
+        self.reiniciar()
+
+    def reiniciar(self) -> None:
+        """Descarta el texto leído (p. ej. al reintentar la llamada)."""
+        self._texto = ""
+        self._posicion = 0
+        self._pila: List[str] = []
+        self._en_cadena = False
+        self._escape = False
+        self._inicio_cadena = 0
+        self._ultima_cadena = ""
+        self._seccion = ""
+        self._inicio_elemento: Optional[int] = None
+
+    def alimentar(self, fragmento: str) -> List[Tuple[str, Any]]:
+        """
+        Agrega texto recibido y devuelve los elementos que se completaron.
+
+        Args:
+            fragmento: Texto nuevo del stream
+
+        Returns:
+            Lista de (sección, elemento parseado)
+        """
+        self._texto += fragmento
+        texto = self._texto
+        pila = self._pila
+        completados: List[Tuple[str, Any]] = []
+
+        for i in range(self._posicion, len(texto)):
+            c = texto[i]
+            if self._en_cadena:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._en_cadena = False
+                    if len(pila) == 1:
+                        self._ultima_cadena = texto[self._inicio_cadena + 1:i]
+                continue
+            if c == '"':
+                self._en_cadena = True
+                self._inicio_cadena = i
+            elif c == "{" or c == "[":
+                if len(pila) == 2 and pila[0] == "{" and pila[1] == "[":
+                    self._inicio_elemento = i
+                elif len(pila) == 1 and c == "[":
+                    self._seccion = self._ultima_cadena
+                pila.append(c)
+            elif c == "}" or c == "]":
+                if pila:
+                    pila.pop()
+                if len(pila) == 2 and self._inicio_elemento is not None and pila[0] == "{" and pila[1] == "[":
+                    try:
+                        completados.append((self._seccion, cargar_json(texto[self._inicio_elemento:i + 1])))
+                    except Exception:
+                        pass
+                    self._inicio_elemento = None
+
+        self._posicion = len(texto)
+        return completados
+
+
+class SeguimientoStream:
+    """
+    Sigue qué respuestas del batch ya llegaron completas durante el stream.
+
+    Una respuesta está resuelta cuando llegaron sus elementos de todas las
+    secciones del protocolo (validación, evaluación y análisis en el protocolo
+    completo; su único objeto en el compacto).
+    """
+
+    def __init__(
+        self,
+        protocolo: str,
+        al_resolver: Callable[[List[int]], Awaitable[None]],
+    ):
+        """
+        Args:
+            protocolo: Protocolo de salida pedido ("completo" o "compacto")
+            al_resolver: Corrutina que recibe los respuesta_id recién resueltos
+        """
+        self.secciones = SECCIONES_POR_PROTOCOLO.get(protocolo, SECCIONES_COMPLETO)
+        self.al_resolver = al_resolver
+        self._parser = ParserJSONIncremental()
+        self._recibidas: Dict[int, Set[str]] = {}
+        self.resueltas: Set[int] = set()
+
+    def reiniciar(self) -> None:
+        """Empieza de cero (la llamada se reintenta); lo ya resuelto se conserva."""
+        self._parser.reiniciar()
+        self._recibidas = {}
+
+    async def alimentar(self, fragmento: str) -> None:
+        """Procesa texto del stream y notifica las respuestas recién resueltas."""
+        nuevas: List[int] = []
+        for seccion, elemento in self._parser.alimentar(fragmento):
+            if seccion not in self.secciones or not isinstance(elemento, dict):
+                continue
+            rid = elemento.get("id", elemento.get("respuesta_id"))
+            if not isinstance(rid, int):
+                continue
+            recibidas = self._recibidas.setdefault(rid, set())
+            recibidas.add(seccion)
+            if len(recibidas) == len(self.secciones) and rid not in self.resueltas:
+                self.resueltas.add(rid)
+                nuevas.append(rid)
+        if nuevas:
+            await self.al_resolver(nuevas)
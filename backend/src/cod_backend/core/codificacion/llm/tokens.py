@@ -0,0 +1,127 @@
+"""
+Conteo local de tokens.
+
+Usa tiktoken con la codificación del modelo solo si su archivo BPE ya está en
+la caché local de tiktoken (TIKTOKEN_CACHE_DIR): nunca se descarga. Si tiktoken
+no está instalado, está desactivado (TOKENS_USAR_TIKTOKEN) o la codificación no
+está en la caché, se usa la estimación de ~4 caracteres por token
+(estimar_tokens). Para precargar la caché en el despliegue:
+
+    TIKTOKEN_CACHE_DIR=... python -c "import tiktoken; tiktoken.get_encoding('o200k_base')"
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+
+from .invocacion import estimar_tokens
+from ....config import TOKENS_USAR_TIKTOKEN
+
+# Codificación para los modelos que tiktoken no conoce (backends compatibles, determinista)
+CODIFICACION_POR_DEFECTO = "o200k_base"
+
+# Archivo BPE que descarga tiktoken para cada codificación (la clave de su caché)
+URL_ENCODINGS = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+ARCHIVO_BPE = {
+    "o200k_base": "o200k_base",
+    "o200k_harmony": "o200k_base",
+    "cl100k_base": "cl100k_base",
+    "p50k_base": "p50k_base",
+    "p50k_edit": "p50k_base",
+    "r50k_base": "r50k_base",
+}
+
+_lock = threading.Lock()
+_codificaciones: Dict[str, Optional[Any]] = {}
+
+
+def _nombre_codificacion(modelo: Optional[str]) -> str:
+    """Nombre de la codificación de tiktoken para el modelo."""
+    try:
+        from tiktoken.model import encoding_name_for_model
+        return encoding_name_for_model(modelo or "")
+    except (ImportError, KeyError):
+        return CODIFICACION_POR_DEFECTO
+
+
+def _en_cache_local(nombre: str) -> bool:
+    """
+    Si el archivo BPE de la codificación ya está en la caché de tiktoken.
+
+    Replica la ubicación que usa tiktoken (TIKTOKEN_CACHE_DIR, DATA_GYM_CACHE_DIR
+    o el directorio temporal) y su clave (sha1 de la URL del archivo).
+    """
+    archivo = ARCHIVO_BPE.get(nombre)
+    if archivo is None:
+        return False
+    directorio = os.environ.get(
+        "TIKTOKEN_CACHE_DIR",
+        os.environ.get("DATA_GYM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "data-gym-cache")),
+    )
+    if not directorio:
+        return False
+    clave = hashlib.sha1(URL_ENCODINGS.format(archivo).encode()).hexdigest()
+    return os.path.exists(os.path.join(directorio, clave))
+
+
+def _codificacion(modelo: Optional[str]) -> Optional[Any]:
+    """
+    Codificación de tiktoken para el modelo (cargada una vez por nombre).
+
+    Solo se carga desde la caché local; sin el archivo no se intenta descargar.
+
+    Returns:
+        tiktoken.Encoding, o None si no se puede usar tiktoken
+    """
+    if not TOKENS_USAR_TIKTOKEN:
+        return None
+    nombre = _nombre_codificacion(modelo)
+    with _lock:
+        if nombre not in _codificaciones:
+            if not _en_cache_local(nombre):
+                print(f"⚠️  {nombre} no está en la caché local de tiktoken (TIKTOKEN_CACHE_DIR); "
+                      f"se estiman ~4 caracteres por token")
+                _codificaciones[nombre] = None
+                return None
+            try:
+                import tiktoken
+                _codificaciones[nombre] = tiktoken.get_encoding(nombre)
+            except Exception as e:
+                print(f"⚠️  tiktoken no disponible ({nombre}: {type(e).__name__}); se estiman ~4 caracteres por token")
+                _codificaciones[nombre] = None
+        return _codificaciones[nombre]
+
+
+def contar_tokens(texto: str, modelo: Optional[str] = None) -> int:
+    """
+    Tokens de un texto para el modelo.
+
+    Args:
+        texto: Texto a contar
+        modelo: Modelo cuya codificación se usa (por defecto o200k_base)
+
+    Returns:
+        Tokens del texto (exactos con tiktoken, estimados si no)
+    """
+    codificacion = _codificacion(modelo)
+    if codificacion is None:
+        return estimar_tokens(texto)
+    return len(codificacion.encode_ordinary(texto))
+
+
+def contar_tokens_lista(textos: List[str], modelo: Optional[str] = None) -> List[int]:
+    """
+    Tokens de cada texto de una lista (en una sola pasada de tiktoken).
+
+    Args:
+        textos: Textos a contar
+        modelo: Modelo cuya codificación se usa
+
+    Returns:
+        Tokens de cada texto, en el mismo orden
+    """
+    codificacion = _codificacion(modelo)
+    if codificacion is None:
+        return [estimar_tokens(texto) for texto in textos]
+    return [len(tokens) for tokens in codificacion.encode_ordinary_batch(textos)]
@@ -2,13 +2,19 @@
 Nodos del grafo de codificación.
 """
 from .preparar_batch import nodo_preparar_batch
-from .codificar_combinado import nodo_codificar_combinado
+from .codificar_combinado import (
+    nodo_codificar_combinado,
+    preparar_solicitud_lote,
+    codificar_desde_lote,
+)
 from .ensamblar import nodo_ensamblar
 from .decidir_continuar import decidir_continuar
 
 __all__ = [
     "nodo_preparar_batch",
     "nodo_codificar_combinado",
+    "preparar_solicitud_lote",
+    "codificar_desde_lote",
     "nodo_ensamblar",
     "decidir_continuar",
 ]
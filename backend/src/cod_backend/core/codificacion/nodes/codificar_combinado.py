@@ -4,27 +4,79 @@ Nodo del grafo: Codificar combinado (validación + evaluación + identificación
 Este nodo optimizado combina las tres operaciones en una sola llamada GPT,
 reduciendo el costo y la latencia en ~70% comparado con los nodos separados.
 """
+import asyncio
 import json
 import re
 import time
-from typing import Any, Dict, List, Set, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import convert_to_openai_messages
+from langchain_core.runnables import RunnableConfig
+from pydantic import ValidationError
 
 from ..graph.state import EstadoCodificacion
-from ..prompts import load_prompt
-from ....config import OPENAI_API_KEY, supports_temperature
+from ..llm import (
+    BackendLLM,
+    obtener_backend,
+    invocar_llm,
+    estimar_tokens,
+    obtener_cache,
+    clave_respuesta,
+    FORMATO_RESPUESTA,
+    FORMATO_RESPUESTA_COMPACTA,
+    PROTOCOLO_COMPLETO,
+    PROTOCOLO_COMPACTO,
+    cargar_json,
+    validar_salida,
+    expandir_salida_compacta,
+    SeguimientoStream,
+    HistorialLatencias,
+    primera_valida,
+    timeout_llamada,
+)
+from ..prompts import obtener_prompt, version_prompt
+from ..utils import (
+    MAX_CODIGOS_EXISTENTES,
+    SIN_CODIGOS_EXISTENTES,
+    clave_concepto,
+    obtener_indice_catalogo,
+)
+from ....config import (
+    CATALOGO_MAX_TOKENS,
+    CASCADA_CONFIANZA_MIN,
+    CASCADA_CONFIANZA_MAX,
+    supports_temperature,
+)
 from ...utils import (
     extraer_tokens,
+    extraer_tokens_cacheados,
     normalizar_texto,
     normalizar_marca_nombre,
     es_marca_o_nombre_propio,
     detectar_codigo_especial,
 )
 
-# Constante para limitar códigos existentes en el prompt
-MAX_CODIGOS_EXISTENTES = 150
+# Tokens de salida esperados por respuesta (para reservar cuota en el limitador)
+TOKENS_COMPLETION_POR_RESPUESTA = 150
+TOKENS_COMPLETION_POR_RESPUESTA_COMPACTA = 60
+
+# Plantilla del prompt según el protocolo de salida
+PROMPT_POR_PROTOCOLO = {
+    PROTOCOLO_COMPLETO: "codificar_combinado",
+    PROTOCOLO_COMPACTO: "codificar_compacto",
+}
+
+
+def _modelo_rapido(state: EstadoCodificacion) -> Optional[str]:
+    """Modelo rápido de la cascada (None si el trabajo no usa cascada)."""
+    modelo_rapido = state.get("modelo_rapido")
+    return modelo_rapido if modelo_rapido and modelo_rapido != state["modelo_gpt"] else None
+
+
+def _protocolo(state: EstadoCodificacion) -> str:
+    """Protocolo de salida del trabajo ("completo" si no se indicó)."""
+    protocolo = state.get("protocolo_salida") or PROTOCOLO_COMPLETO
+    return protocolo if protocolo in PROMPT_POR_PROTOCOLO else PROTOCOLO_COMPLETO
 
 
 def _reparar_json_llm(texto: str) -> str:
@@ -55,14 +107,21 @@ def _reparar_json_llm(texto: str) -> str:
     return texto
 
 
-def _preparar_respuestas(state: EstadoCodificacion) -> Tuple[List[str], Dict[int, int], Dict[int, bool]]:
+def _preparar_respuestas(
+    state: EstadoCodificacion,
+) -> Tuple[List[str], Dict[int, int], Dict[int, bool], List[int]]:
     """
     Prepara las respuestas del batch para procesamiento.
     
+    Las respuestas vacías y las de código especial se resuelven sin el LLM
+    (ensamblar asigna el código especial), así que no se envían.
+    
     Returns:
-        Tupla con (respuestas_formateadas, respuestas_especiales, respuestas_rechazadas)
+        Tupla con (respuestas_formateadas, respuestas_especiales, respuestas_rechazadas,
+        ids de las respuestas formateadas)
     """
     respuestas = []
+    ids_respuestas: List[int] = []
     respuestas_especiales: Dict[int, int] = {}
     respuestas_rechazadas_automatico: Dict[int, bool] = {}
     
@@ -78,76 +137,194 @@ def _preparar_respuestas(state: EstadoCodificacion) -> Tuple[List[str], Dict[int
         codigo_esp = detectar_codigo_especial(texto)
         if codigo_esp is not None:
             respuestas_especiales[resp_id] = codigo_esp
+            continue
         respuestas.append(f"{resp_id}. {texto}")
+        ids_respuestas.append(resp_id)
     
-    return respuestas, respuestas_especiales, respuestas_rechazadas_automatico
+    return respuestas, respuestas_especiales, respuestas_rechazadas_automatico, ids_respuestas
 
 
-def _preparar_catalogo(state: EstadoCodificacion) -> str:
+def _consultar_cache(
+    state: EstadoCodificacion,
+    ids_respuestas: List[int],
+) -> Tuple[Dict[int, str], Dict[int, Dict[str, Any]]]:
     """
-    Prepara el catálogo histórico como string para el prompt.
+    Busca en la caché persistente los resultados de las respuestas del batch.
     
     Returns:
-        String con el catálogo formateado
+        Tupla con (clave de caché por respuesta_id, entrada cacheada por respuesta_id)
     """
-    if state["catalogo"]:
-        codigos_normales = [c for c in state["catalogo"]]
-        return "\n".join([f"  {c['codigo']}. {c['descripcion']}" for c in codigos_normales[:50]])
-    return "No hay catálogo histórico disponible."
+    cache = obtener_cache() if state.get("usar_cache") else None
+    if cache is None:
+        return {}, {}
+    
+    version = version_prompt(PROMPT_POR_PROTOCOLO[_protocolo(state)])
+    claves = {
+        rid: clave_respuesta(
+            state["batch_respuestas"][rid - 1]["texto"],
+            state["pregunta"],
+            state.get("huella_catalogo", ""),
+            _identificador_modelos(state),
+            version,
+        )
+        for rid in ids_respuestas
+    }
+    encontrados = cache.obtener(claves.values())
+    hits = {rid: encontrados[clave] for rid, clave in claves.items() if clave in encontrados}
+    return claves, hits
 
 
-def _preparar_codigos_existentes(state: EstadoCodificacion) -> str:
+def _backend(state: EstadoCodificacion) -> BackendLLM:
+    """Backend del trabajo: la instancia del estado o, si es un nombre, la del registro."""
+    backend = state.get("backend_llm")
+    return backend if isinstance(backend, BackendLLM) else obtener_backend(backend)
+
+
+def _identificador_modelos(state: EstadoCodificacion) -> str:
+    """
+    Modelos que producen el resultado del batch (parte de la clave de caché).
+    
+    Incluye el backend (fuera de OpenAI) y, con cascada, los dos modelos.
+    """
+    backend = _backend(state)
+    principal = backend.identificador(state["modelo_gpt"])
+    rapido = _modelo_rapido(state)
+    return f"{backend.identificador(rapido)}>{principal}" if rapido else principal
+
+
+def _resultado_desde_cache(hits: Dict[int, Dict[str, Any]], codigo_base: int) -> Dict[str, Any]:
+    """
+    Reconstruye un resultado del LLM a partir de entradas cacheadas.
+    
+    Los códigos nuevos cacheados se renumeran desde `codigo_base` (un número por
+    concepto distinto), ya que los números guardados pertenecen a otra ejecución.
+    """
+    codigo_por_concepto: Dict[str, int] = {}
+    resultado: Dict[str, Any] = {"validaciones": [], "evaluaciones": [], "analisis": []}
+    for rid in sorted(hits):
+        entrada = hits[rid]
+        resultado["validaciones"].append({"respuesta_id": rid, **entrada.get("validacion", {})})
+        resultado["evaluaciones"].append({"respuesta_id": rid, "evaluaciones": entrada.get("evaluaciones", [])})
+        analisis = entrada.get("analisis", {})
+        conceptos = []
+        for c in analisis.get("conceptos_nuevos", []):
+            clave = clave_concepto(c.get("descripcion", ""))
+            if clave not in codigo_por_concepto:
+                codigo_por_concepto[clave] = codigo_base + len(codigo_por_concepto)
+            conceptos.append({**c, "codigo": codigo_por_concepto[clave]})
+        resultado["analisis"].append({
+            "respuesta_id": rid,
+            "respuesta_cubierta_completamente": analisis.get("respuesta_cubierta_completamente", False),
+            "conceptos_nuevos": conceptos,
+        })
+    return resultado
+
+
+def _validacion_por_defecto(rid: int) -> Dict[str, Any]:
+    """Validación de una respuesta enviada al LLM que no vino en su salida."""
+    return {
+        "respuesta_id": rid,
+        "es_valida": True,
+        "razon": "Válida (sin validación específica)",
+    }
+
+
+def _alinear_por_id(resultado: Dict[str, Any], ids_llm: List[int]) -> Dict[str, Any]:
+    """
+    Deja una validación por cada respuesta enviada al LLM, en el orden de
+    `ids_llm`: la del LLM con ese respuesta_id o una por defecto si falta.
+    Descarta validaciones con ids que no se enviaron.
     """
-    Prepara los códigos ya creados en batches anteriores como string para el prompt.
-    Limita a los últimos MAX_CODIGOS_EXISTENTES para evitar prompts muy grandes.
+    por_id = {v.get("respuesta_id"): v for v in resultado.get("validaciones", [])}
+    alineadas = [por_id.get(rid) or _validacion_por_defecto(rid) for rid in ids_llm]
+    return {**resultado, "validaciones": alineadas}
+
+
+def _guardar_en_cache(
+    resultado: Dict[str, Any],
+    ids_llm: List[int],
+    claves: Dict[int, str],
+) -> None:
+    """Guarda en la caché persistente el resultado del LLM de cada respuesta."""
+    cache = obtener_cache()
+    if cache is None or not claves:
+        return
+    evaluaciones = {ev.get("respuesta_id"): ev for ev in resultado.get("evaluaciones", [])}
+    analisis = {a.get("respuesta_id"): a for a in resultado.get("analisis", [])}
+    entradas: Dict[str, Dict[str, Any]] = {}
+    for val in resultado.get("validaciones", []):
+        rid = val.get("respuesta_id")
+        if rid not in claves or rid not in ids_llm:
+            continue
+        analisis_rid = analisis.get(rid, {})
+        entradas[claves[rid]] = {
+            "validacion": {k: v for k, v in val.items() if k != "respuesta_id"},
+            "evaluaciones": evaluaciones.get(rid, {}).get("evaluaciones", []),
+            "analisis": {
+                "respuesta_cubierta_completamente": analisis_rid.get("respuesta_cubierta_completamente", False),
+                "conceptos_nuevos": analisis_rid.get("conceptos_nuevos", []),
+            },
+        }
+    cache.guardar(entradas)
+
+
+def _ordenar_por_id(resultado: Dict[str, Any]) -> Dict[str, Any]:
+    """Ordena las tres secciones de un resultado por respuesta_id."""
+    return {
+        seccion: sorted(resultado.get(seccion, []), key=lambda x: x.get("respuesta_id") or 0)
+        for seccion in ("validaciones", "evaluaciones", "analisis")
+    }
+
+
+def _preparar_catalogo(state: EstadoCodificacion) -> str:
+    """
+    Prepara el catálogo histórico como string para el prompt.
+    
+    Si el catálogo no cabe en el presupuesto de tokens (catalogo_max_tokens),
+    se envían solo los códigos más relevantes para las respuestas del batch,
+    recuperados con el índice léxico del catálogo (construido una vez por trabajo).
+    Si cabe (según catalogo_tokens, contado al armar los batches) se envía
+    completo sin construir el índice.
     
     Returns:
-        String con los códigos existentes formateados
+        String con el catálogo formateado
     """
-    codigos_ya_creados: Dict[int, str] = {}
-    if state.get("codificaciones"):
-        # Recopilar todos los códigos
-        todos_codigos: List[Tuple[int, str]] = []
-        for cod in state["codificaciones"]:
-            for nuevo in cod.get("codigos_nuevos", []):
-                cid = nuevo.get("codigo")
-                desc = nuevo.get("descripcion", "")
-                if cid and desc:
-                    todos_codigos.append((cid, desc))
-        
-        # Ordenar por código (más recientes = códigos más altos) y tomar los últimos N
-        todos_codigos.sort(key=lambda x: x[0])
-        codigos_recientes = todos_codigos[-MAX_CODIGOS_EXISTENTES:] if len(todos_codigos) > MAX_CODIGOS_EXISTENTES else todos_codigos
-        
-        for cid, desc in codigos_recientes:
-            codigos_ya_creados[cid] = desc
+    catalogo = state["catalogo"]
+    if not catalogo:
+        return "No hay catálogo histórico disponible."
     
-    if codigos_ya_creados:
-        codigos_existentes_str = "\n**CÓDIGOS NUEVOS YA CREADOS EN BATCHES ANTERIORES:**\n"
-        for cid in sorted(codigos_ya_creados.keys()):
-            codigos_existentes_str += f"  {cid}: {codigos_ya_creados[cid]}\n"
-        codigos_existentes_str += "\n**IMPORTANTE:** Si encuentras un concepto similar a uno de estos, NO crees un código nuevo.\n"
-        if len(codigos_ya_creados) >= MAX_CODIGOS_EXISTENTES:
-            codigos_existentes_str += f"\n**NOTA:** Se muestran solo los últimos {MAX_CODIGOS_EXISTENTES} códigos creados para mantener el prompt manejable.\n"
-        return codigos_existentes_str
-    return "No hay códigos nuevos creados en batches anteriores."
+    max_tokens = state.get("catalogo_max_tokens") or CATALOGO_MAX_TOKENS
+    tokens_catalogo = state.get("catalogo_tokens")
+    if tokens_catalogo is not None and tokens_catalogo <= max_tokens:
+        seleccion = catalogo
+    else:
+        indice = obtener_indice_catalogo(catalogo, state.get("huella_catalogo", ""))
+        seleccion = indice.relevantes(
+            [str(r.get("texto", "")) for r in state["batch_respuestas"]],
+            max_tokens,
+            state.get("modelo_gpt"),
+        )
+    catalogo_str = "\n".join([f"  {c['codigo']}. {c['descripcion']}" for c in seleccion])
+    if len(seleccion) < len(catalogo):
+        print(f"   📚 Catálogo: {len(seleccion)}/{len(catalogo)} códigos relevantes para el batch")
+        catalogo_str += (
+            f"\n  (Se muestran los {len(seleccion)} códigos más relevantes para estas "
+            f"respuestas, de un catálogo de {len(catalogo)})"
+        )
+    return catalogo_str
 
 
-def _normalizar_concepto(desc: str) -> str:
+def _preparar_codigos_existentes(state: EstadoCodificacion) -> str:
     """
-    Normaliza un concepto para comparación, manejando marcas/nombres propios.
+    Sección del prompt con los códigos ya creados en batches anteriores.
+    
+    ensamblar la renderiza (con los últimos MAX_CODIGOS_EXISTENTES) solo
+    cuando un batch crea códigos; aquí se lee ya armada del estado.
     
-    Args:
-        desc: Descripción del concepto
-        
     Returns:
-        Descripción normalizada
+        String con los códigos existentes formateados
     """
-    if not desc:
-        return ""
-    if es_marca_o_nombre_propio(desc):
-        return normalizar_texto(normalizar_marca_nombre(desc))
-    return normalizar_texto(desc)
+    return state.get("seccion_codigos_existentes") or SIN_CODIGOS_EXISTENTES
 
 
 def _filtrar_conceptos_nuevos(
@@ -156,11 +333,15 @@ def _filtrar_conceptos_nuevos(
     respuestas_norm: List[str]
 ) -> List[Dict[str, Any]]:
     """
-    Filtra conceptos nuevos para eliminar duplicados e inventados.
+    Filtra conceptos nuevos inventados o repetidos y reutiliza los ya conocidos.
+    
+    Un concepto que ya está en el índice de conceptos del trabajo (catálogo o
+    batches anteriores) no se descarta: se conserva con el código existente,
+    para que la respuesta quede codificada igual que las anteriores.
     
     Args:
         resultado: Resultado del LLM
-        state: Estado actual del grafo
+        state: Estado actual del grafo (con indice_conceptos)
         respuestas_norm: Respuestas normalizadas del batch
         
     Returns:
@@ -170,35 +351,32 @@ def _filtrar_conceptos_nuevos(
         desc_norm = normalizar_texto(normalizar_marca_nombre(desc))
         return any(desc_norm and desc_norm in resp for resp in respuestas_norm)
     
-    # Construir conjunto de conceptos ya existentes (catálogo + batches previos)
-    conceptos_existentes_norm: Set[str] = set()
-    for c in state.get("catalogo", []):
-        conceptos_existentes_norm.add(_normalizar_concepto(c.get("descripcion", "")))
-    for codif in state.get("codificaciones", []):
-        for nuevo in codif.get("codigos_nuevos", []):
-            conceptos_existentes_norm.add(_normalizar_concepto(nuevo.get("descripcion", "")))
+    indice = state.get("indice_conceptos") or {}
     
     # Filtrar conceptos nuevos inventados/duplicados (especialmente marcas/nombres)
     analisis_filtrado: List[Dict[str, Any]] = []
     for analisis_data in resultado.get("analisis", []):
         conceptos_filtrados: List[Dict[str, Any]] = []
-        vistos_batch: Set[str] = set()
+        vistos_respuesta: Set[str] = set()
         
         for c in analisis_data.get("conceptos_nuevos", []):
             desc = c.get("descripcion", "")
-            desc_norm = _normalizar_concepto(desc)
-            if not desc_norm:
+            clave = clave_concepto(desc)
+            if not clave:
                 continue
             
             # Si es marca/nombre, solo aceptar si aparece en las respuestas
             if es_marca_o_nombre_propio(desc) and not _marca_aparece_en_respuestas(desc):
                 continue
             
-            # Evitar duplicados contra catálogo, batches previos y este batch
-            if desc_norm in conceptos_existentes_norm or desc_norm in vistos_batch:
+            # El mismo concepto dos veces en una respuesta
+            if clave in vistos_respuesta:
                 continue
+            vistos_respuesta.add(clave)
             
-            vistos_batch.add(desc_norm)
+            # Concepto ya conocido: se reutiliza su código en lugar de crear otro
+            if clave in indice:
+                c = {**c, "codigo": indice[clave]}
             conceptos_filtrados.append(c)
         
         analisis_filtrado.append({
@@ -209,104 +387,558 @@ def _filtrar_conceptos_nuevos(
     return analisis_filtrado
 
 
-def nodo_codificar_combinado(state: EstadoCodificacion) -> EstadoCodificacion:
+class ErrorSalidaLLM(RuntimeError):
+    """La salida del LLM no se pudo parsear o llegó truncada."""
+    
+    def __init__(self, mensaje: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        super().__init__(mensaje)
+        # Tokens ya pagados por la llamada fallida
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+
+
+def _traducir_error_api(e: Exception) -> RuntimeError:
     """
-    Nodo optimizado que combina validación + evaluación + identificación en UNA sola llamada GPT.
-    Reduce el costo y la latencia en ~70% comparado con los 3 nodos separados.
+    Convierte errores de la API de OpenAI en mensajes descriptivos para el usuario.
     
     Args:
-        state: Estado actual del grafo
+        e: Error original
         
     Returns:
-        Estado actualizado con validaciones, evaluaciones y cobertura del batch
+        RuntimeError con mensaje descriptivo
     """
-    print("\n🚀 Codificando batch (validación + evaluación + identificación combinadas)...")
+    error_msg = str(e)
+    if isinstance(e, asyncio.TimeoutError):
+        return RuntimeError("Tiempo de espera agotado al comunicarse con el LLM (timeout de la llamada o plazo del trabajo).")
+    if "insufficient_quota" in error_msg.lower():
+        return RuntimeError("Cuota de OpenAI insuficiente. Por favor, verifica tu cuenta.")
+    elif "rate limit" in error_msg.lower() or "429" in error_msg:
+        return RuntimeError("Límite de velocidad de la API de OpenAI alcanzado. Por favor, espera unos momentos e intenta de nuevo.")
+    elif "invalid_api_key" in error_msg.lower() or "401" in error_msg:
+        return RuntimeError("Clave de API de OpenAI inválida o no configurada correctamente.")
+    elif "timeout" in error_msg.lower():
+        return RuntimeError("Tiempo de espera agotado al comunicarse con OpenAI. Intenta de nuevo.")
+    else:
+        return RuntimeError(f"Error al comunicarse con OpenAI: {error_msg}")
+
+
+def _reparar_salida(contenido: str) -> Any:
+    """
+    Camino lento de parseo: quita bloques markdown y repara el JSON malformado.
     
-    # Preparar respuestas
-    respuestas, respuestas_especiales, respuestas_rechazadas_automatico = _preparar_respuestas(state)
+    Args:
+        contenido: Texto devuelto por el LLM
+        
+    Returns:
+        Objeto parseado
+    """
+    # Limpiar markdown code blocks si existen
+    if "```json" in contenido:
+        contenido = contenido.split("```json")[1].split("```")[0].strip()
+    elif "```" in contenido:
+        contenido = contenido.split("```")[1].split("```")[0].strip()
+    try:
+        return json.loads(contenido)
+    except Exception:
+        return json.loads(_reparar_json_llm(contenido))
+
+
+def _parsear_salida(
+    respuesta_llm: Any,
+    estructurada: bool = False,
+    metricas: Optional[Dict[str, int]] = None,
+    protocolo: str = PROTOCOLO_COMPLETO,
+) -> Dict[str, Any]:
+    """
+    Parsea la salida JSON del LLM.
     
-    if not respuestas:
-        print("   ⚠️  Sin respuestas válidas para procesar")
-        return {
-            **state,
-            "validaciones_batch": [],
-            "evaluaciones_batch": [],
-            "cobertura_batch": [],
-            "respuestas_especiales": respuestas_especiales,
-        }
+    El contenido se parsea directamente con orjson; solo si falla se usa el
+    camino de reparación (bloques markdown, comas sobrantes, comillas), que se
+    cuenta en `metricas["reparaciones_json"]`. En modo estructurado el resultado
+    se valida además contra el esquema de su protocolo. Las salidas compactas
+    se expanden al formato completo.
     
-    # Preparar contexto para el prompt
-    catalogo_str = _preparar_catalogo(state)
-    codigos_existentes_str = _preparar_codigos_existentes(state)
-    codigo_base = state.get("proximo_codigo_nuevo", 1)
+    Args:
+        respuesta_llm: Respuesta del LLM
+        estructurada: Si se pidió salida con esquema estricto (structured outputs)
+        metricas: Diccionario opcional donde se acumula `reparaciones_json`
+        protocolo: Protocolo de salida pedido ("completo" o "compacto")
+        
+    Returns:
+        Resultado parseado (siempre en formato completo)
+        
+    Raises:
+        ErrorSalidaLLM: Si la salida está truncada, no es JSON válido o no cumple el esquema
+    """
+    meta = getattr(respuesta_llm, "response_metadata", {}) or {}
+    if meta.get("finish_reason") == "length":
+        raise ErrorSalidaLLM("La salida del LLM llegó truncada (finish_reason=length)")
+    rechazo = (getattr(respuesta_llm, "additional_kwargs", {}) or {}).get("refusal")
+    if rechazo:
+        raise ErrorSalidaLLM(f"El LLM rechazó generar la salida: {rechazo}")
+    
+    contenido = respuesta_llm.content
+    try:
+        resultado = cargar_json(contenido)
+    except Exception:
+        if metricas is not None:
+            metricas["reparaciones_json"] = metricas.get("reparaciones_json", 0) + 1
+        try:
+            resultado = _reparar_salida(contenido)
+        except Exception as e:
+            raise ErrorSalidaLLM(f"Error al parsear la salida combinada: {e}\nContenido: {contenido}")
+    if not isinstance(resultado, dict):
+        raise ErrorSalidaLLM(f"La salida combinada no es un objeto JSON: {contenido}")
+    if estructurada:
+        try:
+            resultado = validar_salida(resultado, protocolo)
+        except ValidationError as e:
+            raise ErrorSalidaLLM(f"La salida combinada no cumple el esquema: {e}")
+    if protocolo == PROTOCOLO_COMPACTO:
+        if not isinstance(resultado.get("r"), list):
+            raise ErrorSalidaLLM(f"La salida compacta no tiene la lista 'r': {contenido}")
+        resultado = expandir_salida_compacta(resultado)
+    return resultado
+
+
+def _entradas_prompt(contexto: Dict[str, str], respuestas: List[str], codigo_base: int) -> Dict[str, Any]:
+    """Variables de la plantilla del prompt para un grupo de respuestas."""
+    return {
+        **contexto,
+        "respuestas": "\n".join(respuestas),
+        "codigo_base": codigo_base,
+    }
+
+
+async def _llamar_llm(
+    state: EstadoCodificacion,
+    contexto: Dict[str, str],
+    respuestas: List[str],
+    codigo_base: int,
+    metricas: Dict[str, int],
+    al_resolver: Optional[Callable[[List[int]], Awaitable[None]]] = None,
+    historial: Optional[HistorialLatencias] = None,
+) -> Tuple[Dict[str, Any], int, int]:
+    """
+    Hace una llamada al LLM para un grupo de respuestas y parsea la salida.
     
-    # Cargar prompt combinado
-    prompt_template = load_prompt("codificar_combinado")
-    prompt = ChatPromptTemplate.from_messages([("system", prompt_template)])
+    Si se indica `al_resolver`, la llamada se hace en streaming y se le pasan
+    los respuesta_id a medida que su resultado termina de llegar.
     
-    # Configurar LLM
-    llm_kwargs = {"model": state["modelo_gpt"], "api_key": OPENAI_API_KEY}
-    if supports_temperature(state["modelo_gpt"]):
-        llm_kwargs["temperature"] = 0.1
-    llm = ChatOpenAI(**llm_kwargs)
+    Si se indica `historial` (latencias del trabajo), cada intento tiene un
+    timeout derivado de él (acotado por la fecha límite del trabajo); si además
+    el trabajo tiene `solicitudes_redundantes` y la llamada supera el plazo aprendido,
+    se lanza una solicitud redundante y gana la primera salida válida; los tokens
+    del intento perdedor se suman en `tokens_redundantes`.
+    
+    Returns:
+        Tupla con (resultado, prompt_tokens, completion_tokens)
+        
+    Raises:
+        ErrorSalidaLLM: Si la salida no se puede parsear o está truncada
+        RuntimeError: Si la API falla tras agotar los reintentos
+    """
+    # Prompt compilado y cliente LLM compartidos (sin reconstruirlos por batch)
+    protocolo = _protocolo(state)
+    compacta = protocolo == PROTOCOLO_COMPACTO
+    prompt = obtener_prompt(PROMPT_POR_PROTOCOLO[protocolo])
+    modelo = state["modelo_gpt"]
+    backend = _backend(state)
+    llm = backend.obtener_llm(modelo)
+    estructurada = bool(state.get("salida_estructurada")) and backend.soporta_salida_estructurada
+    if estructurada:
+        llm = llm.bind(response_format=FORMATO_RESPUESTA_COMPACTA if compacta else FORMATO_RESPUESTA)
     chain = prompt | llm
     
-    # Llamar a GPT (UNA SOLA VEZ)
-    inicio_tiempo = time.time()
-    try:
-        respuesta_llm = chain.invoke({
-            "pregunta": state["pregunta"],
-            "catalogo": catalogo_str,
-            "codigos_existentes": codigos_existentes_str,
-            "respuestas": "\n".join(respuestas),
-            "codigo_base": codigo_base,
-        })
-    except Exception as e:
-        error_msg = str(e)
-        # Mejorar mensajes de error comunes de OpenAI
-        if "rate limit" in error_msg.lower() or "429" in error_msg:
-            raise RuntimeError("Límite de velocidad de la API de OpenAI alcanzado. Por favor, espera unos momentos e intenta de nuevo.")
-        elif "invalid_api_key" in error_msg.lower() or "401" in error_msg:
-            raise RuntimeError("Clave de API de OpenAI inválida o no configurada correctamente.")
-        elif "insufficient_quota" in error_msg.lower():
-            raise RuntimeError("Cuota de OpenAI insuficiente. Por favor, verifica tu cuenta.")
-        elif "timeout" in error_msg.lower():
-            raise RuntimeError("Tiempo de espera agotado al comunicarse con OpenAI. Intenta de nuevo.")
+    entradas = _entradas_prompt(contexto, respuestas, codigo_base)
+    tokens_prompt = estimar_tokens(prompt.format(**entradas))
+    tokens_estimados = tokens_prompt + (
+        TOKENS_COMPLETION_POR_RESPUESTA_COMPACTA if compacta else TOKENS_COMPLETION_POR_RESPUESTA
+    ) * len(respuestas)
+    plazo = (
+        historial.plazo(modelo, len(respuestas))
+        if historial is not None and state.get("solicitudes_redundantes") else None
+    )
+    timeout = timeout_llamada(modelo, len(respuestas), historial)
+    
+    async def _intento(redundante: bool) -> Tuple[Dict[str, Any], int, int]:
+        if redundante:
+            metricas["redundantes_emitidas"] += 1
+            print(f"   🐢 Llamada sin respuesta tras {plazo:.1f}s: se lanza una solicitud redundante")
+        # Llamar a GPT a través del limitador compartido (con reintentos)
+        inicio_tiempo = time.time()
+        try:
+            respuesta_llm = await invocar_llm(
+                chain,
+                entradas,
+                backend.identificador(modelo),
+                tokens_estimados,
+                metricas=metricas,
+                # El progreso por respuesta lo reporta solo el intento original
+                stream=SeguimientoStream(protocolo, al_resolver) if al_resolver and not redundante else None,
+                limites=backend.limites(modelo),
+                timeout=timeout,
+                fecha_limite=state.get("fecha_limite"),
+            )
+        except Exception as e:
+            raise _traducir_error_api(e) from e
+        tiempo_llamada = time.time() - inicio_tiempo
+        
+        prompt_tokens, completion_tokens, _total = extraer_tokens(respuesta_llm)
+        cached_tokens = extraer_tokens_cacheados(respuesta_llm)
+        metricas["cached_tokens"] += cached_tokens
+        detalle_cache = f", {cached_tokens} de entrada cacheados" if cached_tokens else ""
+        print(f"   ✅ Respuesta recibida en {tiempo_llamada:.1f}s ({prompt_tokens + completion_tokens} tokens{detalle_cache})")
+        
+        try:
+            resultado = _parsear_salida(respuesta_llm, estructurada, metricas, protocolo)
+        except ErrorSalidaLLM as e:
+            # Los tokens ya se pagaron aunque la salida no sirva
+            raise ErrorSalidaLLM(str(e), prompt_tokens, completion_tokens) from e
+        if historial is not None:
+            historial.registrar(modelo, tiempo_llamada, len(respuestas))
+        return resultado, prompt_tokens, completion_tokens
+    
+    (resultado, prompt_tokens, completion_tokens), gano_redundante, perdedores = await primera_valida(
+        _intento, plazo
+    )
+    if not perdedores:
+        return resultado, prompt_tokens, completion_tokens
+    
+    extra_prompt = extra_completion = 0
+    for perdedor in perdedores:
+        if perdedor.cancelled():
+            # Cancelado en vuelo: se cuenta el prompt ya enviado (estimado)
+            metricas["tokens_redundantes"] += tokens_prompt
+            continue
+        # Terminó (con error de salida o justo después del ganador): sus tokens se pagaron
+        error = perdedor.exception()
+        if error is None:
+            _resultado, pt, ct = perdedor.result()
         else:
-            raise RuntimeError(f"Error al comunicarse con OpenAI: {error_msg}")
+            pt, ct = getattr(error, "prompt_tokens", 0), getattr(error, "completion_tokens", 0)
+        extra_prompt += pt
+        extra_completion += ct
+        metricas["tokens_redundantes"] += pt + ct
+    if gano_redundante:
+        metricas["redundantes_ganadoras"] += 1
+        if al_resolver is not None:
+            await al_resolver([v.get("respuesta_id") for v in resultado.get("validaciones", [])])
+    return resultado, prompt_tokens + extra_prompt, completion_tokens + extra_completion
+
+
+def _codigos_nuevos_resultado(resultado: Dict[str, Any]) -> Set[int]:
+    """Códigos nuevos propuestos en un resultado del LLM."""
+    codigos: Set[int] = set()
+    for analisis_data in resultado.get("analisis", []):
+        for c in analisis_data.get("conceptos_nuevos", []):
+            if isinstance(c.get("codigo"), int):
+                codigos.add(c["codigo"])
+    return codigos
+
+
+def _combinar_resultados(primero: Dict[str, Any], segundo: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Combina los resultados de dos mitades de un batch.
     
-    tiempo_llamada = time.time() - inicio_tiempo
+    Los códigos nuevos del segundo resultado que choquen con los del primero se
+    renumeran por encima del máximo usado, para que ensamblar no mezcle conceptos.
+    """
+    usados = _codigos_nuevos_resultado(primero)
+    siguiente = max(usados | _codigos_nuevos_resultado(segundo), default=0) + 1
+    remapeo: Dict[int, int] = {}
+    for codigo in sorted(_codigos_nuevos_resultado(segundo) & usados):
+        remapeo[codigo] = siguiente
+        siguiente += 1
     
-    prompt_tokens, completion_tokens, _total = extraer_tokens(respuesta_llm)
-    print(f"   ✅ Respuesta recibida en {tiempo_llamada:.1f}s ({prompt_tokens + completion_tokens} tokens)")
+    analisis_segundo = []
+    for analisis_data in segundo.get("analisis", []):
+        conceptos = [
+            {**c, "codigo": remapeo.get(c.get("codigo"), c.get("codigo"))}
+            for c in analisis_data.get("conceptos_nuevos", [])
+        ]
+        analisis_segundo.append({**analisis_data, "conceptos_nuevos": conceptos})
     
-    # Parsear respuesta JSON
+    return {
+        "validaciones": primero.get("validaciones", []) + segundo.get("validaciones", []),
+        "evaluaciones": primero.get("evaluaciones", []) + segundo.get("evaluaciones", []),
+        "analisis": primero.get("analisis", []) + analisis_segundo,
+    }
+
+
+async def _codificar_con_biseccion(
+    state: EstadoCodificacion,
+    contexto: Dict[str, str],
+    respuestas: List[str],
+    codigo_base: int,
+    metricas: Dict[str, int],
+    al_resolver: Optional[Callable[[List[int]], Awaitable[None]]] = None,
+    historial: Optional[HistorialLatencias] = None,
+) -> Tuple[Dict[str, Any], int, int]:
+    """
+    Codifica un grupo de respuestas; si la salida es inválida o truncada, lo
+    divide en mitades y reintenta cada una recursivamente.
+    
+    Returns:
+        Tupla con (resultado, prompt_tokens, completion_tokens)
+        
+    Raises:
+        RuntimeError: Si una sola respuesta sigue produciendo salida inválida
+    """
     try:
-        contenido = respuesta_llm.content
-        # Limpiar markdown code blocks si existen
-        if "```json" in contenido:
-            contenido = contenido.split("```json")[1].split("```")[0].strip()
-        elif "```" in contenido:
-            contenido = contenido.split("```")[1].split("```")[0].strip()
-        try:
-            resultado = json.loads(contenido)
-        except Exception:
-            contenido_reparado = _reparar_json_llm(contenido)
-            resultado = json.loads(contenido_reparado)
-    except Exception as e:
-        raise RuntimeError(f"Error al parsear la salida combinada: {e}\nContenido: {respuesta_llm.content}")
+        return await _llamar_llm(
+            state, contexto, respuestas, codigo_base, metricas, al_resolver=al_resolver, historial=historial
+        )
+    except ErrorSalidaLLM as e:
+        if len(respuestas) <= 1:
+            raise RuntimeError(str(e)) from e
+        tokens_perdidos = (e.prompt_tokens, e.completion_tokens)
     
-    # Filtrar conceptos nuevos
-    respuestas_norm = [
-        normalizar_texto(str(r.get("texto", ""))) for r in state["batch_respuestas"]
-    ]
-    analisis_filtrado = _filtrar_conceptos_nuevos(resultado, state, respuestas_norm)
+    metricas["divisiones_batch"] += 1
+    mitad = len(respuestas) // 2
+    print(f"   ✂️  Salida inválida o truncada: dividiendo {len(respuestas)} respuestas en {mitad} + {len(respuestas) - mitad}")
+    
+    primero, pt1, ct1 = await _codificar_con_biseccion(
+        state, contexto, respuestas[:mitad], codigo_base, metricas, al_resolver, historial
+    )
+    codigo_base_segundo = max(_codigos_nuevos_resultado(primero) | {codigo_base - 1}) + 1
+    segundo, pt2, ct2 = await _codificar_con_biseccion(
+        state, contexto, respuestas[mitad:], codigo_base_segundo, metricas, al_resolver, historial
+    )
+    
+    return (
+        _combinar_resultados(primero, segundo),
+        tokens_perdidos[0] + pt1 + pt2,
+        tokens_perdidos[1] + ct1 + ct2,
+    )
+
+
+def _respuestas_a_escalar(
+    resultado: Dict[str, Any],
+    ids_llm: List[int],
+    banda: Tuple[float, float],
+) -> List[int]:
+    """
+    Respuestas del modelo rápido que deben pasar al modelo principal.
+    
+    Se escalan las respuestas cuya mejor confianza (entre los códigos que
+    aplican) cae en la banda de incertidumbre, las que proponen conceptos
+    nuevos y las que faltan en la salida.
+    
+    Args:
+        resultado: Resultado del modelo rápido
+        ids_llm: respuesta_id enviados al modelo rápido
+        banda: Banda de incertidumbre [min, max)
+        
+    Returns:
+        respuesta_id a escalar, en orden
+    """
+    validas = {v.get("respuesta_id"): v.get("es_valida", True) for v in resultado.get("validaciones", [])}
+    evaluaciones = {ev.get("respuesta_id"): ev.get("evaluaciones", []) for ev in resultado.get("evaluaciones", [])}
+    analisis = {a.get("respuesta_id"): a.get("conceptos_nuevos", []) for a in resultado.get("analisis", [])}
+    escalar: List[int] = []
+    for rid in ids_llm:
+        if rid not in validas:
+            escalar.append(rid)
+            continue
+        if not validas[rid]:
+            continue
+        mejor = max(
+            (c.get("confianza", 0.0) for c in evaluaciones.get(rid, []) if c.get("aplica")),
+            default=None,
+        )
+        if analisis.get(rid) or (mejor is not None and banda[0] <= mejor < banda[1]):
+            escalar.append(rid)
+    return escalar
+
+
+def _reemplazar_respuestas(
+    resultado: Dict[str, Any],
+    reemplazo: Dict[str, Any],
+    ids: List[int],
+) -> Dict[str, Any]:
+    """Sustituye en `resultado` las respuestas `ids` por las de `reemplazo`."""
+    ids_reemplazo = set(ids)
+    return _ordenar_por_id({
+        seccion: [
+            item for item in resultado.get(seccion, []) if item.get("respuesta_id") not in ids_reemplazo
+        ] + reemplazo.get(seccion, [])
+        for seccion in ("validaciones", "evaluaciones", "analisis")
+    })
+
+
+async def _codificar_en_cascada(
+    state: EstadoCodificacion,
+    contexto: Dict[str, str],
+    respuestas: List[str],
+    ids_llm: List[int],
+    codigo_base: int,
+    metricas: Dict[str, int],
+    al_resolver: Optional[Callable[[List[int]], Awaitable[None]]] = None,
+    historial: Optional[HistorialLatencias] = None,
+) -> Tuple[Dict[str, Any], int, int]:
+    """
+    Codifica con el modelo rápido y reenvía al modelo principal solo las
+    respuestas dudosas (ver _respuestas_a_escalar).
+    
+    Los tokens del modelo rápido se registran además en
+    `metricas["*_rapido"]` para calcular el costo por modelo.
+    
+    Returns:
+        Tupla con (resultado combinado, prompt_tokens, completion_tokens)
+    """
+    modelo_rapido = _modelo_rapido(state)
+    banda = tuple(state.get("banda_incertidumbre") or (CASCADA_CONFIANZA_MIN, CASCADA_CONFIANZA_MAX))
+    
+    metricas_rapido = _metricas_vacias()
+    resultado, prompt_tokens, completion_tokens = await _codificar_con_biseccion(
+        {**state, "modelo_gpt": modelo_rapido}, contexto, respuestas, codigo_base, metricas_rapido,
+        historial=historial,
+    )
+    for clave in (
+        "reintentos_llm", "reintentos_429", "divisiones_batch", "cached_tokens", "reparaciones_json",
+        "redundantes_emitidas", "redundantes_ganadoras", "tokens_redundantes",
+    ):
+        metricas[clave] += metricas_rapido[clave]
+    metricas["prompt_tokens_rapido"] += prompt_tokens
+    metricas["completion_tokens_rapido"] += completion_tokens
+    metricas["cached_tokens_rapido"] += metricas_rapido["cached_tokens"]
+    metricas["respuestas_cascada"] += len(respuestas)
+    
+    escalar = _respuestas_a_escalar(resultado, ids_llm, banda)
+    if al_resolver is not None:
+        await al_resolver([rid for rid in ids_llm if rid not in escalar])
+    print(f"   🪜 Cascada: {len(escalar)}/{len(respuestas)} respuestas escaladas de {modelo_rapido} a {state['modelo_gpt']}")
+    if not escalar:
+        return resultado, prompt_tokens, completion_tokens
+    
+    metricas["respuestas_escaladas"] += len(escalar)
+    por_id = dict(zip(ids_llm, respuestas))
+    resultado_principal, pt, ct = await _codificar_con_biseccion(
+        state, contexto, [por_id[rid] for rid in escalar], codigo_base, metricas, al_resolver, historial
+    )
+    return (
+        _reemplazar_respuestas(resultado, resultado_principal, escalar),
+        prompt_tokens + pt,
+        completion_tokens + ct,
+    )
+
+
+def _progreso_por_respuesta(
+    state: EstadoCodificacion,
+    config: Optional[RunnableConfig],
+    ya_resueltas: int,
+) -> Optional[Callable[[List[int]], Awaitable[None]]]:
+    """
+    Construye el callback que reporta las respuestas del batch resueltas durante el stream.
     
-    # Procesar validaciones
+    El reporte se entrega a `config["configurable"]["progreso_respuestas"]`
+    (clave del batch, respuestas resueltas del batch), si existe y el trabajo
+    usa streaming.
+    
+    Args:
+        state: Estado actual del grafo
+        config: Configuración de la ejecución del grafo
+        ya_resueltas: Respuestas del batch resueltas sin LLM (caché, vacías)
+    """
+    progreso_respuestas = ((config or {}).get("configurable") or {}).get("progreso_respuestas")
+    if not state.get("streaming") or progreso_respuestas is None or not state["batch_respuestas"]:
+        return None
+    
+    clave_batch = state["batch_respuestas"][0].get("fila_excel")
+    resueltas: Set[int] = set()
+    
+    async def _al_resolver(ids: List[int]) -> None:
+        resueltas.update(ids)
+        await progreso_respuestas(clave_batch, ya_resueltas + len(resueltas))
+    
+    return _al_resolver
+
+
+def _historial_latencias(config: Optional[RunnableConfig]) -> Optional[HistorialLatencias]:
+    """
+    Historial de latencias del trabajo (timeouts por llamada y solicitudes redundantes).
+    
+    Se toma de `config["configurable"]["historial_latencias"]`, compartido por
+    todos los batches del trabajo.
+    """
+    return ((config or {}).get("configurable") or {}).get("historial_latencias")
+
+
+def _preparar_codificacion(state: EstadoCodificacion) -> Dict[str, Any]:
+    """
+    Prepara el batch para el LLM: respuestas a enviar, contexto del prompt y
+    resultados ya disponibles en la caché persistente.
+    
+    Returns:
+        Diccionario con respuestas, respuestas_especiales, respuestas_rechazadas,
+        ids_respuestas, contexto, codigo_base, claves_cache, hits_cache, ids_llm
+        y respuestas_llm
+    """
+    respuestas, respuestas_especiales, respuestas_rechazadas_automatico, ids_respuestas = _preparar_respuestas(state)
+    preparacion: Dict[str, Any] = {
+        "respuestas": respuestas,
+        "respuestas_especiales": respuestas_especiales,
+        "respuestas_rechazadas": respuestas_rechazadas_automatico,
+        "ids_respuestas": ids_respuestas,
+        "claves_cache": {},
+        "hits_cache": {},
+        "ids_llm": [],
+        "respuestas_llm": [],
+    }
+    if not respuestas:
+        return preparacion
+    
+    # Preparar contexto para el prompt
+    preparacion["contexto"] = {
+        "pregunta": state["pregunta"],
+        "catalogo": _preparar_catalogo(state),
+        "codigos_existentes": _preparar_codigos_existentes(state),
+    }
+    preparacion["codigo_base"] = state.get("proximo_codigo_nuevo", 1)
+    
+    # Consultar la caché persistente: los hits no van al LLM
+    claves_cache, hits_cache = _consultar_cache(state, ids_respuestas)
+    if hits_cache:
+        print(f"   💾 Caché: {len(hits_cache)}/{len(ids_respuestas)} respuestas ya codificadas")
+    preparacion["claves_cache"] = claves_cache
+    preparacion["hits_cache"] = hits_cache
+    preparacion["ids_llm"] = [rid for rid in ids_respuestas if rid not in hits_cache]
+    preparacion["respuestas_llm"] = [r for rid, r in zip(ids_respuestas, respuestas) if rid not in hits_cache]
+    return preparacion
+
+
+def _metricas_vacias() -> Dict[str, int]:
+    """Contadores de una codificación de batch."""
+    return {
+        "reintentos_llm": 0, "reintentos_429": 0, "divisiones_batch": 0, "cached_tokens": 0,
+        "reparaciones_json": 0, "respuestas_cascada": 0, "respuestas_escaladas": 0,
+        "prompt_tokens_rapido": 0, "completion_tokens_rapido": 0, "cached_tokens_rapido": 0,
+        "redundantes_emitidas": 0, "redundantes_ganadoras": 0, "tokens_redundantes": 0,
+    }
+
+
+def _validaciones_batch(
+    state: EstadoCodificacion,
+    preparacion: Dict[str, Any],
+    validaciones_llm: Dict[int, Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Una validación por respuesta del batch, en orden.
+    
+    Args:
+        state: Estado actual del grafo
+        preparacion: Salida de _preparar_codificacion
+        validaciones_llm: Validaciones del LLM (o de la caché) por respuesta_id
+        
+    Returns:
+        Validaciones del batch: automáticas para las vacías y las de código
+        especial, la del LLM para el resto
+    """
+    respuestas_especiales = preparacion["respuestas_especiales"]
+    respuestas_rechazadas_automatico = preparacion["respuestas_rechazadas"]
     validaciones: List[Dict[str, Any]] = []
-    idx_llm = 0
-    for i, _resp in enumerate(state["batch_respuestas"]):
-        rid = i + 1
+    for rid in range(1, len(state["batch_respuestas"]) + 1):
         if rid in respuestas_rechazadas_automatico:
             validaciones.append({
                 "respuesta_id": rid,
@@ -320,15 +952,69 @@ def nodo_codificar_combinado(state: EstadoCodificacion) -> EstadoCodificacion:
                 "razon": f"Código especial {respuestas_especiales[rid]} detectado automáticamente",
             })
         else:
-            if idx_llm < len(resultado.get("validaciones", [])):
-                validaciones.append(resultado["validaciones"][idx_llm])
-            else:
-                validaciones.append({
-                    "respuesta_id": rid,
-                    "es_valida": True,
-                    "razon": "Válida (sin validación específica)",
-                })
-            idx_llm += 1
+            validaciones.append(validaciones_llm.get(rid) or _validacion_por_defecto(rid))
+    return validaciones
+
+
+def _estado_sin_respuestas(state: EstadoCodificacion, preparacion: Dict[str, Any]) -> Dict[str, Any]:
+    """Actualización del estado para un batch sin respuestas que enviar al LLM."""
+    print("   ⚠️  Sin respuestas para enviar al LLM")
+    return {
+        "validaciones_batch": _validaciones_batch(state, preparacion, {}),
+        "evaluaciones_batch": [],
+        "cobertura_batch": [],
+        "respuestas_especiales": preparacion["respuestas_especiales"],
+    }
+
+
+def _completar_codificacion(
+    state: EstadoCodificacion,
+    preparacion: Dict[str, Any],
+    resultado: Dict[str, Any],
+    prompt_tokens: int,
+    completion_tokens: int,
+    metricas: Dict[str, int],
+) -> Dict[str, Any]:
+    """
+    Combina el resultado del LLM con la caché, filtra conceptos nuevos y arma
+    las validaciones, evaluaciones y cobertura del batch.
+    
+    Args:
+        state: Estado actual del grafo
+        preparacion: Salida de _preparar_codificacion
+        resultado: Resultado del LLM para las respuestas enviadas
+        prompt_tokens: Tokens de entrada usados
+        completion_tokens: Tokens de salida usados
+        metricas: Contadores de la codificación del batch
+        
+    Returns:
+        Actualización del estado: validaciones, evaluaciones y cobertura del
+        batch, y lo que el batch suma a cada contador
+    """
+    respuestas_especiales = preparacion["respuestas_especiales"]
+    claves_cache = preparacion["claves_cache"]
+    hits_cache = preparacion["hits_cache"]
+    codigo_base = preparacion["codigo_base"]
+    
+    if preparacion["respuestas_llm"] and claves_cache:
+        resultado = _alinear_por_id(resultado, preparacion["ids_llm"])
+        _guardar_en_cache(resultado, preparacion["ids_llm"], claves_cache)
+    
+    if hits_cache:
+        resultado = _ordenar_por_id(
+            _combinar_resultados(resultado, _resultado_desde_cache(hits_cache, codigo_base))
+        )
+    
+    # Filtrar conceptos nuevos
+    respuestas_norm = [
+        normalizar_texto(str(r.get("texto", ""))) for r in state["batch_respuestas"]
+    ]
+    analisis_filtrado = _filtrar_conceptos_nuevos(resultado, state, respuestas_norm)
+    
+    # Procesar validaciones (por respuesta_id, no por posición)
+    validaciones = _validaciones_batch(
+        state, preparacion, {v.get("respuesta_id"): v for v in resultado.get("validaciones", [])}
+    )
     
     # Procesar evaluaciones
     evaluaciones: List[Dict[str, Any]] = []
@@ -360,18 +1046,143 @@ def nodo_codificar_combinado(state: EstadoCodificacion) -> EstadoCodificacion:
     print(f"   ✅ Matches catálogo: {matches}")
     print(f"   ✅ Conceptos nuevos: {conceptos_nuevos}")
     
-    total_prompt = state.get("prompt_tokens", 0) + prompt_tokens
-    total_completion = state.get("completion_tokens", 0) + completion_tokens
-    total_tokens = state.get("total_tokens", 0) + prompt_tokens + completion_tokens
-    
     return {
-        **state,
         "validaciones_batch": validaciones,
         "evaluaciones_batch": evaluaciones,
         "cobertura_batch": cobertura,
         "respuestas_especiales": respuestas_especiales,
-        "prompt_tokens": total_prompt,
-        "completion_tokens": total_completion,
-        "total_tokens": total_tokens,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        **metricas,
+        "cache_consultas": len(claves_cache) if claves_cache else 0,
+        "cache_hits": len(hits_cache),
     }
 
+
+async def nodo_codificar_combinado(
+    state: EstadoCodificacion,
+    config: Optional[RunnableConfig] = None,
+) -> Dict[str, Any]:
+    """
+    Nodo optimizado que combina validación + evaluación + identificación en UNA sola llamada GPT.
+    Reduce el costo y la latencia en ~70% comparado con los 3 nodos separados.
+    
+    Args:
+        state: Estado actual del grafo
+        config: Configuración de la ejecución (callback de progreso por respuesta)
+        
+    Returns:
+        Actualización del estado con validaciones, evaluaciones y cobertura del batch
+    """
+    print("\n🚀 Codificando batch (validación + evaluación + identificación combinadas)...")
+    
+    preparacion = _preparar_codificacion(state)
+    if not preparacion["respuestas"]:
+        return _estado_sin_respuestas(state, preparacion)
+    
+    metricas = _metricas_vacias()
+    prompt_tokens = completion_tokens = 0
+    resultado: Dict[str, Any] = {"validaciones": [], "evaluaciones": [], "analisis": []}
+    respuestas_llm = preparacion["respuestas_llm"]
+    if respuestas_llm:
+        al_resolver = _progreso_por_respuesta(
+            state, config, len(state["batch_respuestas"]) - len(respuestas_llm)
+        )
+        historial = _historial_latencias(config)
+        if _modelo_rapido(state):
+            resultado, prompt_tokens, completion_tokens = await _codificar_en_cascada(
+                state, preparacion["contexto"], respuestas_llm, preparacion["ids_llm"],
+                preparacion["codigo_base"], metricas, al_resolver, historial
+            )
+        else:
+            resultado, prompt_tokens, completion_tokens = await _codificar_con_biseccion(
+                state, preparacion["contexto"], respuestas_llm, preparacion["codigo_base"], metricas,
+                al_resolver, historial
+            )
+    
+    return _completar_codificacion(state, preparacion, resultado, prompt_tokens, completion_tokens, metricas)
+
+
+def preparar_solicitud_lote(
+    state: EstadoCodificacion,
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Prepara un batch para la API de lotes (modo offline) en lugar de llamar al LLM.
+    
+    Args:
+        state: Estado del batch (con batch_respuestas)
+        
+    Returns:
+        Tupla con (preparación del batch, body de chat completions o None si no
+        hay respuestas que enviar al LLM)
+    """
+    preparacion = _preparar_codificacion(state)
+    if not preparacion["respuestas_llm"]:
+        return preparacion, None
+    
+    protocolo = _protocolo(state)
+    prompt = obtener_prompt(PROMPT_POR_PROTOCOLO[protocolo])
+    entradas = _entradas_prompt(
+        preparacion["contexto"], preparacion["respuestas_llm"], preparacion["codigo_base"]
+    )
+    body: Dict[str, Any] = {
+        "model": state["modelo_gpt"],
+        "messages": convert_to_openai_messages(prompt.format_messages(**entradas)),
+    }
+    if supports_temperature(state["modelo_gpt"]):
+        body["temperature"] = 0.1
+    if state.get("salida_estructurada") and _backend(state).soporta_salida_estructurada:
+        body["response_format"] = (
+            FORMATO_RESPUESTA_COMPACTA if protocolo == PROTOCOLO_COMPACTO else FORMATO_RESPUESTA
+        )
+    return preparacion, body
+
+
+async def codificar_desde_lote(
+    state: EstadoCodificacion,
+    preparacion: Dict[str, Any],
+    respuesta_llm: Optional[Any],
+) -> Dict[str, Any]:
+    """
+    Equivalente de nodo_codificar_combinado con el resultado de la API de lotes.
+    
+    Si la solicitud del batch falló en el lote, o su salida es inválida o está
+    truncada, el batch se vuelve a codificar en modo interactivo (con división
+    del batch si hace falta).
+    
+    Args:
+        state: Estado del batch (el mismo usado en preparar_solicitud_lote)
+        preparacion: Preparación devuelta por preparar_solicitud_lote
+        respuesta_llm: Mensaje del resultado del lote (None si la solicitud falló)
+        
+    Returns:
+        Actualización del estado, como la de nodo_codificar_combinado
+    """
+    if not preparacion["respuestas"]:
+        return _estado_sin_respuestas(state, preparacion)
+    
+    metricas = _metricas_vacias()
+    prompt_tokens = completion_tokens = 0
+    resultado: Optional[Dict[str, Any]] = {"validaciones": [], "evaluaciones": [], "analisis": []}
+    respuestas_llm = preparacion["respuestas_llm"]
+    if respuestas_llm:
+        resultado = None
+        if respuesta_llm is not None:
+            prompt_tokens, completion_tokens, _total = extraer_tokens(respuesta_llm)
+            metricas["cached_tokens"] += extraer_tokens_cacheados(respuesta_llm)
+            try:
+                resultado = _parsear_salida(
+                    respuesta_llm, bool(state.get("salida_estructurada")), metricas, _protocolo(state)
+                )
+            except ErrorSalidaLLM as e:
+                print(f"   ⚠️  Salida del lote inválida: {str(e)[:200]}")
+        if resultado is None:
+            print(f"   🔁 Recodificando {len(respuestas_llm)} respuestas en modo interactivo")
+            resultado, pt, ct = await _codificar_con_biseccion(
+                state, preparacion["contexto"], respuestas_llm, preparacion["codigo_base"], metricas
+            )
+            prompt_tokens += pt
+            completion_tokens += ct
+    
+    return _completar_codificacion(state, preparacion, resultado, prompt_tokens, completion_tokens, metricas)
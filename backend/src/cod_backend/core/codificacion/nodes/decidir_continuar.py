@@ -2,9 +2,10 @@
 Nodo del grafo: Decidir si continuar con el siguiente batch.
 """
 from ..graph.state import EstadoCodificacion
+from ..utils import rango_batch
 
 
-def decidir_continuar(state: EstadoCodificacion) -> str:
+async def decidir_continuar(state: EstadoCodificacion) -> str:
     """
     Decide si continuar procesando más batches o finalizar.
     
@@ -16,7 +17,7 @@ def decidir_continuar(state: EstadoCodificacion) -> str:
     """
     # batch_actual ya fue incrementado en el nodo finalizar
     # Verificar si hay más respuestas por procesar
-    inicio_siguiente = state["batch_actual"] * state["batch_size"]
+    inicio_siguiente, _fin = rango_batch(state, state["batch_actual"])
     hay_mas = inicio_siguiente < len(state["respuestas"])
     
     if hay_mas:
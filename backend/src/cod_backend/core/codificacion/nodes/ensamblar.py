@@ -4,159 +4,116 @@ Nodo del grafo: Ensamblar resultados del batch.
 Combina validaciones, evaluaciones y cobertura en codificaciones finales,
 y realiza validación y deduplicación de códigos nuevos.
 """
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, List, Set, Tuple
 
 from ..graph.state import EstadoCodificacion
 from ...utils import (
-    normalizar_texto,
     normalizar_marca_nombre,
     es_marca_o_nombre_propio,
 )
+from ..utils import (
+    actualizar_codigos_recientes,
+    clave_concepto,
+    determinar_categoria_respuesta,
+    renderizar_codigos_existentes,
+)
 
 
-def _determinar_categoria_respuesta(
-    resp: Dict[str, Any],
-    state: EstadoCodificacion
-) -> Optional[str]:
-    """
-    Determina la categoría de una respuesta basándose en config_auxiliar.
-    
-    Args:
-        resp: Respuesta del batch
-        state: Estado actual del grafo
-        
-    Returns:
-        Categoría ("negativa", "neutral", "positiva") o None
-    """
-    categoria_resp: Optional[str] = None
-    config_auxiliar = state.get("config_auxiliar")
-    if config_auxiliar and config_auxiliar.get("usar", False):
-        categorizacion = config_auxiliar.get("categorizacion", {})
-        dato_aux = resp.get("dato_auxiliar")
-        if dato_aux:
-            if dato_aux in categorizacion.get("negativas", []):
-                categoria_resp = "negativa"
-            elif dato_aux in categorizacion.get("neutrales", []):
-                categoria_resp = "neutral"
-            elif dato_aux in categorizacion.get("positivas", []):
-                categoria_resp = "positiva"
-    return categoria_resp
+def _decision(codigos_hist: List[int], codigos_nuevos: List[Dict[str, Any]]) -> str:
+    """Decisión de una respuesta válida según los códigos asignados."""
+    if codigos_hist and codigos_nuevos:
+        return "mixto"
+    if codigos_hist:
+        return "historico"
+    if codigos_nuevos:
+        return "nuevo"
+    return "rechazar"
 
 
 def _validar_y_deduplicar_codigos(
     codificaciones_batch: List[Dict[str, Any]],
     state: EstadoCodificacion
-) -> List[Dict[str, Any]]:
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
     """
-    Valida y deduplica códigos nuevos del batch.
+    Valida y deduplica códigos nuevos del batch contra el índice de conceptos.
+    
+    Un concepto ya indexado reutiliza su código: si es del catálogo histórico
+    pasa a `codigos_historicos`; si lo creó un batch anterior se asigna ese
+    código. Los conceptos repetidos dentro del batch comparten el código de su
+    primera aparición. Solo los conceptos que crea el batch consumen números,
+    en orden desde `proximo_codigo_nuevo` (o desde el código más alto del
+    índice, si lo supera), así que la numeración no deja huecos ni repite un
+    código existente. Dentro de una respuesta cada concepto aparece una vez.
     
     Args:
         codificaciones_batch: Lista de codificaciones del batch
-        state: Estado actual del grafo
+        state: Estado actual del grafo (con indice_conceptos, catalogo y
+            proximo_codigo_nuevo)
         
     Returns:
-        Lista de codificaciones con códigos validados y deduplicados
+        Tupla con (codificaciones del batch, conceptos nuevos aceptados para
+        el índice: clave -> código)
     """
-    codigos_nuevos_batch: List[Dict[str, Any]] = []
-    for cod in codificaciones_batch:
-        codigos_nuevos_batch.extend(cod.get("codigos_nuevos", []))
-    
-    if not codigos_nuevos_batch:
-        return codificaciones_batch
-    
-    # Recopilar todos los códigos existentes (históricos + batches anteriores)
-    codigos_existentes_map: Dict[str, int] = {}  # desc_normalizada -> codigo
-    
-    # Del catálogo histórico
-    for cat_item in state.get("catalogo", []):
-        desc = cat_item.get("descripcion", "")
-        if desc:
-            desc_norm = normalizar_texto(desc)
-            codigos_existentes_map[desc_norm] = cat_item.get("codigo")
-    
-    # De batches anteriores
-    for cod_prev in state.get("codificaciones", []):
-        for nuevo_prev in cod_prev.get("codigos_nuevos", []):
-            desc = nuevo_prev.get("descripcion", "")
-            if desc:
-                desc_norm = normalizar_texto(desc)
-                codigos_existentes_map[desc_norm] = nuevo_prev.get("codigo")
-    
-    # Validar y deduplicar códigos nuevos del batch actual
-    codigos_vistos_batch: Dict[str, Dict[str, Any]] = {}  # desc_normalizada -> código_info
-    duplicados_encontrados = 0
-    
-    for cod_nuevo in codigos_nuevos_batch:
-        desc = cod_nuevo.get("descripcion", "")
-        if not desc:
-            continue
-        
-        desc_norm = normalizar_texto(desc)
-        
-        # Verificar si ya existe en catálogo histórico o batches anteriores
-        if desc_norm in codigos_existentes_map:
-            codigo_existente = codigos_existentes_map[desc_norm]
-            print(f"   ⚠️  Duplicado detectado: '{desc}' ya existe como código {codigo_existente}")
-            duplicados_encontrados += 1
-            continue
-        
-        # Verificar si ya existe en este batch
-        if desc_norm in codigos_vistos_batch:
-            codigo_existente_batch = codigos_vistos_batch[desc_norm].get("codigo")
-            print(f"   ⚠️  Duplicado en batch: '{desc}' ya fue creado como código {codigo_existente_batch}")
-            duplicados_encontrados += 1
-            continue
-        
-        # Para marcas/nombres propios, normalizar la descripción
-        if es_marca_o_nombre_propio(desc):
-            desc_normalizada = normalizar_marca_nombre(desc)
-            cod_nuevo["descripcion"] = desc_normalizada
-            desc_norm = normalizar_texto(desc_normalizada)
-        
-        codigos_vistos_batch[desc_norm] = cod_nuevo
-    
-    if duplicados_encontrados > 0:
-        print(f"   ⚠️  {duplicados_encontrados} códigos duplicados detectados y eliminados")
+    conceptos_batch: Dict[str, int] = {}
+    if not any(cod.get("codigos_nuevos") for cod in codificaciones_batch):
+        return codificaciones_batch, conceptos_batch
     
-    # Crear mapeo de códigos originales a códigos validados
-    mapeo_codigos_validos: Dict[int, Dict[str, Any]] = {}  # codigo_original -> codigo_validado
+    indice = state.get("indice_conceptos") or {}
+    codigos_catalogo: Set[int] = {c.get("codigo") for c in state.get("catalogo", [])}
+    codigo_validado: Dict[int, Dict[str, Any]] = {}  # código -> código nuevo del batch (primera aparición)
+    siguiente = max([state.get("proximo_codigo_nuevo", 1), *(codigo + 1 for codigo in indice.values() if isinstance(codigo, int))])
+    reutilizados = 0
     
-    for cod_nuevo in codigos_nuevos_batch:
-        desc = cod_nuevo.get("descripcion", "")
-        if not desc:
-            continue
-        desc_norm = normalizar_texto(desc)
-        codigo_orig = cod_nuevo.get("codigo")
-        
-        # Si el código está en codigos_vistos_batch, significa que es válido y único
-        if desc_norm in codigos_vistos_batch:
-            mapeo_codigos_validos[codigo_orig] = codigos_vistos_batch[desc_norm]
-    
-    # Actualizar códigos nuevos en codificaciones_batch con los validados
     for cod in codificaciones_batch:
-        codigos_nuevos_validados = []
-        codigos_ya_agregados: Set[str] = set()  # Para evitar duplicados dentro de la misma respuesta
+        if not cod.get("codigos_nuevos"):
+            continue
+        codigos_hist = list(cod.get("codigos_historicos", []))
+        codigos_nuevos_validados: List[Dict[str, Any]] = []
+        claves_respuesta: Set[str] = set()
         
-        for cod_nuevo in cod.get("codigos_nuevos", []):
-            codigo_orig = cod_nuevo.get("codigo")
+        for cod_nuevo in cod["codigos_nuevos"]:
+            desc = cod_nuevo.get("descripcion", "")
+            clave = clave_concepto(desc)
+            if not clave:
+                continue
+            
+            # Las marcas/nombres propios se guardan con su forma normalizada
+            if es_marca_o_nombre_propio(desc):
+                desc = normalizar_marca_nombre(desc)
+            
+            if clave in indice:
+                codigo = indice[clave]
+                reutilizados += 1
+            elif clave in conceptos_batch:
+                codigo = conceptos_batch[clave]
+            else:
+                codigo = conceptos_batch[clave] = siguiente
+                siguiente += 1
+                codigo_validado[codigo] = {**cod_nuevo, "codigo": codigo, "descripcion": desc}
             
-            # Si el código está en el mapeo de válidos, usarlo
-            if codigo_orig in mapeo_codigos_validos:
-                codigo_validado = mapeo_codigos_validos[codigo_orig]
-                desc_validada = codigo_validado.get("descripcion", "")
-                desc_norm = normalizar_texto(desc_validada)
-                
-                # Solo agregar si no lo hemos agregado ya (evitar duplicados en misma respuesta)
-                if desc_norm not in codigos_ya_agregados:
-                    codigos_nuevos_validados.append(codigo_validado)
-                    codigos_ya_agregados.add(desc_norm)
+            if codigo in codigos_catalogo:
+                if codigo not in codigos_hist:
+                    codigos_hist.append(codigo)
+                continue
+            if clave in claves_respuesta:
+                continue
+            claves_respuesta.add(clave)
+            codigos_nuevos_validados.append(
+                codigo_validado.get(codigo) or {**cod_nuevo, "codigo": codigo, "descripcion": desc}
+            )
         
+        cod["codigos_historicos"] = codigos_hist
         cod["codigos_nuevos"] = codigos_nuevos_validados
+        if cod.get("decision") != "rechazar":
+            cod["decision"] = _decision(codigos_hist, codigos_nuevos_validados)
+    
+    if reutilizados:
+        print(f"   ♻️  {reutilizados} conceptos ya existentes reutilizaron su código")
     
-    return codificaciones_batch
+    return codificaciones_batch, conceptos_batch
 
 
-def nodo_ensamblar(state: EstadoCodificacion) -> EstadoCodificacion:
+async def nodo_ensamblar(state: EstadoCodificacion) -> Dict[str, Any]:
     """
     Ensambla los resultados del batch en codificaciones finales.
     
@@ -164,18 +121,26 @@ def nodo_ensamblar(state: EstadoCodificacion) -> EstadoCodificacion:
         state: Estado actual del grafo
         
     Returns:
-        Estado actualizado con codificaciones del batch agregadas
+        Actualización del estado con las codificaciones del batch y sus
+        conceptos nuevos (los reductores de los canales los agregan) y, si
+        el batch creó códigos, el próximo código nuevo, la ventana de
+        códigos recientes y su sección del prompt
     """
     print("\n🔧 Ensamblando resultados...")
     
     codificaciones_batch: List[Dict[str, Any]] = []
     
-    for i, (resp, val) in enumerate(
-        zip(state["batch_respuestas"], state["validaciones_batch"])
-    ):
+    # Resultados del batch indexados por respuesta_id (una pasada por sección)
+    validaciones = {v["respuesta_id"]: v for v in state["validaciones_batch"]}
+    evaluaciones = {ev["respuesta_id"]: ev for ev in state["evaluaciones_batch"]}
+    coberturas = {c["respuesta_id"]: c for c in state["cobertura_batch"]}
+    respuestas_especiales = state.get("respuestas_especiales", {})
+    
+    for i, resp in enumerate(state["batch_respuestas"]):
         resp_id = i + 1
+        val = validaciones.get(resp_id)
         
-        if not val["es_valida"]:
+        if val is None or not val["es_valida"]:
             codificaciones_batch.append({
                 "fila_excel": resp["fila_excel"],
                 "texto": resp["texto"],
@@ -187,27 +152,21 @@ def nodo_ensamblar(state: EstadoCodificacion) -> EstadoCodificacion:
             continue
         
         # Determinar categoría a partir de config_auxiliar y dato_auxiliar de la respuesta
-        categoria_resp = _determinar_categoria_respuesta(resp, state)
+        categoria_resp = determinar_categoria_respuesta(resp, state.get("config_auxiliar"))
         
-        codigo_especial = state.get("respuestas_especiales", {}).get(resp_id)
+        codigo_especial = respuestas_especiales.get(resp_id)
         if codigo_especial:
             codigos_hist = [codigo_especial]
             codigos_nuevos: List[Dict[str, Any]] = []
             decision = "historico"
         else:
-            evaluacion = next(
-                (ev for ev in state["evaluaciones_batch"] if ev["respuesta_id"] == resp_id),
-                {"evaluaciones": []},
-            )
+            evaluacion = evaluaciones.get(resp_id, {"evaluaciones": []})
             codigos_hist = [
                 c["codigo"]
                 for c in evaluacion.get("evaluaciones", [])
                 if c["aplica"] and c["confianza"] >= 0.85
             ]
-            cobertura = next(
-                (c for c in state["cobertura_batch"] if c["respuesta_id"] == resp_id),
-                {"conceptos_nuevos": []},
-            )
+            cobertura = coberturas.get(resp_id, {"conceptos_nuevos": []})
             codigos_nuevos = [
                 {
                     "codigo": c["codigo"],
@@ -216,14 +175,7 @@ def nodo_ensamblar(state: EstadoCodificacion) -> EstadoCodificacion:
                 }
                 for c in cobertura.get("conceptos_nuevos", [])
             ]
-            if codigos_hist and codigos_nuevos:
-                decision = "mixto"
-            elif codigos_hist:
-                decision = "historico"
-            elif codigos_nuevos:
-                decision = "nuevo"
-            else:
-                decision = "rechazar"
+            decision = _decision(codigos_hist, codigos_nuevos)
         
         codificaciones_batch.append({
             "fila_excel": resp["fila_excel"],
@@ -236,7 +188,7 @@ def nodo_ensamblar(state: EstadoCodificacion) -> EstadoCodificacion:
         })
     
     # Validar y deduplicar códigos nuevos
-    codificaciones_batch = _validar_y_deduplicar_codigos(codificaciones_batch, state)
+    codificaciones_batch, conceptos_batch = _validar_y_deduplicar_codigos(codificaciones_batch, state)
     
     decisiones: Dict[str, int] = {}
     for cod in codificaciones_batch:
@@ -245,8 +197,25 @@ def nodo_ensamblar(state: EstadoCodificacion) -> EstadoCodificacion:
     
     print(f"   📊 Decisiones: {decisiones}")
     
-    return {
-        **state,
-        "codificaciones": state["codificaciones"] + codificaciones_batch,
+    actualizacion: Dict[str, Any] = {
+        "codificaciones": codificaciones_batch,
+        "indice_conceptos": conceptos_batch,
     }
+    if conceptos_batch:
+        actualizacion["proximo_codigo_nuevo"] = max(conceptos_batch.values()) + 1
+    
+    # Códigos creados por el batch: actualizar la ventana y la sección del prompt
+    codigos_creados = set(conceptos_batch.values())
+    creados = {
+        c["codigo"]: c["descripcion"]
+        for cod in codificaciones_batch
+        for c in cod["codigos_nuevos"]
+        if c.get("codigo") in codigos_creados and c.get("descripcion")
+    }
+    if creados:
+        recientes = actualizar_codigos_recientes(state.get("codigos_recientes") or {}, creados)
+        actualizacion["codigos_recientes"] = recientes
+        actualizacion["seccion_codigos_existentes"] = renderizar_codigos_existentes(recientes)
+    
+    return actualizacion
 
@@ -1,10 +1,13 @@
 """
 Nodo del grafo: Preparar batch de respuestas.
 """
+from typing import Any, Dict
+
 from ..graph.state import EstadoCodificacion
+from ..utils import rango_batch
 
 
-def nodo_preparar_batch(state: EstadoCodificacion) -> EstadoCodificacion:
+async def nodo_preparar_batch(state: EstadoCodificacion) -> Dict[str, Any]:
     """
     Prepara el siguiente batch de respuestas para procesar.
     
@@ -12,11 +15,10 @@ def nodo_preparar_batch(state: EstadoCodificacion) -> EstadoCodificacion:
         state: Estado actual del grafo
         
     Returns:
-        Estado actualizado con el batch de respuestas preparado
+        Actualización del estado con el batch de respuestas preparado
     """
-    inicio = state["batch_actual"] * state["batch_size"]
-    fin = inicio + state["batch_size"]
+    inicio, fin = rango_batch(state, state["batch_actual"])
     batch = state["respuestas"][inicio:fin]
     print(f"\n📦 Preparando batch {state['batch_actual'] + 1}: filas {inicio + 1} a {min(fin, len(state['respuestas']))} de {len(state['respuestas'])}")
-    return {**state, "batch_respuestas": batch}
+    return {"batch_respuestas": batch}
 
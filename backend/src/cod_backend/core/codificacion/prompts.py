@@ -1,7 +1,14 @@
 """
 Utilidades para cargar prompts desde archivos.
+
+Los prompts se leen de disco y se compilan a `ChatPromptTemplate` una sola vez;
+los nodos obtienen la plantilla ya compilada desde el registro en memoria.
 """
+import hashlib
 from pathlib import Path
+from typing import Dict
+
+from langchain_core.prompts import ChatPromptTemplate
 
 PROMPTS_DIR = Path(__file__).parent.parent.parent / "prompts" / "codificacion_nueva"
 
@@ -19,3 +26,54 @@ def load_prompt(nombre: str) -> str:
     ruta = PROMPTS_DIR / f"{nombre}.md"
     return ruta.read_text(encoding="utf-8")
 
+
+
+_prompts_compilados: Dict[str, ChatPromptTemplate] = {}
+_versiones_prompt: Dict[str, str] = {}
+
+
+def obtener_prompt(nombre: str) -> ChatPromptTemplate:
+    """
+    Devuelve el prompt compilado como ChatPromptTemplate (cacheado en memoria).
+    
+    Args:
+        nombre: Nombre del prompt (sin extensión .md)
+        
+    Returns:
+        Plantilla de chat con el prompt como mensaje de sistema
+    """
+    prompt = _prompts_compilados.get(nombre)
+    if prompt is None:
+        prompt = ChatPromptTemplate.from_messages([("system", load_prompt(nombre))])
+        _prompts_compilados[nombre] = prompt
+    return prompt
+
+
+def precargar_prompts() -> int:
+    """
+    Compila todos los prompts .md disponibles (se llama al iniciar el servidor).
+    
+    Returns:
+        Número de prompts compilados
+    """
+    for ruta in sorted(PROMPTS_DIR.glob("*.md")):
+        obtener_prompt(ruta.stem)
+    return len(_prompts_compilados)
+
+
+def version_prompt(nombre: str) -> str:
+    """
+    Versión del prompt derivada de su contenido (cambia si se edita el .md).
+    
+    Args:
+        nombre: Nombre del prompt (sin extensión .md)
+        
+    Returns:
+        Hash corto del contenido del prompt
+    """
+    version = _versiones_prompt.get(nombre)
+    if version is None:
+        version = hashlib.sha256(load_prompt(nombre).encode("utf-8")).hexdigest()[:12]
+        _versiones_prompt[nombre] = version
+    return version
+
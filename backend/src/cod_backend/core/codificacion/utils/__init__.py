@@ -1,11 +1,44 @@
 """
 Utilidades para el proceso de codificación.
 """
-from .batch_size import calcular_batch_size_optimo
-from .categoria import detectar_categoria_desde_texto
+from .batch_size import empaquetar_batches, rango_batch
+from .categoria import detectar_categoria_desde_texto, determinar_categoria_respuesta
+from .codigos_recientes import (
+    MAX_CODIGOS_EXISTENTES,
+    SIN_CODIGOS_EXISTENTES,
+    actualizar_codigos_recientes,
+    renderizar_codigos_existentes,
+)
+from .conceptos import asignar_codigos_creados, clave_concepto, crear_indice_conceptos
+from .fusion import fusionar_codigos_nuevos
+from .duplicados import colapsar_duplicados, expandir_duplicados
+from .similares import agrupar_similares
+from .indice_catalogo import (
+    IndiceCatalogo,
+    PreclasificadorLexico,
+    evaluar_preclasificador,
+    obtener_indice_catalogo,
+)
 
 __all__ = [
-    "calcular_batch_size_optimo",
+    "empaquetar_batches",
+    "rango_batch",
     "detectar_categoria_desde_texto",
+    "determinar_categoria_respuesta",
+    "MAX_CODIGOS_EXISTENTES",
+    "SIN_CODIGOS_EXISTENTES",
+    "actualizar_codigos_recientes",
+    "renderizar_codigos_existentes",
+    "asignar_codigos_creados",
+    "clave_concepto",
+    "crear_indice_conceptos",
+    "fusionar_codigos_nuevos",
+    "colapsar_duplicados",
+    "expandir_duplicados",
+    "agrupar_similares",
+    "IndiceCatalogo",
+    "PreclasificadorLexico",
+    "evaluar_preclasificador",
+    "obtener_indice_catalogo",
 ]
 
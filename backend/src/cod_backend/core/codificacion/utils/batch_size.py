@@ -1,48 +1,86 @@
 """
-Utilidades para calcular el tamaño óptimo de batches.
+Utilidades para calcular el tamaño de los batches.
+
+El codificador arma los batches por presupuesto de tokens (empaquetar_batches):
+los límites de cada batch quedan en el estado (`limites_batches`) y los nodos
+los leen con rango_batch (sin límites en el estado, batches de `batch_size`).
 """
+from typing import Any, List, Mapping, Tuple
+
+# Una respuesta que ocupa más de esta fracción del espacio para respuestas va sola en su batch
+FRACCION_RESPUESTA_LARGA = 0.5
 
 
-def calcular_batch_size_optimo(
-    total_respuestas: int,
-    tamanio_catalogo: int = 0,
-    modelo: str = "gpt-4o-mini"
-) -> int:
+def empaquetar_batches(
+    tokens_respuestas: List[int],
+    presupuesto_tokens: int,
+    tokens_fijos: int,
+    tokens_salida_por_respuesta: int,
+    max_tokens_salida: int,
+    max_respuestas: int,
+) -> List[int]:
     """
-    Calcula un batch_size óptimo basado en el tamaño de los datos.
+    Agrupa respuestas consecutivas en batches que llenan un presupuesto de tokens.
     
-    Para modelos con contexto grande (gpt-4o, gpt-4-turbo): batch_size más grande
-    Para modelos con contexto limitado (gpt-4o-mini): batch_size más conservador
+    Cada llamada cuesta `tokens_fijos` (instrucciones, catálogo, códigos ya
+    creados) más, por respuesta, sus tokens y la salida esperada. Cada batch se
+    llena hasta el presupuesto sin pasar de `max_tokens_salida` de salida
+    esperada ni de `max_respuestas`. Una respuesta muy larga (más de
+    FRACCION_RESPUESTA_LARGA del espacio para respuestas) va sola en su batch.
+    Si los tokens fijos ya llenan el presupuesto se avisa y cada respuesta va
+    en su propia llamada.
     
     Args:
-        total_respuestas: Número total de respuestas a procesar
-        tamanio_catalogo: Número de códigos en el catálogo histórico
-        modelo: Modelo GPT a usar
+        tokens_respuestas: Tokens de cada respuesta, en orden
+        presupuesto_tokens: Tokens objetivo por llamada (prompt + salida)
+        tokens_fijos: Tokens del prompt que no dependen de las respuestas
+        tokens_salida_por_respuesta: Tokens de salida esperados por respuesta
+        max_tokens_salida: Salida esperada máxima por batch
+        max_respuestas: Respuestas por batch como máximo
         
     Returns:
-        batch_size recomendado (entre 5 y 20)
+        Límites de los batches: el batch i son las respuestas
+        [limites[i], limites[i + 1])
     """
-    # Modelos con contexto grande pueden manejar batches más grandes
-    modelos_grandes = ["gpt-4o", "gpt-4-turbo", "gpt-4", "o1"]
-    es_modelo_grande = any(m in modelo.lower() for m in modelos_grandes)
-    
-    # Batch size base según el modelo
-    if es_modelo_grande:
-        batch_base = 15  # Modelos grandes pueden manejar más
-    else:
-        batch_base = 10  # Modelos pequeños más conservador
-    
-    # Ajustar según el tamaño del catálogo
-    # Catálogos muy grandes reducen el espacio disponible para respuestas
-    if tamanio_catalogo > 100:
-        batch_base = max(5, batch_base - 3)
-    elif tamanio_catalogo > 50:
-        batch_base = max(7, batch_base - 2)
+    if tokens_respuestas and tokens_fijos >= presupuesto_tokens:
+        print(
+            f"⚠️  El prompt fijo ({tokens_fijos} tokens: instrucciones, catálogo y códigos creados) "
+            f"no deja espacio en el presupuesto por llamada ({presupuesto_tokens}): se enviará una "
+            f"respuesta por llamada. Sube tokens_por_batch o baja catalogo_max_tokens."
+        )
+    espacio = max(presupuesto_tokens - tokens_fijos, 1)
+    tope = max(1, min(max_respuestas, max_tokens_salida // max(tokens_salida_por_respuesta, 1)))
+    limites = [0]
+    usados = cantidad = 0
+    for indice, tokens in enumerate(tokens_respuestas):
+        costo = tokens + tokens_salida_por_respuesta
+        larga = costo > espacio * FRACCION_RESPUESTA_LARGA
+        if cantidad and (larga or usados + costo > espacio or cantidad >= tope):
+            limites.append(indice)
+            usados = cantidad = 0
+        usados += costo
+        cantidad += 1
+        if larga:
+            limites.append(indice + 1)
+            usados = cantidad = 0
+    if limites[-1] < len(tokens_respuestas):
+        limites.append(len(tokens_respuestas))
+    return limites
+
+
+def rango_batch(state: Mapping[str, Any], indice: int) -> Tuple[int, int]:
+    """
+    Rango [inicio, fin) de las respuestas del batch `indice`.
     
-    # Para datasets muy grandes (1000+), mantener batch_size razonable
-    # para evitar que los códigos existentes crezcan demasiado
-    if total_respuestas > 1000:
-        batch_base = min(batch_base, 12)  # Limitar a 12 para datasets grandes
+    Usa `limites_batches` del estado si existen; si no, batches de `batch_size`.
     
-    return batch_base
-
+    Returns:
+        Tupla con (inicio, fin); inicio >= total de respuestas si no hay más batches
+    """
+    limites = state.get("limites_batches")
+    if limites:
+        if indice + 1 >= len(limites):
+            return limites[-1], limites[-1]
+        return limites[indice], limites[indice + 1]
+    inicio = indice * state["batch_size"]
+    return inicio, inicio + state["batch_size"]
@@ -1,7 +1,7 @@
 """
 Utilidades para detectar y manejar categorías de códigos.
 """
-from typing import Optional
+from typing import Any, Dict, Optional
 from ...utils import normalizar_texto
 
 
@@ -36,3 +36,30 @@ def detectar_categoria_desde_texto(texto: str) -> Optional[str]:
     
     return None
 
+
+def determinar_categoria_respuesta(
+    resp: Dict[str, Any],
+    config_auxiliar: Optional[Dict[str, Any]]
+) -> Optional[str]:
+    """
+    Determina la categoría de una respuesta basándose en config_auxiliar.
+    
+    Args:
+        resp: Respuesta (con dato_auxiliar opcional)
+        config_auxiliar: Configuración de dato auxiliar del proceso
+        
+    Returns:
+        Categoría ("negativa", "neutral", "positiva") o None
+    """
+    categoria_resp: Optional[str] = None
+    if config_auxiliar and config_auxiliar.get("usar", False):
+        categorizacion = config_auxiliar.get("categorizacion", {})
+        dato_aux = resp.get("dato_auxiliar")
+        if dato_aux:
+            if dato_aux in categorizacion.get("negativas", []):
+                categoria_resp = "negativa"
+            elif dato_aux in categorizacion.get("neutrales", []):
+                categoria_resp = "neutral"
+            elif dato_aux in categorizacion.get("positivas", []):
+                categoria_resp = "positiva"
+    return categoria_resp
@@ -0,0 +1,62 @@
+"""
+Ventana de códigos nuevos recientes para el prompt.
+
+El prompt de cada batch muestra los códigos nuevos ya creados en batches
+anteriores (los últimos MAX_CODIGOS_EXISTENTES por número de código). En lugar
+de recorrer todas las codificaciones del trabajo en cada batch, el estado
+guarda la ventana acotada de códigos y la sección ya renderizada; ensamblar
+las actualiza solo cuando el batch creó códigos.
+"""
+from typing import Dict
+
+# Máximo de códigos existentes en el prompt
+MAX_CODIGOS_EXISTENTES = 150
+
+SIN_CODIGOS_EXISTENTES = "No hay códigos nuevos creados en batches anteriores."
+
+
+def actualizar_codigos_recientes(
+    recientes: Dict[int, str],
+    nuevos: Dict[int, str],
+    maximo: int = MAX_CODIGOS_EXISTENTES,
+) -> Dict[int, str]:
+    """
+    Agrega códigos creados a la ventana y conserva los `maximo` más altos.
+
+    Los códigos nuevos se numeran en orden creciente, así que los más altos
+    son los más recientes. El costo depende de la ventana (acotada) y de los
+    códigos agregados, no del largo del trabajo.
+
+    Args:
+        recientes: Ventana actual (código -> descripción)
+        nuevos: Códigos creados por el batch (código -> descripción)
+        maximo: Tamaño de la ventana
+
+    Returns:
+        Ventana nueva (no modifica `recientes`)
+    """
+    ventana = {**recientes, **nuevos}
+    if len(ventana) > maximo:
+        ventana = dict(sorted(ventana.items())[-maximo:])
+    return ventana
+
+
+def renderizar_codigos_existentes(recientes: Dict[int, str]) -> str:
+    """
+    Sección del prompt con los códigos nuevos ya creados.
+
+    Args:
+        recientes: Ventana de códigos (código -> descripción)
+
+    Returns:
+        Texto de la sección (SIN_CODIGOS_EXISTENTES si la ventana está vacía)
+    """
+    if not recientes:
+        return SIN_CODIGOS_EXISTENTES
+    texto = "\n**CÓDIGOS NUEVOS YA CREADOS EN BATCHES ANTERIORES:**\n"
+    for cid in sorted(recientes):
+        texto += f"  {cid}: {recientes[cid]}\n"
+    texto += "\n**IMPORTANTE:** Si encuentras un concepto similar a uno de estos, NO crees un código nuevo.\n"
+    if len(recientes) >= MAX_CODIGOS_EXISTENTES:
+        texto += f"\n**NOTA:** Se muestran solo los últimos {MAX_CODIGOS_EXISTENTES} códigos creados para mantener el prompt manejable.\n"
+    return texto
@@ -0,0 +1,82 @@
+"""
+Índice de conceptos del trabajo.
+
+Mapea la clave normalizada de cada concepto (las marcas y nombres propios con
+su forma canónica) a su código. Se arma una vez con el catálogo histórico y
+cada batch le agrega solo los códigos nuevos que aceptó, de modo que el
+filtrado y la deduplicación de conceptos nuevos consultan en O(1) en lugar de
+recorrer el catálogo y todas las codificaciones anteriores en cada batch.
+
+El índice es un dict de str a int para que el estado del grafo siga siendo
+serializable.
+"""
+from typing import Any, Dict, List, Tuple
+
+from ...utils import normalizar_texto, normalizar_marca_nombre, es_marca_o_nombre_propio
+
+
+def clave_concepto(desc: str) -> str:
+    """
+    Clave normalizada de un concepto (maneja marcas/nombres propios).
+
+    Args:
+        desc: Descripción del concepto
+
+    Returns:
+        Clave normalizada ("" si la descripción está vacía)
+    """
+    if not desc:
+        return ""
+    if es_marca_o_nombre_propio(desc):
+        return normalizar_texto(normalizar_marca_nombre(desc))
+    return normalizar_texto(desc)
+
+
+def crear_indice_conceptos(catalogo: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Índice inicial de un trabajo: los conceptos del catálogo histórico.
+
+    Args:
+        catalogo: Catálogo histórico ({"codigo", "descripcion"})
+
+    Returns:
+        Clave de concepto -> código
+    """
+    indice: Dict[str, int] = {}
+    for item in catalogo:
+        clave = clave_concepto(item.get("descripcion", ""))
+        if clave:
+            indice[clave] = item.get("codigo")
+    return indice
+
+
+def asignar_codigos_creados(
+    conceptos_batch: Dict[str, int],
+    indice: Dict[str, int],
+    proximo_codigo: int,
+) -> Tuple[Dict[int, int], Dict[str, int], int]:
+    """
+    Traduce los códigos provisionales de un batch concurrente a los del trabajo.
+
+    Los batches concurrentes numeran sus conceptos nuevos por separado. Al
+    terminar cada batch, un concepto que otro batch ya agregó al índice toma su
+    código, y el resto recibe el siguiente número del contador compartido.
+
+    Args:
+        conceptos_batch: Conceptos que creó el batch (clave -> código provisional)
+        indice: Índice compartido del trabajo (clave -> código)
+        proximo_codigo: Siguiente código libre del contador compartido
+
+    Returns:
+        Tupla con (código provisional -> código del trabajo, conceptos nuevos
+        para el índice, siguiente código libre)
+    """
+    mapa: Dict[int, int] = {}
+    nuevos: Dict[str, int] = {}
+    for clave, codigo in conceptos_batch.items():
+        if clave in indice:
+            mapa[codigo] = indice[clave]
+        else:
+            mapa[codigo] = nuevos[clave] = proximo_codigo
+            proximo_codigo += 1
+    return mapa, nuevos, proximo_codigo
@@ -0,0 +1,81 @@
+"""
+Colapso de respuestas duplicadas antes de armar los batches.
+
+En las encuestas muchas respuestas se repiten literalmente ("precio",
+"Buen servicio", ...). Solo se envía al grafo una respuesta representante
+por cada texto normalizado y, al terminar, sus códigos se replican en
+todas las filas del grupo.
+"""
+from typing import Any, Dict, List, Tuple
+
+from ...utils import normalizar_texto
+
+
+def _clave_duplicado(respuesta: Dict[str, Any]) -> Tuple[str, Any]:
+    """
+    Clave de agrupación de una respuesta.
+
+    Incluye el dato auxiliar porque determina la categoría de los códigos nuevos.
+    """
+    return normalizar_texto(str(respuesta.get("texto", ""))), respuesta.get("dato_auxiliar")
+
+
+def colapsar_duplicados(
+    respuestas: List[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], Dict[int, List[Dict[str, Any]]]]:
+    """
+    Agrupa las respuestas por texto normalizado y deja una representante por grupo.
+
+    Args:
+        respuestas: Respuestas cargadas del archivo (con fila_excel, texto, id)
+
+    Returns:
+        Tupla con (representantes en el orden original,
+        duplicados por fila_excel de la representante)
+    """
+    representantes: List[Dict[str, Any]] = []
+    representante_por_clave: Dict[Tuple[str, Any], int] = {}
+    duplicados: Dict[int, List[Dict[str, Any]]] = {}
+
+    for respuesta in respuestas:
+        clave = _clave_duplicado(respuesta)
+        fila_representante = representante_por_clave.get(clave)
+        if fila_representante is None:
+            representante_por_clave[clave] = respuesta["fila_excel"]
+            representantes.append(respuesta)
+        else:
+            duplicados.setdefault(fila_representante, []).append(respuesta)
+
+    return representantes, duplicados
+
+
+def expandir_duplicados(
+    codificaciones: List[Dict[str, Any]],
+    duplicados: Dict[int, List[Dict[str, Any]]],
+) -> List[Dict[str, Any]]:
+    """
+    Replica la codificación de cada representante en las filas de su grupo.
+
+    Args:
+        codificaciones: Codificaciones de las respuestas representantes
+        duplicados: Duplicados por fila_excel de la representante (colapsar_duplicados)
+
+    Returns:
+        Codificaciones de todas las filas, ordenadas por fila_excel
+    """
+    if not duplicados:
+        return codificaciones
+
+    expandidas: List[Dict[str, Any]] = []
+    for cod in codificaciones:
+        expandidas.append(cod)
+        for respuesta in duplicados.get(cod["fila_excel"], []):
+            expandidas.append({
+                **cod,
+                "fila_excel": respuesta["fila_excel"],
+                "texto": respuesta["texto"],
+                "codigos_historicos": list(cod["codigos_historicos"]),
+                "codigos_nuevos": [dict(n) for n in cod["codigos_nuevos"]],
+            })
+
+    return sorted(expandidas, key=lambda c: c["fila_excel"])
@@ -0,0 +1,87 @@
+"""
+Utilidades para fusionar resultados de batches ejecutados en paralelo.
+
+Cuando varios batches se codifican al mismo tiempo, todos parten del mismo
+`proximo_codigo_nuevo` y pueden proponer el mismo número para conceptos
+distintos (o números distintos para el mismo concepto). Este módulo
+renumera los códigos nuevos en el orden de los batches para que la
+numeración quede única y secuencial, igual que en la ejecución secuencial.
+"""
+from typing import Any, Dict, List, Tuple
+
+from .conceptos import clave_concepto, crear_indice_conceptos
+
+
+def fusionar_codigos_nuevos(
+    codificaciones_por_batch: List[List[Dict[str, Any]]],
+    proximo_codigo_nuevo: int,
+    catalogo: List[Dict[str, Any]] | None = None,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Concatena las codificaciones de varios batches y renumera sus códigos nuevos.
+
+    Los batches se recorren en su orden original. Cada concepto nuevo (por
+    descripción normalizada) recibe un único código, asignado de forma
+    secuencial desde `proximo_codigo_nuevo`. Si un concepto ya existe en el
+    catálogo histórico se reutiliza ese código y se mueve a `codigos_historicos`.
+
+    Args:
+        codificaciones_por_batch: Codificaciones de cada batch, en orden de batch
+        proximo_codigo_nuevo: Primer código disponible para conceptos nuevos
+        catalogo: Catálogo histórico (opcional) para detectar duplicados
+
+    Returns:
+        Tupla con (codificaciones_fusionadas, proximo_codigo_nuevo_actualizado)
+    """
+    codigos_catalogo = crear_indice_conceptos(catalogo or [])
+
+    codigo_por_concepto: Dict[str, int] = {}
+    siguiente = proximo_codigo_nuevo
+    fusionadas: List[Dict[str, Any]] = []
+
+    for codificaciones in codificaciones_por_batch:
+        for cod in codificaciones:
+            codigos_hist = list(cod.get("codigos_historicos", []))
+            codigos_nuevos: List[Dict[str, Any]] = []
+            vistos: set[int] = set()
+
+            for nuevo in cod.get("codigos_nuevos", []):
+                clave = clave_concepto(nuevo.get("descripcion", ""))
+                if not clave:
+                    continue
+
+                if clave in codigos_catalogo:
+                    codigo_hist = codigos_catalogo[clave]
+                    if codigo_hist not in codigos_hist:
+                        codigos_hist.append(codigo_hist)
+                    continue
+
+                if clave not in codigo_por_concepto:
+                    codigo_por_concepto[clave] = siguiente
+                    siguiente += 1
+
+                codigo_final = codigo_por_concepto[clave]
+                if codigo_final in vistos:
+                    continue
+                vistos.add(codigo_final)
+                codigos_nuevos.append({**nuevo, "codigo": codigo_final})
+
+            decision = cod.get("decision")
+            if decision != "rechazar":
+                if codigos_hist and codigos_nuevos:
+                    decision = "mixto"
+                elif codigos_hist:
+                    decision = "historico"
+                elif codigos_nuevos:
+                    decision = "nuevo"
+                else:
+                    decision = "rechazar"
+
+            fusionadas.append({
+                **cod,
+                "decision": decision,
+                "codigos_historicos": codigos_hist,
+                "codigos_nuevos": codigos_nuevos,
+            })
+
+    return fusionadas, siguiente
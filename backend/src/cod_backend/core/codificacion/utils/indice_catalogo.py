@@ -0,0 +1,344 @@
+"""
+Índice léxico local del catálogo histórico (TF-IDF sobre n-gramas de caracteres).
+
+Se construye una vez por ejecución a partir del catálogo cargado y permite:
+- Preclasificar respuestas que coinciden casi literalmente con un código del
+  catálogo ("Mala atención", "Precios altos") sin llamar al LLM.
+- Recuperar los códigos más relevantes para un batch de respuestas
+  (lista corta del catálogo dentro de un presupuesto de tokens).
+
+Los n-gramas de caracteres toleran errores de ortografía, plurales y
+diferencias de acentos. Todo es local (numpy, sin red).
+"""
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..llm.tokens import contar_tokens_lista
+from ...utils import normalizar_texto
+
+RANGO_NGRAMAS = (3, 5)
+# Índices de catálogo distintos que se mantienen en memoria (uno por trabajo activo)
+MAX_INDICES_EN_MEMORIA = 8
+
+_RE_PUNTUACION = re.compile(r"[^\w\s]")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+def _ngramas(texto: str, rango: Tuple[int, int] = RANGO_NGRAMAS) -> Counter:
+    """N-gramas de caracteres (con bordes de palabra) del texto normalizado."""
+    limpio = _RE_PUNTUACION.sub(" ", normalizar_texto(str(texto)))
+    limpio = " " + _RE_ESPACIOS.sub(" ", limpio).strip() + " "
+    conteo: Counter = Counter()
+    for n in range(rango[0], rango[1] + 1):
+        for i in range(len(limpio) - n + 1):
+            conteo[limpio[i:i + n]] += 1
+    return conteo
+
+
+class IndiceCatalogo:
+    """Índice TF-IDF de las descripciones del catálogo histórico."""
+
+    def __init__(self, catalogo: List[Dict[str, Any]], rango_ngramas: Tuple[int, int] = RANGO_NGRAMAS):
+        """
+        Construye el índice.
+
+        Args:
+            catalogo: Lista de códigos {"codigo", "descripcion"}
+            rango_ngramas: Largo mínimo y máximo de los n-gramas de caracteres
+        """
+        self.catalogo = catalogo
+        self.codigos = [c["codigo"] for c in catalogo]
+        self.rango_ngramas = rango_ngramas
+        # Tokens de cada línea del catálogo en el prompt, por modelo (se cuentan una vez)
+        self._tokens_lineas: Dict[Optional[str], List[int]] = {}
+
+        conteos = [_ngramas(c.get("descripcion", ""), rango_ngramas) for c in catalogo]
+        self.vocabulario: Dict[str, int] = {}
+        frecuencia_documentos: List[int] = []
+        for conteo in conteos:
+            for ngrama in conteo:
+                columna = self.vocabulario.get(ngrama)
+                if columna is None:
+                    self.vocabulario[ngrama] = len(frecuencia_documentos)
+                    frecuencia_documentos.append(1)
+                else:
+                    frecuencia_documentos[columna] += 1
+
+        total = len(catalogo)
+        self.idf = np.log((1 + total) / (1 + np.asarray(frecuencia_documentos, dtype=np.float32))) + 1
+        # Peso de los n-gramas que no aparecen en el catálogo (cuentan en la norma)
+        self.idf_desconocido = float(math.log(1 + total) + 1)
+
+        # Matriz n-gramas x códigos dispersa (CSR): los códigos y pesos del n-grama i
+        # están en [_inicios[i], _inicios[i + 1]); la memoria crece con los n-gramas
+        # de cada descripción, no con vocabulario x catálogo
+        filas_ngrama: List[np.ndarray] = []
+        codigos_ngrama: List[np.ndarray] = []
+        pesos_ngrama: List[np.ndarray] = []
+        for fila, conteo in enumerate(conteos):
+            columnas = np.fromiter((self.vocabulario[ngrama] for ngrama in conteo), dtype=np.int64, count=len(conteo))
+            pesos = np.fromiter(conteo.values(), dtype=np.float32, count=len(conteo)) * self.idf[columnas]
+            norma = float(np.linalg.norm(pesos)) or 1.0
+            filas_ngrama.append(columnas)
+            codigos_ngrama.append(np.full(len(columnas), fila, dtype=np.int32))
+            pesos_ngrama.append(pesos / norma)
+        filas = np.concatenate(filas_ngrama) if filas_ngrama else np.zeros(0, dtype=np.int64)
+        orden = np.argsort(filas, kind="stable")
+        self._codigos = (np.concatenate(codigos_ngrama) if codigos_ngrama else np.zeros(0, dtype=np.int32))[orden]
+        self._pesos = (np.concatenate(pesos_ngrama) if pesos_ngrama else np.zeros(0, dtype=np.float32))[orden]
+        self._inicios = np.zeros(len(self.vocabulario) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(filas, minlength=len(self.vocabulario)), out=self._inicios[1:])
+
+    def __len__(self) -> int:
+        return len(self.codigos)
+
+    def similitudes(self, texto: str) -> np.ndarray:
+        """
+        Similitud coseno entre un texto y cada código del catálogo.
+
+        Args:
+            texto: Texto de la respuesta
+
+        Returns:
+            Vector (len(catalogo),) con similitudes en [0, 1]
+        """
+        if not self.codigos:
+            return np.zeros(0, dtype=np.float32)
+        conteo = _ngramas(texto, self.rango_ngramas)
+        columnas: List[int] = []
+        pesos: List[float] = []
+        norma = 0.0
+        for ngrama, frecuencia in conteo.items():
+            columna = self.vocabulario.get(ngrama)
+            if columna is None:
+                norma += (frecuencia * self.idf_desconocido) ** 2
+                continue
+            peso = frecuencia * float(self.idf[columna])
+            norma += peso ** 2
+            columnas.append(columna)
+            pesos.append(peso)
+        if not columnas:
+            return np.zeros(len(self.codigos), dtype=np.float32)
+        vector = np.asarray(pesos, dtype=np.float32) / math.sqrt(norma)
+        # Posiciones de las entradas de los n-gramas del texto en la matriz dispersa
+        inicios = self._inicios[columnas]
+        largos = self._inicios[np.asarray(columnas) + 1] - inicios
+        desplazamientos = np.repeat(inicios - (np.cumsum(largos) - largos), largos)
+        posiciones = desplazamientos + np.arange(int(largos.sum()))
+        return np.bincount(
+            self._codigos[posiciones],
+            weights=np.repeat(vector, largos) * self._pesos[posiciones],
+            minlength=len(self.codigos),
+        ).astype(np.float32)
+
+    def similitudes_lote(self, textos: Sequence[str]) -> np.ndarray:
+        """
+        Similitudes de varios textos contra el catálogo.
+
+        Returns:
+            Matriz (len(textos), len(catalogo))
+        """
+        if not textos:
+            return np.zeros((0, len(self.codigos)), dtype=np.float32)
+        return np.vstack([self.similitudes(t) for t in textos])
+
+    def tokens_lineas(self, modelo: Optional[str] = None) -> List[int]:
+        """
+        Tokens de la línea de cada código en el prompt (con su salto de línea).
+
+        Se cuentan con contar_tokens_lista, igual que el empaquetado de batches.
+
+        Args:
+            modelo: Modelo cuya codificación se usa
+
+        Returns:
+            Tokens por código, en el orden del catálogo
+        """
+        tokens = self._tokens_lineas.get(modelo)
+        if tokens is None:
+            lineas = [f"  {c['codigo']}. {c.get('descripcion', '')}\n" for c in self.catalogo]
+            tokens = self._tokens_lineas[modelo] = contar_tokens_lista(lineas, modelo)
+        return tokens
+
+    def relevantes(
+        self, textos: Sequence[str], max_tokens: int, modelo: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Selecciona los códigos más relevantes para un grupo de respuestas.
+
+        Cada código se puntúa con su mejor similitud contra las respuestas y se
+        agregan en orden de puntaje mientras quepan en `max_tokens` (ver
+        tokens_lineas). Si el catálogo completo cabe en el presupuesto, se
+        devuelve completo.
+
+        Args:
+            textos: Textos de las respuestas del batch
+            max_tokens: Presupuesto de tokens para la sección del catálogo
+            modelo: Modelo cuya codificación se usa para contar los tokens
+
+        Returns:
+            Códigos seleccionados, en el orden original del catálogo
+        """
+        tokens = self.tokens_lineas(modelo)
+        if sum(tokens) <= max_tokens:
+            return self.catalogo
+
+        puntajes = (
+            self.similitudes_lote(textos).max(axis=0) if textos
+            else np.zeros(len(self.catalogo), dtype=np.float32)
+        )
+        elegidos: List[int] = []
+        usados = 0
+        for posicion in np.argsort(-puntajes, kind="stable"):
+            if usados + tokens[posicion] > max_tokens:
+                continue
+            usados += tokens[posicion]
+            elegidos.append(int(posicion))
+        return [self.catalogo[posicion] for posicion in sorted(elegidos)]
+
+
+_lock_indices = threading.Lock()
+_indices: "OrderedDict[str, IndiceCatalogo]" = OrderedDict()
+
+
+def obtener_indice_catalogo(catalogo: List[Dict[str, Any]], huella: str) -> IndiceCatalogo:
+    """
+    Devuelve el índice del catálogo, construyéndolo una sola vez por huella.
+
+    Args:
+        catalogo: Catálogo histórico del trabajo
+        huella: Huella del catálogo (huella_catalogo)
+
+    Returns:
+        Índice compartido entre los batches del trabajo
+    """
+    with _lock_indices:
+        indice = _indices.get(huella)
+        if indice is not None:
+            _indices.move_to_end(huella)
+            return indice
+    indice = IndiceCatalogo(catalogo)
+    with _lock_indices:
+        _indices[huella] = indice
+        while len(_indices) > MAX_INDICES_EN_MEMORIA:
+            _indices.popitem(last=False)
+    return indice
+
+
+class PreclasificadorLexico:
+    """
+    Asigna un código del catálogo sin LLM cuando la coincidencia léxica es clara.
+
+    Solo se asigna si la mejor similitud alcanza `umbral` y supera a la
+    segunda por al menos `margen` (evita elegir entre dos códigos parecidos).
+    """
+
+    def __init__(self, indice: IndiceCatalogo, umbral: float, margen: float):
+        self.indice = indice
+        self.umbral = umbral
+        self.margen = margen
+
+    def _mejores(self, texto: str) -> Tuple[Optional[int], float, float]:
+        """Devuelve (posición del mejor código, mejor similitud, segunda similitud)."""
+        similitudes = self.indice.similitudes(texto)
+        if similitudes.size == 0:
+            return None, 0.0, 0.0
+        if similitudes.size == 1:
+            return 0, float(similitudes[0]), 0.0
+        segunda, mejor = np.argpartition(similitudes, -2)[-2:]
+        if similitudes[segunda] > similitudes[mejor]:
+            segunda, mejor = mejor, segunda
+        return int(mejor), float(similitudes[mejor]), float(similitudes[segunda])
+
+    def clasificar(self, texto: str) -> Optional[Tuple[int, float]]:
+        """
+        Intenta codificar una respuesta.
+
+        Args:
+            texto: Texto de la respuesta
+
+        Returns:
+            Tupla (código, similitud) o None si la respuesta es ambigua
+        """
+        posicion, mejor, segunda = self._mejores(texto)
+        if posicion is None or mejor < self.umbral or mejor - segunda < self.margen:
+            return None
+        return self.indice.codigos[posicion], mejor
+
+    def calibrar(
+        self,
+        muestra: Iterable[Tuple[str, Iterable[int]]],
+        precision_objetivo: float = 0.98,
+        umbral_minimo: float = 0.5,
+    ) -> float:
+        """
+        Ajusta `umbral` al menor valor que alcanza la precisión objetivo en una muestra etiquetada.
+
+        Args:
+            muestra: Pares (texto, códigos correctos)
+            precision_objetivo: Precisión mínima exigida (0-1)
+            umbral_minimo: Umbral más bajo que se considera
+
+        Returns:
+            Umbral elegido (también queda en self.umbral)
+        """
+        candidatos: List[Tuple[float, bool]] = []
+        for texto, codigos in muestra:
+            posicion, mejor, segunda = self._mejores(texto)
+            if posicion is None or mejor < umbral_minimo or mejor - segunda < self.margen:
+                continue
+            candidatos.append((mejor, {self.indice.codigos[posicion]} == set(codigos)))
+
+        # Recorrer de mayor a menor similitud y quedarse con el umbral más bajo
+        # cuya precisión acumulada sigue sobre el objetivo
+        candidatos.sort(key=lambda c: c[0], reverse=True)
+        aciertos = 0
+        umbral = self.umbral
+        for total, (similitud, correcto) in enumerate(candidatos, start=1):
+            aciertos += correcto
+            if aciertos / total >= precision_objetivo:
+                umbral = similitud
+        self.umbral = umbral
+        return umbral
+
+
+def evaluar_preclasificador(
+    preclasificador: PreclasificadorLexico,
+    muestra: Iterable[Tuple[str, Iterable[int]]],
+) -> Dict[str, Any]:
+    """
+    Mide la tasa de asignación y la precisión del preclasificador en una muestra etiquetada.
+
+    Una asignación es correcta solo si el código asignado es exactamente el
+    conjunto de códigos etiquetado (si la respuesta lleva más códigos, saltarse
+    el LLM perdería información).
+
+    Args:
+        preclasificador: Preclasificador a evaluar
+        muestra: Pares (texto, códigos correctos)
+
+    Returns:
+        Diccionario con muestra, asignadas, aciertos, hit_rate y precision
+    """
+    total = asignadas = aciertos = 0
+    for texto, codigos in muestra:
+        total += 1
+        resultado = preclasificador.clasificar(texto)
+        if resultado is None:
+            continue
+        asignadas += 1
+        aciertos += {resultado[0]} == set(codigos)
+    return {
+        "muestra": total,
+        "asignadas": asignadas,
+        "aciertos": aciertos,
+        "hit_rate": asignadas / total if total else 0.0,
+        "precision": aciertos / asignadas if asignadas else 0.0,
+        "umbral": preclasificador.umbral,
+        "margen": preclasificador.margen,
+    }
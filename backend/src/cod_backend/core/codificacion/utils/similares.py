@@ -0,0 +1,219 @@
+"""
+Agrupación de respuestas casi duplicadas (MinHash + LSH sobre n-gramas de caracteres).
+
+Complementa el colapso de duplicados exactos: variantes ortográficas,
+palabras de más o diferencias de puntuación ("el precio", "precio!!",
+"el precioo") se agrupan si su similitud de Jaccard estimada supera un
+umbral. Cada grupo envía una sola respuesta representante al LLM.
+
+Todo es local (numpy, sin red). Las firmas MinHash se calculan de forma
+vectorizada y el LSH por bandas limita las comparaciones a un candidato
+por banda, por lo que escala linealmente con el número de respuestas.
+"""
+import re
+import zlib
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ...utils import normalizar_texto
+
+NUM_PERMUTACIONES = 64
+TAMANIO_NGRAMA = 3
+UMBRAL_SIMILITUD_DEFECTO = 0.8
+
+_SEMILLA = 1234
+# Textos procesados por bloque al calcular firmas (acota la memoria)
+_TEXTOS_POR_BLOQUE = 4096
+
+
+_RE_PUNTUACION = re.compile(r"[^\w\s]")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+def _shingles(texto: str) -> List[str]:
+    """N-gramas de caracteres del texto normalizado y sin puntuación."""
+    limpio = _RE_PUNTUACION.sub(" ", normalizar_texto(texto))
+    limpio = " " + _RE_ESPACIOS.sub(" ", limpio).strip() + " "
+    if len(limpio) <= TAMANIO_NGRAMA:
+        return [limpio]
+    return list({limpio[i:i + TAMANIO_NGRAMA] for i in range(len(limpio) - TAMANIO_NGRAMA + 1)})
+
+
+def _elegir_bandas(umbral: float, num_permutaciones: int) -> Tuple[int, int]:
+    """
+    Elige (bandas, filas por banda) para el LSH.
+
+    Se toma la mayor cantidad de filas cuyo umbral teórico (1/b)^(1/r) quede
+    algo por debajo del umbral pedido: así casi no se pierden candidatos y los
+    falsos positivos se descartan al verificar la similitud.
+    """
+    mejor = (num_permutaciones, 1)
+    for filas in range(1, num_permutaciones + 1):
+        if num_permutaciones % filas:
+            continue
+        bandas = num_permutaciones // filas
+        if (1 / bandas) ** (1 / filas) <= umbral - 0.05:
+            mejor = (bandas, filas)
+    return mejor
+
+
+def calcular_firmas(textos: List[str], num_permutaciones: int = NUM_PERMUTACIONES) -> np.ndarray:
+    """
+    Calcula las firmas MinHash de una lista de textos.
+
+    Args:
+        textos: Textos a firmar
+        num_permutaciones: Largo de cada firma
+
+    Returns:
+        Matriz (len(textos), num_permutaciones) de uint32
+    """
+    if not textos:
+        return np.empty((0, num_permutaciones), dtype=np.uint32)
+
+    # Vocabulario de shingles: cada shingle distinto recibe un índice
+    todos: List[str] = []
+    largos = np.empty(len(textos), dtype=np.int64)
+    for i, texto in enumerate(textos):
+        shingles = _shingles(texto)
+        largos[i] = len(shingles)
+        todos.extend(shingles)
+    indices, vocabulario = pd.factorize(np.asarray(todos, dtype=object))
+    inicios = np.concatenate(([0], np.cumsum(largos)[:-1]))
+
+    # Permutaciones (hash multiplicativo) calculadas una vez por shingle distinto
+    generador = np.random.default_rng(_SEMILLA)
+    a = generador.integers(1, 1 << 63, size=num_permutaciones, dtype=np.uint64) | np.uint64(1)
+    b = generador.integers(0, 1 << 63, size=num_permutaciones, dtype=np.uint64)
+    base = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in vocabulario),
+        dtype=np.uint64,
+        count=len(vocabulario),
+    )
+    permutaciones = ((base[:, None] * a[None, :] + b[None, :]) >> np.uint64(32)).astype(np.uint32)
+    # Fila de relleno con el valor máximo: no afecta al mínimo
+    relleno = len(permutaciones)
+    permutaciones = np.vstack([
+        permutaciones,
+        np.full((1, num_permutaciones), np.iinfo(np.uint32).max, dtype=np.uint32),
+    ])
+
+    # Bloques de textos de largo parecido, para rellenar lo menos posible
+    orden = np.argsort(largos, kind="stable")
+    firmas = np.empty((len(textos), num_permutaciones), dtype=np.uint32)
+    for inicio in range(0, len(textos), _TEXTOS_POR_BLOQUE):
+        filas = orden[inicio:inicio + _TEXTOS_POR_BLOQUE]
+        largos_bloque = largos[filas]
+        ancho = int(largos_bloque.max())
+        # Matriz (textos del bloque, ancho) de índices de shingles, con relleno
+        columnas = np.arange(ancho)
+        posiciones = inicios[filas][:, None] + columnas[None, :]
+        validas = columnas[None, :] < largos_bloque[:, None]
+        matriz = np.where(validas, indices[np.minimum(posiciones, len(indices) - 1)], relleno)
+        # Mínimo por columnas (evita materializar el bloque 3D)
+        minimos = permutaciones[matriz[:, 0]]
+        for columna in range(1, ancho):
+            np.minimum(minimos, permutaciones[matriz[:, columna]], out=minimos)
+        firmas[filas] = minimos
+
+    return firmas
+
+
+def agrupar_similares(
+    respuestas: List[Dict[str, Any]],
+    umbral: float = UMBRAL_SIMILITUD_DEFECTO,
+    num_permutaciones: int = NUM_PERMUTACIONES,
+) -> Tuple[List[Dict[str, Any]], Dict[int, List[Dict[str, Any]]], List[Dict[str, Any]]]:
+    """
+    Agrupa respuestas casi duplicadas y deja una representante por grupo.
+
+    Cada respuesta se compara con la primera respuesta de cada uno de sus
+    buckets LSH. Si la más parecida alcanza el umbral, la respuesta se une al
+    grupo de esa respuesta (verificando la similitud contra su representante,
+    para que los grupos no deriven por encadenamiento); si no, pasa a ser
+    representante. Solo se agrupan respuestas con el mismo dato auxiliar
+    (determina la categoría de los códigos nuevos).
+
+    Args:
+        respuestas: Respuestas a agrupar (con fila_excel y texto)
+        umbral: Similitud de Jaccard mínima (0-1) para agrupar
+        num_permutaciones: Largo de las firmas MinHash
+
+    Returns:
+        Tupla con (representantes en el orden original,
+        miembros por fila_excel del representante,
+        auditoría: una entrada por miembro con su representante y similitud)
+    """
+    total = len(respuestas)
+    if total == 0:
+        return [], {}, []
+
+    firmas = calcular_firmas([str(r.get("texto", "")) for r in respuestas], num_permutaciones)
+    bandas, filas = _elegir_bandas(umbral, num_permutaciones)
+
+    # Una clave entera por banda (combinación lineal de las filas de la banda),
+    # mezclada con el dato auxiliar para no cruzar categorías
+    mezcla = np.random.default_rng(_SEMILLA + 1).integers(
+        1, 1 << 63, size=filas, dtype=np.uint64
+    ) | np.uint64(1)
+    claves = (firmas.reshape(total, bandas, filas).astype(np.uint64) * mezcla).sum(axis=2, dtype=np.uint64)
+    id_auxiliar: Dict[Any, int] = {}
+    auxiliares = np.fromiter(
+        (id_auxiliar.setdefault(r.get("dato_auxiliar"), len(id_auxiliar)) for r in respuestas),
+        dtype=np.uint64,
+        count=total,
+    )
+    claves ^= (auxiliares * np.uint64(0x9E3779B97F4A7C15))[:, None]
+
+    # Primera respuesta de cada bucket, por banda
+    lideres = np.empty((total, bandas), dtype=np.int64)
+    for banda in range(bandas):
+        _, primeros, inversos = np.unique(claves[:, banda], return_index=True, return_inverse=True)
+        lideres[:, banda] = primeros[inversos]
+
+    # Similitud estimada contra cada líder (por bloques para acotar memoria)
+    similitudes = np.empty((total, bandas), dtype=np.float32)
+    for inicio in range(0, total, _TEXTOS_POR_BLOQUE):
+        fin = inicio + _TEXTOS_POR_BLOQUE
+        similitudes[inicio:fin] = (firmas[lideres[inicio:fin]] == firmas[inicio:fin, None, :]).mean(axis=2)
+    similitudes[lideres == np.arange(total)[:, None]] = 0.0
+
+    posicion = similitudes.argmax(axis=1)
+    mejor = lideres[np.arange(total), posicion].tolist()
+    mejor_similitud = similitudes[np.arange(total), posicion].tolist()
+
+    representante_de = list(range(total))
+    similitud_final = [0.0] * total
+    for i in range(total):
+        if mejor_similitud[i] < umbral:
+            continue
+        lider = mejor[i]
+        representante = representante_de[lider]
+        similitud = mejor_similitud[i]
+        if representante != lider:
+            similitud = float(np.count_nonzero(firmas[representante] == firmas[i])) / num_permutaciones
+            if similitud < umbral:
+                continue
+        representante_de[i] = representante
+        similitud_final[i] = similitud
+
+    representantes: List[Dict[str, Any]] = []
+    miembros: Dict[int, List[Dict[str, Any]]] = {}
+    auditoria: List[Dict[str, Any]] = []
+    for i, respuesta in enumerate(respuestas):
+        representante = respuestas[representante_de[i]]
+        if representante is respuesta:
+            representantes.append(respuesta)
+            continue
+        miembros.setdefault(representante["fila_excel"], []).append(respuesta)
+        auditoria.append({
+            "fila_representante": representante["fila_excel"],
+            "texto_representante": representante["texto"],
+            "fila_excel": respuesta["fila_excel"],
+            "texto": respuesta["texto"],
+            "similitud": round(similitud_final[i], 3),
+        })
+
+    return representantes, miembros, auditoria
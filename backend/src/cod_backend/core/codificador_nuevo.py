@@ -9,20 +9,115 @@ prompts desde archivos .md para mantener el código limpio.
 
 from __future__ import annotations
 
+import functools
+import inspect
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Union
 from datetime import datetime
 
 import pandas as pd
 from langgraph.pregel.main import RunnableConfig
 
-from ..config import calcular_costo
+from ..config import (
+    LEXICO_UMBRAL,
+    LEXICO_MARGEN,
+    CATALOGO_MAX_TOKENS,
+    LLM_SALIDA_ESTRUCTURADA,
+    LLM_PROTOCOLO_SALIDA,
+    LLM_STREAMING,
+    CASCADA_CONFIANZA_MIN,
+    CASCADA_CONFIANZA_MAX,
+    LLM_SOLICITUDES_REDUNDANTES,
+    TRABAJO_PLAZO_SEGUNDOS,
+    PLAZO_MODELO_RAPIDO,
+    BATCH_TOKENS_OBJETIVO,
+    BATCH_FRACCION_VENTANA,
+    BATCH_MAX_TOKENS_SALIDA,
+    BATCH_MAX_RESPUESTAS,
+)
 from ..utils import load_data, save_data
+from .utils import detectar_codigo_especial, extraer_tokens
 
 # Imports de la estructura modular
-from .codificacion.graph.state import EstadoCodificacion
+from .codificacion.graph.state import EstadoCodificacion, agregar_conceptos, aplicar_actualizacion
 from .codificacion.graph.builder import construir_grafo
-from .codificacion.utils import calcular_batch_size_optimo, detectar_categoria_desde_texto
+from .codificacion.graph.checkpoints import (
+    delta_del_batch,
+    huella_trabajo,
+    obtener_checkpoints,
+    restaurar_estado,
+)
+from .codificacion.llm import (
+    huella_catalogo,
+    PROTOCOLOS_SALIDA,
+    PROTOCOLO_COMPACTO,
+    ClienteLotes,
+    ErrorLote,
+    MAX_SOLICITUDES_POR_LOTE,
+    solicitud_lote,
+    HistorialLatencias,
+    PlazoTrabajo,
+    BackendLLM,
+    obtener_backend,
+    contar_tokens,
+    contar_tokens_lista,
+)
+from .codificacion.nodes import preparar_solicitud_lote, codificar_desde_lote, nodo_ensamblar
+from .codificacion.nodes.codificar_combinado import (
+    PROMPT_POR_PROTOCOLO,
+    TOKENS_COMPLETION_POR_RESPUESTA,
+    TOKENS_COMPLETION_POR_RESPUESTA_COMPACTA,
+)
+from .codificacion.prompts import load_prompt
+from .codificacion.utils import (
+    MAX_CODIGOS_EXISTENTES,
+    SIN_CODIGOS_EXISTENTES,
+    actualizar_codigos_recientes,
+    renderizar_codigos_existentes,
+    empaquetar_batches,
+    asignar_codigos_creados,
+    crear_indice_conceptos,
+    detectar_categoria_desde_texto,
+    fusionar_codigos_nuevos,
+    colapsar_duplicados,
+    expandir_duplicados,
+    agrupar_similares,
+    determinar_categoria_respuesta,
+    IndiceCatalogo,
+    PreclasificadorLexico,
+    evaluar_preclasificador,
+    obtener_indice_catalogo,
+)
+
+
+# Tokens reservados por código nuevo listado en el prompt ("  123: descripción")
+TOKENS_POR_CODIGO_EXISTENTE = 10
+
+# Tokens de cada línea de respuesta además del texto (número, separador, salto de línea)
+TOKENS_POR_LINEA_RESPUESTA = 4
+
+
+# Contadores acumulativos del estado que se suman al fusionar batches concurrentes
+CONTADORES_ESTADO = (
+    "prompt_tokens",
+    "completion_tokens",
+    "total_tokens",
+    "cached_tokens",
+    "reintentos_llm",
+    "reintentos_429",
+    "divisiones_batch",
+    "reparaciones_json",
+    "cache_consultas",
+    "cache_hits",
+    "respuestas_cascada",
+    "respuestas_escaladas",
+    "prompt_tokens_rapido",
+    "completion_tokens_rapido",
+    "cached_tokens_rapido",
+    "redundantes_emitidas",
+    "redundantes_ganadoras",
+    "tokens_redundantes",
+)
 
 
 class CodificadorNuevo:
@@ -30,16 +125,143 @@ class CodificadorNuevo:
     Codificador que implementa el flujo del Grafo V3 utilizando LangGraph.
     """
 
-    def __init__(self, modelo: str = "gpt-4o-mini", config_auxiliar: Optional[Dict[str, Any]] = None):
+    def __init__(
+        self,
+        modelo: str = "gpt-4o-mini",
+        config_auxiliar: Optional[Dict[str, Any]] = None,
+        batches_concurrentes: int = 1,
+        usar_cache: bool = True,
+        colapsar_repetidas: bool = True,
+        umbral_similares: Optional[float] = None,
+        preclasificar: bool = False,
+        catalogo_max_tokens: Optional[int] = None,
+        salida_estructurada: Optional[bool] = None,
+        protocolo_salida: Optional[str] = None,
+        streaming: Optional[bool] = None,
+        modo_lote: bool = False,
+        cliente_lotes: Optional[ClienteLotes] = None,
+        intervalo_sondeo: Optional[float] = None,
+        modelo_rapido: Optional[str] = None,
+        banda_incertidumbre: Optional[tuple[float, float]] = None,
+        solicitudes_redundantes: Optional[bool] = None,
+        backend: Optional[Union[str, BackendLLM]] = None,
+        plazo_segundos: Optional[float] = None,
+        tokens_por_batch: Optional[int] = None,
+        max_respuestas_batch: Optional[int] = None,
+    ):
         """
         Inicializa el codificador.
         
         Args:
             modelo: Modelo GPT a usar (por defecto "gpt-4o-mini")
             config_auxiliar: Configuración de dato auxiliar para categorización
+            batches_concurrentes: Número de batches en vuelo al mismo tiempo
+                (1 = ejecución secuencial del grafo)
+            usar_cache: Reutilizar resultados guardados en la caché persistente
+                del LLM (si está habilitada con LLM_CACHE_HABILITADO)
+            colapsar_repetidas: Enviar al LLM una sola vez cada texto repetido y
+                replicar sus códigos en todas las filas con ese texto
+            umbral_similares: Si se indica (0 < umbral <= 1), agrupar también respuestas casi
+                duplicadas (MinHash/LSH) con similitud >= umbral y codificar solo
+                una representante por grupo
+            preclasificar: Asignar sin LLM los códigos del catálogo que coinciden
+                casi literalmente con la respuesta (umbral LEXICO_UMBRAL/LEXICO_MARGEN)
+            catalogo_max_tokens: Presupuesto de tokens del catálogo en el prompt; si
+                el catálogo no cabe, cada batch recibe los códigos más relevantes
+                (por defecto CATALOGO_MAX_TOKENS)
+            salida_estructurada: Pedir al modelo JSON con esquema estricto y
+                validarlo con pydantic (por defecto LLM_SALIDA_ESTRUCTURADA); solo
+                si el backend la admite (soporta_salida_estructurada)
+            protocolo_salida: "completo" (veredicto por cada código del catálogo) o
+                "compacto" (solo los códigos que aplican; por defecto LLM_PROTOCOLO_SALIDA)
+            streaming: Pedir la salida en streaming y reportar el progreso por
+                respuesta durante cada llamada (por defecto LLM_STREAMING)
+            modo_lote: Codificación offline: enviar todos los batches juntos a la API
+                de lotes del proveedor (más barata, sin interactividad) y ensamblar
+                los resultados al terminar
+            cliente_lotes: Cliente de la API de lotes (por defecto ClienteLotes()
+                contra LLM_LOTES_BASE_URL)
+            intervalo_sondeo: Segundos entre consultas del estado del lote
+                (por defecto LLM_LOTES_INTERVALO_SONDEO)
+            modelo_rapido: Cascada de modelos: cada batch se codifica primero con este
+                modelo (barato y rápido) y solo las respuestas dudosas se reenvían a
+                `modelo` (None = sin cascada)
+            banda_incertidumbre: (min, max) de la mejor confianza del modelo rápido
+                que se escala al modelo principal; también se escalan las respuestas
+                que proponen códigos nuevos (por defecto CASCADA_CONFIANZA_MIN/MAX)
+            solicitudes_redundantes: Repetir las llamadas que superan un percentil alto de
+                las latencias del propio trabajo; gana la primera salida válida
+                (por defecto LLM_SOLICITUDES_REDUNDANTES)
+            backend: Backend de LLM del trabajo: "openai", "compatible" (servidor
+                propio con la API de OpenAI), "determinista" (sin red) o una
+                instancia de BackendLLM solo para este trabajo (por defecto LLM_BACKEND).
+                Su concurrencia y ventana de contexto acotan los batches en vuelo,
+                el tamaño de batch y el presupuesto del catálogo; su precio da el costo
+            plazo_segundos: Plazo del trabajo en segundos (0 = sin plazo; por
+                defecto TRABAJO_PLAZO_SEGUNDOS). Acota el timeout de cada llamada y,
+                si la proyección no llega a tiempo, el planificador sube la
+                concurrencia, pasa los batches pendientes a un modelo más rápido y,
+                vencido el plazo, devuelve un resultado parcial
+            tokens_por_batch: Tokens objetivo por llamada (prompt + salida esperada)
+                con los que se llena cada batch, contados con tiktoken (por defecto
+                BATCH_TOKENS_OBJETIVO; acotado a BATCH_FRACCION_VENTANA de la
+                ventana de contexto del backend)
+            max_respuestas_batch: Respuestas por batch como máximo (por defecto
+                BATCH_MAX_RESPUESTAS)
+        
+        Raises:
+            ValueError: Si el protocolo o el backend no existen, si el umbral de
+                similares está fuera de (0, 1], o si se pide modo lote con un
+                backend que no lo admite o con plazo
         """
         self.modelo = modelo
+        # Una instancia es del trabajo: viaja en el estado sin pasar por el registro
+        self.backend = backend if isinstance(backend, BackendLLM) else obtener_backend(backend)
         self.config_auxiliar = config_auxiliar
+        self.batches_concurrentes = min(max(1, int(batches_concurrentes or 1)), self.backend.concurrencia_maxima)
+        self.usar_cache = usar_cache
+        self.colapsar_repetidas = colapsar_repetidas
+        if umbral_similares is not None and not 0 < umbral_similares <= 1:
+            raise ValueError(f"umbral_similares debe estar en (0, 1]: {umbral_similares}")
+        self.umbral_similares = umbral_similares
+        self._respuestas_unicas = 0
+        self.df_auditoria_similares: Optional[pd.DataFrame] = None
+        self.preclasificar = preclasificar
+        self._preclasificadas = 0
+        self.tokens_por_batch = min(
+            tokens_por_batch or BATCH_TOKENS_OBJETIVO,
+            int(self.backend.ventana_contexto * BATCH_FRACCION_VENTANA),
+        )
+        self.max_respuestas_batch = max_respuestas_batch or BATCH_MAX_RESPUESTAS
+        # El catálogo no puede ocupar más de un cuarto de la ventana de contexto
+        self.catalogo_max_tokens = min(catalogo_max_tokens or CATALOGO_MAX_TOKENS, self.backend.ventana_contexto // 4)
+        self.salida_estructurada = (
+            LLM_SALIDA_ESTRUCTURADA if salida_estructurada is None else salida_estructurada
+        ) and self.backend.soporta_salida_estructurada
+        self.protocolo_salida = protocolo_salida or LLM_PROTOCOLO_SALIDA
+        if self.protocolo_salida not in PROTOCOLOS_SALIDA:
+            raise ValueError(
+                f"Protocolo de salida inválido: {self.protocolo_salida} "
+                f"(opciones: {', '.join(PROTOCOLOS_SALIDA)})"
+            )
+        self.streaming = LLM_STREAMING if streaming is None else streaming
+        self.modo_lote = modo_lote
+        if modo_lote and not self.backend.soporta_lotes:
+            raise ValueError(f"El backend {self.backend.nombre} no admite el modo lote")
+        self.cliente_lotes = cliente_lotes
+        self.intervalo_sondeo = intervalo_sondeo
+        self._estadisticas_lote: Dict[str, int] = {}
+        self.modelo_rapido = modelo_rapido if modelo_rapido and modelo_rapido != modelo else None
+        self.banda_incertidumbre = banda_incertidumbre or (CASCADA_CONFIANZA_MIN, CASCADA_CONFIANZA_MAX)
+        self.solicitudes_redundantes = LLM_SOLICITUDES_REDUNDANTES if solicitudes_redundantes is None else solicitudes_redundantes
+        if modo_lote and plazo_segundos:
+            raise ValueError("El modo lote no admite plazo de trabajo")
+        # El plazo por defecto no aplica al modo lote (offline)
+        self.plazo_segundos = (
+            TRABAJO_PLAZO_SEGUNDOS if plazo_segundos is None and not modo_lote else plazo_segundos
+        ) or None
+        self._plazo: Optional[PlazoTrabajo] = None
+        self._modelo_plazo: Optional[str] = None
         self._instancia_id = id(self)
         self.df_codigos_nuevos: Optional[pd.DataFrame] = None
         self.stats: Optional[Dict[str, Any]] = None
@@ -49,14 +271,20 @@ class CodificadorNuevo:
         ruta_respuestas: str,
         ruta_codigos: Optional[str] = None,
         progress_callback=None,
+        proceso_id: Optional[str] = None,
     ) -> pd.DataFrame:
         """
         Ejecuta el proceso completo de codificación usando el nuevo grafo.
         
+        Con `proceso_id` (y CHECKPOINTS_HABILITADOS) cada batch terminado se
+        guarda como checkpoint; si el trabajo ya tiene batches guardados para la
+        misma entrada, se reanuda desde ellos sin volver a enviarlos al LLM.
+        
         Args:
             ruta_respuestas: Ruta al archivo Excel con respuestas
             ruta_codigos: Ruta opcional al archivo Excel con catálogo histórico
             progress_callback: Función opcional para reportar progreso
+            proceso_id: ID del trabajo para sus checkpoints (None = sin checkpoints)
             
         Returns:
             DataFrame con los resultados de la codificación
@@ -68,6 +296,9 @@ class CodificadorNuevo:
         import time
         timestamp_ejecucion = time.time()
         print(f"🕐 Timestamp de ejecución: {timestamp_ejecucion}")
+        # El plazo corre desde el inicio del trabajo (incluye la carga y la preparación)
+        self._plazo = PlazoTrabajo(self.plazo_segundos) if self.plazo_segundos else None
+        self._modelo_plazo = None
 
         # Cargar datos
         df = load_data(ruta_respuestas)
@@ -147,39 +378,87 @@ class CodificadorNuevo:
         print(f"📋 Total de filas en el archivo (DataFrame): {len(df)}")
         print(f"📋 Total de respuestas cargadas: {len(respuestas_reales)}")
 
+        # Colapsar respuestas repetidas: una representante por texto normalizado
+        total_cargadas = len(respuestas_reales)
+        duplicados: Dict[int, List[Dict[str, Any]]] = {}
+        if self.colapsar_repetidas:
+            respuestas_reales, duplicados = colapsar_duplicados(respuestas_reales)
+            if duplicados:
+                print(
+                    f"🧬 Respuestas repetidas colapsadas: {total_cargadas - len(respuestas_reales)} "
+                    f"({len(respuestas_reales)} únicas de {total_cargadas})"
+                )
+
+        # Agrupar respuestas casi duplicadas (opcional)
+        auditoria_similares: List[Dict[str, Any]] = []
+        if self.umbral_similares:
+            respuestas_reales, miembros_similares, auditoria_similares = agrupar_similares(
+                respuestas_reales, umbral=self.umbral_similares
+            )
+            for fila_representante, miembros in miembros_similares.items():
+                grupo = duplicados.setdefault(fila_representante, [])
+                for miembro in miembros:
+                    grupo.append(miembro)
+                    grupo.extend(duplicados.pop(miembro["fila_excel"], []))
+            if auditoria_similares:
+                print(
+                    f"🧬 Respuestas similares agrupadas (umbral {self.umbral_similares}): "
+                    f"{len(auditoria_similares)} en {len(miembros_similares)} grupos"
+                )
+        self.df_auditoria_similares = pd.DataFrame(auditoria_similares)
+        self._respuestas_unicas = len(respuestas_reales)
+
         # Cargar catálogo histórico
         catalogo_historico, catalogo_por_categoria = self._cargar_catalogo(ruta_codigos)
 
+        # Actualizar config_auxiliar si se desactivó automáticamente
+        config_auxiliar_final = self.config_auxiliar
+        if not usar_auxiliar and self.config_auxiliar is not None:
+            # Crear una copia de la configuración pero con usar=False
+            config_auxiliar_final = {**self.config_auxiliar, "usar": False}
+
+        # Preclasificar sin LLM las respuestas que coinciden con el catálogo
+        codificaciones_lexicas: List[Dict[str, Any]] = []
+        if self.preclasificar and catalogo_historico:
+            respuestas_reales, codificaciones_lexicas = self._preclasificar_respuestas(
+                respuestas_reales, catalogo_historico, config_auxiliar_final
+            )
+        self._preclasificadas = len(codificaciones_lexicas)
+
+        respuestas_al_llm = len(respuestas_reales)
+        if total_cargadas > respuestas_al_llm:
+            print(f"💡 Posiciones de LLM ahorradas: {total_cargadas - respuestas_al_llm}/{total_cargadas}")
+
         # Calcular código inicial para nuevos códigos
         proximo_codigo_inicial = self._calcular_codigo_inicial(catalogo_historico)
 
-        print(f"\n📊 Respuestas cargadas: {len(respuestas_reales)}")
+        print(f"\n📊 Respuestas a codificar: {len(respuestas_reales)}")
         print(f"📚 Catálogo histórico: {len(catalogo_historico)} códigos")
         print(f"🔢 Código inicial para nuevos códigos: {proximo_codigo_inicial}")
 
-        # Calcular batch size óptimo
-        batch_size = calcular_batch_size_optimo(
-            total_respuestas=len(respuestas_reales),
-            tamanio_catalogo=len(catalogo_historico),
-            modelo=self.modelo
+        # Llenar cada batch hasta el presupuesto de tokens
+        tokens_catalogo = self._contar_tokens_catalogo(catalogo_historico)
+        limites_batches = self._empaquetar_respuestas(respuestas_reales, catalogo_historico, tokens_catalogo)
+        batches_esperados = len(limites_batches) - 1
+        tamanios = [fin - inicio for inicio, fin in zip(limites_batches, limites_batches[1:])]
+        batch_size = max(tamanios, default=1)
+        print(
+            f"📦 Batches por tokens ({self.tokens_por_batch} por llamada): {batches_esperados} batches "
+            f"de {min(tamanios, default=0)} a {batch_size} respuestas"
         )
-        batches_esperados = (len(respuestas_reales) + batch_size - 1) // batch_size
-        print(f"📦 Batch size optimizado: {batch_size} respuestas por batch ({batches_esperados} batches totales)")
-
-        # Actualizar config_auxiliar si se desactivó automáticamente
-        config_auxiliar_final = self.config_auxiliar
-        if not usar_auxiliar and self.config_auxiliar is not None:
-            # Crear una copia de la configuración pero con usar=False
-            config_auxiliar_final = {**self.config_auxiliar, "usar": False}
         
         # Preparar estado inicial
         estado_inicial: EstadoCodificacion = {
             "pregunta": nombre_pregunta,
             "modelo_gpt": self.modelo,
+            "backend_llm": self.backend,
             "batch_size": batch_size,
+            "limites_batches": limites_batches,
             "respuestas": respuestas_reales,
             "catalogo": catalogo_historico,
             "catalogo_por_categoria": catalogo_por_categoria,
+            "catalogo_max_tokens": self.catalogo_max_tokens,
+            "catalogo_tokens": tokens_catalogo,
             "batch_actual": 0,
             "batch_respuestas": [],
             "codificaciones": [],
@@ -187,10 +466,37 @@ class CodificadorNuevo:
             "evaluaciones_batch": [],
             "cobertura_batch": [],
             "proximo_codigo_nuevo": proximo_codigo_inicial,
+            "indice_conceptos": crear_indice_conceptos(catalogo_historico),
+            "codigos_recientes": {},
+            "seccion_codigos_existentes": SIN_CODIGOS_EXISTENTES,
             "respuestas_especiales": {},
             "prompt_tokens": 0,
             "completion_tokens": 0,
             "total_tokens": 0,
+            "cached_tokens": 0,
+            "reintentos_llm": 0,
+            "reintentos_429": 0,
+            "divisiones_batch": 0,
+            "salida_estructurada": self.salida_estructurada,
+            "protocolo_salida": self.protocolo_salida,
+            "streaming": self.streaming,
+            "reparaciones_json": 0,
+            "modelo_rapido": self.modelo_rapido,
+            "banda_incertidumbre": list(self.banda_incertidumbre),
+            "respuestas_cascada": 0,
+            "respuestas_escaladas": 0,
+            "prompt_tokens_rapido": 0,
+            "completion_tokens_rapido": 0,
+            "cached_tokens_rapido": 0,
+            "solicitudes_redundantes": self.solicitudes_redundantes,
+            "redundantes_emitidas": 0,
+            "redundantes_ganadoras": 0,
+            "tokens_redundantes": 0,
+            "fecha_limite": self._plazo.fecha_limite if self._plazo else None,
+            "usar_cache": self.usar_cache,
+            "huella_catalogo": huella_catalogo(catalogo_historico),
+            "cache_consultas": 0,
+            "cache_hits": 0,
             "config_auxiliar": config_auxiliar_final,
         }
 
@@ -200,30 +506,93 @@ class CodificadorNuevo:
         
         print("🚀 Usando nodo combinado (optimizado - 1 llamada GPT por batch)")
 
+        progress_callback = self._progreso_monotono(progress_callback)
+        configurable = self._configurable_progreso(len(respuestas_reales), progress_callback)
+        # Un solo historial por trabajo: timeouts y solicitudes redundantes se aprenden de todos sus batches
+        configurable["historial_latencias"] = HistorialLatencias()
+
         recursion_limit = max(batches_esperados * 10, 100)
-        config = RunnableConfig(recursion_limit=recursion_limit)
+        config = RunnableConfig(recursion_limit=recursion_limit, configurable=configurable)
 
         print("\n🚀 Ejecutando grafo nuevo...\n")
         
-        # Ejecutar en hilo separado para no bloquear el event loop
-        import asyncio
-        estado_final = await asyncio.to_thread(
-            self._ejecutar_stream,
-            app,
-            estado_inicial,
-            config,
-            batches_esperados,
-            len(respuestas_reales),
-            batch_size,
-            progress_callback
-        )
+        if self.backend.nombre != "openai":
+            print(f"🔌 Backend de LLM: {self.backend.nombre}")
+        if self.modelo_rapido:
+            print(f"🪜 Cascada: {self.modelo_rapido} → {self.modelo} (banda {self.banda_incertidumbre})")
+        self._estadisticas_lote = {}
+        concurrente = self._plazo is not None or (self.batches_concurrentes > 1 and batches_esperados > 1)
+        # El modo lote no usa checkpoints: el lote enviado ya queda en la API de lotes
+        checkpoints = obtener_checkpoints() if proceso_id and not self.modo_lote else None
+        batches_hechos: Dict[int, Dict[str, Any]] = {}
+        guardar_checkpoint = None
+        if checkpoints is not None:
+            huella = huella_trabajo(estado_inicial, "concurrente" if concurrente else "secuencial")
+            batches_hechos = checkpoints.batches_completados(proceso_id, huella)
+            guardar_checkpoint = functools.partial(checkpoints.guardar_batch, proceso_id)
+            if batches_hechos:
+                print(
+                    f"♻️  Reanudando desde checkpoint: {len(batches_hechos)}/{batches_esperados} "
+                    f"batches ya completados"
+                )
+        if self.modo_lote:
+            print(f"📤 Modo lote: {batches_esperados} batches en la API de lotes")
+            estado_final = await self._ejecutar_lote(
+                estado_inicial,
+                progress_callback
+            )
+        elif concurrente:
+            # Con plazo, el planificador decide entre batches (concurrencia y modelo)
+            if self._plazo is not None:
+                print(f"⏱️  Plazo del trabajo: {self.plazo_segundos:.0f}s")
+            print(f"⚡ Modo concurrente: {self.batches_concurrentes} batches en vuelo")
+            estado_final = await self._ejecutar_concurrente(
+                app,
+                estado_inicial,
+                batches_esperados,
+                progress_callback,
+                configurable,
+                self._plazo,
+                batches_hechos,
+                guardar_checkpoint
+            )
+        else:
+            # Los checkpoints secuenciales son siempre los primeros batches del trabajo
+            completados = 0
+            while completados in batches_hechos:
+                completados += 1
+            if completados:
+                restaurar_estado(estado_inicial, (batches_hechos[i] for i in range(completados)))
+                estado_inicial["batch_actual"] = completados
+            if completados and completados >= batches_esperados:
+                estado_final = estado_inicial
+                await self._notificar_progreso(progress_callback, 1.0, "✅ Codificación completada")
+            else:
+                # El grafo es asíncrono: se ejecuta en el mismo event loop, sin ocupar un hilo
+                estado_final = await self._ejecutar_stream(
+                    app,
+                    estado_inicial,
+                    config,
+                    batches_esperados,
+                    len(respuestas_reales),
+                    limites_batches,
+                    progress_callback,
+                    guardar_checkpoint
+                )
 
-        # Construir DataFrame de resultados
+        if codificaciones_lexicas:
+            estado_final["codificaciones"] = sorted(
+                estado_final["codificaciones"] + codificaciones_lexicas,
+                key=lambda c: c["fila_excel"],
+            )
+
+        # Construir DataFrame de resultados (replicando los códigos en las filas repetidas)
         df_resultados = self._construir_dataframe_resultados(
             estado_final,
             df,
             columna_id,
-            nombre_pregunta
+            nombre_pregunta,
+            duplicados
         )
 
         # Calcular estadísticas
@@ -231,6 +600,147 @@ class CodificadorNuevo:
 
         return df_resultados
 
+    def _contar_tokens_catalogo(self, catalogo_historico: List[Dict[str, Any]]) -> int:
+        """Tokens del catálogo completo tal como va en el prompt."""
+        catalogo_str = "\n".join(f"  {c['codigo']}. {c['descripcion']}" for c in catalogo_historico)
+        return contar_tokens(catalogo_str, self.modelo)
+
+    def _empaquetar_respuestas(
+        self,
+        respuestas: List[Dict[str, Any]],
+        catalogo_historico: List[Dict[str, Any]],
+        tokens_catalogo: Optional[int] = None,
+    ) -> List[int]:
+        """
+        Arma los batches por presupuesto de tokens (ver empaquetar_batches).
+        
+        Los tokens fijos de cada llamada son los de la plantilla del prompt, el
+        catálogo (hasta catalogo_max_tokens) y una reserva para la lista de
+        códigos nuevos ya creados; la salida esperada por respuesta depende del
+        protocolo.
+        
+        Args:
+            respuestas: Respuestas a codificar
+            catalogo_historico: Catálogo histórico
+            tokens_catalogo: Tokens del catálogo completo, si ya se contaron
+        
+        Returns:
+            Límites de los batches sobre `respuestas`
+        """
+        compacto = self.protocolo_salida == PROTOCOLO_COMPACTO
+        if tokens_catalogo is None:
+            tokens_catalogo = self._contar_tokens_catalogo(catalogo_historico)
+        tokens_fijos = (
+            contar_tokens(load_prompt(PROMPT_POR_PROTOCOLO[self.protocolo_salida]), self.modelo)
+            + min(tokens_catalogo, self.catalogo_max_tokens)
+            + MAX_CODIGOS_EXISTENTES * TOKENS_POR_CODIGO_EXISTENTE
+        )
+        tokens_respuestas = [
+            tokens + TOKENS_POR_LINEA_RESPUESTA
+            for tokens in contar_tokens_lista([str(r["texto"]) for r in respuestas], self.modelo)
+        ]
+        return empaquetar_batches(
+            tokens_respuestas,
+            presupuesto_tokens=self.tokens_por_batch,
+            tokens_fijos=tokens_fijos,
+            tokens_salida_por_respuesta=(
+                TOKENS_COMPLETION_POR_RESPUESTA_COMPACTA if compacto else TOKENS_COMPLETION_POR_RESPUESTA
+            ),
+            max_tokens_salida=BATCH_MAX_TOKENS_SALIDA,
+            max_respuestas=self.max_respuestas_batch,
+        )
+
+    def _preclasificar_respuestas(
+        self,
+        respuestas: List[Dict[str, Any]],
+        catalogo_historico: List[Dict[str, Any]],
+        config_auxiliar: Optional[Dict[str, Any]],
+    ) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Codifica con el índice léxico las respuestas que coinciden claramente
+        con un código del catálogo; el resto sigue hacia el LLM.
+        
+        Returns:
+            Tupla con (respuestas pendientes para el LLM, codificaciones asignadas)
+        """
+        # Mismo índice que usa el nodo combinado para la lista corta del catálogo
+        indice = obtener_indice_catalogo(catalogo_historico, huella_catalogo(catalogo_historico))
+        preclasificador = PreclasificadorLexico(indice, LEXICO_UMBRAL, LEXICO_MARGEN)
+        pendientes: List[Dict[str, Any]] = []
+        codificaciones: List[Dict[str, Any]] = []
+        for resp in respuestas:
+            # Los códigos especiales (NS/NR...) los resuelve el nodo combinado
+            resultado = None
+            if detectar_codigo_especial(resp["texto"]) is None:
+                resultado = preclasificador.clasificar(resp["texto"])
+            if resultado is None:
+                pendientes.append(resp)
+                continue
+            codigo, _similitud = resultado
+            codificaciones.append({
+                "fila_excel": resp["fila_excel"],
+                "texto": resp["texto"],
+                "decision": "historico",
+                "codigos_historicos": [codigo],
+                "codigos_nuevos": [],
+                "dato_auxiliar": resp.get("dato_auxiliar"),
+                "categoria": determinar_categoria_respuesta(resp, config_auxiliar),
+                "origen": "lexico",
+            })
+        
+        print(
+            f"🔎 Preclasificadas sin LLM: {len(codificaciones)}/{len(respuestas)} "
+            f"(umbral {preclasificador.umbral}, margen {preclasificador.margen})"
+        )
+        return pendientes, codificaciones
+
+    def evaluar_preclasificador(
+        self,
+        ruta_muestra: str,
+        ruta_codigos: str,
+        precision_objetivo: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Mide el preclasificador léxico sobre una muestra etiquetada.
+        
+        La muestra tiene el formato de la hoja de resultados: la segunda columna
+        es el texto y la columna "Códigos asignados" los códigos ("1; 5").
+        
+        Args:
+            ruta_muestra: Excel con la muestra etiquetada
+            ruta_codigos: Excel con el catálogo histórico
+            precision_objetivo: Si se indica, calibra antes el umbral para
+                alcanzar esta precisión en la muestra
+            
+        Returns:
+            Métricas (hit_rate, precision, asignadas, umbral, margen...)
+        """
+        catalogo_historico, _ = self._cargar_catalogo(ruta_codigos)
+        df_muestra = load_data(ruta_muestra)
+        columna_texto = df_muestra.columns[1]
+        muestra = []
+        for _, row in df_muestra.iterrows():
+            if pd.isna(row[columna_texto]):
+                continue
+            codigos = [
+                int(c) for c in str(row.get("Códigos asignados", "")).replace(",", ";").split(";")
+                if c.strip().isdigit()
+            ]
+            muestra.append((str(row[columna_texto]), codigos))
+        
+        preclasificador = PreclasificadorLexico(
+            IndiceCatalogo(catalogo_historico), LEXICO_UMBRAL, LEXICO_MARGEN
+        )
+        if precision_objetivo is not None:
+            preclasificador.calibrar(muestra, precision_objetivo)
+        metricas = evaluar_preclasificador(preclasificador, muestra)
+        print(
+            f"🔎 Preclasificador léxico: hit rate {metricas['hit_rate']:.1%}, "
+            f"precisión {metricas['precision']:.1%} "
+            f"({metricas['asignadas']}/{metricas['muestra']}, umbral {metricas['umbral']:.3f})"
+        )
+        return metricas
+
     def _cargar_catalogo(
         self,
         ruta_codigos: Optional[str]
@@ -335,18 +845,88 @@ class CodificadorNuevo:
             print(f"   ✅ No hay códigos válidos en catálogo, empezando desde 1")
             return 1
 
-    def _ejecutar_stream(
+    @staticmethod
+    async def _notificar_progreso(progress_callback, progreso: float, mensaje: str) -> None:
+        """
+        Llama al callback de progreso, esperándolo si es una corrutina.
+        
+        Permite que el callback haga comprobaciones de pausa/cancelación
+        con `await` sin bloquear el event loop.
+        """
+        if progress_callback is None:
+            return
+        resultado = progress_callback(progreso, mensaje)
+        if inspect.isawaitable(resultado):
+            await resultado
+
+    @staticmethod
+    def _progreso_monotono(progress_callback):
+        """
+        Envuelve el callback de progreso para que el porcentaje nunca retroceda.
+        
+        El progreso por respuesta (streaming) y el progreso por nodo del grafo se
+        calculan por separado; el callback recibe siempre el mayor visto.
+        """
+        if progress_callback is None:
+            return None
+        maximo = 0.0
+        
+        def _callback(progreso: float, mensaje: str):
+            nonlocal maximo
+            maximo = max(maximo, progreso)
+            return progress_callback(maximo, mensaje)
+        
+        return _callback
+
+    def _configurable_progreso(self, total_respuestas: int, progress_callback) -> Dict[str, Any]:
+        """
+        Configuración del grafo con el callback de progreso por respuesta.
+        
+        El nodo de codificación informa, durante el stream de cada llamada, cuántas
+        respuestas de su batch ya están resueltas; aquí se suman las de todos los
+        batches (también los que están en vuelo en modo concurrente).
+        
+        Args:
+            total_respuestas: Respuestas enviadas al grafo
+            progress_callback: Callback de progreso del trabajo
+            
+        Returns:
+            Diccionario para `RunnableConfig(configurable=...)`
+        """
+        if not self.streaming or progress_callback is None or total_respuestas <= 0:
+            return {}
+        resueltas_por_batch: Dict[Any, int] = {}
+        
+        async def _progreso_respuestas(clave_batch: Any, resueltas: int) -> None:
+            resueltas_por_batch[clave_batch] = max(resueltas_por_batch.get(clave_batch, 0), resueltas)
+            hechas = sum(resueltas_por_batch.values())
+            progreso = min(hechas / total_respuestas, 0.98)
+            mensaje = f"✍️ {hechas}/{total_respuestas} respuestas codificadas"
+            await self._notificar_progreso(progress_callback, progreso, mensaje)
+        
+        return {"progreso_respuestas": _progreso_respuestas}
+
+    async def _ejecutar_stream(
         self,
         app,
         estado_inicial: EstadoCodificacion,
         config: RunnableConfig,
         total_batches: int,
         total_respuestas: int,
-        batch_size: int,
-        progress_callback=None
+        limites_batches: List[int],
+        progress_callback=None,
+        guardar_checkpoint: Optional[Callable[[int, Dict[str, Any]], None]] = None
     ) -> EstadoCodificacion:
         """
-        Ejecuta el stream del grafo en un hilo separado.
+        Ejecuta el stream asíncrono del grafo reportando el progreso por nodo.
+        
+        Los eventos "updates" traen el delta de cada nodo (para el progreso) y
+        los "values" el estado completo después de cada paso, que LangGraph arma
+        con referencias a sus canales (sin copiar las codificaciones).
+        
+        Con `guardar_checkpoint`, al terminar cada batch se guardan los deltas
+        de sus nodos (no el estado completo), así que el costo del checkpoint
+        depende del batch y no del largo del trabajo.
         
         Returns:
             Estado final del grafo
@@ -355,47 +935,54 @@ class CodificadorNuevo:
             Exception: Si ocurre un error durante la ejecución, se propaga con mensaje descriptivo
         """
         estado_resultado = estado_inicial
+        deltas_batch: List[Dict[str, Any]] = []
         
         try:
-            for event in app.stream(estado_inicial, config=config):
-                for node_name, node_state in event.items():
-                    estado_resultado = node_state
-                    
+            async for modo, evento in app.astream(estado_inicial, config=config, stream_mode=["updates", "values"]):
+                if modo == "values":
+                    estado_resultado = evento
+                    continue
+                for node_name, actualizacion in evento.items():
+                    if guardar_checkpoint is not None:
+                        if node_name == "finalizar":
+                            guardar_checkpoint(actualizacion["batch_actual"] - 1, delta_del_batch(deltas_batch))
+                            deltas_batch = []
+                        elif actualizacion:
+                            deltas_batch.append(actualizacion)
                     if progress_callback:
                         batch_actual = estado_resultado.get("batch_actual", 0)
+                        respuestas_procesadas = limites_batches[min(batch_actual, total_batches)]
+                        batch_size = limites_batches[min(batch_actual + 1, total_batches)] - respuestas_procesadas
                         
                         # Actualizar progreso según el nodo
                         if node_name == "preparar_batch":
-                            respuestas_procesadas = batch_actual * batch_size
                             if total_respuestas > 0:
                                 progreso = min(respuestas_procesadas / total_respuestas, 0.98)
                                 mensaje = f"📦 Preparando batch {batch_actual + 1}/{total_batches}"
-                                progress_callback(progreso, mensaje)
+                                await self._notificar_progreso(progress_callback, progreso, mensaje)
                         
                         elif node_name == "codificar_combinado":
-                            respuestas_procesadas = batch_actual * batch_size
                             if total_respuestas > 0:
                                 progreso = min((respuestas_procesadas + batch_size * 0.5) / total_respuestas, 0.98)
                                 mensaje = f"🚀 Codificando batch {batch_actual + 1}/{total_batches}"
-                                progress_callback(progreso, mensaje)
+                                await self._notificar_progreso(progress_callback, progreso, mensaje)
                         
                         elif node_name == "ensamblar":
-                            respuestas_procesadas = batch_actual * batch_size
                             if total_respuestas > 0:
                                 progreso = min((respuestas_procesadas + batch_size * 0.9) / total_respuestas, 0.98)
                                 mensaje = f"🔧 Ensamblando resultados (batch {batch_actual + 1}/{total_batches})"
-                                progress_callback(progreso, mensaje)
+                                await self._notificar_progreso(progress_callback, progreso, mensaje)
                         
                         elif node_name == "finalizar":
-                            batch_actual_final = estado_resultado.get("batch_actual", 0)
+                            batch_actual_final = actualizacion.get("batch_actual", batch_actual)
                             if batch_actual_final >= total_batches:
-                                progress_callback(1.0, "✅ Codificación completada")
+                                await self._notificar_progreso(progress_callback, 1.0, "✅ Codificación completada")
                             else:
-                                respuestas_procesadas = batch_actual_final * batch_size
+                                respuestas_procesadas = limites_batches[batch_actual_final]
                                 if total_respuestas > 0:
                                     progreso = min(respuestas_procesadas / total_respuestas, 0.98)
                                 mensaje = f"🔄 Batch {batch_actual_final}/{total_batches} completado, continuando..."
-                                progress_callback(progreso, mensaje)
+                                await self._notificar_progreso(progress_callback, progreso, mensaje)
             
             return estado_resultado
         except Exception as e:
@@ -413,19 +1000,444 @@ class CodificadorNuevo:
             # Propagar el error con el mensaje mejorado
             raise RuntimeError(f"Error durante la codificación: {mensaje_error}") from e
 
+    async def _ejecutar_concurrente(
+        self,
+        app,
+        estado_inicial: EstadoCodificacion,
+        total_batches: int,
+        progress_callback=None,
+        configurable: Optional[Dict[str, Any]] = None,
+        plazo: Optional[PlazoTrabajo] = None,
+        batches_hechos: Optional[Dict[int, Dict[str, Any]]] = None,
+        guardar_checkpoint: Optional[Callable[[int, Dict[str, Any]], None]] = None
+    ) -> EstadoCodificacion:
+        """
+        Ejecuta el grafo manteniendo hasta `batches_concurrentes` batches en vuelo.
+        
+        Cada batch se ejecuta como una corrida independiente del grafo (un solo
+        batch) y ve los códigos nuevos de los batches que ya terminaron. Al final
+        los resultados se fusionan en orden de batch y los códigos nuevos se
+        renumeran desde `proximo_codigo_nuevo` para que sean únicos y secuenciales.
+        
+        Con `plazo`, después de cada batch el planificador revisa la proyección
+        (ver _reaccionar_al_plazo). Vencido el plazo, los batches que no
+        empezaron (o cuya llamada se cortó) quedan con decisión "sin_codificar".
+        
+        `batches_hechos` son los deltas de un checkpoint (batches que no se
+        vuelven a ejecutar); con `guardar_checkpoint` se guarda el delta de cada
+        batch que termina: sus codificaciones, sus conceptos y códigos nuevos y
+        sus contadores.
+        
+        Returns:
+            Estado final con la misma estructura que la ejecución secuencial
+            
+        Raises:
+            RuntimeError: Si falla alguno de los batches (salvo por el plazo vencido)
+        """
+        import asyncio
+        
+        respuestas = estado_inicial["respuestas"]
+        limites = estado_inicial["limites_batches"]
+        batches = [respuestas[inicio:fin] for inicio, fin in zip(limites, limites[1:])]
+        
+        semaforo = asyncio.Semaphore(self.batches_concurrentes)
+        concurrencia = self.batches_concurrentes
+        modelo_batches = estado_inicial["modelo_gpt"]
+        resultados: List[Optional[EstadoCodificacion]] = [None] * len(batches)
+        # Conceptos y códigos recientes de los batches terminados (los ven los siguientes)
+        indice_conceptos = dict(estado_inicial["indice_conceptos"])
+        codigos_recientes = dict(estado_inicial["codigos_recientes"])
+        seccion_codigos = estado_inicial["seccion_codigos_existentes"]
+        completados = 0
+        fallido = False
+        for indice, delta in sorted((batches_hechos or {}).items()):
+            resultados[indice] = delta
+            agregar_conceptos(indice_conceptos, delta["indice_conceptos"])
+            codigos_recientes = actualizar_codigos_recientes(codigos_recientes, delta["codigos_recientes"])
+            completados += 1
+        if completados:
+            seccion_codigos = renderizar_codigos_existentes(codigos_recientes)
+        # Contador compartido de códigos nuevos: ningún código del índice lo alcanza
+        proximo_codigo = max([
+            estado_inicial["proximo_codigo_nuevo"],
+            *(codigo + 1 for codigo in indice_conceptos.values() if isinstance(codigo, int)),
+        ])
+        
+        async def _procesar(indice: int, batch: List[Dict[str, Any]]) -> None:
+            nonlocal completados, concurrencia, modelo_batches, codigos_recientes, seccion_codigos, fallido
+            nonlocal proximo_codigo
+            async with semaforo:
+                if fallido or (plazo is not None and plazo.vencido()):
+                    return
+                indice_inicial = dict(indice_conceptos)
+                estado_batch: EstadoCodificacion = {
+                    **estado_inicial,
+                    "modelo_gpt": modelo_batches,
+                    "respuestas": batch,
+                    "limites_batches": [0, len(batch)],
+                    "batch_actual": 0,
+                    "batch_respuestas": [],
+                    "codificaciones": [],
+                    "indice_conceptos": indice_inicial,
+                    "proximo_codigo_nuevo": proximo_codigo,
+                    "codigos_recientes": codigos_recientes,
+                    "seccion_codigos_existentes": seccion_codigos,
+                    **{contador: 0 for contador in CONTADORES_ESTADO},
+                }
+                config_batch = RunnableConfig(recursion_limit=100, configurable=configurable or {})
+                try:
+                    estado_salida = await app.ainvoke(estado_batch, config_batch)
+                except Exception:
+                    if plazo is not None and plazo.vencido():
+                        print(f"   ⏱️  Batch {indice + 1} cortado por el plazo del trabajo")
+                        return
+                    fallido = True
+                    raise
+                
+                if estado_batch["modelo_gpt"] != estado_inicial["modelo_gpt"]:
+                    # Todo el batch corrió con el modelo de respaldo del plazo
+                    for clave in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                        estado_salida[f"{clave}_rapido"] = estado_salida.get(clave, 0)
+                # Los batches en vuelo numeran sus conceptos desde el mismo contador:
+                # se pasan a códigos del trabajo antes de que los vean los siguientes
+                mapa, conceptos_nuevos, proximo_codigo = asignar_codigos_creados(
+                    {
+                        clave: codigo
+                        for clave, codigo in estado_salida["indice_conceptos"].items()
+                        if clave not in indice_inicial
+                    },
+                    indice_conceptos,
+                    proximo_codigo,
+                )
+                for cod in estado_salida["codificaciones"]:
+                    cod["codigos_nuevos"] = [
+                        {**nuevo, "codigo": mapa.get(nuevo["codigo"], nuevo["codigo"])}
+                        for nuevo in cod["codigos_nuevos"]
+                    ]
+                resultados[indice] = estado_salida
+                agregar_conceptos(indice_conceptos, conceptos_nuevos)
+                creados = {
+                    mapa[codigo]: descripcion
+                    for codigo, descripcion in estado_salida["codigos_recientes"].items()
+                    if codigo in mapa and mapa[codigo] not in codigos_recientes
+                }
+                if guardar_checkpoint is not None:
+                    guardar_checkpoint(indice, {
+                        "codificaciones": estado_salida["codificaciones"],
+                        "indice_conceptos": conceptos_nuevos,
+                        "codigos_recientes": creados,
+                        **{contador: estado_salida.get(contador, 0) for contador in CONTADORES_ESTADO},
+                    })
+                if creados:
+                    codigos_recientes = actualizar_codigos_recientes(codigos_recientes, creados)
+                    seccion_codigos = renderizar_codigos_existentes(codigos_recientes)
+                completados += 1
+                
+                if plazo is not None:
+                    nueva_concurrencia, modelo_batches = self._reaccionar_al_plazo(
+                        plazo, completados, total_batches, concurrencia, modelo_batches
+                    )
+                    for _ in range(nueva_concurrencia - concurrencia):
+                        semaforo.release()
+                    concurrencia = nueva_concurrencia
+                
+                if progress_callback:
+                    progreso = min(completados / total_batches, 0.98)
+                    mensaje = f"🚀 Batch {completados}/{total_batches} completado"
+                    await self._notificar_progreso(progress_callback, progreso, mensaje)
+        
+        tareas = [
+            asyncio.create_task(_procesar(indice, batch))
+            for indice, batch in enumerate(batches)
+            if resultados[indice] is None
+        ]
+        try:
+            if guardar_checkpoint is None:
+                await asyncio.gather(*tareas)
+            else:
+                # Con checkpoints, tras un error los batches en vuelo terminan (su llamada
+                # ya está pagada) y quedan guardados; los que no empezaron se saltan
+                for resultado in await asyncio.gather(*tareas, return_exceptions=True):
+                    if isinstance(resultado, BaseException):
+                        raise resultado
+        except Exception as e:
+            for tarea in tareas:
+                tarea.cancel()
+            import traceback
+            print("❌ ERROR en _ejecutar_concurrente:")
+            print(traceback.format_exc())
+            mensaje_error = str(e) or f"Error durante la ejecución del grafo: {type(e).__name__}"
+            raise RuntimeError(f"Error durante la codificación: {mensaje_error}") from e
+        
+        codificaciones, proximo_codigo = fusionar_codigos_nuevos(
+            [r["codificaciones"] for r in resultados if r is not None],
+            estado_inicial["proximo_codigo_nuevo"],
+            estado_inicial["catalogo"],
+        )
+        sin_codificar = [
+            {
+                "fila_excel": resp["fila_excel"],
+                "texto": resp["texto"],
+                "decision": "sin_codificar",
+                "codigos_historicos": [],
+                "codigos_nuevos": [],
+                "dato_auxiliar": resp.get("dato_auxiliar"),
+                "categoria": None,
+            }
+            for batch, resultado in zip(batches, resultados) if resultado is None
+            for resp in batch
+        ]
+        if sin_codificar and plazo is not None:
+            plazo.registrar("resultado_parcial", respuestas_sin_codificar=len(sin_codificar))
+            print(f"⏱️  Plazo vencido: {len(sin_codificar)} respuestas quedan sin codificar (resultado parcial)")
+            codificaciones = sorted(codificaciones + sin_codificar, key=lambda c: c["fila_excel"])
+        
+        if progress_callback:
+            await self._notificar_progreso(progress_callback, 1.0, "✅ Codificación completada")
+        
+        return {
+            **estado_inicial,
+            "batch_actual": len(batches),
+            "codificaciones": codificaciones,
+            "proximo_codigo_nuevo": proximo_codigo,
+            **{
+                contador: sum(r.get(contador, 0) for r in resultados if r is not None)
+                for contador in CONTADORES_ESTADO
+            },
+        }
+
+    def _reaccionar_al_plazo(
+        self,
+        plazo: PlazoTrabajo,
+        completados: int,
+        total_batches: int,
+        concurrencia: int,
+        modelo: str
+    ) -> tuple[int, str]:
+        """
+        Elige una acción si la proyección del trabajo no llega al plazo.
+        
+        Se toma como máximo una acción por batch terminado, en este orden:
+        subir la concurrencia (al doble, hasta la del backend) y pasar los
+        batches pendientes al modelo rápido (el de la cascada o
+        PLAZO_MODELO_RAPIDO). Las acciones quedan en `plazo.acciones`.
+        
+        Returns:
+            Tupla con (concurrencia, modelo) para los batches siguientes
+        """
+        if completados >= total_batches or not plazo.en_riesgo(completados, total_batches):
+            return concurrencia, modelo
+        
+        if concurrencia < self.backend.concurrencia_maxima:
+            nueva = min(concurrencia * 2, self.backend.concurrencia_maxima)
+            plazo.registrar("subir_concurrencia", de=concurrencia, a=nueva)
+            print(f"⏱️  Plazo en riesgo: {concurrencia} → {nueva} batches en vuelo")
+            return nueva, modelo
+        
+        rapido = self.modelo_rapido or PLAZO_MODELO_RAPIDO
+        if rapido and rapido != modelo:
+            plazo.registrar("modelo_rapido", de=modelo, a=rapido)
+            print(f"⏱️  Plazo en riesgo: batches pendientes con {rapido} en lugar de {modelo}")
+            self._modelo_plazo = rapido
+            return concurrencia, rapido
+        
+        return concurrencia, modelo
+
+    async def _ejecutar_lote(
+        self,
+        estado_inicial: EstadoCodificacion,
+        progress_callback=None
+    ) -> EstadoCodificacion:
+        """
+        Codifica todos los batches con la API de lotes del proveedor (modo offline).
+        
+        Los prompts de todos los batches se generan de antemano y se envían en un
+        solo lote; al terminar, cada resultado pasa por el mismo parseo, filtrado
+        y ensamblado que en la ejecución del grafo. Como los batches no ven los
+        códigos nuevos creados por los demás, al final se reconcilian con la misma
+        fusión que el modo concurrente: un código por concepto, numeración
+        secuencial y reutilización de los códigos del catálogo.
+        
+        Las solicitudes que fallan en el lote (o devuelven salida inválida) se
+        recodifican en modo interactivo.
+        
+        Returns:
+            Estado final con la misma estructura que la ejecución secuencial
+            
+        Raises:
+            RuntimeError: Si el lote falla o alguno de los batches no se puede codificar
+        """
+        import asyncio
+        
+        respuestas = estado_inicial["respuestas"]
+        limites = estado_inicial["limites_batches"]
+        estados_batch: List[EstadoCodificacion] = [
+            {
+                **estado_inicial,
+                "respuestas": respuestas[inicio:fin],
+                "limites_batches": [0, fin - inicio],
+                "batch_respuestas": respuestas[inicio:fin],
+                "codificaciones": [],
+                # La cascada es interactiva: en el lote todo va al modelo principal
+                "modelo_rapido": None,
+                **{contador: 0 for contador in CONTADORES_ESTADO},
+            }
+            for inicio, fin in zip(limites, limites[1:])
+        ]
+        total_batches = len(estados_batch)
+        
+        try:
+            # Prompts de todos los batches (los hits de caché no se envían)
+            preparaciones: List[Dict[str, Any]] = []
+            solicitudes: List[Dict[str, Any]] = []
+            for indice, estado_batch in enumerate(estados_batch):
+                preparacion, body = preparar_solicitud_lote(estado_batch)
+                preparaciones.append(preparacion)
+                if body is not None:
+                    solicitudes.append(solicitud_lote(f"batch-{indice}", body))
+            
+            mensajes: Dict[str, Any] = {}
+            if solicitudes:
+                mensajes = await self._enviar_y_esperar_lote(solicitudes, progress_callback)
+            
+            prompt_lote = completion_lote = 0
+            for mensaje in mensajes.values():
+                if mensaje is not None:
+                    prompt, completion, _total = extraer_tokens(mensaje)
+                    prompt_lote += prompt
+                    completion_lote += completion
+            self._estadisticas_lote = {
+                "solicitudes_lote": len(solicitudes),
+                "fallidas_lote": sum(
+                    1 for solicitud in solicitudes if mensajes.get(solicitud["custom_id"]) is None
+                ),
+                "prompt_tokens_lote": prompt_lote,
+                "completion_tokens_lote": completion_lote,
+            }
+            
+            # Ensamblado (y recodificación interactiva de las fallidas)
+            semaforo = asyncio.Semaphore(self.batches_concurrentes)
+            completados = 0
+            
+            async def _ensamblar(indice: int) -> EstadoCodificacion:
+                nonlocal completados
+                async with semaforo:
+                    estado_batch = aplicar_actualizacion(
+                        estados_batch[indice],
+                        await codificar_desde_lote(
+                            estados_batch[indice], preparaciones[indice], mensajes.get(f"batch-{indice}")
+                        ),
+                    )
+                    estado_batch = aplicar_actualizacion(estado_batch, await nodo_ensamblar(estado_batch))
+                completados += 1
+                if progress_callback:
+                    progreso = min(0.9 + 0.08 * completados / total_batches, 0.98)
+                    mensaje = f"🔧 Ensamblando resultados del lote ({completados}/{total_batches})"
+                    await self._notificar_progreso(progress_callback, progreso, mensaje)
+                return estado_batch
+            
+            resultados = await asyncio.gather(*(_ensamblar(i) for i in range(total_batches)))
+        except Exception as e:
+            import traceback
+            print("❌ ERROR en _ejecutar_lote:")
+            print(traceback.format_exc())
+            mensaje_error = str(e) or f"Error durante la codificación en lote: {type(e).__name__}"
+            raise RuntimeError(f"Error durante la codificación: {mensaje_error}") from e
+        
+        # Reconciliación de los códigos nuevos entre batches
+        codificaciones, proximo_codigo = fusionar_codigos_nuevos(
+            [r["codificaciones"] for r in resultados],
+            estado_inicial["proximo_codigo_nuevo"],
+            estado_inicial["catalogo"],
+        )
+        
+        if progress_callback:
+            await self._notificar_progreso(progress_callback, 1.0, "✅ Codificación completada")
+        
+        return {
+            **estado_inicial,
+            "batch_actual": total_batches,
+            "codificaciones": codificaciones,
+            "proximo_codigo_nuevo": proximo_codigo,
+            **{
+                contador: sum(r.get(contador, 0) for r in resultados)
+                for contador in CONTADORES_ESTADO
+            },
+        }
+
+    async def _enviar_y_esperar_lote(
+        self,
+        solicitudes: List[Dict[str, Any]],
+        progress_callback=None
+    ) -> Dict[str, Any]:
+        """
+        Envía las solicitudes a la API de lotes y espera a que terminen.
+        
+        Si superan MAX_SOLICITUDES_POR_LOTE se reparten en varios lotes que se
+        procesan en paralelo.
+        
+        Returns:
+            Mensaje del resultado por custom_id (None si la solicitud falló)
+            
+        Raises:
+            ErrorLote: Si algún lote termina en estado "failed"
+        """
+        import asyncio
+        
+        cliente = self.cliente_lotes or ClienteLotes()
+        lotes = []
+        for inicio in range(0, len(solicitudes), MAX_SOLICITUDES_POR_LOTE):
+            lote = await cliente.enviar(solicitudes[inicio:inicio + MAX_SOLICITUDES_POR_LOTE])
+            print(f"📤 Lote {lote['id']} enviado ({lote.get('request_counts', {}).get('total', '?')} solicitudes)")
+            lotes.append(lote)
+        await self._notificar_progreso(
+            progress_callback, 0.02, f"📤 {len(solicitudes)} solicitudes enviadas a la API de lotes"
+        )
+        
+        terminadas: Dict[str, int] = {}
+        
+        async def _al_sondear(lote: Dict[str, Any]) -> None:
+            conteo = lote.get("request_counts") or {}
+            terminadas[lote["id"]] = conteo.get("completed", 0) + conteo.get("failed", 0)
+            hechas = sum(terminadas.values())
+            mensaje = f"⏳ Lote: {hechas}/{len(solicitudes)} solicitudes procesadas ({lote.get('status')})"
+            await self._notificar_progreso(progress_callback, 0.02 + 0.88 * hechas / len(solicitudes), mensaje)
+        
+        finales = await asyncio.gather(*(
+            cliente.esperar(lote["id"], self.intervalo_sondeo, _al_sondear) for lote in lotes
+        ))
+        
+        mensajes: Dict[str, Any] = {}
+        for lote in finales:
+            if lote.get("status") == "failed":
+                raise ErrorLote(f"El lote {lote['id']} falló: {lote.get('errors')}")
+            print(f"📥 Lote {lote['id']} terminado ({lote.get('status')}): {lote.get('request_counts')}")
+            mensajes.update(await cliente.resultados(lote))
+        return mensajes
+
     def _construir_dataframe_resultados(
         self,
         estado_final: EstadoCodificacion,
         df: pd.DataFrame,
         columna_id: str,
-        nombre_pregunta: str
+        nombre_pregunta: str,
+        duplicados: Optional[Dict[int, List[Dict[str, Any]]]] = None
     ) -> pd.DataFrame:
         """
         Construye el DataFrame de resultados a partir del estado final.
         
+        Las codificaciones de las respuestas representantes se replican en
+        las filas repetidas (`duplicados`), y el estado final queda con las
+        codificaciones de todas las filas.
+        
         Returns:
             DataFrame con los resultados
         """
+        if duplicados:
+            estado_final["codificaciones"] = expandir_duplicados(
+                estado_final["codificaciones"], duplicados
+            )
+
         decisiones: Dict[str, int] = {}
         for c in estado_final["codificaciones"]:
             dec = c["decision"]
@@ -506,7 +1518,10 @@ class CodificadorNuevo:
         self.df_codigos_nuevos = df_catalogo_nuevos
 
         # Calcular estadísticas
-        total_respuestas_codificadas = len(estado_final["codificaciones"])
+        respuestas_sin_codificar = sum(
+            1 for c in estado_final["codificaciones"] if c["decision"] == "sin_codificar"
+        )
+        total_respuestas_codificadas = len(estado_final["codificaciones"]) - respuestas_sin_codificar
         total_codigos_nuevos = len(df_catalogo_nuevos) if not df_catalogo_nuevos.empty else 0
         total_codigos_historicos = sum(
             len(c["codigos_historicos"]) for c in estado_final["codificaciones"]
@@ -514,7 +1529,34 @@ class CodificadorNuevo:
         prompt_tokens = estado_final.get("prompt_tokens", 0)
         completion_tokens = estado_final.get("completion_tokens", 0)
         total_tokens = estado_final.get("total_tokens", 0)
-        costo_total = calcular_costo(prompt_tokens, completion_tokens, self.modelo)
+        cached_tokens = estado_final.get("cached_tokens", 0)
+        # Los tokens procesados en la API de lotes se cobran con descuento
+        prompt_lote = self._estadisticas_lote.get("prompt_tokens_lote", 0)
+        completion_lote = self._estadisticas_lote.get("completion_tokens_lote", 0)
+        costo_lote = self.backend.calcular_costo(prompt_lote, completion_lote, self.modelo, en_lote=True)
+        tokens_por_modelo = self._tokens_por_modelo(estado_final)
+        costo_total = 0.0
+        costo_sin_cache_prompts = 0.0
+        for modelo, uso in tokens_por_modelo.items():
+            # Los tokens del lote son todos del modelo principal
+            prompt_lote_modelo, completion_lote_modelo = (
+                (prompt_lote, completion_lote) if modelo == self.modelo else (0, 0)
+            )
+            costo_lote_modelo = self.backend.calcular_costo(prompt_lote_modelo, completion_lote_modelo, modelo, en_lote=True)
+            prompt_interactivo = uso["prompt_tokens"] - prompt_lote_modelo
+            completion_interactivo = uso["completion_tokens"] - completion_lote_modelo
+            uso["costo"] = costo_lote_modelo + self.backend.calcular_costo(
+                prompt_interactivo, completion_interactivo, modelo, uso["cached_tokens"]
+            )
+            costo_total += uso["costo"]
+            costo_sin_cache_prompts += costo_lote_modelo + self.backend.calcular_costo(
+                prompt_interactivo, completion_interactivo, modelo
+            )
+        ahorro_cache_prompts = costo_sin_cache_prompts - costo_total
+        respuestas_cascada = estado_final.get("respuestas_cascada", 0)
+        respuestas_escaladas = estado_final.get("respuestas_escaladas", 0)
+        cache_hits = estado_final.get("cache_hits", 0)
+        cache_consultas = estado_final.get("cache_consultas", 0)
 
         self.stats = {
             "total_respuestas_codificadas": total_respuestas_codificadas,
@@ -523,8 +1565,63 @@ class CodificadorNuevo:
             "total_tokens": total_tokens,
             "prompt_tokens": prompt_tokens,
             "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "cached_ratio": (cached_tokens / prompt_tokens) if prompt_tokens else 0.0,
             "costo_total": costo_total,
+            "ahorro_cache_prompts": ahorro_cache_prompts,
+            "reintentos_llm": estado_final.get("reintentos_llm", 0),
+            "reintentos_429": estado_final.get("reintentos_429", 0),
+            "divisiones_batch": estado_final.get("divisiones_batch", 0),
+            "reparaciones_json": estado_final.get("reparaciones_json", 0),
+            "cache_hits": cache_hits,
+            "cache_consultas": cache_consultas,
+            "cache_hit_ratio": (cache_hits / cache_consultas) if cache_consultas else 0.0,
+            "respuestas_unicas": self._respuestas_unicas,
+            "respuestas_agrupadas_similares": (
+                len(self.df_auditoria_similares) if self.df_auditoria_similares is not None else 0
+            ),
+            "preclasificadas_lexico": self._preclasificadas,
+            "solicitudes_lote": self._estadisticas_lote.get("solicitudes_lote", 0),
+            "fallidas_lote": self._estadisticas_lote.get("fallidas_lote", 0),
+            "ahorro_api_lotes": self.backend.calcular_costo(prompt_lote, completion_lote, self.modelo) - costo_lote,
+            "backend": self.backend.nombre,
+            "tokens_por_modelo": tokens_por_modelo,
+            "respuestas_cascada": respuestas_cascada,
+            "respuestas_escaladas": respuestas_escaladas,
+            "tasa_escalado": (respuestas_escaladas / respuestas_cascada) if respuestas_cascada else 0.0,
+            "redundantes_emitidas": estado_final.get("redundantes_emitidas", 0),
+            "redundantes_ganadoras": estado_final.get("redundantes_ganadoras", 0),
+            "tokens_redundantes": estado_final.get("tokens_redundantes", 0),
+            "plazo_segundos": self.plazo_segundos,
+            "acciones_plazo": list(self._plazo.acciones) if self._plazo else [],
+            "resultado_parcial": respuestas_sin_codificar > 0,
+            "respuestas_sin_codificar": respuestas_sin_codificar,
+            "slots_llm_ahorrados": (
+                total_respuestas_codificadas - self._respuestas_unicas + self._preclasificadas
+            ),
+        }
+
+    def _tokens_por_modelo(self, estado_final: EstadoCodificacion) -> Dict[str, Dict[str, Any]]:
+        """
+        Reparte los tokens del trabajo entre el modelo rápido (cascada o respaldo
+        del plazo) y el principal.
+        
+        Returns:
+            {modelo: {"prompt_tokens", "completion_tokens", "cached_tokens"}}
+        """
+        rapido = {
+            "prompt_tokens": estado_final.get("prompt_tokens_rapido", 0),
+            "completion_tokens": estado_final.get("completion_tokens_rapido", 0),
+            "cached_tokens": estado_final.get("cached_tokens_rapido", 0),
+        }
+        principal = {
+            clave: estado_final.get(clave, 0) - valor for clave, valor in rapido.items()
         }
+        tokens = {self.modelo: principal}
+        modelo_rapido = self.modelo_rapido or self._modelo_plazo
+        if modelo_rapido:
+            tokens[modelo_rapido] = rapido
+        return tokens
 
     def exportar_catalogo_nuevos(self, nombre_proyecto: str) -> Optional[str]:
         """
@@ -1,7 +1,7 @@
 """
 Utilidades del core.
 """
-from .token_utils import extraer_tokens
+from .token_utils import extraer_tokens, extraer_tokens_cacheados
 from .text_processing import (
     normalizar_texto,
     son_conceptos_similares,
@@ -12,6 +12,7 @@ from .text_processing import (
 
 __all__ = [
     "extraer_tokens",
+    "extraer_tokens_cacheados",
     "normalizar_texto",
     "son_conceptos_similares",
     "detectar_codigo_especial",
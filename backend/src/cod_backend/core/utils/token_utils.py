@@ -9,7 +9,8 @@ def extraer_tokens(response: Any) -> Tuple[int, int, int]:
     Extrae (prompt_tokens, completion_tokens, total_tokens) desde response_metadata.
     
     Compatible con los formatos nuevos de OpenAI (input/output/total_tokens) 
-    y antiguos (prompt_tokens/completion_tokens/total_tokens).
+    y antiguos (prompt_tokens/completion_tokens/total_tokens). En streaming el
+    uso llega solo en `usage_metadata` del mensaje acumulado.
     
     Args:
         response: Respuesta del LLM (ChatOpenAI response)
@@ -18,7 +19,12 @@ def extraer_tokens(response: Any) -> Tuple[int, int, int]:
         Tupla con (prompt_tokens, completion_tokens, total_tokens)
     """
     meta = getattr(response, "response_metadata", {}) or {}
-    usage = meta.get("token_usage") or meta.get("usage") or {}
+    usage = (
+        meta.get("token_usage")
+        or meta.get("usage")
+        or getattr(response, "usage_metadata", None)
+        or {}
+    )
 
     prompt = (
         usage.get("prompt_tokens")
@@ -36,3 +42,28 @@ def extraer_tokens(response: Any) -> Tuple[int, int, int]:
     )
     return int(prompt or 0), int(completion or 0), int(total or 0)
 
+
+
+def extraer_tokens_cacheados(response: Any) -> int:
+    """
+    Extrae los tokens de entrada servidos desde la caché de prompts del proveedor.
+    
+    Son un subconjunto de prompt_tokens (el prefijo repetido del prompt) y se
+    facturan con descuento. Compatible con `prompt_tokens_details.cached_tokens`
+    (Chat Completions), `input_tokens_details.cached_tokens` (Responses) y
+    `usage_metadata.input_token_details.cache_read` (LangChain).
+    
+    Args:
+        response: Respuesta del LLM (ChatOpenAI response)
+        
+    Returns:
+        Número de tokens de entrada cacheados (0 si el proveedor no lo informa)
+    """
+    meta = getattr(response, "response_metadata", {}) or {}
+    usage = meta.get("token_usage") or meta.get("usage") or {}
+    detalles = usage.get("prompt_tokens_details") or usage.get("input_tokens_details") or {}
+    cacheados = detalles.get("cached_tokens")
+    if cacheados is None:
+        usage_metadata = getattr(response, "usage_metadata", None) or {}
+        cacheados = (usage_metadata.get("input_token_details") or {}).get("cache_read")
+    return int(cacheados or 0)
@@ -9,6 +9,8 @@ import uvicorn
 
 from .api.routes import codificacion, progress
 from .schemas.api_schemas import HealthResponse
+from .core.codificacion.llm import cerrar_clientes
+from .core.codificacion.prompts import precargar_prompts
 from . import config
 
 # Crear aplicación FastAPI
@@ -59,9 +61,17 @@ async def startup_event():
     # 🆕 MEJORA 2: Limpieza automática de archivos temporales al inicio
     print("🧹 Ejecutando limpieza automática de archivos temporales...")
     codificacion.limpiar_archivos_temporales(horas_antiguedad=24)
+    total_prompts = precargar_prompts()
+    print(f"📝 {total_prompts} prompts compilados en memoria")
     print("✅ Servidor iniciado correctamente")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Libera el pool de conexiones compartido con el LLM"""
+    await cerrar_clientes()
+
+
 # ========== ENDPOINTS BASE ==========
 
 @app.get("/")
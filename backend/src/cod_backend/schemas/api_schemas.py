@@ -10,6 +10,26 @@ class CodificacionRequest(BaseModel):
     ruta_respuestas: str = Field(..., description="Ruta al archivo Excel de respuestas")
     ruta_codigos: Optional[str] = Field(None, description="Ruta al archivo Excel de códigos históricos (opcional)")
     modelo: str = Field("gpt-4o-mini", description="Modelo GPT a usar")
+    batches_concurrentes: int = Field(1, ge=1, le=32, description="Batches procesados en paralelo (1 = secuencial)")
+    umbral_similares: Optional[float] = Field(
+        None, ge=0.5, le=1.0, description="Similitud mínima para agrupar respuestas casi duplicadas (None = desactivado)"
+    )
+    preclasificar: bool = Field(False, description="Asignar sin LLM los códigos del catálogo con coincidencia léxica clara")
+    modo_lote: bool = Field(
+        False, description="Codificación offline con la API de lotes del proveedor (más barata, sin interactividad)"
+    )
+    modelo_rapido: Optional[str] = Field(
+        None, description="Modelo económico de primera pasada; solo las respuestas inciertas se escalan a `modelo`"
+    )
+    solicitudes_redundantes: Optional[bool] = Field(
+        None, description="Repetir como solicitud redundante las llamadas más lentas que el percentil de latencia del trabajo (None = LLM_SOLICITUDES_REDUNDANTES)"
+    )
+    backend: Optional[str] = Field(
+        None, description="Backend de LLM: openai, compatible (servidor propio) o determinista (None = LLM_BACKEND)"
+    )
+    plazo_segundos: Optional[float] = Field(
+        None, ge=0, description="Plazo del trabajo en segundos; vencido, se devuelve un resultado parcial (None = TRABAJO_PLAZO_SEGUNDOS, 0 = sin plazo)"
+    )
 
 
 class CodificacionResponse(BaseModel):
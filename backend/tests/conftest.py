@@ -0,0 +1,28 @@
+"""
+Fixtures compartidas de los tests
+"""
+import pandas as pd
+import pytest
+
+# Catálogo histórico por defecto de los archivos de prueba (código -> descripción)
+CATALOGO_BASE = {1: "Precio", 2: "Atención"}
+
+
+@pytest.fixture
+def archivos_encuesta(tmp_path):
+    """
+    Escribe en tmp_path el Excel de respuestas y el del catálogo histórico.
+
+    Devuelve una función `(textos, catalogo=CATALOGO_BASE)` que escribe las
+    respuestas (IDs de 1 a len(textos), columna "P1") y el catálogo
+    (código -> descripción) y retorna (ruta_respuestas, ruta_codigos).
+    """
+    def _escribir(textos, catalogo=None):
+        catalogo = CATALOGO_BASE if catalogo is None else catalogo
+        ruta_respuestas = tmp_path / "respuestas.xlsx"
+        ruta_codigos = tmp_path / "codigos.xlsx"
+        pd.DataFrame({"ID": range(1, len(textos) + 1), "P1": list(textos)}).to_excel(ruta_respuestas, index=False)
+        pd.DataFrame({"COD": list(catalogo), "TEXTO": list(catalogo.values())}).to_excel(ruta_codigos, index=False)
+        return str(ruta_respuestas), str(ruta_codigos)
+
+    return _escribir
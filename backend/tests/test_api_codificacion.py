@@ -68,6 +68,18 @@ def test_codificar_archivo_inexistente():
         assert "detail" in response.json() or "message" in response.json()
 
 
+def test_codificar_nuevo_upload_umbral_invalido(tmp_path, monkeypatch):
+    """Un umbral de similares fuera de (0, 1] devuelve 400, no 500"""
+    monkeypatch.chdir(tmp_path)
+    response = client.post(
+        "/api/v1/codificar-nuevo-upload",
+        files={"archivo_respuestas": ("respuestas.xlsx", b"contenido", "application/octet-stream")},
+        data={"umbral_similares": "0", "backend": "determinista"},
+    )
+    assert response.status_code == 400
+    assert "umbral_similares" in response.json()["detail"]
+
+
 def test_root_endpoint():
     """Test del endpoint raíz"""
     response = client.get("/")
@@ -0,0 +1,133 @@
+"""
+Tests de los backends de LLM (OpenAI, servidor compatible y determinista)
+"""
+import asyncio
+
+import pytest
+
+from cod_backend.core import CodificadorNuevo
+from cod_backend.core.codificacion.llm import (
+    BackendCompatible,
+    BackendLLM,
+    obtener_backend,
+    registrar_backend,
+    codificar_prompt,
+)
+
+
+def _textos(total=30):
+    textos = []
+    for i in range(total):
+        if i % 3 == 0:
+            textos.append(f"el precio es justo {i}")
+        elif i % 3 == 1:
+            textos.append(f"muy buena atención del personal {i}")
+        else:
+            textos.append(f"sabor rico {i}" if i % 2 else f"porción pequeña {i}")
+    return textos
+
+
+@pytest.mark.parametrize("protocolo", ["completo", "compacto"])
+def test_backend_determinista_de_punta_a_punta(archivos_encuesta, protocolo):
+    """El grafo completo corre sin red, en modo secuencial y concurrente, con los mismos resultados"""
+    ruta_respuestas, ruta_codigos = archivos_encuesta(_textos())
+    resultados = []
+    for concurrentes in (1, 4, 1):
+        codificador = CodificadorNuevo(
+            modelo="determinista",
+            backend="determinista",
+            usar_cache=False,
+            protocolo_salida=protocolo,
+            batches_concurrentes=concurrentes,
+            max_respuestas_batch=10,
+        )
+        df = asyncio.run(codificador.ejecutar_codificacion(ruta_respuestas, ruta_codigos))
+        resultados.append(list(df["Códigos asignados"]))
+
+        assert set(df[df["P1"].str.startswith("el precio")]["Códigos asignados"]) == {"1"}
+        assert set(df[df["P1"].str.startswith("muy buena")]["Códigos asignados"]) == {"2"}
+        # Un concepto nuevo de un batch anterior se reutiliza en los siguientes
+        codigos_sabor = set(df[df["P1"].str.startswith("sabor rico")]["Códigos asignados"])
+        assert len(codigos_sabor) == 1 and codigos_sabor != {""}
+        assert len(codificador.df_codigos_nuevos) >= 2
+        assert codificador.stats["backend"] == "determinista"
+        assert codificador.stats["prompt_tokens"] > 0
+        assert codificador.stats["costo_total"] == 0.0
+
+    # Misma entrada, misma salida (también entre secuencial y concurrente)
+    assert resultados[0] == resultados[1] == resultados[2]
+
+
+def test_codificar_prompt_reutiliza_codigos_existentes():
+    """Un concepto ya creado en batches anteriores no se vuelve a proponer"""
+    prompt = (
+        "### CATÁLOGO HISTÓRICO\n  1. Precio\n\n"
+        "### CÓDIGOS NUEVOS YA CREADOS EN BATCHES ANTERIORES\n  7: Sabor rico\n\n"
+        "### CÓDIGO BASE PARA CÓDIGOS NUEVOS\n8\n\n"
+        "### RESPUESTAS\n1. precio alto\n2. sabor rico\n3. -"
+    )
+
+    salida = codificar_prompt(prompt)
+
+    assert [v["es_valida"] for v in salida["validaciones"]] == [True, True, False]
+    assert salida["evaluaciones"][0]["evaluaciones"] == [{"codigo": 1, "aplica": True, "confianza": 0.95}]
+    assert salida["analisis"][1]["conceptos_nuevos"][0]["codigo"] == 7
+
+
+def test_backend_compatible_declara_sus_caracteristicas():
+    """Un servidor propio tiene su cuota, su clave de caché y su costo"""
+    backend = BackendCompatible(
+        base_url="http://inferencia.lan:8000/v1",
+        concurrencia_maxima=3,
+        ventana_contexto=8192,
+        precio_prompt_1k=0.001,
+        precio_completion_1k=0.002,
+        nombre="lan",
+    )
+
+    assert backend.identificador("llama-3") == "lan:llama-3"
+    assert backend.limites("llama-3")["concurrencia_maxima"] == 3
+    assert backend.calcular_costo(2000, 1000, "llama-3") == pytest.approx(0.004)
+    assert str(backend.obtener_llm("llama-3").openai_api_base) == "http://inferencia.lan:8000/v1"
+
+    codificador = CodificadorNuevo(modelo="llama-3", backend=backend, batches_concurrentes=10)
+    assert codificador.backend is backend
+    assert codificador.batches_concurrentes == 3
+    assert codificador.catalogo_max_tokens <= 8192 // 4
+
+
+def test_backend_por_instancia_o_por_nombre_registrado():
+    """Una instancia queda en su trabajo; un nombre registrado se busca sin distinguir mayúsculas"""
+    integrado = obtener_backend("compatible")
+    propio = BackendCompatible(base_url="http://otro.lan:8000/v1")
+
+    codificador = CodificadorNuevo(modelo="llama-3", backend=propio)
+    assert codificador.backend is propio
+    assert obtener_backend("compatible") is integrado
+
+    gpu = registrar_backend(BackendCompatible(base_url="http://gpu.lan:8000/v1", nombre="LocalGPU"))
+    assert CodificadorNuevo(modelo="llama-3", backend="LocalGPU").backend is gpu
+    assert obtener_backend("localgpu") is gpu
+
+    with pytest.raises(TypeError):
+        BackendLLM()
+
+
+def test_salida_estructurada_solo_si_el_backend_la_admite():
+    """Un servidor compatible sin json_schema no recibe response_format salvo que se configure"""
+    sin_esquema = BackendCompatible(base_url="http://otro.lan:8000/v1")
+    con_esquema = BackendCompatible(base_url="http://otro.lan:8000/v1", soporta_salida_estructurada=True)
+
+    assert not sin_esquema.soporta_salida_estructurada
+    assert not CodificadorNuevo(modelo="llama-3", backend=sin_esquema, salida_estructurada=True).salida_estructurada
+    assert CodificadorNuevo(modelo="llama-3", backend=con_esquema, salida_estructurada=True).salida_estructurada
+    assert obtener_backend("openai").soporta_salida_estructurada
+
+
+def test_backend_invalido_o_sin_lotes():
+    """Backends desconocidos o sin API de lotes se rechazan al crear el codificador"""
+    assert obtener_backend("openai").identificador("gpt-4o") == "gpt-4o"
+    with pytest.raises(ValueError):
+        CodificadorNuevo(backend="desconocido")
+    with pytest.raises(ValueError):
+        CodificadorNuevo(backend="determinista", modo_lote=True)
@@ -0,0 +1,65 @@
+"""
+Tests para el orden del prompt (caché de prompts del proveedor) y el costo de tokens cacheados
+"""
+from langchain_core.messages import AIMessage
+
+from cod_backend.config import calcular_costo
+from cod_backend.core.codificacion.prompts import obtener_prompt
+from cod_backend.core.utils import extraer_tokens_cacheados
+
+
+def _renderizar(respuestas, codigo_base, codigos_existentes="No hay códigos nuevos creados en batches anteriores."):
+    return obtener_prompt("codificar_combinado").format(
+        pregunta="¿Por qué recomendaría la marca?",
+        catalogo="  1. Precio\n  2. Servicio",
+        codigos_existentes=codigos_existentes,
+        respuestas=respuestas,
+        codigo_base=codigo_base,
+    )
+
+
+def test_prefijo_del_prompt_es_igual_entre_batches():
+    """Las instrucciones, la pregunta y el catálogo van antes que los datos de cada batch"""
+    primero = _renderizar("1. buen precio", 3)
+    segundo = _renderizar("1. mala atención\n2. caro", 7, "  3: Atención")
+
+    prefijo_comun = 0
+    while primero[prefijo_comun] == segundo[prefijo_comun]:
+        prefijo_comun += 1
+
+    assert "PASO 1: VALIDACIÓN" in primero[:prefijo_comun]
+    assert "  1. Precio\n  2. Servicio" in primero[:prefijo_comun]
+    assert prefijo_comun > 0.9 * len(primero)
+
+
+def test_codigo_base_se_renderiza():
+    """El código base llega al prompt como número, sin llaves literales"""
+    texto = _renderizar("1. buen precio", 42)
+
+    assert "{codigo_base}" not in texto
+    assert "### CÓDIGO BASE PARA CÓDIGOS NUEVOS\n42" in texto
+    assert texto.rstrip().endswith("1. buen precio")
+
+
+def test_extraer_tokens_cacheados():
+    """Lee los tokens cacheados de los formatos de uso de OpenAI"""
+    chat = AIMessage(content="", response_metadata={
+        "token_usage": {"prompt_tokens": 2000, "prompt_tokens_details": {"cached_tokens": 1536}},
+    })
+    responses = AIMessage(content="", response_metadata={
+        "usage": {"input_tokens": 2000, "input_tokens_details": {"cached_tokens": 1024}},
+    })
+    sin_detalle = AIMessage(content="", response_metadata={"token_usage": {"prompt_tokens": 100}})
+
+    assert extraer_tokens_cacheados(chat) == 1536
+    assert extraer_tokens_cacheados(responses) == 1024
+    assert extraer_tokens_cacheados(sin_detalle) == 0
+
+
+def test_costo_descuenta_tokens_cacheados():
+    """Los tokens cacheados se cobran con su precio y no como entrada normal"""
+    sin_cache = calcular_costo(10_000, 1_000, "gpt-4o")
+    con_cache = calcular_costo(10_000, 1_000, "gpt-4o", cached_tokens=8_000)
+
+    assert round(sin_cache, 6) == 0.035
+    assert round(con_cache, 6) == round(0.005 + 0.01 + 0.01, 6)
@@ -0,0 +1,77 @@
+"""
+Tests para la caché persistente de respuestas del LLM
+"""
+import time
+
+from cod_backend.core.codificacion.llm.cache import CacheRespuestas, clave_respuesta, huella_catalogo
+from cod_backend.core.codificacion.nodes import codificar_combinado as cc
+
+
+def _valor(codigo):
+    return {"evaluaciones": [{"codigo": codigo, "aplica": True}]}
+
+
+def test_guardar_y_obtener(tmp_path):
+    """Las entradas guardadas se recuperan por clave"""
+    cache = CacheRespuestas(str(tmp_path / "cache.sqlite"))
+    cache.guardar({"a": _valor(1), "b": _valor(2)})
+
+    encontrados = cache.obtener(["a", "b", "c"])
+
+    assert encontrados == {"a": _valor(1), "b": _valor(2)}
+    cache.cerrar()
+
+
+def test_expulsa_entradas_vencidas(tmp_path):
+    """Las entradas más antiguas que max_dias no se devuelven y se podan"""
+    cache = CacheRespuestas(str(tmp_path / "cache.sqlite"), max_dias=1)
+    cache.guardar({"vieja": _valor(1), "nueva": _valor(2)})
+    cache._conexion.execute("UPDATE respuestas SET creado = ? WHERE clave = 'vieja'", (time.time() - 2 * 86400,))
+
+    assert set(cache.obtener(["vieja", "nueva"])) == {"nueva"}
+    assert cache.podar() == 1
+    assert cache.total_entradas() == 1
+    cache.cerrar()
+
+
+def test_expulsa_las_menos_usadas_al_exceder_tamano(tmp_path):
+    """Al superar max_entradas se eliminan las accedidas hace más tiempo"""
+    cache = CacheRespuestas(str(tmp_path / "cache.sqlite"), max_entradas=2)
+    cache.guardar({"a": _valor(1)})
+    cache.guardar({"b": _valor(2)})
+    cache.guardar({"c": _valor(3)})
+    cache._conexion.execute("UPDATE respuestas SET accedido = 0 WHERE clave = 'b'")
+
+    cache.podar()
+
+    assert set(cache.obtener(["a", "b", "c"])) == {"a", "c"}
+    cache.cerrar()
+
+
+def test_clave_normaliza_texto_y_distingue_contexto():
+    """Textos equivalentes comparten clave; cambiar modelo, prompt o catálogo la cambia"""
+    huella = huella_catalogo([{"codigo": 1, "descripcion": "Precio"}])
+    base = clave_respuesta("  Buen PRECIO ", "P1", huella, "gpt-4o-mini", "v1")
+
+    assert clave_respuesta("buen precio", "P1", huella, "gpt-4o-mini", "v1") == base
+    assert clave_respuesta("buen precio", "P1", huella, "gpt-5", "v1") != base
+    assert clave_respuesta("buen precio", "P1", huella, "gpt-4o-mini", "v2") != base
+    otra_huella = huella_catalogo([{"codigo": 1, "descripcion": "Calidad"}])
+    assert clave_respuesta("buen precio", "P1", otra_huella, "gpt-4o-mini", "v1") != base
+
+
+def test_resultado_desde_cache_renumera_codigos_nuevos():
+    """Los códigos nuevos cacheados se renumeran desde el código base del batch"""
+    hits = {
+        4: {"validacion": {"es_valida": True, "razon": ""}, "evaluaciones": [],
+            "analisis": {"conceptos_nuevos": [{"codigo": 90, "descripcion": "Atención rápida"}]}},
+        2: {"validacion": {"es_valida": True, "razon": ""}, "evaluaciones": [],
+            "analisis": {"conceptos_nuevos": [{"codigo": 17, "descripcion": "Atencion rapida"},
+                                              {"codigo": 18, "descripcion": "Buen sabor"}]}},
+    }
+
+    resultado = cc._resultado_desde_cache(hits, codigo_base=50)
+
+    assert [v["respuesta_id"] for v in resultado["validaciones"]] == [2, 4]
+    codigos = [[c["codigo"] for c in a["conceptos_nuevos"]] for a in resultado["analisis"]]
+    assert codigos == [[50, 51], [50]]
@@ -0,0 +1,95 @@
+"""
+Tests de la cascada de modelos (modelo rápido + escalado de respuestas inciertas)
+"""
+import asyncio
+import re
+
+
+from cod_backend.core import CodificadorNuevo
+from cod_backend.core.codificacion.nodes import codificar_combinado as cc
+
+
+def _resultado(evaluaciones_por_id, nuevos_por_id=None):
+    nuevos_por_id = nuevos_por_id or {}
+    return {
+        "validaciones": [{"respuesta_id": rid, "es_valida": True, "razon": "Relevante"} for rid in evaluaciones_por_id],
+        "evaluaciones": [
+            {"respuesta_id": rid, "evaluaciones": evaluaciones} for rid, evaluaciones in evaluaciones_por_id.items()
+        ],
+        "analisis": [
+            {"respuesta_id": rid, "conceptos_nuevos": nuevos_por_id.get(rid, [])} for rid in evaluaciones_por_id
+        ],
+    }
+
+
+def test_respuestas_a_escalar():
+    """Se escalan las respuestas en la banda de incertidumbre, con conceptos nuevos o ausentes"""
+    resultado = _resultado(
+        {
+            1: [{"codigo": 1, "aplica": True, "confianza": 0.95}],
+            2: [{"codigo": 1, "aplica": True, "confianza": 0.7}],
+            3: [{"codigo": 1, "aplica": False, "confianza": 0.99}],
+            4: [],
+        },
+        nuevos_por_id={4: [{"codigo": 10, "descripcion": "Sabor"}]},
+    )
+
+    assert cc._respuestas_a_escalar(resultado, [1, 2, 3, 4, 5], (0.6, 0.9)) == [2, 4, 5]
+    # Una banda más estrecha deja pasar la respuesta de confianza 0.7
+    assert cc._respuestas_a_escalar(resultado, [1, 2, 3, 4, 5], (0.5, 0.6)) == [4, 5]
+
+
+def test_cascada_escala_solo_las_respuestas_inciertas(archivos_encuesta, monkeypatch):
+    """El modelo principal solo recibe las respuestas dudosas y su resultado reemplaza al del rápido"""
+    llamadas = []
+
+    async def _llamar_llm_falso(state, contexto, respuestas, codigo_base, metricas, al_resolver=None, historial=None):
+        modelo = state["modelo_gpt"]
+        llamadas.append((modelo, len(respuestas)))
+        evaluaciones = {}
+        for linea in respuestas:
+            rid_texto, texto = linea.split(". ", 1)
+            # El modelo rápido duda con las respuestas ambiguas; el principal no
+            dudosa = "quizás" in texto and modelo == "gpt-4o-mini"
+            evaluaciones[int(rid_texto)] = [
+                {"codigo": 1, "aplica": "precio" in texto, "confianza": 0.7 if dudosa else 0.95},
+                {"codigo": 2, "aplica": modelo == "gpt-4o" and "quizás" in texto, "confianza": 0.95},
+            ]
+        return _resultado(evaluaciones), 100, 20
+
+    monkeypatch.setattr(cc, "_llamar_llm", _llamar_llm_falso)
+
+    textos = [f"quizás el precio {i}" if i % 4 == 0 else f"el precio es justo {i}" for i in range(12)]
+    ruta_respuestas, ruta_codigos = archivos_encuesta(textos)
+
+    codificador = CodificadorNuevo(
+        modelo="gpt-4o",
+        modelo_rapido="gpt-4o-mini",
+        usar_cache=False,
+        streaming=False,
+    )
+    df = asyncio.run(codificador.ejecutar_codificacion(ruta_respuestas, ruta_codigos))
+
+    codigos = dict(zip(df["P1"], df["Códigos asignados"]))
+    for texto in textos:
+        esperado = "1; 2" if texto.startswith("quizás") else "1"
+        assert re.sub(r"\s", "", codigos[texto]) == esperado.replace(" ", "")
+
+    assert sum(n for modelo, n in llamadas if modelo == "gpt-4o-mini") == 12
+    assert sum(n for modelo, n in llamadas if modelo == "gpt-4o") == 3
+
+    stats = codificador.stats
+    assert stats["respuestas_cascada"] == 12
+    assert stats["respuestas_escaladas"] == 3
+    assert stats["tasa_escalado"] == 0.25
+    por_modelo = stats["tokens_por_modelo"]
+    assert set(por_modelo) == {"gpt-4o-mini", "gpt-4o"}
+    assert por_modelo["gpt-4o-mini"]["prompt_tokens"] + por_modelo["gpt-4o"]["prompt_tokens"] == stats["prompt_tokens"]
+    assert abs(sum(uso["costo"] for uso in por_modelo.values()) - stats["costo_total"]) < 1e-12
+
+
+def test_cascada_desactivada_con_el_mismo_modelo():
+    """Si el modelo rápido es el principal no hay cascada"""
+    assert cc._modelo_rapido({"modelo_gpt": "gpt-4o", "modelo_rapido": "gpt-4o"}) is None
+    assert cc._modelo_rapido({"modelo_gpt": "gpt-4o", "modelo_rapido": None}) is None
+    assert cc._modelo_rapido({"modelo_gpt": "gpt-4o", "modelo_rapido": "gpt-4o-mini"}) == "gpt-4o-mini"
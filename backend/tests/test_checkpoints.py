@@ -0,0 +1,98 @@
+"""
+Tests de los checkpoints durables y la reanudación de trabajos
+"""
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from cod_backend.core import CodificadorNuevo
+from cod_backend.core import codificador_nuevo
+from cod_backend.core.codificacion.graph.checkpoints import CheckpointsTrabajo, restaurar_estado
+from cod_backend.core.codificacion.llm.determinista import ChatDeterminista
+
+
+def _textos(total=40):
+    return [
+        f"el precio es justo {i}" if i % 3 == 0 else f"sabor rico {i}" if i % 3 == 1 else f"porción pequeña {i}"
+        for i in range(total)
+    ]
+
+
+def _contar_llamadas(monkeypatch, fallar_en=None):
+    """Cuenta las llamadas al modelo determinista; la número `fallar_en` lanza un error."""
+    llamadas = []
+    original = ChatDeterminista._responder
+
+    def _responder(self, messages):
+        llamadas.append(1)
+        if len(llamadas) == fallar_en:
+            raise RuntimeError("servidor caído")
+        return original(self, messages)
+
+    monkeypatch.setattr(ChatDeterminista, "_responder", _responder)
+    return llamadas
+
+
+def _codificar(rutas, concurrentes, proceso_id=None):
+    codificador = CodificadorNuevo(
+        modelo="determinista",
+        backend="determinista",
+        usar_cache=False,
+        batches_concurrentes=concurrentes,
+        max_respuestas_batch=10,
+    )
+    df = asyncio.run(codificador.ejecutar_codificacion(*rutas, proceso_id=proceso_id))
+    return df, codificador
+
+
+def test_checkpoints_por_huella(tmp_path):
+    """Los deltas se recuperan con la misma huella y se descartan si la entrada cambió"""
+    checkpoints = CheckpointsTrabajo(str(tmp_path / "checkpoints.sqlite"))
+    checkpoints.registrar_trabajo("p1", {"ruta_respuestas": "temp/r.xlsx"})
+    assert checkpoints.batches_completados("p1", "h1") == {}
+
+    checkpoints.guardar_batch("p1", 0, {"codificaciones": [{"fila_excel": 2}], "codigos_recientes": {7: "Sabor"}})
+    checkpoints.guardar_batch("p1", 1, {"codificaciones": [{"fila_excel": 3}], "prompt_tokens": 5})
+
+    hechos = checkpoints.batches_completados("p1", "h1")
+    assert sorted(hechos) == [0, 1]
+    assert hechos[0]["codigos_recientes"] == {7: "Sabor"}
+    estado = restaurar_estado({"codificaciones": [], "prompt_tokens": 10}, [hechos[0], hechos[1]])
+    assert [c["fila_excel"] for c in estado["codificaciones"]] == [2, 3]
+    assert estado["prompt_tokens"] == 15
+
+    assert checkpoints.batches_completados("p1", "otra") == {}
+    assert checkpoints.obtener_parametros("p1") == {"ruta_respuestas": "temp/r.xlsx"}
+    assert checkpoints.rutas_registradas() == {Path("temp/r.xlsx").resolve()}
+    checkpoints.eliminar("p1")
+    assert checkpoints.rutas_registradas() == set()
+    assert checkpoints.obtener_parametros("p1") is None
+
+
+@pytest.mark.parametrize("concurrentes", [1, 4])
+def test_reanudar_no_repite_batches_pagados(tmp_path, archivos_encuesta, monkeypatch, concurrentes):
+    """Un trabajo que falla a mitad se reanuda sin volver a llamar al LLM por los batches hechos"""
+    rutas = archivos_encuesta(_textos(), catalogo={1: "Precio"})
+    llamadas = _contar_llamadas(monkeypatch)
+    df_completo, _ = _codificar(rutas, concurrentes)
+    total_llamadas = len(llamadas)
+    assert total_llamadas >= 4
+
+    checkpoints = CheckpointsTrabajo(str(tmp_path / "checkpoints.sqlite"))
+    monkeypatch.setattr(codificador_nuevo, "obtener_checkpoints", lambda: checkpoints)
+
+    llamadas = _contar_llamadas(monkeypatch, fallar_en=3)
+    with pytest.raises(RuntimeError):
+        _codificar(rutas, concurrentes, proceso_id="trabajo-1")
+
+    llamadas = _contar_llamadas(monkeypatch)
+    df_reanudado, codificador = _codificar(rutas, concurrentes, proceso_id="trabajo-1")
+
+    if concurrentes == 1:
+        assert len(llamadas) == total_llamadas - 2
+    else:
+        assert len(llamadas) < total_llamadas
+    assert list(df_reanudado["Códigos asignados"]) == list(df_completo["Códigos asignados"])
+    assert codificador.stats["prompt_tokens"] > 0
+
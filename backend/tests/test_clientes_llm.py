@@ -0,0 +1,112 @@
+"""
+Tests del pool HTTP compartido, el registro de clientes LLM y los prompts precompilados
+"""
+import asyncio
+import http.server
+import threading
+
+import pytest
+
+from cod_backend.core.codificacion.llm import clientes
+from cod_backend.core.codificacion.llm.clientes import (
+    estadisticas_pool,
+    obtener_http_client,
+    obtener_llm,
+)
+from cod_backend.core.codificacion.prompts import obtener_prompt, precargar_prompts, version_prompt
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    srv = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    hilo = threading.Thread(target=srv.serve_forever, daemon=True)
+    hilo.start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}/"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_pool_se_reutiliza_en_el_loop_y_se_recrea_en_otro(servidor):
+    """Dentro de un loop el cliente (y su conexión) se reutiliza; al terminar el loop se cierra"""
+    antes = estadisticas_pool()
+
+    async def _dos_solicitudes():
+        cliente = obtener_http_client()
+        await cliente.get(servidor)
+        await cliente.get(servidor)
+        assert obtener_http_client() is cliente
+        assert obtener_llm("gpt-4o-mini", api_key="test") is obtener_llm("gpt-4o-mini", api_key="test")
+        return cliente
+
+    primero = asyncio.run(_dos_solicitudes())
+    despues = estadisticas_pool()
+    assert despues["solicitudes"] - antes["solicitudes"] == 2
+    assert despues["conexiones_nuevas"] - antes["conexiones_nuevas"] == 1
+    # El loop terminó: su pool quedó cerrado (no se filtran conexiones)
+    assert primero.is_closed
+
+    async def _obtener():
+        return obtener_http_client()
+
+    segundo = asyncio.run(_obtener())
+    assert segundo is not primero
+
+
+def test_cambio_de_loop_cierra_el_pool_anterior_en_su_loop():
+    """Si el loop del pool sigue vivo en otro hilo, el pool se cierra allí al reemplazarlo"""
+    loop_hilo = asyncio.new_event_loop()
+    hilo = threading.Thread(target=loop_hilo.run_forever, daemon=True)
+    hilo.start()
+
+    async def _obtener():
+        return obtener_http_client()
+
+    try:
+        viejo = asyncio.run_coroutine_threadsafe(_obtener(), loop_hilo).result(timeout=5)
+        nuevo = asyncio.run(_obtener())
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), loop_hilo).result(timeout=5)
+        assert nuevo is not viejo
+        assert viejo.is_closed
+    finally:
+        loop_hilo.call_soon_threadsafe(loop_hilo.stop)
+        hilo.join(timeout=5)
+        loop_hilo.close()
+        asyncio.run(clientes.cerrar_clientes())
+
+
+
+def test_clientes_se_separan_por_clave_de_api():
+    """Misma URL y modelo con otra clave no reutiliza el cliente (ni sus credenciales)"""
+    async def _clientes():
+        url = "http://inferencia.lan:8000/v1"
+        return (
+            obtener_llm("llama-3", base_url=url, api_key="clave-a"),
+            obtener_llm("llama-3", base_url=url, api_key="clave-b"),
+            obtener_llm("llama-3", base_url=url, api_key="clave-a"),
+        )
+
+    a, b, a_otra_vez = asyncio.run(_clientes())
+    assert a is a_otra_vez
+    assert b is not a
+    assert b.openai_api_key.get_secret_value() == "clave-b"
+
+def test_prompts_precompilados_y_version():
+    """Los prompts se compilan una vez y su versión depende del contenido"""
+    assert precargar_prompts() > 0
+    assert obtener_prompt("codificar_combinado") is obtener_prompt("codificar_combinado")
+    version = version_prompt("codificar_combinado")
+    assert len(version) == 12
+    assert version_prompt("codificar_combinado") == version
@@ -0,0 +1,61 @@
+"""
+Tests para la fusión de batches del modo concurrente
+"""
+from cod_backend.core.codificacion.utils import fusionar_codigos_nuevos
+
+
+def _cod(fila, hist=None, nuevos=None, decision="nuevo"):
+    return {
+        "fila_excel": fila,
+        "texto": f"respuesta {fila}",
+        "decision": decision,
+        "codigos_historicos": hist or [],
+        "codigos_nuevos": nuevos or [],
+    }
+
+
+def test_renumera_codigos_en_orden_de_batch():
+    """Batches que parten del mismo código base reciben códigos únicos y secuenciales"""
+    batch_1 = [_cod(2, nuevos=[{"codigo": 50, "descripcion": "Precio alto"}])]
+    batch_2 = [_cod(3, nuevos=[{"codigo": 50, "descripcion": "Buen sabor"}])]
+
+    fusionadas, proximo = fusionar_codigos_nuevos([batch_1, batch_2], 50)
+
+    assert [c["fila_excel"] for c in fusionadas] == [2, 3]
+    assert fusionadas[0]["codigos_nuevos"][0]["codigo"] == 50
+    assert fusionadas[1]["codigos_nuevos"][0]["codigo"] == 51
+    assert proximo == 52
+
+
+def test_mismo_concepto_en_batches_distintos_comparte_codigo():
+    """El mismo concepto propuesto por dos batches queda con un solo código"""
+    batch_1 = [_cod(2, nuevos=[{"codigo": 50, "descripcion": "Buen servicio"}])]
+    batch_2 = [_cod(3, nuevos=[{"codigo": 52, "descripcion": "buen  servicio"}])]
+
+    fusionadas, proximo = fusionar_codigos_nuevos([batch_1, batch_2], 50)
+
+    assert fusionadas[0]["codigos_nuevos"][0]["codigo"] == 50
+    assert fusionadas[1]["codigos_nuevos"][0]["codigo"] == 50
+    assert proximo == 51
+
+
+def test_concepto_del_catalogo_pasa_a_historico():
+    """Un concepto nuevo que ya existe en el catálogo se convierte en código histórico"""
+    catalogo = [{"codigo": 7, "descripcion": "Precio alto"}]
+    batch = [_cod(2, nuevos=[{"codigo": 50, "descripcion": "Precio alto"}])]
+
+    fusionadas, proximo = fusionar_codigos_nuevos([batch], 50, catalogo)
+
+    assert fusionadas[0]["codigos_historicos"] == [7]
+    assert fusionadas[0]["codigos_nuevos"] == []
+    assert fusionadas[0]["decision"] == "historico"
+    assert proximo == 50
+
+
+def test_rechazos_se_mantienen():
+    """Las respuestas rechazadas no cambian de decisión"""
+    batch = [_cod(2, decision="rechazar")]
+
+    fusionadas, _ = fusionar_codigos_nuevos([batch], 1)
+
+    assert fusionadas[0]["decision"] == "rechazar"
@@ -0,0 +1,57 @@
+"""
+Tests de la ventana de códigos nuevos recientes del prompt
+"""
+import asyncio
+
+from cod_backend.core.codificacion.nodes import nodo_ensamblar
+from cod_backend.core.codificacion.nodes.codificar_combinado import _preparar_codigos_existentes
+from cod_backend.core.codificacion.utils import (
+    MAX_CODIGOS_EXISTENTES,
+    SIN_CODIGOS_EXISTENTES,
+    actualizar_codigos_recientes,
+    renderizar_codigos_existentes,
+)
+
+
+def test_ventana_conserva_los_codigos_mas_recientes():
+    """La ventana se queda con los MAX_CODIGOS_EXISTENTES códigos más altos"""
+    recientes = {}
+    for inicio in range(10, 10 + MAX_CODIGOS_EXISTENTES + 20, 10):
+        recientes = actualizar_codigos_recientes(
+            recientes, {codigo: f"Concepto {codigo}" for codigo in range(inicio, inicio + 10)}
+        )
+
+    assert len(recientes) == MAX_CODIGOS_EXISTENTES
+    assert min(recientes) == 30 and max(recientes) == 179
+
+    seccion = renderizar_codigos_existentes(recientes)
+    assert seccion.index("  30: Concepto 30") < seccion.index("  179: Concepto 179")
+    assert "Se muestran solo los últimos" in seccion
+    assert renderizar_codigos_existentes({}) == SIN_CODIGOS_EXISTENTES
+
+
+def test_seccion_se_rehace_solo_cuando_el_batch_crea_codigos():
+    """ensamblar actualiza la ventana y la sección si hubo códigos creados; el prompt la lee del estado"""
+    state = {
+        "catalogo": [{"codigo": 1, "descripcion": "Precio"}],
+        "indice_conceptos": {"precio": 1, "sabor rico": 7},
+        "codigos_recientes": {7: "Sabor rico"},
+        "batch_respuestas": [{"fila_excel": 2, "texto": "sabor rico"}, {"fila_excel": 3, "texto": "porción chica"}],
+        "validaciones_batch": [{"respuesta_id": 1, "es_valida": True}, {"respuesta_id": 2, "es_valida": True}],
+        "evaluaciones_batch": [],
+        "cobertura_batch": [
+            {"respuesta_id": 1, "conceptos_nuevos": [{"codigo": 7, "descripcion": "Sabor rico"}]},
+            {"respuesta_id": 2, "conceptos_nuevos": [{"codigo": 8, "descripcion": "Porción chica"}]},
+        ],
+        "respuestas_especiales": {},
+        "proximo_codigo_nuevo": 8,
+    }
+
+    delta = asyncio.run(nodo_ensamblar(state))
+    assert sorted(delta["codigos_recientes"]) == [7, 8]
+    assert _preparar_codigos_existentes(delta) == renderizar_codigos_existentes(delta["codigos_recientes"])
+
+    # Un batch que solo reutiliza códigos no toca la sección
+    solo_reutiliza = {**state, "cobertura_batch": state["cobertura_batch"][:1]}
+    assert "seccion_codigos_existentes" not in asyncio.run(nodo_ensamblar(solo_reutiliza))
+    assert _preparar_codigos_existentes({}) == SIN_CODIGOS_EXISTENTES
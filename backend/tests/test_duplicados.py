@@ -0,0 +1,90 @@
+"""
+Tests para el colapso de respuestas repetidas y casi duplicadas
+"""
+import pytest
+
+from cod_backend.core.codificacion.utils import agrupar_similares, colapsar_duplicados, expandir_duplicados
+from cod_backend.core.codificador_nuevo import CodificadorNuevo
+
+
+def _resp(fila, texto, aux=None):
+    resp = {"fila_excel": fila, "texto": texto, "id": fila - 1}
+    if aux:
+        resp["dato_auxiliar"] = aux
+    return resp
+
+
+def test_colapsa_por_texto_normalizado():
+    """Textos iguales tras normalizar comparten representante"""
+    respuestas = [_resp(2, "Precio"), _resp(3, "buen servicio"), _resp(4, "  precio "), _resp(5, "PRECIO")]
+
+    representantes, duplicados = colapsar_duplicados(respuestas)
+
+    assert [r["fila_excel"] for r in representantes] == [2, 3]
+    assert [r["fila_excel"] for r in duplicados[2]] == [4, 5]
+
+
+def test_dato_auxiliar_separa_grupos():
+    """El mismo texto con distinto dato auxiliar no se colapsa"""
+    respuestas = [_resp(2, "precio", "Promotor"), _resp(3, "precio", "Detractor")]
+
+    representantes, duplicados = colapsar_duplicados(respuestas)
+
+    assert len(representantes) == 2
+    assert duplicados == {}
+
+
+def test_expandir_replica_codigos_en_cada_fila():
+    """Cada fila repetida recibe los códigos de su representante y conserva su texto"""
+    respuestas = [_resp(2, "Precio"), _resp(3, "sabor"), _resp(4, "precio")]
+    _, duplicados = colapsar_duplicados(respuestas)
+    codificaciones = [
+        {"fila_excel": 2, "texto": "Precio", "decision": "historico", "codigos_historicos": [1], "codigos_nuevos": []},
+        {"fila_excel": 3, "texto": "sabor", "decision": "nuevo", "codigos_historicos": [],
+         "codigos_nuevos": [{"codigo": 10, "descripcion": "Sabor"}]},
+    ]
+
+    expandidas = expandir_duplicados(codificaciones, duplicados)
+
+    assert [c["fila_excel"] for c in expandidas] == [2, 3, 4]
+    assert expandidas[2]["texto"] == "precio"
+    assert expandidas[2]["codigos_historicos"] == [1]
+    assert expandidas[2]["codigos_historicos"] is not expandidas[0]["codigos_historicos"]
+
+
+def test_agrupa_respuestas_casi_duplicadas():
+    """Variantes de puntuación y ortografía se agrupan con su representante"""
+    respuestas = [
+        _resp(2, "el precio"), _resp(3, "el precio!!"), _resp(4, "buen servicio"),
+        _resp(5, "mal servicio"), _resp(6, "Buen servicio."),
+    ]
+
+    representantes, miembros, auditoria = agrupar_similares(respuestas, umbral=0.8)
+
+    assert [r["texto"] for r in representantes] == ["el precio", "buen servicio", "mal servicio"]
+    assert [m["fila_excel"] for m in miembros[2]] == [3]
+    assert [m["fila_excel"] for m in miembros[4]] == [6]
+    assert {a["fila_excel"]: a["fila_representante"] for a in auditoria} == {3: 2, 6: 4}
+    assert all(a["similitud"] >= 0.8 for a in auditoria)
+
+
+def test_similares_no_cruza_dato_auxiliar():
+    """Respuestas casi iguales con distinto dato auxiliar quedan en grupos separados"""
+    respuestas = [_resp(2, "el precio", "Promotor"), _resp(3, "el precio!", "Detractor")]
+
+    representantes, miembros, _ = agrupar_similares(respuestas, umbral=0.8)
+
+    assert len(representantes) == 2
+    assert miembros == {}
+
+
+@pytest.mark.parametrize("umbral", [0, -0.1, 1.5])
+def test_umbral_similares_fuera_de_rango(umbral):
+    """Un umbral fuera de (0, 1] se rechaza al crear el codificador"""
+    with pytest.raises(ValueError, match="umbral_similares"):
+        CodificadorNuevo(backend="determinista", umbral_similares=umbral)
+
+
+def test_umbral_similares_acepta_uno():
+    """El umbral 1 (solo idénticas tras normalizar) es válido"""
+    assert CodificadorNuevo(backend="determinista", umbral_similares=1.0).umbral_similares == 1.0
@@ -0,0 +1,112 @@
+"""
+Tests del empaquetado de batches por presupuesto de tokens
+"""
+from cod_backend.core import CodificadorNuevo
+from cod_backend.core.codificacion.llm import contar_tokens, contar_tokens_lista, estimar_tokens
+from cod_backend.core.codificacion.llm import tokens as modulo_tokens
+from cod_backend.core.codificacion.utils import empaquetar_batches, rango_batch
+
+
+def _tamanios(limites):
+    return [fin - inicio for inicio, fin in zip(limites, limites[1:])]
+
+
+def test_batches_se_llenan_hasta_el_presupuesto():
+    """Respuestas cortas: batches llenos; la salida esperada y el tope de respuestas también limitan"""
+    # Espacio para respuestas: 10000 - 2000 = 8000; cada respuesta cuesta 10 + 150
+    limites = empaquetar_batches([10] * 120, 10_000, 2_000, 150, 100_000, 1_000)
+    assert _tamanios(limites) == [50, 50, 20]
+    assert limites[0] == 0 and limites[-1] == 120
+
+    # Tope por salida esperada (3000 // 150 = 20) y por cantidad de respuestas
+    assert _tamanios(empaquetar_batches([10] * 50, 10_000, 2_000, 150, 3_000, 1_000)) == [20, 20, 10]
+    assert _tamanios(empaquetar_batches([10] * 50, 10_000, 2_000, 150, 100_000, 15)) == [15, 15, 15, 5]
+
+    assert empaquetar_batches([], 10_000, 2_000, 150, 100_000, 60) == [0]
+
+
+def test_respuesta_larga_va_sola():
+    """Una respuesta que ocupa más de la mitad del espacio no comparte batch"""
+    tokens = [20, 20, 5_000, 20, 20]
+    limites = empaquetar_batches(tokens, 10_000, 2_000, 100, 100_000, 60)
+    assert limites == [0, 2, 3, 5]
+
+    # Aunque no quepa en el presupuesto, la respuesta se envía (sola)
+    assert empaquetar_batches([50_000], 10_000, 2_000, 100, 100_000, 60) == [0, 1]
+
+
+def test_prompt_fijo_sin_espacio_avisa(capsys):
+    """Si el prompt fijo llena el presupuesto se avisa en vez de degradar en silencio"""
+    assert empaquetar_batches([10] * 3, 10_000, 2_000, 100, 100_000, 60) == [0, 3]
+    assert "⚠️" not in capsys.readouterr().out
+
+    assert empaquetar_batches([10] * 3, 2_000, 2_500, 100, 100_000, 60) == [0, 1, 2, 3]
+    assert "una respuesta por llamada" in capsys.readouterr().out
+
+
+def test_rango_batch_con_y_sin_limites():
+    """Los nodos leen los límites del estado; sin límites, batches de tamaño fijo"""
+    estado = {"limites_batches": [0, 7, 9], "batch_size": 7}
+    assert rango_batch(estado, 0) == (0, 7)
+    assert rango_batch(estado, 1) == (7, 9)
+    assert rango_batch(estado, 2) == (9, 9)
+    assert rango_batch({"batch_size": 10}, 2) == (20, 30)
+
+
+def test_conteo_sin_tiktoken_usa_la_estimacion(monkeypatch):
+    """Sin tiktoken se estima con ~4 caracteres por token"""
+    monkeypatch.setattr(modulo_tokens, "TOKENS_USAR_TIKTOKEN", False)
+    texto = "el precio me parece justo para lo que ofrecen"
+    assert contar_tokens(texto, "gpt-4o") == estimar_tokens(texto)
+    assert contar_tokens_lista([texto, "sí"], "gpt-4o") == [estimar_tokens(texto), estimar_tokens("sí")]
+
+
+
+def test_tiktoken_solo_desde_la_cache_local(monkeypatch, tmp_path):
+    """Sin el archivo BPE en TIKTOKEN_CACHE_DIR no se llama a tiktoken (no se descarga nada)"""
+    import hashlib
+
+    import tiktoken
+
+    cargadas = []
+
+    class _Codificacion:
+        def encode_ordinary(self, texto):
+            return texto.split()
+
+    def _get_encoding(nombre):
+        cargadas.append(nombre)
+        return _Codificacion()
+
+    monkeypatch.setattr(tiktoken, "get_encoding", _get_encoding)
+    monkeypatch.setattr(modulo_tokens, "TOKENS_USAR_TIKTOKEN", True)
+    monkeypatch.setattr(modulo_tokens, "_codificaciones", {})
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+    texto = "el precio me parece justo para lo que ofrecen"
+
+    assert contar_tokens(texto, "gpt-4o") == estimar_tokens(texto)
+    assert cargadas == []
+
+    monkeypatch.setattr(modulo_tokens, "_codificaciones", {})
+    url = modulo_tokens.URL_ENCODINGS.format("o200k_base")
+    (tmp_path / hashlib.sha1(url.encode()).hexdigest()).write_bytes(b"")
+    assert contar_tokens(texto, "gpt-4o") == 9
+    assert cargadas == ["o200k_base"]
+
+def test_codificador_empaqueta_por_largo_de_respuesta():
+    """Respuestas de una palabra van en pocos batches llenos; los párrafos en batches chicos"""
+    codificador = CodificadorNuevo(modelo="gpt-4o", backend="determinista")
+    catalogo = [{"codigo": 1, "descripcion": "Precio"}]
+
+    cortas = [{"fila_excel": i + 2, "texto": "bueno"} for i in range(120)]
+    limites_cortas = codificador._empaquetar_respuestas(cortas, catalogo)
+    assert len(limites_cortas) - 1 <= 3
+    assert max(_tamanios(limites_cortas)) <= codificador.max_respuestas_batch
+
+    parrafo = "la atención fue lenta y el local estaba muy lleno a la hora del almuerzo " * 20
+    largas = [{"fila_excel": i + 2, "texto": parrafo} for i in range(20)]
+    largas.insert(5, {"fila_excel": 99, "texto": parrafo * 30})
+    limites_largas = codificador._empaquetar_respuestas(largas, catalogo)
+    assert max(_tamanios(limites_largas)) < 20
+    # La respuesta enorme queda sola en su batch
+    assert (5, 6) in zip(limites_largas, limites_largas[1:])
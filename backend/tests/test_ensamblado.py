@@ -0,0 +1,66 @@
+"""
+Tests del ensamblado indexado por respuesta_id
+"""
+import asyncio
+
+from cod_backend.core.codificacion.nodes import nodo_codificar_combinado, nodo_ensamblar
+from cod_backend.core.codificacion.nodes.codificar_combinado import _alinear_por_id, _preparar_codificacion
+from cod_backend.core.codificacion.utils import crear_indice_conceptos
+
+
+CATALOGO = [{"codigo": 1, "descripcion": "Precio"}]
+
+
+def _estado(textos):
+    return {
+        "pregunta": "P1",
+        "modelo_gpt": "determinista",
+        "backend_llm": "determinista",
+        "catalogo": CATALOGO,
+        "catalogo_por_categoria": {},
+        "catalogo_max_tokens": 2000,
+        "batch_respuestas": [{"fila_excel": i + 2, "texto": texto} for i, texto in enumerate(textos)],
+        "codificaciones": [],
+        "proximo_codigo_nuevo": 2,
+        "indice_conceptos": crear_indice_conceptos(CATALOGO),
+        "usar_cache": False,
+        "streaming": False,
+    }
+
+
+def test_codigo_especial_no_desalinea_las_validaciones():
+    """Las respuestas de código especial no van al LLM y no corren las validaciones de las siguientes"""
+    state = _estado(["NS", "???", "el precio es justo", "-"])
+    assert _preparar_codificacion(state)["ids_llm"] == [2, 3]
+
+    delta = asyncio.run(nodo_codificar_combinado(state))
+    assert [v["es_valida"] for v in delta["validaciones_batch"]] == [True, False, True, False]
+    assert "especial" in delta["validaciones_batch"][0]["razon"]
+
+    codificaciones = asyncio.run(nodo_ensamblar({**state, **delta}))["codificaciones"]
+    assert [c["codigos_historicos"] for c in codificaciones] == [[98], [], [1], []]
+    assert [c["decision"] for c in codificaciones] == ["historico", "rechazar", "historico", "rechazar"]
+
+
+def test_batch_solo_con_especiales_conserva_sus_filas():
+    """Sin nada que enviar al LLM, las respuestas especiales y vacías igual se ensamblan"""
+    state = _estado(["NC", "", "N/A"])
+    delta = asyncio.run(nodo_codificar_combinado(state))
+    codificaciones = asyncio.run(nodo_ensamblar({**state, **delta}))["codificaciones"]
+
+    assert [c["fila_excel"] for c in codificaciones] == [2, 3, 4]
+    assert [c["codigos_historicos"] for c in codificaciones] == [[99], [], [97]]
+
+
+def test_alinear_por_id_usa_el_id_y_no_la_posicion():
+    """Las validaciones se toman por respuesta_id; las que faltan quedan válidas por defecto"""
+    resultado = {"validaciones": [
+        {"respuesta_id": 5, "es_valida": False, "razon": "Sin contenido"},
+        {"respuesta_id": 2, "es_valida": True, "razon": "Relevante"},
+        {"respuesta_id": 9, "es_valida": True, "razon": "No enviada"},
+    ]}
+
+    alineadas = _alinear_por_id(resultado, [2, 3, 5])["validaciones"]
+
+    assert [(v["respuesta_id"], v["es_valida"]) for v in alineadas] == [(2, True), (3, True), (5, False)]
+    assert alineadas[1]["razon"] == "Válida (sin validación específica)"
@@ -0,0 +1,104 @@
+"""
+Tests del estado del grafo con canales de solo-agregar y deltas por nodo
+"""
+import asyncio
+
+from langgraph.graph import StateGraph, END
+
+from cod_backend.core.codificacion.graph.builder import nodo_finalizar
+from cod_backend.core.codificacion.graph.state import (
+    REDUCTORES_ESTADO,
+    EstadoCodificacion,
+    aplicar_actualizacion,
+)
+from cod_backend.core.codificacion.nodes import nodo_ensamblar, nodo_preparar_batch
+
+
+def _estado(respuestas, **extra):
+    return {
+        "respuestas": respuestas,
+        "limites_batches": [0, 2, len(respuestas)],
+        "batch_size": 2,
+        "batch_actual": 0,
+        "codificaciones": [],
+        "catalogo": [],
+        "prompt_tokens": 0,
+        **extra,
+    }
+
+
+def test_nodos_devuelven_solo_su_delta():
+    """Cada nodo devuelve las claves que cambia, no una copia del estado"""
+    respuestas = [{"fila_excel": i + 2, "texto": f"precio {i}"} for i in range(3)]
+    estado = _estado(respuestas)
+
+    assert asyncio.run(nodo_preparar_batch(estado)) == {"batch_respuestas": respuestas[:2]}
+    assert asyncio.run(nodo_finalizar(estado)) == {"batch_actual": 1}
+
+    estado_batch = {
+        **estado,
+        "batch_respuestas": respuestas[:2],
+        "validaciones_batch": [{"respuesta_id": 1, "es_valida": True}, {"respuesta_id": 2, "es_valida": False}],
+        "evaluaciones_batch": [
+            {"respuesta_id": 1, "evaluaciones": [{"codigo": 1, "aplica": True, "confianza": 0.9}]},
+        ],
+        "cobertura_batch": [],
+        "respuestas_especiales": {},
+    }
+    delta = asyncio.run(nodo_ensamblar(estado_batch))
+    assert sorted(delta) == ["codificaciones", "indice_conceptos"]
+    assert delta["indice_conceptos"] == {}
+    assert [c["decision"] for c in delta["codificaciones"]] == ["historico", "rechazar"]
+
+
+def test_aplicar_actualizacion_usa_los_reductores():
+    """Fuera del grafo (modo lote) las codificaciones se agregan y los contadores se suman"""
+    assert {"codificaciones", "prompt_tokens", "cache_hits"} <= set(REDUCTORES_ESTADO)
+    assert "batch_actual" not in REDUCTORES_ESTADO
+
+    estado = _estado([], codificaciones=[{"fila_excel": 2}], prompt_tokens=100)
+    nuevo = aplicar_actualizacion(estado, {
+        "codificaciones": [{"fila_excel": 3}],
+        "prompt_tokens": 50,
+        "batch_actual": 1,
+    })
+
+    assert [c["fila_excel"] for c in nuevo["codificaciones"]] == [2, 3]
+    assert nuevo["prompt_tokens"] == 150
+    assert nuevo["batch_actual"] == 1
+
+
+def test_canal_de_codificaciones_no_se_copia_entre_batches():
+    """En el grafo, la lista de codificaciones es la misma en todos los pasos y los contadores acumulan"""
+    async def _batch(state):
+        return {
+            "codificaciones": [{"fila_excel": state["batch_actual"]}],
+            "prompt_tokens": 10,
+        }
+
+    async def _siguiente(state):
+        return {"batch_actual": state["batch_actual"] + 1}
+
+    workflow = StateGraph(EstadoCodificacion)
+    workflow.add_node("batch", _batch)
+    workflow.add_node("siguiente", _siguiente)
+    workflow.set_entry_point("batch")
+    workflow.add_edge("batch", "siguiente")
+    workflow.add_conditional_edges(
+        "siguiente", lambda s: "batch" if s["batch_actual"] < 5 else "fin", {"batch": "batch", "fin": END}
+    )
+    app = workflow.compile()
+
+    async def _correr():
+        estados = []
+        async for estado in app.astream(
+            {"batch_actual": 0, "codificaciones": [], "prompt_tokens": 0}, stream_mode="values"
+        ):
+            estados.append(estado)
+        return estados
+
+    estados = asyncio.run(_correr())
+    final = estados[-1]
+    assert [c["fila_excel"] for c in final["codificaciones"]] == [0, 1, 2, 3, 4]
+    assert final["prompt_tokens"] == 50
+    assert len({id(e["codificaciones"]) for e in estados}) == 1
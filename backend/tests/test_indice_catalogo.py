@@ -0,0 +1,110 @@
+"""
+Tests para el índice léxico del catálogo (preclasificador sin LLM y lista corta por batch)
+"""
+from cod_backend.core.codificacion.llm import contar_tokens
+from cod_backend.core.codificacion.nodes import codificar_combinado
+from cod_backend.core.codificacion.utils import (
+    IndiceCatalogo,
+    PreclasificadorLexico,
+    evaluar_preclasificador,
+)
+
+CATALOGO = [
+    {"codigo": 1, "descripcion": "Mala atención"},
+    {"codigo": 2, "descripcion": "Precios altos"},
+    {"codigo": 3, "descripcion": "Buena atención"},
+    {"codigo": 4, "descripcion": "Buen sabor"},
+]
+
+
+def test_similitud_tolera_acentos_y_puntuacion():
+    """Una respuesta casi literal tiene similitud ~1 con su código"""
+    indice = IndiceCatalogo(CATALOGO)
+
+    similitudes = indice.similitudes("mala atencion!!")
+
+    assert similitudes.argmax() == 0
+    assert similitudes[0] > 0.99
+    assert similitudes[2] < 0.7
+
+
+
+def test_indice_disperso_crece_con_los_ngramas_del_catalogo():
+    """La matriz guarda solo las entradas no nulas y encuentra el código exacto en un catálogo grande"""
+    catalogo = [{"codigo": i, "descripcion": f"Concepto genérico número {i}"} for i in range(2000)]
+    indice = IndiceCatalogo(catalogo)
+
+    entradas = indice._pesos.nbytes + indice._codigos.nbytes + indice._inicios.nbytes
+    assert entradas < 8 * 1024 * 1024
+    assert indice._pesos.size < len(indice.vocabulario) * len(catalogo) // 100
+
+    similitudes = indice.similitudes("concepto generico numero 1500")
+    assert similitudes.shape == (2000,)
+    assert similitudes.argmax() == 1500
+    assert similitudes[1500] > 0.99
+
+def test_preclasificador_deja_pasar_respuestas_ambiguas():
+    """Solo asigna con coincidencia clara; respuestas con varios conceptos van al LLM"""
+    preclasificador = PreclasificadorLexico(IndiceCatalogo(CATALOGO), umbral=0.9, margen=0.15)
+
+    assert preclasificador.clasificar("Mala atención")[0] == 1
+    assert preclasificador.clasificar("buen sabor y precios altos") is None
+    assert preclasificador.clasificar("me encantó el local") is None
+
+
+def test_calibrar_y_evaluar_en_muestra_etiquetada():
+    """La calibración baja el umbral mientras se mantiene la precisión objetivo"""
+    preclasificador = PreclasificadorLexico(IndiceCatalogo(CATALOGO), umbral=0.9, margen=0.15)
+    muestra = [
+        ("mala atencion", [1]),
+        ("precios muy altos", [2]),
+        ("buena atención", [3]),
+        ("buen sabor y precios altos", [4, 2]),
+    ]
+
+    antes = evaluar_preclasificador(preclasificador, muestra)
+    umbral = preclasificador.calibrar(muestra, precision_objetivo=1.0)
+    despues = evaluar_preclasificador(preclasificador, muestra)
+
+    assert antes["asignadas"] == 2
+    assert umbral < 0.9
+    assert despues["hit_rate"] > antes["hit_rate"]
+    assert despues["precision"] == 1.0
+
+
+def test_relevantes_respeta_presupuesto_y_prioriza_coincidencias():
+    """Con catálogo grande se envían los códigos más relevantes que caben en el presupuesto"""
+    catalogo = CATALOGO + [{"codigo": 10 + i, "descripcion": f"Concepto genérico número {i}"} for i in range(100)]
+    indice = IndiceCatalogo(catalogo)
+
+    seleccion = indice.relevantes(["los precios son muy altos"], max_tokens=40)
+
+    codigos = [c["codigo"] for c in seleccion]
+    assert 2 in codigos
+    assert sum(contar_tokens(f"  {c['codigo']}. {c['descripcion']}\n") for c in seleccion) <= 40
+    assert codigos == sorted(codigos)
+
+
+def test_relevantes_devuelve_todo_si_cabe():
+    """Si el catálogo completo cabe en el presupuesto no se recorta"""
+    indice = IndiceCatalogo(CATALOGO)
+
+    assert indice.relevantes(["algo"], max_tokens=1000) == CATALOGO
+
+
+def test_catalogo_que_cabe_no_construye_el_indice(monkeypatch):
+    """Si el catálogo completo cabe en el presupuesto se envía sin armar el índice"""
+    def _sin_indice(*args):
+        raise AssertionError("no debería construirse el índice")
+
+    monkeypatch.setattr(codificar_combinado, "obtener_indice_catalogo", _sin_indice)
+    state = {
+        "catalogo": CATALOGO,
+        "catalogo_tokens": 20,
+        "catalogo_max_tokens": 100,
+        "batch_respuestas": [{"texto": "precios altos"}],
+    }
+
+    catalogo_str = codificar_combinado._preparar_catalogo(state)
+
+    assert all(c["descripcion"] in catalogo_str for c in CATALOGO)
@@ -0,0 +1,186 @@
+"""
+Tests del índice de conceptos del trabajo (deduplicación de códigos nuevos)
+"""
+import asyncio
+
+from cod_backend.core import CodificadorNuevo
+from cod_backend.core.codificacion.graph.state import agregar_conceptos, aplicar_actualizacion
+from cod_backend.core.codificacion.nodes import nodo_ensamblar
+from cod_backend.core.codificacion.nodes.codificar_combinado import _filtrar_conceptos_nuevos
+from cod_backend.core.codificacion.utils import clave_concepto, crear_indice_conceptos
+
+
+CATALOGO = [{"codigo": 1, "descripcion": "Precio"}, {"codigo": 2, "descripcion": "Atención"}]
+
+
+def test_indice_con_claves_normalizadas():
+    """El índice parte del catálogo y conserva el primer código de cada concepto"""
+    indice = crear_indice_conceptos(CATALOGO)
+    assert indice == {clave_concepto("Precio"): 1, clave_concepto("Atención"): 2}
+    assert clave_concepto("ATENCIÓN") == clave_concepto("atencion")
+
+    agregar_conceptos(indice, {clave_concepto("Sabor rico"): 7, clave_concepto("Precio"): 9})
+    assert indice[clave_concepto("sabor rico")] == 7
+    assert indice[clave_concepto("Precio")] == 1
+
+
+def test_concepto_conocido_reutiliza_su_codigo():
+    """Un concepto ya indexado no se descarta: se filtra al código existente"""
+    state = {"indice_conceptos": {**crear_indice_conceptos(CATALOGO), "sabor rico": 7}}
+    resultado = {"analisis": [
+        {"respuesta_id": 1, "conceptos_nuevos": [
+            {"codigo": 9, "descripcion": "Sabor rico"},
+            {"codigo": 10, "descripcion": "Porción pequeña"},
+            {"codigo": 11, "descripcion": "porcion pequeña"},
+        ]},
+    ]}
+
+    analisis = _filtrar_conceptos_nuevos(resultado, state, ["sabor rico y porcion pequena"])
+
+    assert [(c["codigo"], c["descripcion"]) for c in analisis[0]["conceptos_nuevos"]] == [
+        (7, "Sabor rico"), (10, "Porción pequeña"),
+    ]
+
+
+def test_ensamblar_deduplica_contra_el_indice():
+    """Conceptos del catálogo pasan a históricos; los nuevos del batch entran al índice"""
+    respuestas = [{"fila_excel": i + 2, "texto": texto} for i, texto in enumerate(["precio caro", "sabor rico", "rico sabor"])]
+    state = {
+        "catalogo": CATALOGO,
+        "indice_conceptos": crear_indice_conceptos(CATALOGO),
+        "batch_respuestas": respuestas,
+        "validaciones_batch": [{"respuesta_id": i, "es_valida": True} for i in (1, 2, 3)],
+        "evaluaciones_batch": [],
+        "cobertura_batch": [
+            {"respuesta_id": 1, "conceptos_nuevos": [{"codigo": 5, "descripcion": "precio"}]},
+            {"respuesta_id": 2, "conceptos_nuevos": [{"codigo": 5, "descripcion": "Sabor rico"}]},
+            {"respuesta_id": 3, "conceptos_nuevos": [{"codigo": 6, "descripcion": "sabor  rico"}]},
+        ],
+        "respuestas_especiales": {},
+        "proximo_codigo_nuevo": 5,
+    }
+
+    delta = asyncio.run(nodo_ensamblar(state))
+    codificaciones = delta["codificaciones"]
+
+    assert codificaciones[0]["decision"] == "historico"
+    assert codificaciones[0]["codigos_historicos"] == [1]
+    assert [c["codigo"] for c in codificaciones[1]["codigos_nuevos"]] == [5]
+    assert [c["codigo"] for c in codificaciones[2]["codigos_nuevos"]] == [5]
+    assert delta["indice_conceptos"] == {clave_concepto("Sabor rico"): 5}
+    assert delta["proximo_codigo_nuevo"] == 6
+
+
+def test_ensamblar_numera_sin_huecos():
+    """Los conceptos reutilizados no consumen números: los nuevos siguen desde el próximo código"""
+    respuestas = [{"fila_excel": 2, "texto": "sabor rico y porción pequeña"}]
+    state = {
+        "catalogo": CATALOGO,
+        "indice_conceptos": {**crear_indice_conceptos(CATALOGO), clave_concepto("Sabor rico"): 7},
+        "batch_respuestas": respuestas,
+        "validaciones_batch": [{"respuesta_id": 1, "es_valida": True}],
+        "evaluaciones_batch": [],
+        "cobertura_batch": [
+            {"respuesta_id": 1, "conceptos_nuevos": [
+                {"codigo": 8, "descripcion": "Sabor rico"},
+                {"codigo": 9, "descripcion": "Porción pequeña"},
+            ]},
+        ],
+        "respuestas_especiales": {},
+        "proximo_codigo_nuevo": 8,
+    }
+
+    delta = asyncio.run(nodo_ensamblar(state))
+
+    assert [c["codigo"] for c in delta["codificaciones"][0]["codigos_nuevos"]] == [7, 8]
+    assert delta["indice_conceptos"] == {clave_concepto("Porción pequeña"): 8}
+    assert delta["proximo_codigo_nuevo"] == 9
+
+
+def test_ensamblar_no_reutiliza_codigos_del_indice_para_conceptos_nuevos():
+    """Si el índice ya tiene el próximo código, los conceptos nuevos se numeran por encima"""
+    state = {
+        "catalogo": CATALOGO,
+        "indice_conceptos": {clave_concepto("Calidad del producto"): 101},
+        "batch_respuestas": [{"fila_excel": 2, "texto": "buena calidad y entrega rápida"}],
+        "validaciones_batch": [{"respuesta_id": 1, "es_valida": True}],
+        "evaluaciones_batch": [],
+        "cobertura_batch": [
+            {"respuesta_id": 1, "conceptos_nuevos": [
+                {"codigo": 101, "descripcion": "Calidad del producto"},
+                {"codigo": 102, "descripcion": "Rapidez de entrega"},
+            ]},
+        ],
+        "respuestas_especiales": {},
+        "proximo_codigo_nuevo": 101,
+    }
+
+    delta = asyncio.run(nodo_ensamblar(state))
+
+    assert [c["codigo"] for c in delta["codificaciones"][0]["codigos_nuevos"]] == [101, 102]
+    assert delta["indice_conceptos"] == {clave_concepto("Rapidez de entrega"): 102}
+
+
+class _GrafoPropuestas:
+    """Grafo de prueba: cada batch ensambla las propuestas fijas de sus respuestas."""
+
+    def __init__(self, propuestas):
+        self.propuestas = propuestas
+        self.estados = {}
+
+    async def ainvoke(self, estado, config):
+        respuestas = estado["respuestas"]
+        self.estados[respuestas[0]["fila_excel"]] = estado
+        await asyncio.sleep(0)
+        estado = {
+            **estado,
+            "batch_respuestas": respuestas,
+            "validaciones_batch": [{"respuesta_id": i + 1, "es_valida": True} for i in range(len(respuestas))],
+            "evaluaciones_batch": [],
+            "cobertura_batch": [
+                {
+                    "respuesta_id": i + 1,
+                    "conceptos_nuevos": [
+                        {"codigo": estado["proximo_codigo_nuevo"], "descripcion": desc}
+                        for desc in self.propuestas[r["fila_excel"]]
+                    ],
+                }
+                for i, r in enumerate(respuestas)
+            ],
+        }
+        return aplicar_actualizacion(estado, await nodo_ensamblar(estado))
+
+
+def test_batches_concurrentes_no_comparten_codigos_provisionales():
+    """Dos batches en vuelo crean conceptos distintos; el siguiente reutiliza uno y crea otro"""
+    propuestas = {2: ["Sabor rico"], 3: ["Porción pequeña"], 4: ["Porción pequeña", "Calidad del producto"]}
+    respuestas = [{"fila_excel": fila, "texto": " ".join(descs)} for fila, descs in propuestas.items()]
+    estado_inicial = {
+        "modelo_gpt": "determinista",
+        "respuestas": respuestas,
+        "limites_batches": [0, 1, 2, 3],
+        "catalogo": CATALOGO,
+        "codificaciones": [],
+        "indice_conceptos": crear_indice_conceptos(CATALOGO),
+        "proximo_codigo_nuevo": 3,
+        "codigos_recientes": {},
+        "seccion_codigos_existentes": "",
+        "respuestas_especiales": {},
+    }
+    codificador = CodificadorNuevo(modelo="determinista", backend="determinista", batches_concurrentes=2)
+    grafo = _GrafoPropuestas(propuestas)
+
+    final = asyncio.run(codificador._ejecutar_concurrente(grafo, estado_inicial, total_batches=3))
+
+    codigos = {
+        c["fila_excel"]: [(n["codigo"], clave_concepto(n["descripcion"])) for n in c["codigos_nuevos"]]
+        for c in final["codificaciones"]
+    }
+    assert codigos == {
+        2: [(3, clave_concepto("Sabor rico"))],
+        3: [(4, clave_concepto("Porción pequeña"))],
+        4: [(4, clave_concepto("Porción pequeña")), (5, clave_concepto("Calidad del producto"))],
+    }
+    assert final["proximo_codigo_nuevo"] == 6
+    # El tercer batch vio los dos conceptos de los batches en vuelo
+    assert sorted(grafo.estados[4]["codigos_recientes"]) == [3, 4]
@@ -0,0 +1,63 @@
+"""
+Tests para el limitador de velocidad adaptativo del LLM
+"""
+import asyncio
+
+from cod_backend.core.codificacion.llm.limitador import LimitadorModelo, _parsear_duracion
+
+
+def test_parsear_duracion_headers():
+    """Interpreta los formatos de duración de los headers de OpenAI"""
+    assert _parsear_duracion("1s") == 1.0
+    assert _parsear_duracion("6m0s") == 360.0
+    assert abs(_parsear_duracion("120ms") - 0.12) < 1e-9
+    assert _parsear_duracion("2.5") == 2.5
+    assert _parsear_duracion(None) is None
+    assert _parsear_duracion("nada") is None
+
+
+def test_incremento_aditivo_con_exitos():
+    """Cada llamada exitosa sube la concurrencia de forma aditiva"""
+    limitador = LimitadorModelo("m", rpm=1000, tpm=1_000_000, concurrencia_inicial=2)
+
+    for _ in range(4):
+        asyncio.run(limitador.adquirir(100))
+        limitador.liberar(100, tokens_reales=100)
+
+    assert limitador.limite_concurrencia > 2
+    assert limitador.en_vuelo == 0
+
+
+def test_429_reduce_concurrencia_y_pausa():
+    """Un 429 divide la concurrencia y pausa según retry-after"""
+    limitador = LimitadorModelo("m", rpm=1000, tpm=1_000_000, concurrencia_inicial=8)
+    asyncio.run(limitador.adquirir(100))
+
+    pausa = limitador.registrar_429(100, {"Retry-After": "3"})
+
+    assert pausa == 3.0
+    assert limitador.limite_concurrencia == 4
+    assert limitador.total_429 == 1
+    assert limitador._intentar_adquirir(100) > 2.5
+
+
+def test_headers_con_poca_cuota_reducen_concurrencia():
+    """Los headers x-ratelimit con poca cuota restante se tratan como congestión"""
+    limitador = LimitadorModelo("m", rpm=1000, tpm=1_000_000, concurrencia_inicial=8)
+    asyncio.run(limitador.adquirir(100))
+
+    limitador.liberar(100, headers={
+        "x-ratelimit-limit-requests": "100",
+        "x-ratelimit-remaining-requests": "3",
+    })
+
+    assert limitador.rpm == 100
+    assert limitador.limite_concurrencia < 8
+
+
+def test_bucket_de_tokens_bloquea_sin_cuota():
+    """Sin tokens disponibles en el bucket, la reserva devuelve un tiempo de espera"""
+    limitador = LimitadorModelo("m", rpm=1000, tpm=600, concurrencia_inicial=8)
+
+    assert limitador._intentar_adquirir(600) == 0.0
+    assert limitador._intentar_adquirir(600) > 0
@@ -0,0 +1,124 @@
+"""
+Tests de punta a punta del modo lote (API de lotes) contra el endpoint local
+"""
+import asyncio
+import json
+import re
+
+
+from cod_backend.config import calcular_costo
+from cod_backend.core import CodificadorNuevo
+from cod_backend.core.codificacion.llm import EndpointLotesLocal
+from cod_backend.core.codificacion.nodes import codificar_combinado as cc
+
+
+def _codificar_prompt(texto_prompt):
+    """Codificación determinista: 'precio' -> código 1, 'sabor' -> concepto nuevo."""
+    codigo_base = int(re.search(r"### CÓDIGO BASE PARA CÓDIGOS NUEVOS\n(\d+)", texto_prompt).group(1))
+    lineas = re.search(r"### RESPUESTAS\n(.*)$", texto_prompt, re.S).group(1).strip().splitlines()
+    salida = {"validaciones": [], "evaluaciones": [], "analisis": []}
+    for linea in lineas:
+        rid_texto, texto = linea.split(". ", 1)
+        rid = int(rid_texto)
+        salida["validaciones"].append({"respuesta_id": rid, "es_valida": True, "razon": "Relevante"})
+        salida["evaluaciones"].append({"respuesta_id": rid, "evaluaciones": [
+            {"codigo": 1, "aplica": "precio" in texto, "confianza": 0.95},
+        ]})
+        nuevos = [{"codigo": codigo_base, "descripcion": "Buen sabor", "texto_original": texto}] if "sabor" in texto else []
+        salida["analisis"].append({
+            "respuesta_id": rid, "respuesta_cubierta_completamente": not nuevos, "conceptos_nuevos": nuevos,
+        })
+    return salida
+
+
+def _textos(total=40):
+    textos = [f"buen sabor del plato {i}" if i % 2 else f"el precio es justo {i}" for i in range(total)]
+    # El proveedor falla la solicitud del batch que contiene esta respuesta
+    textos[25] = "el precio subió, error del proveedor"
+    return textos
+
+
+def test_modo_lote_de_punta_a_punta(archivos_encuesta, monkeypatch):
+    """Los batches van en un solo lote, se ensamblan y los códigos nuevos se reconcilian"""
+    def responder(body):
+        contenido = body["messages"][0]["content"]
+        if "error del proveedor" in contenido:
+            raise RuntimeError("error del proveedor")
+        return _codificar_prompt(contenido)
+
+    endpoint = EndpointLotesLocal(responder, sondeos_en_progreso=2)
+
+    # La solicitud fallida del lote se recodifica en modo interactivo
+    llamadas_interactivas = []
+
+    async def _llamar_llm_falso(state, contexto, respuestas, codigo_base, metricas, al_resolver=None, historial=None):
+        llamadas_interactivas.append(len(respuestas))
+        prompt = cc.obtener_prompt("codificar_combinado")
+        texto = prompt.format(**cc._entradas_prompt(contexto, respuestas, codigo_base))
+        return _codificar_prompt(texto), 10, 5
+
+    monkeypatch.setattr(cc, "_llamar_llm", _llamar_llm_falso)
+
+    ruta_respuestas, ruta_codigos = archivos_encuesta(_textos())
+    codificador = CodificadorNuevo(
+        modelo="gpt-4o-mini",
+        usar_cache=False,
+        streaming=False,
+        modo_lote=True,
+        cliente_lotes=endpoint.cliente(),
+        intervalo_sondeo=0,
+        batches_concurrentes=3,
+        # Respuestas cortas: sin tope caben todas en un batch
+        max_respuestas_batch=10,
+    )
+    progreso = []
+    df = asyncio.run(codificador.ejecutar_codificacion(
+        ruta_respuestas, ruta_codigos, progress_callback=lambda p, m: progreso.append((p, m))
+    ))
+
+    # Todas las filas codificadas, en orden
+    assert len(df) == 40
+    assert list(df["ID"]) == list(range(1, 41))
+    precio = df[df["P1"].str.contains("precio")]["Códigos asignados"]
+    sabor = df[df["P1"].str.contains("sabor")]["Códigos asignados"]
+    assert set(precio) == {"1"}
+    # El mismo concepto propuesto por todos los batches queda con un solo código
+    assert set(sabor) == {"3"}
+    assert list(codificador.df_codigos_nuevos["COD"]) == [3]
+
+    stats = codificador.stats
+    assert stats["solicitudes_lote"] == endpoint.solicitudes_recibidas >= 2
+    assert stats["fallidas_lote"] == 1
+    assert len(llamadas_interactivas) == 1
+    assert stats["ahorro_api_lotes"] > 0
+    assert any("Lote:" in mensaje for _, mensaje in progreso)
+    assert progreso[-1] == (1.0, "✅ Codificación completada")
+
+
+def test_costo_en_lote_con_descuento():
+    """Los tokens procesados por la API de lotes cuestan la mitad"""
+    assert calcular_costo(10_000, 1_000, "gpt-4o", en_lote=True) == calcular_costo(10_000, 1_000, "gpt-4o") / 2
+
+
+def test_solicitud_del_lote_usa_el_prompt_del_nodo():
+    """El body enviado al lote tiene el mismo prompt y formato de salida que la llamada interactiva"""
+    respuestas = [{"fila_excel": 2, "texto": "buen sabor"}, {"fila_excel": 3, "texto": "caro"}]
+    state = {
+        "pregunta": "¿Qué le gustó?",
+        "modelo_gpt": "gpt-4o-mini",
+        "catalogo": [{"codigo": 1, "descripcion": "Precio"}],
+        "batch_respuestas": respuestas,
+        "codificaciones": [],
+        "proximo_codigo_nuevo": 5,
+        "salida_estructurada": True,
+        "usar_cache": False,
+    }
+
+    preparacion, body = cc.preparar_solicitud_lote(state)
+
+    assert preparacion["ids_llm"] == [1, 2]
+    assert body["model"] == "gpt-4o-mini"
+    assert body["response_format"]["json_schema"]["strict"] is True
+    contenido = body["messages"][0]["content"]
+    assert contenido.rstrip().endswith("1. buen sabor\n2. caro")
+    assert json.dumps(body)
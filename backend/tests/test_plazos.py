@@ -0,0 +1,125 @@
+"""
+Tests de los plazos de trabajo y los timeouts por llamada
+"""
+import asyncio
+import time
+
+import pytest
+
+from cod_backend.core import CodificadorNuevo
+from cod_backend.core.codificacion.llm import (
+    BackendCompatible,
+    BackendDeterminista,
+    ChatDeterminista,
+    HistorialLatencias,
+    PlazoTrabajo,
+    acotar_timeout,
+    invocar_llm,
+    timeout_llamada,
+)
+
+
+def test_timeout_derivado_del_historial_y_del_plazo():
+    """El timeout sale del percentil de latencia del trabajo y nunca pasa del presupuesto restante"""
+    assert timeout_llamada("gpt-4o", 10) == 180.0
+
+    historial = HistorialLatencias(percentil=0.5, min_muestras=1, plazo_minimo=0.0)
+    historial.registrar("gpt-4o", 10.0, 10)
+    # 1s por respuesta × 10 respuestas × factor 3
+    assert timeout_llamada("gpt-4o", 10, historial) == 30.0
+    # Piso de LLM_TIMEOUT_MINIMO y techo de LLM_TIMEOUT_LLAMADA
+    assert timeout_llamada("gpt-4o", 1, historial) == 20.0
+    assert timeout_llamada("gpt-4o", 100, historial) == 180.0
+
+    assert acotar_timeout(30.0, None) == 30.0
+    assert acotar_timeout(30.0, time.time() - 1) == 0.0
+    assert 4.0 < acotar_timeout(None, time.time() + 5) <= 5.0
+
+
+def test_llamada_colgada_se_corta_al_vencer_el_plazo():
+    """Una llamada colgada se corta en la fecha límite y no se reintenta"""
+    llamadas = []
+
+    class _ChainColgada:
+        async def ainvoke(self, entradas):
+            llamadas.append(entradas)
+            await asyncio.sleep(10)
+
+    limites = {"rpm": 1000, "tpm": 1_000_000, "concurrencia_inicial": 4, "concurrencia_maxima": 4}
+    inicio = time.time()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(invocar_llm(
+            _ChainColgada(), {}, "plazos:colgado", 100, limites=limites,
+            timeout=60.0, fecha_limite=time.time() + 0.1,
+        ))
+
+    assert len(llamadas) == 1
+    assert time.time() - inicio < 2
+
+
+def test_planificador_sube_concurrencia_y_luego_cambia_de_modelo():
+    """En riesgo, primero se suben los batches en vuelo; al tope del backend, se pasa al modelo rápido"""
+    plazo = PlazoTrabajo(100)
+    plazo.inicio -= 50  # 1 de 4 batches en 50s: la proyección es 200s
+    assert plazo.en_riesgo(1, 4)
+    assert not plazo.en_riesgo(3, 4)
+
+    codificador = CodificadorNuevo(modelo="gpt-4o", backend="determinista")
+    assert codificador._reaccionar_al_plazo(plazo, 1, 4, 2, "gpt-4o") == (4, "gpt-4o")
+
+    limitado = CodificadorNuevo(modelo="gpt-4o", backend=BackendCompatible(concurrencia_maxima=2, nombre="plazos"))
+    assert limitado._reaccionar_al_plazo(plazo, 1, 4, 2, "gpt-4o") == (2, "gpt-4o-mini")
+    # Ya con el modelo rápido no quedan acciones
+    assert limitado._reaccionar_al_plazo(plazo, 2, 4, 2, "gpt-4o-mini") == (2, "gpt-4o-mini")
+
+    assert [a["accion"] for a in plazo.acciones] == ["subir_concurrencia", "modelo_rapido"]
+    assert plazo.acciones[0]["de"] == 2 and plazo.acciones[0]["a"] == 4
+
+    with pytest.raises(ValueError):
+        CodificadorNuevo(modo_lote=True, plazo_segundos=60)
+
+
+class _ChatLento(ChatDeterminista):
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(0.3)
+        return self._generate(messages, stop, **kwargs)
+
+
+class _BackendLento(BackendDeterminista):
+    nombre = "lento"
+    concurrencia_maxima = 1
+
+    def obtener_llm(self, modelo):
+        return _ChatLento(modelo=modelo)
+
+
+def test_plazo_vencido_devuelve_resultado_parcial(archivos_encuesta):
+    """Vencido el plazo, las filas pendientes salen sin códigos y las acciones quedan en las estadísticas"""
+    total = 60
+    ruta_respuestas, ruta_codigos = archivos_encuesta(
+        [f"el precio es justo {i}" for i in range(total)], catalogo={1: "Precio"}
+    )
+
+    codificador = CodificadorNuevo(
+        modelo="determinista",
+        backend=_BackendLento(),
+        usar_cache=False,
+        streaming=False,
+        plazo_segundos=1.0,
+        max_respuestas_batch=10,
+    )
+    df = asyncio.run(codificador.ejecutar_codificacion(ruta_respuestas, ruta_codigos))
+
+    assert len(df) == total
+    codificadas = (df["Códigos asignados"] == "1").sum()
+    assert 0 < codificadas < total
+    assert (df["Códigos asignados"] == "").sum() == total - codificadas
+
+    stats = codificador.stats
+    assert stats["resultado_parcial"] is True
+    assert stats["respuestas_sin_codificar"] == total - codificadas
+    assert stats["total_respuestas_codificadas"] == codificadas
+    acciones = [a["accion"] for a in stats["acciones_plazo"]]
+    assert acciones[0] == "modelo_rapido"
+    assert acciones[-1] == "resultado_parcial"
+    assert set(stats["tokens_por_modelo"]) == {"determinista", "gpt-4o-mini"}
@@ -0,0 +1,111 @@
+"""
+Tests de las solicitudes redundantes ante llamadas lentas (latencia de cola)
+"""
+import asyncio
+import json
+
+from langchain_core.messages import AIMessage
+
+from cod_backend.core.codificacion.llm import HistorialLatencias, primera_valida
+from cod_backend.core.codificacion.nodes import codificar_combinado as cc
+
+
+def test_plazo_aprendido_del_historial():
+    """El plazo es el percentil de la latencia por respuesta, escalado al tamaño de la llamada"""
+    historial = HistorialLatencias(percentil=0.9, min_muestras=3, plazo_minimo=1.0)
+    historial.registrar("gpt-4o", 10.0, 10)
+    historial.registrar("gpt-4o", 20.0, 10)
+    assert historial.plazo("gpt-4o", 10) is None
+
+    historial.registrar("gpt-4o", 40.0, 10)
+    assert historial.plazo("gpt-4o", 10) == 40.0
+    assert historial.plazo("gpt-4o", 5) == 20.0
+    # Nunca por debajo del plazo mínimo, y cada modelo tiene su propio historial
+    assert historial.plazo("gpt-4o", 0) == 4.0
+    historial.plazo_minimo = 30.0
+    assert historial.plazo("gpt-4o", 5) == 30.0
+    assert historial.plazo("gpt-4o-mini", 10) is None
+
+
+def test_primera_valida_cancela_al_perdedor():
+    """Si el original supera el plazo gana la solicitud redundante y el original se cancela"""
+    cancelados = []
+
+    async def llamada(redundante):
+        try:
+            await asyncio.sleep(0.01 if redundante else 5)
+        except asyncio.CancelledError:
+            cancelados.append(redundante)
+            raise
+        return "redundante" if redundante else "original"
+
+    resultado, gano_redundante, perdedores = asyncio.run(primera_valida(llamada, 0.02))
+
+    assert resultado == "redundante"
+    assert gano_redundante is True
+    assert cancelados == [False]
+    assert [p.cancelled() for p in perdedores] == [True]
+
+    # Una llamada que termina dentro del plazo no se duplica
+    async def rapida(redundante):
+        return "redundante" if redundante else "original"
+
+    assert asyncio.run(primera_valida(rapida, 10)) == ("original", False, [])
+
+
+def test_llamada_lenta_se_duplica_y_se_cuenta(monkeypatch):
+    """El nodo duplica la llamada colgada, usa la primera salida válida y suma el intento perdedor"""
+    respuestas = [{"fila_excel": 2, "texto": "buen precio"}, {"fila_excel": 3, "texto": "caro"}]
+    state = {
+        "pregunta": "¿Qué opina?",
+        "modelo_gpt": "gpt-4o-mini",
+        "catalogo": [{"codigo": 1, "descripcion": "Precio"}],
+        "batch_respuestas": respuestas,
+        "codificaciones": [],
+        "proximo_codigo_nuevo": 5,
+        "salida_estructurada": False,
+        "usar_cache": False,
+        "backend_llm": "determinista",
+        "solicitudes_redundantes": True,
+    }
+    preparacion = cc._preparar_codificacion(state)
+    salida = {
+        "validaciones": [{"respuesta_id": rid, "es_valida": True, "razon": "ok"} for rid in preparacion["ids_llm"]],
+        "evaluaciones": [
+            {"respuesta_id": rid, "evaluaciones": [{"codigo": 1, "aplica": True, "confianza": 0.9}]}
+            for rid in preparacion["ids_llm"]
+        ],
+        "analisis": [{"respuesta_id": rid, "conceptos_nuevos": []} for rid in preparacion["ids_llm"]],
+    }
+    llamadas = []
+
+    async def _invocar_falso(chain, entradas, modelo, tokens_estimados, metricas=None, stream=None, limites=None,
+                             timeout=None, fecha_limite=None):
+        llamadas.append(modelo)
+        if len(llamadas) == 1:
+            await asyncio.sleep(5)
+        return AIMessage(
+            content=json.dumps(salida),
+            response_metadata={
+                "finish_reason": "stop",
+                "token_usage": {"prompt_tokens": 100, "completion_tokens": 30, "total_tokens": 130},
+            },
+        )
+
+    monkeypatch.setattr(cc, "invocar_llm", _invocar_falso)
+    historial = HistorialLatencias(min_muestras=1, plazo_minimo=0.05)
+    historial.registrar("gpt-4o-mini", 0.01, 1)
+    metricas = cc._metricas_vacias()
+
+    resultado, prompt_tokens, completion_tokens = asyncio.run(cc._llamar_llm(
+        state, preparacion["contexto"], preparacion["respuestas_llm"], preparacion["codigo_base"], metricas,
+        historial=historial,
+    ))
+
+    assert len(llamadas) == 2
+    assert [v["respuesta_id"] for v in resultado["validaciones"]] == preparacion["ids_llm"]
+    assert (prompt_tokens, completion_tokens) == (100, 30)
+    assert metricas["redundantes_emitidas"] == 1
+    assert metricas["redundantes_ganadoras"] == 1
+    # El original se canceló en vuelo: se cuenta su prompt estimado
+    assert metricas["tokens_redundantes"] > 0
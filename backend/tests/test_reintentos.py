@@ -0,0 +1,89 @@
+"""
+Tests para reintentos del LLM y división de batches con salida inválida
+"""
+import asyncio
+
+import httpx
+import pytest
+from langchain_core.messages import AIMessage
+
+from cod_backend.core.codificacion.llm import invocacion
+from cod_backend.core.codificacion.nodes import codificar_combinado as cc
+
+
+class _ChainInestable:
+    """Chain falsa que falla con error de conexión las primeras N veces"""
+
+    def __init__(self, fallos: int):
+        self.fallos = fallos
+        self.llamadas = 0
+
+    async def ainvoke(self, _entradas):
+        self.llamadas += 1
+        if self.llamadas <= self.fallos:
+            raise httpx.ConnectError("conexión reiniciada")
+        return AIMessage(content="{}")
+
+
+def test_reintenta_errores_transitorios(monkeypatch):
+    """Los errores de conexión se reintentan y se cuentan en las métricas"""
+    monkeypatch.setattr(invocacion, "BACKOFF_MAXIMO", 0.01)
+    chain = _ChainInestable(fallos=2)
+    metricas = {}
+
+    respuesta = asyncio.run(invocacion.invocar_llm(chain, {}, "modelo-test", 10, metricas=metricas))
+
+    assert respuesta.content == "{}"
+    assert chain.llamadas == 3
+    assert metricas["reintentos_llm"] == 2
+
+
+def test_agota_reintentos_y_propaga(monkeypatch):
+    """Si el error persiste, se propaga tras el último intento"""
+    monkeypatch.setattr(invocacion, "BACKOFF_MAXIMO", 0.01)
+    chain = _ChainInestable(fallos=100)
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(invocacion.invocar_llm(chain, {}, "modelo-test", 10))
+    assert chain.llamadas == invocacion.MAX_INTENTOS_TRANSITORIOS
+
+
+def test_parsear_salida_truncada():
+    """Una salida con finish_reason=length se considera inválida"""
+    respuesta = AIMessage(content='{"validaciones": [', response_metadata={"finish_reason": "length"})
+
+    with pytest.raises(cc.ErrorSalidaLLM):
+        cc._parsear_salida(respuesta)
+
+
+def test_biseccion_divide_hasta_obtener_salida_valida(monkeypatch):
+    """Un batch con salida inválida se divide en mitades y se combinan los resultados"""
+
+    async def _llamar_llm_falso(state, contexto, respuestas, codigo_base, metricas, al_resolver=None, historial=None):
+        if len(respuestas) > 2:
+            raise cc.ErrorSalidaLLM("truncada", prompt_tokens=100, completion_tokens=50)
+        ids = [int(r.split(".")[0]) for r in respuestas]
+        return {
+            "validaciones": [{"respuesta_id": i, "es_valida": True, "razon": ""} for i in ids],
+            "evaluaciones": [],
+            "analisis": [
+                {"respuesta_id": i, "conceptos_nuevos": [{"codigo": codigo_base, "descripcion": f"Concepto {i}"}]}
+                for i in ids[:1]
+            ],
+        }, 10, 5
+
+    monkeypatch.setattr(cc, "_llamar_llm", _llamar_llm_falso)
+    respuestas = [f"{i}. respuesta {i}" for i in range(1, 6)]
+    metricas = {"reintentos_llm": 0, "reintentos_429": 0, "divisiones_batch": 0}
+
+    resultado, prompt_tokens, completion_tokens = asyncio.run(
+        cc._codificar_con_biseccion({}, {}, respuestas, 50, metricas)
+    )
+
+    assert [v["respuesta_id"] for v in resultado["validaciones"]] == [1, 2, 3, 4, 5]
+    codigos = [c["codigo"] for a in resultado["analisis"] for c in a["conceptos_nuevos"]]
+    assert len(codigos) == len(set(codigos))
+    assert metricas["divisiones_batch"] == 2
+    # 2 llamadas fallidas (100+50) y 3 exitosas (10+5)
+    assert prompt_tokens == 230
+    assert completion_tokens == 115
@@ -0,0 +1,83 @@
+"""
+Tests para el parseo y la validación de la salida combinada del LLM
+"""
+import json
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from cod_backend.core.codificacion.llm import FORMATO_RESPUESTA
+from cod_backend.core.codificacion.nodes import codificar_combinado as cc
+
+SALIDA = {
+    "validaciones": [{"respuesta_id": 1, "es_valida": True, "razon": "Relevante"}],
+    "evaluaciones": [{"respuesta_id": 1, "evaluaciones": [{"codigo": 2, "aplica": True, "confianza": 0.9}]}],
+    "analisis": [{
+        "respuesta_id": 1,
+        "respuesta_cubierta_completamente": False,
+        "conceptos_nuevos": [{"codigo": 10, "descripcion": "Sabor", "texto_original": "rico"}],
+    }],
+}
+
+
+def test_salida_estructurada_valida_sin_reparar():
+    """El JSON válido se parsea por el camino rápido y se valida contra el esquema"""
+    metricas = {"reparaciones_json": 0}
+
+    resultado = cc._parsear_salida(AIMessage(content=json.dumps(SALIDA)), estructurada=True, metricas=metricas)
+
+    assert resultado == SALIDA
+    assert metricas["reparaciones_json"] == 0
+
+
+def test_salida_fuera_de_esquema_es_invalida():
+    """Una salida que no cumple el esquema se trata como inválida (se divide el batch)"""
+    salida = {**SALIDA, "validaciones": [{"respuesta_id": "uno", "es_valida": True}]}
+
+    with pytest.raises(cc.ErrorSalidaLLM):
+        cc._parsear_salida(AIMessage(content=json.dumps(salida)), estructurada=True)
+
+
+def test_reparacion_solo_como_respaldo_y_contada():
+    """Los bloques markdown y las comas sobrantes pasan por la reparación, que se cuenta"""
+    contenido = "```json\n" + json.dumps(SALIDA)[:-1] + ",}\n```"
+    metricas = {"reparaciones_json": 0}
+
+    resultado = cc._parsear_salida(AIMessage(content=contenido), metricas=metricas)
+
+    assert resultado == SALIDA
+    assert metricas["reparaciones_json"] == 1
+
+
+def test_formato_respuesta_estricto():
+    """El esquema enviado al modelo es estricto y no admite campos adicionales"""
+    esquema = FORMATO_RESPUESTA["json_schema"]["schema"]
+
+    assert FORMATO_RESPUESTA["json_schema"]["strict"] is True
+    assert esquema["additionalProperties"] is False
+    assert all(d["additionalProperties"] is False for d in esquema["$defs"].values())
+    assert set(esquema["required"]) == {"validaciones", "evaluaciones", "analisis"}
+
+
+def test_salida_compacta_se_expande_al_formato_completo():
+    """La salida compacta (solo códigos que aplican) llega a ensamblar en el formato de siempre"""
+    compacta = {"r": [
+        {"id": 1, "ok": True, "razon": "", "cod": [{"c": 2, "p": 0.9}], "cub": False,
+         "nuevos": [{"c": 10, "d": "Sabor", "t": "rico"}]},
+        {"id": 2, "ok": False, "razon": "Ruido", "cod": [], "cub": False, "nuevos": []},
+    ]}
+
+    resultado = cc._parsear_salida(
+        AIMessage(content=json.dumps(compacta)), estructurada=True, protocolo="compacto"
+    )
+
+    assert resultado["validaciones"][0] == {**SALIDA["validaciones"][0], "razon": "Válida"}
+    assert resultado["validaciones"][1] == {"respuesta_id": 2, "es_valida": False, "razon": "Ruido"}
+    assert resultado["evaluaciones"][0] == SALIDA["evaluaciones"][0]
+    assert resultado["analisis"][0] == SALIDA["analisis"][0]
+
+
+def test_salida_completa_con_protocolo_compacto_es_invalida():
+    """Si se pidió el protocolo compacto, una salida en otro formato se trata como inválida"""
+    with pytest.raises(cc.ErrorSalidaLLM):
+        cc._parsear_salida(AIMessage(content=json.dumps(SALIDA)), protocolo="compacto")
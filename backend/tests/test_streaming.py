@@ -0,0 +1,84 @@
+"""
+Tests para la lectura incremental de la salida del LLM en streaming
+"""
+import asyncio
+import json
+
+from cod_backend.core.codificacion.llm import ParserJSONIncremental, SeguimientoStream
+
+SALIDA = {
+    "validaciones": [
+        {"respuesta_id": 1, "es_valida": True, "razon": "Dice \"rico\" {sic}"},
+        {"respuesta_id": 2, "es_valida": False, "razon": "Ruido ]"},
+    ],
+    "evaluaciones": [
+        {"respuesta_id": 1, "evaluaciones": [{"codigo": 2, "aplica": True, "confianza": 0.9}]},
+        {"respuesta_id": 2, "evaluaciones": []},
+    ],
+    "analisis": [
+        {"respuesta_id": 1, "respuesta_cubierta_completamente": True, "conceptos_nuevos": []},
+    ],
+}
+
+
+def _trozos(texto, tamanio=7):
+    return [texto[i:i + tamanio] for i in range(0, len(texto), tamanio)]
+
+
+def test_parser_entrega_elementos_al_cerrarse():
+    """Cada elemento de los arreglos de primer nivel se entrega una vez, aunque llegue en trozos"""
+    parser = ParserJSONIncremental()
+    elementos = []
+    for trozo in _trozos(json.dumps(SALIDA)):
+        elementos.extend(parser.alimentar(trozo))
+
+    assert elementos == [
+        ("validaciones", SALIDA["validaciones"][0]),
+        ("validaciones", SALIDA["validaciones"][1]),
+        ("evaluaciones", SALIDA["evaluaciones"][0]),
+        ("evaluaciones", SALIDA["evaluaciones"][1]),
+        ("analisis", SALIDA["analisis"][0]),
+    ]
+
+
+def test_seguimiento_resuelve_con_todas_las_secciones():
+    """En el protocolo completo una respuesta se resuelve cuando llegó a las tres secciones"""
+    notificadas = []
+
+    async def al_resolver(ids):
+        notificadas.append(list(ids))
+
+    async def correr():
+        seguimiento = SeguimientoStream("completo", al_resolver)
+        for trozo in _trozos(json.dumps(SALIDA)):
+            await seguimiento.alimentar(trozo)
+        return seguimiento
+
+    seguimiento = asyncio.run(correr())
+
+    assert notificadas == [[1]]
+    assert seguimiento.resueltas == {1}
+
+
+def test_seguimiento_compacto_y_reinicio():
+    """En el protocolo compacto basta un objeto; al reiniciar no se repiten notificaciones"""
+    notificadas = []
+
+    async def al_resolver(ids):
+        notificadas.extend(ids)
+
+    compacta = json.dumps({"r": [
+        {"id": 1, "ok": True, "razon": "", "cod": [{"c": 2, "p": 0.9}], "cub": True, "nuevos": []},
+        {"id": 2, "ok": False, "razon": "Ruido", "cod": [], "cub": False, "nuevos": []},
+    ]})
+
+    async def correr():
+        seguimiento = SeguimientoStream("compacto", al_resolver)
+        await seguimiento.alimentar(compacta[:60])
+        seguimiento.reiniciar()
+        for trozo in _trozos(compacta):
+            await seguimiento.alimentar(trozo)
+
+    asyncio.run(correr())
+
+    assert notificadas == [1, 2]